@@ -12,6 +12,7 @@ import time
 from stat import S_ISDIR, S_ISREG
 
 import paramiko
+from ctf.common import profiling
 from ctf.common.connections.constants import (
     DEFAULT_TIMEOUT_SECONDS,
     LF,
@@ -245,7 +246,8 @@ class SSHConnection(object):
                         f"connect | no time left to retry ip {self.ip_address}"
                     )
                     break  # no time left for a retry
-                time.sleep(self.connect_retry_interval_sec)
+                with profiling.span("connect_retry", "sleep", host=self.ip_address):
+                    time.sleep(self.connect_retry_interval_sec)
                 self._debug_log(f"connect | retrying ip f{self.ip_address}")
         except Exception as e:
             result["error"] = 1
@@ -286,61 +288,71 @@ class SSHConnection(object):
         result["returncode"] = 0
         result["stderr"] = ""
 
-        try:
-            result = self.connect()
-            if result["error"] != 0:
-                return result
-
-            use_interactive_mode, shell_name, reason = self._can_use_interactive_mode()
-            if not use_interactive_mode and reason:
-                logger.warning(reason)
+        with profiling.span(
+            "ssh_command",
+            "command",
+            host=self.ip_address,
+            cmd=cmd[: profiling.MAX_CMD_CHARS],
+        ) as span:
+            try:
+                result = self.connect()
+                if result["error"] != 0:
+                    return result
+
+                use_interactive_mode, shell_name, reason = self._can_use_interactive_mode()
+                if not use_interactive_mode and reason:
+                    logger.warning(reason)
+
+                # '&' is the standard shell command background process operator
+                # CTF is currently written to track foreground shell processes only
+                # for advanced features like Hard Stop or Live Logs
+                if use_interactive_mode and cmd.endswith("&"):
+                    use_interactive_mode = False
+                    logger.warning(
+                        "Skipping SSH interactive mode since Command will create a background process"
+                    )
 
-            # '&' is the standard shell command background process operator
-            # CTF is currently written to track foreground shell processes only
-            # for advanced features like Hard Stop or Live Logs
-            if use_interactive_mode and cmd.endswith("&"):
-                use_interactive_mode = False
-                logger.warning(
-                    "Skipping SSH interactive mode since Command will create a background process"
+                logger.info(
+                    f"SSH Send Shell Command will{'' if use_interactive_mode else ' not'} use interactive mode"
                 )
 
-            logger.info(
-                f"SSH Send Shell Command will{'' if use_interactive_mode else ' not'} use interactive mode"
-            )
-
-            if use_interactive_mode:
-                (
-                    result["message"],
-                    result["stderr"],
-                    result["returncode"],
-                ) = self.ssh.send(
-                    cmd,
-                    shell_family_name=self.shell_family_name,
-                    shell_name=shell_name,
-                    timeout=timeout,
-                    on_process_start=on_process_start,
-                    on_process_stop=on_process_stop,
-                    on_stdin_send=on_stdin_send,
-                    on_stdout_recv=on_stdout_recv,
-                    on_stderr_recv=on_stderr_recv,
-                    check_cancel=check_cancel,
-                    check_cancel_complete=check_cancel_complete,
-                )
-            else:
-                (
-                    result["message"],
-                    result["stderr"],
-                    result["returncode"],
-                ) = self.ssh.exec(
-                    cmd,
-                    timeout=timeout,
-                )
+                if use_interactive_mode:
+                    (
+                        result["message"],
+                        result["stderr"],
+                        result["returncode"],
+                    ) = self.ssh.send(
+                        cmd,
+                        shell_family_name=self.shell_family_name,
+                        shell_name=shell_name,
+                        timeout=timeout,
+                        on_process_start=on_process_start,
+                        on_process_stop=on_process_stop,
+                        on_stdin_send=on_stdin_send,
+                        on_stdout_recv=on_stdout_recv,
+                        on_stderr_recv=on_stderr_recv,
+                        check_cancel=check_cancel,
+                        check_cancel_complete=check_cancel_complete,
+                    )
+                else:
+                    (
+                        result["message"],
+                        result["stderr"],
+                        result["returncode"],
+                    ) = self.ssh.exec(
+                        cmd,
+                        timeout=timeout,
+                    )
 
-        except Exception as e:
-            result["error"] = 1
-            result["message"] = str(e)
-        finally:
-            self.disconnect()
+            except Exception as e:
+                result["error"] = 1
+                result["message"] = str(e)
+            finally:
+                self.disconnect()
+            span.set(
+                bytes=len(result.get("message") or "")
+                + len(result.get("stderr") or "")
+            )
 
         if "message" in result:
             self.logs.append(result["message"])
@@ -606,6 +618,18 @@ class SSHConnection(object):
 
         return result
 
+    def get_transport(self):
+        """
+        Return the ssh transport of the calling thread's connection, e.g. to
+        open port forwarding channels. The calling thread must be connected.
+        :return: paramiko Transport
+        """
+        if self.ssh is None:
+            raise ConnectionError(
+                f"get_transport | not connected | ip {self.ip_address}"
+            )
+        return self.ssh.get_transport()
+
     def disconnect(self):
         """
         Disconnect the calling thread from host.
@@ -0,0 +1,156 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+SshPortForwarder forwards a local TCP port to a host/port reachable from an
+    ssh server (like `ssh -L`), over a single ssh connection that stays open
+    until close() is called.
+
+The ssh connection is established by, and belongs to, the forwarder thread
+    (see ThreadSafeSshConnection). Each accepted local connection gets its
+    own "direct-tcpip" channel on that connection, so any number of local
+    clients can use the forward concurrently.
+"""
+
+import logging
+import select
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per socket/channel recv
+FORWARD_READ_BYTES = 65536
+# How often the forwarder thread checks whether it was closed
+ACCEPT_POLL_SECONDS = 0.5
+
+
+class SshPortForwarder:
+    def __init__(
+        self,
+        connection,
+        remote_host: str,
+        remote_port: int,
+        local_host: str = "127.0.0.1",
+        local_port: int = 0,
+    ):
+        """
+        :param connection: SSHConnection to forward through
+        :param remote_host: destination host, as seen from the ssh server
+        :param remote_port: destination port
+        :param local_host: local address to listen on
+        :param local_port: local port to listen on (0 picks a free port)
+        """
+        self.connection = connection
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((local_host, local_port))
+        self._server.settimeout(ACCEPT_POLL_SECONDS)
+        self.local_host, self.local_port = self._server.getsockname()
+        self._closed = threading.Event()
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._serve,
+            name=f"SshPortForwarder-{remote_host}:{remote_port}",
+            daemon=True,
+        )
+
+    def start(self, timeout: float = 60) -> None:
+        """Connect and start forwarding.
+        Raises ConnectionError if the ssh connection fails.
+        """
+        self._server.listen(socket.SOMAXCONN)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            self.close()
+            raise ConnectionError(
+                f"port forward to {self.remote_host}:{self.remote_port} | connect timed out"
+            )
+        if self._error is not None:
+            self.close()
+            raise ConnectionError(
+                f"port forward to {self.remote_host}:{self.remote_port} | {self._error}"
+            )
+
+    def close(self) -> None:
+        """Stop forwarding and disconnect. Open channels are closed."""
+        self._closed.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(ACCEPT_POLL_SECONDS * 4)
+        self._server.close()
+
+    def _connect(self):
+        result = self.connection.connect()
+        if result["error"] != 0:
+            raise ConnectionError(result["message"])
+        return self.connection.get_transport()
+
+    def _serve(self) -> None:
+        try:
+            transport = self._connect()
+        except Exception as e:
+            self._error = str(e)
+            self._ready.set()
+            return
+        self._ready.set()
+
+        try:
+            while not self._closed.is_set():
+                try:
+                    client, client_addr = self._server.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+
+                try:
+                    if not transport.is_active():
+                        logger.info("port forward | reconnecting")
+                        self.connection.disconnect()
+                        transport = self._connect()
+                    channel = transport.open_channel(
+                        "direct-tcpip",
+                        (self.remote_host, self.remote_port),
+                        client_addr,
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"port forward to {self.remote_host}:{self.remote_port} "
+                        + f"| failed to open channel: {e}"
+                    )
+                    client.close()
+                    continue
+
+                threading.Thread(
+                    target=self._pump, args=(client, channel), daemon=True
+                ).start()
+        finally:
+            self.connection.disconnect()
+
+    def _pump(self, client, channel) -> None:
+        """Copy data both ways between a local client and its channel"""
+        try:
+            while not self._closed.is_set():
+                readable, _, _ = select.select(
+                    [client, channel], [], [], ACCEPT_POLL_SECONDS
+                )
+                if client in readable:
+                    data = client.recv(FORWARD_READ_BYTES)
+                    if not data:
+                        break
+                    channel.sendall(data)
+                if channel in readable:
+                    data = channel.recv(FORWARD_READ_BYTES)
+                    if not data:
+                        break
+                    client.sendall(data)
+        except OSError as e:
+            logger.debug(f"port forward | connection closed: {e}")
+        finally:
+            channel.close()
+            client.close()
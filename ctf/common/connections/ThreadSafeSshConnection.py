@@ -42,6 +42,7 @@ from typing import Any, Tuple, Union
 
 import ctf.common.constants as constants
 import paramiko
+from ctf.common import profiling
 from ctf.common.connections.constants import (
     CMD_END_MSG,
     DEFAULT_POLL_DELAY_SECONDS,
@@ -225,16 +226,17 @@ class ThreadSafeSshConnection:
         self._info_log("connect", thread_id)
         ssh_client = state.ssh_client
         ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh_client.connect(
-            hostname=self.ip,
-            port=self.port,
-            username=self.username,
-            password=self.password,
-            timeout=self.timeout,
-            sock=self._create_tunnel(state),
-            allow_agent=self.use_ssh_agent,
-            pkey=self.private_key,
-        )
+        with profiling.span("ssh_connect", "connect", host=self.ip):
+            ssh_client.connect(
+                hostname=self.ip,
+                port=self.port,
+                username=self.username,
+                password=self.password,
+                timeout=self.timeout,
+                sock=self._create_tunnel(state),
+                allow_agent=self.use_ssh_agent,
+                pkey=self.private_key,
+            )
 
         state.scp = SCPClient(ssh_client.get_transport())
         # TODO open sftp channel here once "sftp_enabled" is
@@ -248,6 +250,13 @@ class ThreadSafeSshConnection:
 
         self._info_log("connect | ok", thread_id)
 
+    def get_transport(self) -> paramiko.Transport:
+        """Return the ssh transport of the calling thread's connection"""
+        thread_id, state = self._get_state()
+        if not state.connected:
+            raise ConnectionError(f"get_transport | not connected | thread {thread_id}")
+        return state.ssh_client.get_transport()
+
     def disconnect(self) -> None:
         """Disconnect from the ssh server and jump host"""
         thread_id, state = self._get_state()
@@ -605,22 +614,23 @@ class ThreadSafeSshConnection:
             f'sftp {op} | path "{path}" | local_path "{local_path}"', thread_id
         )
         ret = None
-        if op == "listdir_attr":
-            ret = state.sftp.listdir_attr(path=path)
-        elif op == "listdir":
-            ret = state.sftp.listdir(path=path)
-        elif op == "get":
-            state.sftp.get(remotepath=path, localpath=local_path)
-        elif op == "stat":
-            ret = state.sftp.stat(path=path)
-        elif op == "mkdir":
-            state.sftp.mkdir(path=path)
-        elif op == "remove":
-            state.sftp.remove(path=path)
-        elif op == "rmdir":
-            state.sftp.rmdir(path=path)
-        else:
-            raise ValueError(f"Unknown sftp operation {op}")
+        with profiling.span(f"sftp_{op}", "transfer", host=self.ip, path=path):
+            if op == "listdir_attr":
+                ret = state.sftp.listdir_attr(path=path)
+            elif op == "listdir":
+                ret = state.sftp.listdir(path=path)
+            elif op == "get":
+                state.sftp.get(remotepath=path, localpath=local_path)
+            elif op == "stat":
+                ret = state.sftp.stat(path=path)
+            elif op == "mkdir":
+                state.sftp.mkdir(path=path)
+            elif op == "remove":
+                state.sftp.remove(path=path)
+            elif op == "rmdir":
+                state.sftp.rmdir(path=path)
+            else:
+                raise ValueError(f"Unknown sftp operation {op}")
         return ret
 
     def scp(self, op, local_path, remote_path, recursive=False):
@@ -637,22 +647,23 @@ class ThreadSafeSshConnection:
         )
 
         ret = None
-        if op == "put":
-            ret = state.scp.put(
-                files=local_path, remote_path=remote_path, recursive=recursive
-            )
-        elif op == "get":
-            ret = state.scp.get(
-                local_path=local_path,
-                remote_path=remote_path,
-                recursive=recursive,
-                preserve_times=True,
-            )
-        elif op == "get_glob":
-            with SCPClient(
-                state.ssh_client.get_transport(), sanitize=lambda x: x
-            ) as scp:
-                scp.get(remote_path=remote_path, local_path=local_path)
-        else:
-            raise ValueError(f"Unknown sftp operation {op}")
+        with profiling.span(f"scp_{op}", "transfer", host=self.ip, path=remote_path):
+            if op == "put":
+                ret = state.scp.put(
+                    files=local_path, remote_path=remote_path, recursive=recursive
+                )
+            elif op == "get":
+                ret = state.scp.get(
+                    local_path=local_path,
+                    remote_path=remote_path,
+                    recursive=recursive,
+                    preserve_times=True,
+                )
+            elif op == "get_glob":
+                with SCPClient(
+                    state.ssh_client.get_transport(), sanitize=lambda x: x
+                ) as scp:
+                    scp.get(remote_path=remote_path, local_path=local_path)
+            else:
+                raise ValueError(f"Unknown sftp operation {op}")
         return ret
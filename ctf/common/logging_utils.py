@@ -5,11 +5,26 @@
 
 import functools
 import inspect
+import itertools
 import logging
+import reprlib
+import threading
 import time
+from typing import Any, Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Default characters of logged argument and result values (longer values are
+# abbreviated, see summarize())
+DEFAULT_MAX_CHARS = 1000
+# Items of a logged container shown before it is abbreviated
+MAX_ITEMS = 20
+# Nesting levels of a logged container shown before it is abbreviated
+MAX_LEVELS = 6
+# Buckets of the call duration histograms (the upper bound of bucket i is
+# 2**i microseconds)
+HISTOGRAM_BUCKETS = 40
+
 
 class CommonLogFilter(logging.Formatter):
     def filter(self, record):
@@ -29,10 +44,16 @@ def log_call(
     result: bool = True,
     timer: bool = False,
     exception: bool = False,
+    max_chars: int = DEFAULT_MAX_CHARS,
 ):
     """
     function decorator that logs the lifecycle of the function. Can be called with or without params.
 
+    Nothing is formatted unless the log level is enabled, and arguments and
+    results are only formatted (abbreviated to about `max_chars` characters)
+    when a handler emits the message. While a CallHistogram is installed
+    (see set_call_histogram()), call durations are recorded into it.
+
     Args:
         func (callable, optional): the function to be docrated.
         debug (bool, optional): set to True to log as debug, default is info.
@@ -42,63 +63,75 @@ def log_call(
         result (bool, optional): log the retuen value of the function.
         timer (bool, optional): log how long the function took (in seconds).
         exception (bool, optional): log any exception raised by the decorated function, then re-raise.
+        max_chars (int, optional): characters of logged params and return values.
 
     Returns:
         callable: decorated function
     """
 
-    level = "debug" if debug else "info"
-    frame = inspect.currentframe()
-    frame_index = 1
-    func_frame = inspect.getouterframes(frame)[frame_index]
-    func_lineno = func_frame.lineno
+    level = logging.DEBUG if debug else logging.INFO
+    func_lineno = inspect.currentframe().f_back.f_lineno
+
+    called_format = None
+    if called:
+        called_format = (
+            "%s called with args: %s and kwargs: %s" if params else "%s called"
+        )
+    returned_format = None
+    if timer:
+        returned_format = "%s took %s seconds."
+    elif returned or result:
+        returned_format = "%s returned."
+    if returned_format and result:
+        returned_format += " Result: %s"
 
     def decorator(func):
         overrides = {
             "filename_override": func.__module__,
             "lineno_override": func_lineno,
         }
+        qualname = func.__qualname__
 
         @functools.wraps(func)
         def inner(*args, **kwargs):
-            if timer:
-                start_time = time.time()
-            if called:
-                message = f"{func.__qualname__} called"
+            enabled = logger.isEnabledFor(level)
+            histogram = _call_histogram
+            if not enabled and histogram is None and not exception:
+                return func(*args, **kwargs)
+
+            if enabled and called_format:
+                call_args = (qualname,)
                 if params:
-                    message += f" with args: {args} and kwargs: {kwargs}"
-                _logger(
-                    message,
-                    level,
-                    overrides,
-                )
+                    call_args += (
+                        _LazySummary(args, max_chars),
+                        _LazySummary(kwargs, max_chars),
+                    )
+                logger.log(level, called_format, *call_args, extra=overrides)
 
             # actual function call
-            if exception:
-                try:
-                    result = func(*args, **kwargs)
-                except Exception as e:
-                    _logger(
-                        f"{e.__class__.__name__} was raised during call of {func.__qualname__}",
-                        "exception",
-                        overrides,
+            start_time = time.perf_counter()
+            try:
+                ret = func(*args, **kwargs)
+            except Exception as e:
+                if exception:
+                    logger.exception(
+                        "%s was raised during call of %s",
+                        e.__class__.__name__,
+                        qualname,
+                        extra=overrides,
                     )
-                    raise
-            else:
-                result = func(*args, **kwargs)
-
-            message = ""
-            if timer:
-                message += (
-                    f"{func.__qualname__} took {time.time() - start_time} seconds."
-                )
-            elif returned or result:
-                message += f"{func.__name__} returned."
-            if result:
-                message += f" Result: {result}"
-            if message:
-                _logger(message, level, overrides)
-            return result
+                raise
+            finally:
+                elapsed = time.perf_counter() - start_time
+                if histogram is not None:
+                    histogram.record(qualname, elapsed)
+
+            if enabled and returned_format:
+                returned_args = (qualname, elapsed) if timer else (func.__name__,)
+                if result:
+                    returned_args += (_LazySummary(ret, max_chars, as_str=True),)
+                logger.log(level, returned_format, *returned_args, extra=overrides)
+            return ret
 
         return inner
 
@@ -108,5 +141,137 @@ def log_call(
     return decorator
 
 
-def _logger(message, level, overrides):
-    getattr(logger, level, "info")(message, extra=overrides)
+class _AbbreviatedRepr(reprlib.Repr):
+    def __init__(self, max_chars: int) -> None:
+        super().__init__()
+        self.maxlevel = MAX_LEVELS
+        for attr in ("maxdict", "maxlist", "maxtuple", "maxset", "maxfrozenset"):
+            setattr(self, attr, MAX_ITEMS)
+        for attr in ("maxstring", "maxlong", "maxother"):
+            setattr(self, attr, max_chars)
+
+    def repr_dict(self, x: Dict, level: int) -> str:
+        # Keep the insertion order (reprlib sorts keys), as str() does
+        if not x:
+            return "{}"
+        if level <= 0:
+            return "{...}"
+        pieces = [
+            f"{self.repr1(key, level - 1)}: {self.repr1(value, level - 1)}"
+            for key, value in itertools.islice(x.items(), self.maxdict)
+        ]
+        if len(x) > self.maxdict:
+            pieces.append("...")
+        return "{" + ", ".join(pieces) + "}"
+
+
+@functools.lru_cache(maxsize=None)
+def _get_repr(max_chars: int) -> _AbbreviatedRepr:
+    return _AbbreviatedRepr(max_chars)
+
+
+def summarize(value: Any, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """Return the repr() of a value, abbreviated to about `max_chars`
+    characters (with the size of abbreviated strings and containers).
+    Large containers are not formatted in full.
+    """
+    text = _get_repr(max_chars).repr(value)
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    if isinstance(value, (str, bytes)) and len(value) > max_chars:
+        text += f" ({len(value)} chars)"
+    elif isinstance(value, (dict, list, tuple, set, frozenset)):
+        if len(value) > MAX_ITEMS:
+            text += f" ({type(value).__name__} of {len(value)} items)"
+    return text
+
+
+class _LazySummary:
+    """Log message argument formatted (by summarize()) only when emitted"""
+
+    __slots__ = ("value", "max_chars", "as_str")
+
+    def __init__(self, value: Any, max_chars: int, as_str: bool = False) -> None:
+        self.value = value
+        self.max_chars = max_chars
+        # Format strings as str() rather than repr()
+        self.as_str = as_str
+
+    def __str__(self) -> str:
+        if self.as_str and isinstance(self.value, str):
+            if len(self.value) <= self.max_chars:
+                return self.value
+            return self.value[: self.max_chars] + f"... ({len(self.value)} chars)"
+        return summarize(self.value, self.max_chars)
+
+
+class CallHistogram:
+    def __init__(self) -> None:
+        """Histograms of the durations of log_call-decorated functions"""
+        # Map from function to [count, total seconds, max seconds, buckets]
+        self.calls: Dict[str, List] = {}
+        # Protects: calls
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        bucket = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        with self._lock:
+            calls = self.calls.get(name)
+            if calls is None:
+                calls = self.calls[name] = [0, 0.0, 0.0, [0] * HISTOGRAM_BUCKETS]
+            calls[0] += 1
+            calls[1] += seconds
+            calls[2] = max(calls[2], seconds)
+            calls[3][bucket] += 1
+
+    @staticmethod
+    def _percentile(buckets: List[int], count: int, p: float, max_s: float) -> float:
+        """Upper bound (in seconds) of the bucket holding percentile `p`"""
+        rank = count * p / 100
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if seen >= rank:
+                return min(2**i / 1e6, max_s)
+        return max_s
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Return the call durations of every function, as rows
+        {function, calls, total s, mean ms, p50 ms, p99 ms, max ms}, by
+        decreasing total time
+        """
+        with self._lock:
+            calls = {
+                name: (n, total, max_s, list(buckets))
+                for name, (n, total, max_s, buckets) in self.calls.items()
+            }
+        rows = [
+            {
+                "function": name,
+                "calls": n,
+                "total s": round(total, 3),
+                "mean ms": round(total / n * 1000, 3),
+                "p50 ms": round(self._percentile(buckets, n, 50, max_s) * 1000, 3),
+                "p99 ms": round(self._percentile(buckets, n, 99, max_s) * 1000, 3),
+                "max ms": round(max_s * 1000, 3),
+            }
+            for name, (n, total, max_s, buckets) in calls.items()
+        ]
+        rows.sort(key=lambda row: row["total s"], reverse=True)
+        return rows
+
+
+# Installed call histogram (None while call durations are not recorded)
+_call_histogram: Optional[CallHistogram] = None
+
+
+def set_call_histogram(histogram: Optional[CallHistogram]) -> None:
+    """Record the durations of log_call-decorated functions into `histogram`
+    (None to stop recording)
+    """
+    global _call_histogram
+    _call_histogram = histogram
+
+
+def get_call_histogram() -> Optional[CallHistogram]:
+    return _call_histogram
@@ -0,0 +1,159 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Process-wide registry of device driver classes, keyed by driver content.
+
+CTF sends the driver source of every device (base64 encoded), and setups
+typically share a handful of drivers across many devices. The registry
+compiles each distinct driver once per process, and caches its bytecode on
+disk so later runs skip parsing and compiling it altogether.
+"""
+
+import ast
+import base64
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import sys
+import threading
+import types
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytecode cache directory, unless overridden by $CTF_DRIVER_CACHE_DIR
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ctf", "drivers")
+
+# Serializes parsing and compiling, as the AST conversion of some Python
+# versions is not thread-safe (drivers are compiled concurrently)
+_compile_lock = threading.Lock()
+
+
+class DriverRegistry:
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> None:
+        """Registry of driver classes, with bytecode cached in `cache_dir`
+        (not cached on disk if None)
+        """
+        self.cache_dir = cache_dir
+        # Map from driver content hash to driver class
+        self._classes: Dict[str, Optional[type]] = {}
+        # Protects: _classes, _key_locks
+        self._lock = threading.Lock()
+        # Per-driver locks, so each driver is only compiled once when devices
+        # are initialized concurrently
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def get_driver_class(self, driver_file: str, file_name: str) -> Optional[type]:
+        """Return the (first) class defined by a base64 encoded driver source,
+        or None if the driver cannot be loaded
+        """
+        key = hashlib.sha256(driver_file.encode()).hexdigest()
+        with self._lock:
+            if key in self._classes:
+                return self._classes[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._classes:
+                    return self._classes[key]
+            try:
+                driver_class = self._load_class(key, driver_file, file_name)
+            except Exception as e:
+                logger.exception(f"Error retrieving driver class object: {e}")
+                driver_class = None
+            with self._lock:
+                self._classes[key] = driver_class
+                del self._key_locks[key]
+        return driver_class
+
+    def _load_class(self, key: str, driver_file: str, file_name: str) -> type:
+        cached = self._read_cache(key)
+        if cached:
+            class_name, code = cached
+        else:
+            source = base64.b64decode(driver_file).decode("utf-8")
+            class_name, code = self._compile(source, file_name)
+            self._write_cache(key, class_name, code)
+
+        module_name = f"ctf_driver_{key[:16]}"
+        module = types.ModuleType(module_name)
+        module.__file__ = file_name
+        sys.modules[module_name] = module
+        try:
+            exec(code, module.__dict__)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return getattr(module, class_name)
+
+    @staticmethod
+    def _compile(source: str, file_name: str) -> Tuple[str, types.CodeType]:
+        with _compile_lock:
+            tree = ast.parse(source, file_name)
+            class_name = next(
+                node.name for node in ast.walk(tree) if isinstance(node, ast.ClassDef)
+            )
+            return class_name, compile(tree, file_name, "exec")
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{sys.implementation.cache_tag}")
+
+    def _read_cache(self, key: str) -> Optional[Tuple[str, types.CodeType]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+        try:
+            class_name, code = marshal.loads(data[len(magic) :])
+        except (EOFError, ValueError, TypeError):
+            logger.debug(f"Ignoring corrupt driver cache entry {key}")
+            return None
+        return class_name, code
+
+    def _write_cache(self, key: str, class_name: str, code: types.CodeType) -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(importlib.util.MAGIC_NUMBER)
+                f.write(marshal.dumps((class_name, code)))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"Failed to cache driver {key}: {e}")
+
+
+_registry: Optional[DriverRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def set_driver_registry(registry: Optional[DriverRegistry]) -> None:
+    """Replace the process-wide driver registry (None to reset it)"""
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+
+def get_driver_registry() -> DriverRegistry:
+    """Return the process-wide driver registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DriverRegistry(
+                os.environ.get("CTF_DRIVER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            )
+        return _registry
@@ -3,12 +3,22 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import importlib
 import logging
 import os
-
+import sys
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Plugin folder, added to sys.path on the first plugin lookup
+PLUGIN_FOLDER_PATH = os.path.join(os.path.dirname(__file__), "..", "plugins")
+
+# Map from (module name, function names) to the looked up plugin class
+_plugin_classes = {}
+# Protects: _plugin_classes
+_plugin_classes_lock = threading.Lock()
+
 
 class PluginManager(object):
     def __init__(self, in_callback=None, device_type=None, class_name=None):
@@ -39,19 +49,31 @@ class PluginManager(object):
         return return_output
 
     def load_plugin_function(self, module_name, function_name):
+        """Return the plugin class `module_name` if it has all the functions
+        `function_name` (a name or list of names), else None.
+
+        Successful lookups are cached for the lifetime of the process.
+        """
+        key = (
+            module_name,
+            tuple(function_name) if isinstance(function_name, list) else function_name,
+        )
+        with _plugin_classes_lock:
+            class_ = _plugin_classes.get(key)
+            if class_ is None:
+                class_ = self._load_plugin_function(module_name, function_name)
+                if class_ is not None:
+                    _plugin_classes[key] = class_
+        return class_
+
+    def _load_plugin_function(self, module_name, function_name):
         class_ = None
         try:
-            # Get plugin folder path
-            plugin_folder_path = os.path.join(
-                os.path.dirname(__file__), "..", "plugins"
-            )
-            import sys
-
-            sys.path.append(plugin_folder_path)
-            import importlib
+            if PLUGIN_FOLDER_PATH not in sys.path:
+                sys.path.append(PLUGIN_FOLDER_PATH)
 
             try:
-                module = importlib.import_module(module_name, plugin_folder_path)
+                module = importlib.import_module(module_name, PLUGIN_FOLDER_PATH)
                 if module:
                     class_ = getattr(module, module_name)
                     if isinstance(function_name, list):
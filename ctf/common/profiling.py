@@ -0,0 +1,304 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Opt-in run profiler.
+
+Instrumented code records spans (a named, timed operation with arguments
+such as step, node and bytes) into a bounded in-memory ring. At the end of
+a run, spans are exported as Chrome trace-event JSON (viewable in Perfetto
+or chrome://tracing) and summarized into the top time sinks.
+
+Profiling is off unless a Profiler is installed with set_profiler(); while
+off, span() returns a shared no-op span, so instrumentation costs a
+function call and an attribute check.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+# Default number of spans kept (the oldest spans are dropped first)
+DEFAULT_CAPACITY = 200000
+# Default number of rows of the top time sinks summary
+DEFAULT_TOP_SINKS = 20
+# Characters of a command recorded in its span arguments
+MAX_CMD_CHARS = 120
+
+
+class Span(NamedTuple):
+    name: str
+    category: str
+    # time.perf_counter_ns() at the start of the span
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+    thread_name: str
+    args: Dict[str, Any]
+
+
+class _NullSpan:
+    """Span returned while profiling is disabled"""
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def set(self, **args) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+    def __init__(
+        self, profiler: "Profiler", name: str, category: str, args: Dict[str, Any]
+    ) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self) -> "_ActiveSpan":
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.profiler.record(
+            self.name, self.category, self.start_ns, duration_ns, self.args
+        )
+
+    def set(self, **args) -> None:
+        """Add arguments known only once the operation ran (e.g. bytes)"""
+        self.args.update(args)
+
+
+class Profiler:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        """Record spans into a ring of at most `capacity` spans"""
+        # deque.append() is atomic, so recording takes no lock
+        self.spans: Deque[Span] = deque(maxlen=capacity)
+        # Spans dropped from the ring (approximate under concurrency)
+        self.dropped = 0
+        # Per-thread arguments added to every span (see context())
+        self._context = threading.local()
+        self.origin_ns = time.perf_counter_ns()
+
+    def span(self, name: str, category: str = "", **args) -> _ActiveSpan:
+        """Return a context manager timing an operation, e.g.
+
+        with profiler.span("fetch", "transfer", node=1) as span:
+            ...
+            span.set(bytes=size)
+        """
+        context = getattr(self._context, "args", None)
+        return _ActiveSpan(
+            self, name, category, {**context, **args} if context else args
+        )
+
+    def record(
+        self,
+        name: str,
+        category: str,
+        start_ns: int,
+        duration_ns: int,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if len(self.spans) == self.spans.maxlen:
+            self.dropped += 1
+        thread = threading.current_thread()
+        self.spans.append(
+            Span(
+                name,
+                category,
+                start_ns,
+                duration_ns,
+                thread.ident or 0,
+                thread.name,
+                args or {},
+            )
+        )
+
+    def context(self, **args) -> "_SpanContext":
+        """Return a context manager adding `args` (e.g. step, node) to the
+        spans recorded by the calling thread, including spans recorded by
+        code that does not know them (e.g. connection classes).
+        """
+        return _SpanContext(self._context, args)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Return the spans in Chrome trace-event format"""
+        events: List[Dict[str, Any]] = []
+        threads: Dict[int, str] = {}
+        pid = os.getpid()
+        for span in list(self.spans):
+            threads[span.thread_id] = span.thread_name
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": (span.start_ns - self.origin_ns) / 1000,
+                    "dur": span.duration_ns / 1000,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": span.args,
+                }
+            )
+        for thread_id, thread_name in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": thread_id,
+                    "args": {"name": thread_name},
+                }
+            )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_spans": self.dropped},
+        }
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Write the spans to `path` in Chrome trace-event format"""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+    def top_sinks(self, count: int = DEFAULT_TOP_SINKS) -> List[Dict[str, Any]]:
+        """Return the operations taking the most total time, as rows
+        {category, name, count, total s, mean ms, max ms, bytes}.
+
+        Nested spans are counted in full, so totals of enclosing and
+        enclosed operations overlap.
+        """
+        totals: Dict[tuple, List[int]] = {}
+        for span in list(self.spans):
+            # [count, total ns, max ns, bytes]
+            total = totals.setdefault((span.category, span.name), [0, 0, 0, 0])
+            total[0] += 1
+            total[1] += span.duration_ns
+            total[2] = max(total[2], span.duration_ns)
+            total[3] += span.args.get("bytes", 0) or 0
+        rows = [
+            {
+                "category": category,
+                "name": name,
+                "count": n,
+                "total s": round(total_ns / 1e9, 3),
+                "mean ms": round(total_ns / n / 1e6, 3),
+                "max ms": round(max_ns / 1e6, 3),
+                "bytes": n_bytes,
+            }
+            for (category, name), (n, total_ns, max_ns, n_bytes) in totals.items()
+        ]
+        rows.sort(key=lambda row: row["total s"], reverse=True)
+        return rows[:count]
+
+
+class _SpanContext:
+    def __init__(self, context: threading.local, args: Dict[str, Any]) -> None:
+        self.context = context
+        self.args = args
+        self.saved: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> None:
+        self.saved = getattr(self.context, "args", None)
+        self.context.args = {**(self.saved or {}), **self.args}
+
+    def __exit__(self, *exc_info) -> None:
+        self.context.args = self.saved
+
+
+class ProfiledLock:
+    """Lock wrapper recording the time spent waiting for a contended lock.
+
+    Uncontended acquisitions record nothing.
+    """
+
+    def __init__(self, lock: Any, name: str) -> None:
+        self.lock = lock
+        self.name = name
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self.lock.acquire(blocking=False):
+            return True
+        if not blocking:
+            return False
+        with span(self.name, "lock wait"):
+            return self.lock.acquire(timeout=timeout)
+
+    def release(self) -> None:
+        self.lock.release()
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+# Installed profiler (None while profiling is disabled)
+_profiler: Optional[Profiler] = None
+
+
+def set_profiler(profiler: Optional[Profiler]) -> None:
+    """Install a profiler for the whole process (None to disable profiling)"""
+    global _profiler
+    _profiler = profiler
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def span(name: str, category: str = "", **args) -> Any:
+    """Time an operation with the installed profiler (see Profiler.span()).
+    Returns a no-op span while profiling is disabled.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, category, **args)
+
+
+def context(**args) -> Any:
+    """Add arguments to the calling thread's spans (see Profiler.context())"""
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.context(**args)
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def path_size(path: str) -> int:
+    """Return the size in bytes of a file, or of all files under a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return size
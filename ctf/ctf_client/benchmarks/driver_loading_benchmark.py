@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Benchmark of test setup device loading (get_devices_and_connections())
+for a fake setup of many devices sharing a few drivers.
+
+Scenarios:
+  - per_device: the former loading of drivers, decoding, parsing and
+    importing the driver of every device from a temporary file
+  - cold: the driver registry with empty process and disk caches
+  - disk_cache: a new process (registry) with the disk cache populated
+  - process_cache: a registry that already loaded the drivers
+
+Example:
+
+    python3 -m ctf.ctf_client.benchmarks.driver_loading_benchmark \\
+        --devices 100 --drivers 3
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from ctf.common.helper_functions import b64_decode_and_write_file, get_driver_class_obj
+from ctf.common.plugins.driver_registry import DriverRegistry, set_driver_registry
+from ctf.ctf_client.benchmarks.runner_benchmark import percentile
+from ctf.ctf_client.lib import connections_helper
+from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("per_device", "cold", "disk_cache", "process_cache")
+
+# Methods per fake driver, for drivers of a realistic size
+DRIVER_METHODS = 200
+
+
+def fake_driver_source(driver_idx: int, methods: int = DRIVER_METHODS) -> str:
+    """Source of a fake device driver class"""
+    lines = [
+        "import json",
+        "",
+        "",
+        f"class FakeDriver{driver_idx}:",
+        "    def __init__(self, module=None):",
+        "        self.module = module",
+    ]
+    for i in range(methods):
+        lines += [
+            "",
+            f"    def action_{i}(self, input_var=None):",
+            f'        """Driver {driver_idx} action {i}"""',
+            f"        cmd = 'echo {i}' if input_var is None else str(input_var)",
+            "        result = self.module.action_custom_command(cmd)",
+            "        return json.dumps({'cmd': cmd, 'result': result})",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def fake_setup(devices: int, drivers: int) -> List[Dict]:
+    """Device records of a fake test setup (as returned by the CTF APIs),
+    with `drivers` distinct drivers shared round-robin by the devices
+    """
+    driver_files = [
+        base64.b64encode(fake_driver_source(i).encode()).decode()
+        for i in range(drivers)
+    ]
+    return [
+        {
+            "device_id": node_number,
+            "node_number": node_number,
+            "name": f"node-{node_number}",
+            "device_type_data": {
+                "device_class_name": "GenericInterface",
+                "device_type_name": "generic",
+            },
+            "connections": [],
+            "driver_file_name": f"fake_driver_{node_number % drivers}.py",
+            "driver_file": driver_files[node_number % drivers],
+        }
+        for node_number in range(1, devices + 1)
+    ]
+
+
+def load_per_device(setup: List[Dict]) -> Dict:
+    """Load the devices of a setup the former way (one driver import per
+    device)
+    """
+    devices = {}
+    for result in setup:
+        module = connections_helper.get_device_module(
+            "custom_fun",
+            result["device_type_data"]["device_class_name"],
+            result["connections"],
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            driver_file_name = f"{result['device_id']}_{result['driver_file_name']}"
+            b64_decode_and_write_file(temp_dir, driver_file_name, result["driver_file"])
+            driver_class_obj = get_driver_class_obj(temp_dir, driver_file_name)
+            module.set_driver(driver_class_obj(module=module))
+        module.metadata = result
+        devices[result["node_number"]] = module
+    return devices
+
+
+def time_setup_load(setup: List[Dict], scenario: str, cache_dir: str) -> float:
+    """Time (in seconds) to load the devices of a setup in a scenario"""
+    if scenario == "cold":
+        for file_name in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, file_name))
+    if scenario in ("cold", "disk_cache"):
+        set_driver_registry(DriverRegistry(cache_dir))
+
+    start = time.perf_counter()
+    if scenario == "per_device":
+        devices = load_per_device(setup)
+    else:
+        devices = connections_helper.get_devices_and_connections(setup)
+    elapsed = time.perf_counter() - start
+
+    assert len(devices) == len(setup)
+    return elapsed
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    setup = fake_setup(args.devices, args.drivers)
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            for scenario in SCENARIOS:
+                # Warm up the registry for process_cache
+                time_setup_load(setup, "disk_cache", cache_dir)
+                latencies = [
+                    time_setup_load(setup, scenario, cache_dir)
+                    for _ in range(args.iterations)
+                ]
+                results[scenario] = {
+                    "iterations": len(latencies),
+                    "p50 ms": round(percentile(latencies, 50) * 1000, 2),
+                    "max ms": round(max(latencies) * 1000, 2),
+                    "ms/device": round(
+                        percentile(latencies, 50) * 1000 / args.devices, 3
+                    ),
+                }
+        finally:
+            set_driver_registry(None)
+    return {
+        "params": {"devices": args.devices, "drivers": args.drivers},
+        "scenarios": results,
+    }
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the loading of test setup devices and drivers",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--devices", type=int, default=100, help="Fake devices")
+    parser.add_argument(
+        "--drivers", type=int, default=3, help="Distinct drivers shared by devices"
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=5, help="Setup loads per scenario"
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _get_parser().parse_args(argv)
+    logging.basicConfig(
+        format="[%(asctime)s] %(levelname)s: %(message)s (%(filename)s:%(lineno)d)",
+        level=logging.WARNING,
+    )
+
+    results = run_benchmark(args)
+    print(
+        dict_to_pretty_table(
+            [
+                {"scenario": scenario, **summary}
+                for scenario, summary in results["scenarios"].items()
+            ]
+        )
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Microbenchmark of the log_call decorator on a hot function returning a
+large result (a stats dict), with the logger level at INFO and at DEBUG.
+
+Variants:
+  - undecorated: the bare function
+  - legacy_debug: the former log_call (eager f-string formatting of the
+    params and result), logging at DEBUG
+  - log_call_debug: @log_call(debug=True)
+  - log_call_info: @log_call, formatting abbreviated params and results
+  - log_call_histogram: @log_call(debug=True) with a CallHistogram installed
+
+Example:
+
+    python3 -m ctf.ctf_client.benchmarks.log_call_benchmark --calls 20000
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from ctf.common import logging_utils
+from ctf.common.logging_utils import CallHistogram, log_call, set_call_histogram
+from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("INFO", "DEBUG")
+
+
+def legacy_log_call(func: Callable) -> Callable:
+    """The former log_call(debug=True), formatting every call"""
+
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        message = f"{func.__qualname__} called with args: {args} and kwargs: {kwargs}"
+        logging_utils.logger.debug(message)
+        result = func(*args, **kwargs)
+        message = f"{func.__name__} returned. Result: {result}"
+        logging_utils.logger.debug(message)
+        return result
+
+    return inner
+
+
+def make_variants(stats_keys: int) -> Dict[str, Callable]:
+    """Map from variant to a hot function returning a stats dict"""
+    stats = {f"counter.{i}": i * 1.5 for i in range(stats_keys)}
+
+    def get_stats(node_id: int, keys: Optional[List[str]] = None) -> Dict:
+        return stats
+
+    return {
+        "undecorated": get_stats,
+        "legacy_debug": legacy_log_call(get_stats),
+        "log_call_debug": log_call(debug=True)(get_stats),
+        "log_call_info": log_call(get_stats),
+        "log_call_histogram": log_call(debug=True)(get_stats),
+    }
+
+
+def time_calls(func: Callable, calls: int) -> float:
+    """Time (in seconds) of `calls` calls"""
+    start = time.perf_counter()
+    for node_id in range(calls):
+        func(node_id)
+    return time.perf_counter() - start
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    variants = make_variants(args.stats_keys)
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        handler = logging.StreamHandler(devnull)
+        logging_utils.logger.addHandler(handler)
+        logging_utils.logger.propagate = False
+        try:
+            for level in LEVELS:
+                logging_utils.logger.setLevel(level)
+                for variant, func in variants.items():
+                    if variant == "log_call_histogram":
+                        set_call_histogram(CallHistogram())
+                    try:
+                        # Warm up
+                        time_calls(func, min(args.calls, 100))
+                        elapsed = time_calls(func, args.calls)
+                    finally:
+                        set_call_histogram(None)
+                    results[f"{variant} @ {level}"] = {
+                        "calls": args.calls,
+                        "us/call": round(elapsed / args.calls * 1e6, 3),
+                    }
+        finally:
+            logging_utils.logger.removeHandler(handler)
+            logging_utils.logger.propagate = True
+            logging_utils.logger.setLevel(logging.NOTSET)
+    for level in LEVELS:
+        baseline = results[f"undecorated @ {level}"]["us/call"]
+        for variant in variants:
+            summary = results[f"{variant} @ {level}"]
+            summary["x undecorated"] = round(summary["us/call"] / baseline, 1)
+    return {
+        "params": {"calls": args.calls, "stats_keys": args.stats_keys},
+        "variants": results,
+    }
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the log_call decorator",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--calls", type=int, default=20000, help="Calls per variant and level"
+    )
+    parser.add_argument(
+        "--stats-keys", type=int, default=500, help="Keys of the returned stats"
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _get_parser().parse_args(argv)
+    logging.basicConfig(
+        format="[%(asctime)s] %(levelname)s: %(message)s (%(filename)s:%(lineno)d)",
+        level=logging.WARNING,
+    )
+
+    results = run_benchmark(args)
+    print(
+        dict_to_pretty_table(
+            [
+                {"variant": variant, **summary}
+                for variant, summary in results["variants"].items()
+            ]
+        )
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
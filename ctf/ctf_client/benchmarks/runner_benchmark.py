@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Benchmark of representative BaseCtfTest flows against simulated nodes.
+
+Scenarios:
+  - fanout: run_cmd() + wait_for_cmds() of a `tg2` command on all nodes
+  - log_collection: log file fetches and uploads to the serverless store
+  - image_push: copy_files_parallel() of an image to all nodes
+  - step_results: test steps saving CTF JSON data and keyed JSON objects,
+    recorded in the serverless store
+
+Every scenario reports throughput and latency percentiles. Results are
+written as JSON along with the commit and the benchmark parameters, and can
+be compared against the results of another commit (`--baseline`) to catch
+regressions in the hot paths. Example:
+
+    python3 -m ctf.ctf_client.benchmarks.runner_benchmark \\
+        --nodes 32 --output before.json
+    python3 -m ctf.ctf_client.benchmarks.runner_benchmark \\
+        --nodes 32 --output after.json --baseline before.json
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from argparse import Namespace
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ctf.ctf_client.benchmarks.simulated_nodes import (
+    simulated_nodes,
+    SimulatedNode,
+    SimulatedNodeConfig,
+)
+from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
+from ctf.ctf_client.runner.exceptions import DeviceCmdError
+from ctf.ctf_client.runner.lib import BaseCtfTest
+from ctf.ctf_client.serverless_lib.serverless_api import ServerlessApi
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("fanout", "log_collection", "image_push", "step_results")
+
+# Logs fetched from every node by the log_collection scenario
+LOG_FILES = (
+    "/var/log/e2e_minion/current",
+    "/var/log/openr/current",
+    "/var/log/vpp/vnet.log",
+)
+# Keyed JSON objects saved per test step by the step_results scenario
+KEYED_OBJECTS_PER_STEP = 20
+
+# Metrics compared against a baseline, and whether higher values are better
+COMPARED_METRICS = {"ops/s": True, "p50 ms": False, "p99 ms": False}
+# Default relative change flagged as a regression
+DEFAULT_MAX_REGRESSION = 0.1
+
+
+class RunnerBenchmarkTest(BaseCtfTest):
+    TEST_NAME = "CTF: Runner benchmark"
+    DESCRIPTION = "Exercise runner flows against simulated nodes"
+
+    # Local image pushed by the image_push scenario
+    image_path: str = ""
+    # Test steps run by the step_results scenario
+    steps_run: int = 0
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentile of `values` (linear interpolation between ranks)"""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(
+    latencies: List[float], ops: int, errors: int, elapsed: float
+) -> Dict[str, float]:
+    """Summary of a scenario: throughput and latency percentiles of its
+    iterations (latencies in seconds)
+    """
+    return {
+        "iterations": len(latencies),
+        "ops": ops,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "ops/s": round(ops / elapsed, 2) if elapsed > 0 else math.nan,
+        "p50 ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90 ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99 ms": round(percentile(latencies, 99) * 1000, 2),
+        "max ms": round(max(latencies) * 1000, 2) if latencies else math.nan,
+    }
+
+
+def create_test(
+    nodes: Dict[int, SimulatedNode],
+    workdir: str,
+    max_workers: int,
+    profile: Optional[str] = None,
+) -> RunnerBenchmarkTest:
+    """Create a test running against `nodes`, with results recorded by the
+    serverless API under `workdir`
+    """
+    args = Namespace(
+        max_workers=max_workers,
+        debug=False,
+        run_sandcastle=False,
+        team_id=1,
+        test_setup_id=1,
+        nodes_data=None,
+        nodes_data_dir=None,
+        timeout=600,
+        log_collect_timeout=600,
+        no_ssh_debug=True,
+        scp_timeout=600,
+        # The serverless API is configured below, without the user's
+        # ~/.ctf_serverless_config
+        serverless="false",
+        json_args="{}",
+        store_logs_locally=None,
+        profile=profile,
+    )
+    test = RunnerBenchmarkTest(args)
+    test.serverless = True
+    test.ctf_api = ServerlessApi()
+    test.ctf_api.override_serverless_config(workdir, workdir, workdir)
+    test.test_exe_id = test.ctf_api.create_test_run_result(
+        name="runner_benchmark", identifier="", description="", test_setup=1
+    )["data"]["id"]
+    test.device_info = nodes
+    test.thread_local.init(1)
+    return test
+
+
+def _fanout(
+    test: RunnerBenchmarkTest, node_ids: List[int], iteration: int
+) -> Tuple[int, int]:
+    futures = test.run_cmd("tg2 minion status", node_ids)
+    results = list(test.wait_for_cmds(futures))
+    return len(results), sum(not result["success"] for result in results)
+
+
+def _log_collection(
+    test: RunnerBenchmarkTest, node_ids: List[int], iteration: int
+) -> Tuple[int, int]:
+    try:
+        test._collect_node_logfiles({node_id: list(LOG_FILES) for node_id in node_ids})
+        errors = 0
+    except DeviceCmdError:
+        errors = 1
+    return len(node_ids) * len(LOG_FILES), errors
+
+
+def _image_push(
+    test: RunnerBenchmarkTest, node_ids: List[int], iteration: int
+) -> Tuple[int, int]:
+    try:
+        test.copy_files_parallel(test.image_path, "/tmp/tg-update.bin", node_ids)
+        errors = 0
+    except DeviceCmdError:
+        errors = 1
+    return len(node_ids), errors
+
+
+def _step_results(
+    test: RunnerBenchmarkTest, node_ids: List[int], iteration: int
+) -> Tuple[int, int]:
+    def save_results() -> None:
+        test.save_ctf_json_data(
+            {"ctf_data": [{"data_source": "bench", "data_list": [{"i": iteration}]}]}
+        )
+        for i in range(KEYED_OBJECTS_PER_STEP):
+            test.save_ctf_test_action_result_with_key(
+                f"bench-{iteration}-{i}", {"iteration": iteration, "i": i}
+            )
+
+    step = {
+        "name": f"Benchmark step {iteration}",
+        "function": save_results,
+        "function_args": (),
+        "success_msg": "",
+    }
+    # Unique step index, as recorded step data is kept per step index
+    test.steps_run += 1
+    failed = test._run_test_step(step, step_idx=test.steps_run)
+    test.thread_local.init(1)
+    return KEYED_OBJECTS_PER_STEP, int(failed != 0)
+
+
+SCENARIO_FUNCTIONS: Dict[
+    str, Callable[[RunnerBenchmarkTest, List[int], int], Tuple]
+] = {
+    "fanout": _fanout,
+    "log_collection": _log_collection,
+    "image_push": _image_push,
+    "step_results": _step_results,
+}
+
+
+def run_scenario(
+    test: RunnerBenchmarkTest, scenario: str, iterations: int, warmup: int = 1
+) -> Dict[str, float]:
+    """Run `warmup` + `iterations` iterations of a scenario and summarize
+    the measured iterations
+    """
+    fn = SCENARIO_FUNCTIONS[scenario]
+    node_ids = sorted(test.device_info)
+    for i in range(warmup):
+        fn(test, node_ids, -1 - i)
+
+    latencies: List[float] = []
+    ops = errors = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        iteration_start = time.perf_counter()
+        iteration_ops, iteration_errors = fn(test, node_ids, i)
+        latencies.append(time.perf_counter() - iteration_start)
+        ops += iteration_ops
+        errors += iteration_errors
+    return summarize(latencies, ops, errors, time.perf_counter() - start)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    max_regression: float = DEFAULT_MAX_REGRESSION,
+) -> List[Dict[str, Any]]:
+    """Compare the scenarios of two benchmark results.
+
+    Returns one row per scenario and metric; a row is a regression when
+    the metric got worse by more than `max_regression` (relative).
+    """
+    rows = []
+    for scenario, summary in results["scenarios"].items():
+        base_summary = baseline["scenarios"].get(scenario)
+        if not base_summary:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            current, base = summary[metric], base_summary[metric]
+            if not base or math.isnan(base) or math.isnan(current):
+                continue
+            change = (current - base) / base
+            worse = -change if higher_is_better else change
+            rows.append(
+                {
+                    "scenario": scenario,
+                    "metric": metric,
+                    "baseline": base,
+                    "current": current,
+                    "change %": round(100 * change, 1),
+                    "regression": worse > max_regression,
+                }
+            )
+    return rows
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    config = SimulatedNodeConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        output_bytes=args.output_bytes,
+        failure_rate=args.failure_rate,
+        log_file_bytes=args.log_file_bytes,
+        bandwidth_mbps=args.bandwidth_mbps,
+    )
+    nodes = simulated_nodes(args.nodes, config, seed=args.seed)
+    scenarios: Dict[str, Dict[str, float]] = {}
+    with TemporaryDirectory(prefix="ctf_benchmark_") as workdir:
+        test = create_test(nodes, workdir, args.max_workers, args.profile)
+        test.image_path = os.path.join(workdir, "tg-update.bin")
+        with open(test.image_path, "wb") as f:
+            f.truncate(args.image_bytes)
+        try:
+            for scenario in args.scenarios:
+                logger.info(f"Running scenario {scenario}")
+                scenarios[scenario] = run_scenario(
+                    test, scenario, args.iterations, args.warmup
+                )
+        finally:
+            test.export_profile()
+            test.cleanupThreadPool(test.thread_pool)
+            test.transfer_scheduler.shutdown(wait=False)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "params": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "baseline", "profile", "debug")
+            },
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark CTF runner flows against simulated nodes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--nodes", type=int, default=16, help="Simulated nodes")
+    parser.add_argument(
+        "--max-workers", type=int, default=10, help="Runner thread pool size"
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS,
+        default=list(SCENARIOS),
+        help="Scenarios to run",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=10, help="Measured iterations per scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Unmeasured iterations per scenario"
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=SimulatedNodeConfig.latency_ms,
+        help="Round trip latency of the simulated nodes",
+    )
+    parser.add_argument(
+        "--jitter-ms",
+        type=float,
+        default=SimulatedNodeConfig.jitter_ms,
+        help="Maximum deviation from --latency-ms",
+    )
+    parser.add_argument(
+        "--output-bytes",
+        type=int,
+        default=SimulatedNodeConfig.output_bytes,
+        help="Output size of generic commands",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=SimulatedNodeConfig.failure_rate,
+        help="Probability of a command or transfer failing",
+    )
+    parser.add_argument(
+        "--log-file-bytes",
+        type=int,
+        default=SimulatedNodeConfig.log_file_bytes,
+        help="Size of each log file collected",
+    )
+    parser.add_argument(
+        "--image-bytes", type=int, default=32 << 20, help="Size of the pushed image"
+    )
+    parser.add_argument(
+        "--bandwidth-mbps",
+        type=float,
+        default=SimulatedNodeConfig.bandwidth_mbps,
+        help="Transfer rate of the simulated nodes",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the simulated failures"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline", help="Compare against the results in this JSON file"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=DEFAULT_MAX_REGRESSION,
+        help="Relative change of a metric reported as a regression",
+    )
+    parser.add_argument(
+        "--profile", help="Export a profile of the benchmark to this file"
+    )
+    parser.add_argument("--debug", action="store_true", help="Log runner output")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark. Returns 1 if a regression against the baseline
+    was found, 0 otherwise.
+    """
+    args = _get_parser().parse_args(argv)
+    logging.basicConfig(
+        format="[%(asctime)s] %(levelname)s: %(message)s (%(filename)s:%(lineno)d)",
+        level=logging.DEBUG if args.debug else logging.WARNING,
+    )
+    logger.setLevel(logging.INFO)
+
+    results = run_benchmark(args)
+    rows = [
+        {"scenario": scenario, **summary}
+        for scenario, summary in results["scenarios"].items()
+    ]
+    print(dict_to_pretty_table(rows))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"]["params"] != results["meta"]["params"]:
+        logger.warning("Baseline was run with different parameters")
+    comparison = compare(results, baseline, args.max_regression)
+    print(dict_to_pretty_table(comparison))
+    return 1 if any(row["regression"] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
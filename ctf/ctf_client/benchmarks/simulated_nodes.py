@@ -0,0 +1,169 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Simulated Terragraph nodes for benchmarking the runner and connection layers.
+
+Simulated nodes stand in for test devices in `BaseCtfTest.device_info`:
+commands and file transfers complete after a configurable latency with
+synthetic output, and fail at a configurable rate. Nodes understand a few
+Terragraph utilities (`tg2`, `vppctl`, `get_hw_info`, `get_fw_version`) so
+that representative flows get realistic output shapes; any other command
+returns filler output of the configured size.
+
+Nodes run in-process, so benchmarks measure framework overhead (thread
+pools, locks, result handling, CTF result storage) without a real setup.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# Device type of simulated Terragraph nodes
+SIMULATED_DEVICE_TYPE = "terragraph"
+
+# Default simulated link between the runner and the nodes
+DEFAULT_LATENCY_MS = 20.0
+DEFAULT_BANDWIDTH_MBPS = 100.0
+
+
+@dataclass
+class SimulatedNodeConfig:
+    # Mean latency of a command or file transfer round trip
+    latency_ms: float = DEFAULT_LATENCY_MS
+    # Latency is uniformly distributed in latency_ms +/- jitter_ms
+    jitter_ms: float = 0.0
+    # Size of the output of generic commands
+    output_bytes: int = 256
+    # Probability of a command or file transfer failing
+    failure_rate: float = 0.0
+    # Size of the log files fetched from the node
+    log_file_bytes: int = 1 << 20
+    # Transfer rate of file fetches and pushes
+    bandwidth_mbps: float = DEFAULT_BANDWIDTH_MBPS
+
+
+class SimulatedNode:
+    def __init__(
+        self, node_id: int, config: SimulatedNodeConfig, seed: Optional[int] = None
+    ) -> None:
+        """Simulated test device (see module docstring)"""
+        self.node_id = node_id
+        self.config = config
+        self.connection = SimulatedConnection(self)
+        # Per-node generator, so runs with the same seed fail the same way
+        self.random = random.Random(node_id if seed is None else seed + node_id)
+        self.random_lock = threading.Lock()
+        # Commands received, for checks by benchmarks and tests
+        self.cmds: List[str] = []
+
+    def device_type(self) -> str:
+        return SIMULATED_DEVICE_TYPE
+
+    def delay(self, nbytes: int = 0) -> None:
+        """Sleep for one round trip plus the transfer time of `nbytes`"""
+        with self.random_lock:
+            jitter = self.random.uniform(-1.0, 1.0) * self.config.jitter_ms
+        transfer_s = nbytes * 8 / (self.config.bandwidth_mbps * 1e6)
+        time.sleep(max(self.config.latency_ms + jitter, 0.0) / 1000 + transfer_s)
+
+    def fails(self) -> bool:
+        with self.random_lock:
+            return self.random.random() < self.config.failure_rate
+
+    def output(self, cmd: str) -> str:
+        """Synthetic output of a command"""
+        tokens = cmd.split()
+        utility = tokens[0] if tokens else ""
+        if utility == "tg2":
+            return json.dumps(
+                {
+                    "nodeId": f"00:00:00:10:0d:{self.node_id % 256:02x}",
+                    "status": "ONLINE_INITIATOR",
+                    "linkStatus": {f"link-{i}": "LINK_UP" for i in range(4)},
+                }
+            )
+        if utility == "vppctl":
+            return "\n".join(
+                f"Vpp{i}  {i + 1}  up  9000/0/0/0  rx packets {1000 * i}"
+                for i in range(8)
+            )
+        if utility == "get_hw_info":
+            return f"00:00:00:10:0d:{self.node_id % 256:02x}"
+        if utility == "get_fw_version":
+            return "10.11.0.92"
+        return ("x" * 79 + "\n") * (self.config.output_bytes // 80) + "x" * (
+            self.config.output_bytes % 80
+        )
+
+    def action_custom_command(self, cmd: str, timeout: int = 60) -> Dict[str, Any]:
+        self.cmds.append(cmd)
+        self.delay()
+        if self.fails():
+            return {
+                "error": 1,
+                "returncode": 1,
+                "message": "",
+                "stderr": f"simulated failure of: {cmd}",
+            }
+        message = self.output(cmd)
+        self.delay(len(message))
+        return {"error": 0, "returncode": 0, "message": message, "stderr": ""}
+
+
+class SimulatedConnection:
+    def __init__(self, node: SimulatedNode) -> None:
+        """SSHConnection stand-in transferring synthetic files"""
+        self.node = node
+        self.ip_address = f"fd00::{node.node_id:x}"
+        self.port = 22
+        self.is_jump_host = False
+
+    def _result(self, error: int, message: str) -> Dict[str, Any]:
+        return {"error": error, "message": message, "connection_error": False}
+
+    def connect(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        self.node.delay()
+        return self._result(0, "")
+
+    def disconnect(self) -> Dict[str, Any]:
+        return self._result(0, "")
+
+    def copy_files_from_remote(
+        self, local_path: str, remote_path: str, recursive: bool = True
+    ) -> Dict[str, Any]:
+        """Write a synthetic log file named after `remote_path`"""
+        size = self.node.config.log_file_bytes
+        self.node.delay(size)
+        if self.node.fails():
+            return self._result(1, f"simulated failure fetching {remote_path}")
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path))
+        with open(local_path, "wb") as f:
+            # Unique content, so stores cannot deduplicate it
+            f.write(f"node {self.node.node_id} {remote_path}\n".encode())
+            f.write(os.urandom(size // 2).hex()[: max(size - f.tell(), 0)].encode())
+        return self._result(0, f"Remote file(s) copied from: {remote_path}")
+
+    def copy_files_to_remote(
+        self, local_files: str, remote_path: str, recursive: bool = True
+    ) -> Dict[str, Any]:
+        self.node.delay(os.path.getsize(local_files))
+        if self.node.fails():
+            return self._result(1, f"simulated failure pushing {local_files}")
+        return self._result(0, f"Local file(s) copied to {remote_path}")
+
+
+def simulated_nodes(
+    count: int, config: SimulatedNodeConfig, seed: Optional[int] = None
+) -> Dict[int, SimulatedNode]:
+    """Return `count` simulated nodes, keyed by node ID (from 1)"""
+    return {
+        node_id: SimulatedNode(node_id, config, seed) for node_id in range(1, count + 1)
+    }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Benchmark of test runner CLI startup, each command run in a new process.
+
+Scenarios:
+  - import: importing the test catalog module (tests and test suites)
+  - help: `<runner> --help`
+  - list_tests: `<runner> list-tests`
+  - describe: `<runner> describe <test>` (imports only the described test)
+
+The modules of heavy dependencies loaded by the catalog import are reported
+as well, as they should only be imported once a test is selected. Example
+(from the repository root):
+
+    python3 -m ctf.ctf_client.benchmarks.startup_benchmark \\
+        --runner tg_ctf_runner.py --catalog terragraph.ctf.tg_ctf_tests
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from ctf.ctf_client.benchmarks.runner_benchmark import percentile
+from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("import", "help", "list_tests", "describe")
+
+# Modules that are slow to import and unneeded to list tests
+HEAVY_MODULES = ("matplotlib", "numpy", "pandas", "scipy")
+
+
+def scenario_command(args: argparse.Namespace, scenario: str) -> List[str]:
+    """Command line of a scenario"""
+    if scenario == "import":
+        return [sys.executable, "-c", f"import {args.catalog}"]
+    runner_args = {
+        "help": ["--help"],
+        "list_tests": ["list-tests"],
+        "describe": ["describe", args.describe],
+    }[scenario]
+    return [sys.executable, args.runner] + runner_args
+
+
+def time_command(command: List[str]) -> float:
+    """Time (in seconds) to run a command to completion"""
+    start = time.perf_counter()
+    subprocess.run(
+        command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start
+
+
+def heavy_modules_imported(catalog: str) -> List[str]:
+    """Heavy modules loaded by importing the test catalog module"""
+    code = (
+        "import sys\n"
+        f"import {catalog}\n"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return output.split()
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    results = {}
+    for scenario in SCENARIOS:
+        command = scenario_command(args, scenario)
+        # Warm up the OS file and bytecode caches
+        time_command(command)
+        latencies = [time_command(command) for _ in range(args.iterations)]
+        results[scenario] = {
+            "iterations": len(latencies),
+            "p50 ms": round(percentile(latencies, 50) * 1000, 1),
+            "max ms": round(max(latencies) * 1000, 1),
+        }
+    return {
+        "params": {
+            "runner": args.runner,
+            "catalog": args.catalog,
+            "describe": args.describe,
+        },
+        "heavy_modules": heavy_modules_imported(args.catalog),
+        "scenarios": results,
+    }
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the startup of the test runner CLI",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--runner", default="tg_ctf_runner.py", help="Test runner CLI script"
+    )
+    parser.add_argument(
+        "--catalog",
+        default="terragraph.ctf.tg_ctf_tests",
+        help="Module declaring the tests and test suites",
+    )
+    parser.add_argument(
+        "--describe", default="TestTgPumaIpv6Up", help="Test to describe"
+    )
+    parser.add_argument("--iterations", type=int, default=5, help="Runs per scenario")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _get_parser().parse_args(argv)
+    logging.basicConfig(
+        format="[%(asctime)s] %(levelname)s: %(message)s (%(filename)s:%(lineno)d)",
+        level=logging.WARNING,
+    )
+
+    results = run_benchmark(args)
+    print(
+        dict_to_pretty_table(
+            [
+                {"scenario": scenario, **summary}
+                for scenario, summary in results["scenarios"].items()
+            ]
+        )
+    )
+    print(f"Heavy modules imported: {', '.join(results['heavy_modules']) or 'none'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
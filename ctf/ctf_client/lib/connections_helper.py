@@ -4,7 +4,9 @@
 # LICENSE file in the root directory of this source tree.
 
 import logging
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 
 from ctf.common.connections import (
     SerialConnection as SERIAL,
@@ -12,12 +14,28 @@ from ctf.common.connections import (
     TelnetConnection as TELNET,
 )
 from ctf.common.connections.constants import ConnectionTypeEnum
-from ctf.common.helper_functions import b64_decode_and_write_file, get_driver_class_obj
 from ctf.common.plugins import plugin_manager
+from ctf.common.plugins.driver_registry import get_driver_registry
 from prettytable import PrettyTable
 
 logger = logging.getLogger(__name__)
 
+# Default number of devices initialized concurrently, see
+# set_device_init_workers()
+DEFAULT_INIT_WORKERS = 16
+_init_workers = DEFAULT_INIT_WORKERS
+_init_workers_lock = threading.Lock()
+
+
+class DeviceInitError(Exception):
+    def __init__(self, errors: Dict[int, str]) -> None:
+        """Errors initializing the devices of a test setup, by node number"""
+        self.errors = errors
+        super().__init__(
+            f"Failed to initialize {len(errors)} device(s): "
+            + "; ".join(f"[{node}] {error}" for node, error in errors.items())
+        )
+
 
 class JumpHostConnectionClass:
     def __init__(self):
@@ -73,7 +91,7 @@ def check_plugin_availability(class_name, function_name):
     return pm.load_plugin_function(class_name, function_name)
 
 
-def create_ssh_connection(ssh_conn_db_obj) -> ():
+def create_ssh_connection(ssh_conn_db_obj, connect: bool = True) -> ():
     # Get the required parameters from ssh connection db obj
     ssh_obj = SSH.SSHConnection(
         in_ip_address=ssh_conn_db_obj.ip_address,
@@ -102,11 +120,11 @@ def create_ssh_connection(ssh_conn_db_obj) -> ():
         ssh_obj.inj_private_key = jumphost.private_key
 
     # Try to connect
-    result = ssh_obj.connect()
+    result = ssh_obj.connect() if connect else {"error": 0, "message": ""}
     return result, ssh_obj
 
 
-def create_serial_connection(serial_conn_db_obj) -> ():
+def create_serial_connection(serial_conn_db_obj, connect: bool = True) -> ():
     # Get the required parameters from serial connection obj
     serial_obj = SERIAL.SerialConnection(
         in_port=serial_conn_db_obj.port_name,
@@ -126,11 +144,11 @@ def create_serial_connection(serial_conn_db_obj) -> ():
         serial_obj.ip = jumphost.ip_address
         serial_obj.password = jumphost.password
         serial_obj.is_jump_host = True
-    result = serial_obj.connect()
+    result = serial_obj.connect() if connect else {"error": 0, "message": ""}
     return result, serial_obj
 
 
-def create_telnet_connection(telnet_conn_db_obj) -> ():
+def create_telnet_connection(telnet_conn_db_obj, connect: bool = True) -> ():
     telnet_obj = TELNET.TelnetConnection(
         in_user=telnet_conn_db_obj.username,
         in_password=telnet_conn_db_obj.password,
@@ -154,7 +172,7 @@ def create_telnet_connection(telnet_conn_db_obj) -> ():
         telnet_obj.available_ports = port_list
         # Query the model and get the next available port
 
-    result = telnet_obj.connect()
+    result = telnet_obj.connect() if connect else {"error": 0, "message": ""}
     return result, telnet_obj
 
 
@@ -226,11 +244,12 @@ def get_telnet_connection_class(connection):
     return obj
 
 
-def load_connections_of_devices(db_connection_objs) -> []:
+def load_connections_of_devices(db_connection_objs, connect: bool = True) -> []:
     """
     Function called to load the connections of given devices.
     :param db_connection_objs: contains the list of devices along with their
     connection details to load.
+    :param connect: connect (in the calling thread) to the devices.
     :return: returns the list of all loaded device connections.
     """
     device_connections = []
@@ -240,15 +259,15 @@ def load_connections_of_devices(db_connection_objs) -> []:
         # ssh connection
         if conn_type == ConnectionTypeEnum.SSH:
             obj = get_ssh_connection_class(each_obj)
-            _, device_connection = create_ssh_connection(obj)
+            _, device_connection = create_ssh_connection(obj, connect)
         # telnet
         elif conn_type == ConnectionTypeEnum.TELNET:
             obj = get_telnet_connection_class(each_obj)
-            _, device_connection = create_telnet_connection(obj)
+            _, device_connection = create_telnet_connection(obj, connect)
         # serial
         elif conn_type == ConnectionTypeEnum.SERIAL:
             obj = get_serial_connection_class(each_obj)
-            _, device_connection = create_serial_connection(obj)
+            _, device_connection = create_serial_connection(obj, connect)
         if device_connection:
             device_connections.append(device_connection)
 
@@ -256,7 +275,7 @@ def load_connections_of_devices(db_connection_objs) -> []:
     return device_connections
 
 
-def get_device_module(function_class, device_class, connections_list):
+def get_device_module(function_class, device_class, connections_list, connect=True):
     """
     Function to get initialized instance of connection of given class.
     :param function_class: contains function name which is to be checked
@@ -264,6 +283,7 @@ def get_device_module(function_class, device_class, connections_list):
     :param device_class: contains class name in which function name needs
     to be checked.
     :param connections_list: contains the list of connections.
+    :param connect: connect (in the calling thread) to the device.
     :return: returns the initialized instance of connection module for
     given class.
     """
@@ -274,7 +294,7 @@ def get_device_module(function_class, device_class, connections_list):
         class_module = check_plugin_availability(device_class, function_class)
         module = class_module()
         if module:
-            device_connections = load_connections_of_devices(connections_list)
+            device_connections = load_connections_of_devices(connections_list, connect)
             # TODO pass in connection type for multiple connection devices
             if len(device_connections) > 0:
                 module.connection = device_connections[0]
@@ -285,38 +305,76 @@ def get_device_module(function_class, device_class, connections_list):
     return module
 
 
-def get_devices_and_connections(result_dict):
+def set_device_init_workers(workers: int) -> None:
+    """Set the number of devices initialized concurrently"""
+    global _init_workers
+    with _init_workers_lock:
+        _init_workers = max(1, workers)
+
+
+def _init_device(result):
+    """Return the device module of a test setup device, with its driver"""
+    device_type = result["device_type_data"]
+    # Threads connect on first use (connections are per-thread), so the
+    # devices are not connected by the initialization workers
+    module = get_device_module(
+        "custom_fun",
+        device_type["device_class_name"],
+        result["connections"],
+        connect=False,
+    )
+    if module:
+        if "driver_file" in result:
+            # Devices sharing a driver share its (compiled once) class
+            driver_class_obj = get_driver_registry().get_driver_class(
+                result["driver_file"], result["driver_file_name"]
+            )
+            driver_instance = driver_class_obj(module=module)
+            module.set_driver(driver_instance)
+        module.metadata = result
+    return module
+
+
+def get_devices_and_connections(result_dict, max_workers: Optional[int] = None):
+    """
+    Function to initialize the devices of a test setup concurrently (with at
+    most `max_workers` threads, see set_device_init_workers()).
+    :return: returns the map from node number to device module, in the
+    order of the test setup devices.
+    :raises DeviceInitError: if any device cannot be initialized (after
+    all devices were initialized).
+    """
     t = PrettyTable(["Node Number", "Device Name", "Device Type"])
 
-    devices_and_connections = {}
-    for result in result_dict:
+    workers = max_workers or _init_workers
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(result_dict))),
+        thread_name_prefix="DeviceInit",
+    ) as pool:
+        futures = [pool.submit(_init_device, result) for result in result_dict]
 
-        device_type = result["device_type_data"]
-        module = get_device_module(
-            "custom_fun", device_type["device_class_name"], result["connections"]
-        )
+    devices_and_connections = {}
+    errors = {}
+    for result, future in zip(result_dict, futures):
+        node_number = result["node_number"]
+        try:
+            module = future.result()
+        except Exception as e:
+            logger.error(f"Failed to initialize device {node_number}: {e}")
+            errors[node_number] = f"{type(e).__name__}: {e}"
+            continue
         if module:
             t.add_row(
                 [
-                    str(result["node_number"]),
+                    str(node_number),
                     result["name"],
-                    device_type["device_type_name"],
+                    result["device_type_data"]["device_type_name"],
                 ]
             )
-            if "driver_file" in result:
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    driver_file_name = (
-                        f"{result['device_id']}_{result['driver_file_name']}"
-                    )
-                    b64_decode_and_write_file(
-                        temp_dir, driver_file_name, result["driver_file"]
-                    )
-                    driver_class_obj = get_driver_class_obj(temp_dir, driver_file_name)
-                    driver_instance = driver_class_obj(module=module)
-                    module.set_driver(driver_instance)
-            module.metadata = result
-            devices_and_connections[result["node_number"]] = module
+            devices_and_connections[node_number] = module
 
     logger.info(t)
+    if errors:
+        raise DeviceInitError(errors)
 
     return devices_and_connections
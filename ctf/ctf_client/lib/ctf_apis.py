@@ -120,9 +120,12 @@ class CtfApis(ABC):
         test_exe_id,
         test_action_result_id,
         data_processing_config_key: str = None,
+        move_source: bool = False,
     ):
         """
         Saves the action log against the given test_action_result_id
+        Set move_source if the caller no longer needs source_file_path, so that
+        implementations may consume it instead of copying it.
         """
         pass
 
@@ -134,9 +137,11 @@ class CtfApis(ABC):
         test_exe_id,
         log_type: int = None,
         data_processing_config_key: str = None,
+        move_source: bool = False,
     ):
         """
         Saves the log file against the given test_exe_id
+        See save_action_log_file for move_source.
         """
         pass
 
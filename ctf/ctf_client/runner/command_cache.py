@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Memoization of idempotent device commands.
+
+Tests declare the commands that only read device state (version strings,
+interface lists, status reports...) as regular expressions with a TTL. The
+successful results of these commands are reused on the same device until
+their TTL expires, and concurrent callers of a command that is already
+running on a device wait for its result instead of running it again
+(single-flight).
+
+Every other command is assumed to mutate the device: the cached results of
+a device are dropped when such a command starts and when it finishes, and
+idempotent commands are not cached on a device while it runs one. Callers
+invalidate devices explicitly for changes made outside the cache (reboots,
+file transfers, commands run on other devices).
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Pattern, Tuple
+
+# Runs a command on a device: (*args) -> action_custom_command() result
+CommandFn = Callable[..., Dict[str, Any]]
+
+_Key = Tuple[Hashable, str]
+
+
+@dataclass
+class CommandCacheStats:
+    """Lookups of the commands matching an idempotent command pattern"""
+
+    # Results reused from the cache
+    hits: int = 0
+    # Results shared with a concurrent caller running the same command
+    shared: int = 0
+    # Commands run (and cached, if successful)
+    misses: int = 0
+    # Commands run uncached, while a mutating command ran on the device
+    bypassed: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.shared + self.misses + self.bypassed
+
+
+def _succeeded(result: Dict[str, Any]) -> bool:
+    return (
+        result.get("error") == 0
+        and result.get("returncode") == 0
+        and not result.get("connection_error")
+    )
+
+
+class CommandCache:
+    def __init__(
+        self,
+        idempotent_commands: Dict[str, float],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Cache of the results of `idempotent_commands`, a map from regular
+        expressions (matching whole commands) to TTLs in seconds
+        """
+        self.rules: List[Tuple[str, Pattern, float]] = [
+            (pattern, re.compile(pattern), ttl)
+            for pattern, ttl in idempotent_commands.items()
+        ]
+        self.clock = clock
+        # Map from command pattern to its lookups
+        self.stats: Dict[str, CommandCacheStats] = {
+            pattern: CommandCacheStats() for pattern in idempotent_commands
+        }
+        # Cached results dropped before expiring
+        self.invalidations = 0
+        # Map from (device, command) to the result and its expiry time
+        self._results: Dict[_Key, Tuple[Dict[str, Any], float]] = {}
+        # Map from (device, command) to the result of the running command
+        self._inflight: Dict[_Key, Future] = {}
+        # Map from device to the number of its invalidations, so commands
+        # running across an invalidation are not cached
+        self._generations: Dict[Hashable, int] = {}
+        # Map from device to the number of its running mutating commands
+        self._mutating: Dict[Hashable, int] = {}
+        # Protects: stats, invalidations, _results, _inflight, _generations,
+        # _mutating
+        self._lock = threading.Lock()
+
+    def rule(self, cmd: str) -> Optional[Tuple[str, float]]:
+        """Return the (pattern, TTL) declaring `cmd` idempotent, or None"""
+        for pattern, regex, ttl in self.rules:
+            if regex.fullmatch(cmd):
+                return pattern, ttl
+        return None
+
+    def run(self, node_id: Hashable, cmd: str, fn: CommandFn, *args) -> Dict:
+        """Return the result of `cmd` on a device, calling fn(*args) to run
+        it unless a cached or in-flight result can be used
+        """
+        rule = self.rule(cmd)
+        if rule is None:
+            return self._run_mutating(node_id, fn, args)
+
+        pattern, ttl = rule
+        key = (node_id, cmd)
+        with self._lock:
+            stats = self.stats[pattern]
+            if self._mutating.get(node_id):
+                stats.bypassed += 1
+                future = None
+            else:
+                cached = self._results.get(key)
+                if cached is not None:
+                    if cached[1] > self.clock():
+                        stats.hits += 1
+                        return dict(cached[0])
+                    del self._results[key]
+                future = self._inflight.get(key)
+                if future is not None:
+                    stats.shared += 1
+                    shared = future
+                else:
+                    stats.misses += 1
+                    future = self._inflight[key] = Future()
+                    generation = self._generations.get(node_id, 0)
+                    shared = None
+
+        if future is None:
+            return fn(*args)
+        if shared is not None:
+            return dict(shared.result())
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            with self._lock:
+                self._forget(key, future)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._forget(key, future)
+            if self._generations.get(node_id, 0) == generation and _succeeded(result):
+                self._results[key] = (result, self.clock() + ttl)
+        future.set_result(result)
+        return dict(result)
+
+    def _forget(self, key: _Key, future: Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def _run_mutating(self, node_id: Hashable, fn: CommandFn, args: Tuple) -> Dict:
+        with self._lock:
+            self._mutating[node_id] = self._mutating.get(node_id, 0) + 1
+            self._invalidate([node_id])
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._mutating[node_id] -= 1
+                if not self._mutating[node_id]:
+                    del self._mutating[node_id]
+                self._invalidate([node_id])
+
+    def invalidate(self, node_ids: Optional[List[Hashable]] = None) -> None:
+        """Drop the cached results of the given devices (all if empty)"""
+        with self._lock:
+            if not node_ids:
+                node_ids = list(
+                    {key[0] for key in self._results}
+                    | {key[0] for key in self._inflight}
+                    | set(self._generations)
+                )
+            self._invalidate(node_ids)
+
+    def _invalidate(self, node_ids: List[Hashable]) -> None:
+        node_set = set(node_ids)
+        for node_id in node_set:
+            self._generations[node_id] = self._generations.get(node_id, 0) + 1
+        for key in [key for key in self._results if key[0] in node_set]:
+            if self._results.pop(key)[1] > self.clock():
+                self.invalidations += 1
+        # Later callers must not join commands started before the change
+        for key in [key for key in self._inflight if key[0] in node_set]:
+            del self._inflight[key]
+
+    def rows(self) -> List[Dict[str, str]]:
+        """Lookups of each idempotent command pattern that was used"""
+        with self._lock:
+            rows = []
+            for pattern, _regex, ttl in self.rules:
+                stats = self.stats[pattern]
+                if not stats.lookups:
+                    continue
+                reused = stats.hits + stats.shared
+                rows.append(
+                    {
+                        "command": pattern,
+                        "ttl s": f"{ttl:g}",
+                        "hits": str(stats.hits),
+                        "shared": str(stats.shared),
+                        "misses": str(stats.misses),
+                        "bypassed": str(stats.bypassed),
+                        "hit rate": f"{100 * reused / stats.lookups:.0f}%",
+                    }
+                )
+            return rows
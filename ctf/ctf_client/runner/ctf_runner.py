@@ -7,6 +7,7 @@
 
 import argparse
 import atexit
+import json
 import logging
 import os
 import signal
@@ -17,9 +18,13 @@ from typing import Dict, Optional
 # EXTERNAL_DEPLOYMENT env flag is used to identify if the CTF instance the ctf_client is connecting to is hosted within fb (i.e Tupperware) or external like TIP
 os.environ["EXTERNAL_DEPLOYMENT"] = "True"
 
+from ctf.common.profiling import DEFAULT_CAPACITY
 from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
 
 from .lib import CtfHelpers
+from .step_durations import DEFAULT_TIMEOUT_MARGIN, open_step_durations
+from .suite_scheduler import SuiteScheduler, DurationHistory
+from .transfer_scheduler import DEFAULT_MAX_SESSIONS_PER_NODE, DEFAULT_MAX_UPLOADS
 
 try:
     # To get login credentials via secrets (Facebook internal)
@@ -107,6 +112,36 @@ class CtfRunner:
         run_cmd.add_argument(
             "--max-workers", default=10, help="Maximum simultaneous operations"
         )
+        run_cmd.add_argument(
+            "--max-log-fetches",
+            type=int,
+            help="Maximum simultaneous log file fetches from test devices "
+            + "(defaults to --max-workers)",
+        )
+        run_cmd.add_argument(
+            "--max-log-uploads",
+            type=int,
+            default=DEFAULT_MAX_UPLOADS,
+            help="Maximum simultaneous log file uploads to CTF",
+        )
+        run_cmd.add_argument(
+            "--max-node-sessions",
+            type=int,
+            default=DEFAULT_MAX_SESSIONS_PER_NODE,
+            help="Maximum simultaneous log file transfers from a single test device",
+        )
+        run_cmd.add_argument(
+            "--device-init-workers",
+            type=int,
+            help="Maximum devices initialized and checked for connectivity "
+            + "simultaneously (defaults to --max-workers)",
+        )
+        run_cmd.add_argument(
+            "--skip-connectivity-check",
+            action="store_true",
+            default=False,
+            help="Do not try to connect to all devices before running the test",
+        )
         run_cmd.add_argument(
             "--no-ssh-debug",
             action="store_true",
@@ -119,6 +154,28 @@ class CtfRunner:
             default=False,
             help="Skip any remaining tests in a suite if a test fails",
         )
+        run_cmd.add_argument(
+            "--setup-pool",
+            nargs="+",
+            type=int,
+            default=[],
+            help="Additional test setup IDs to run a suite's tests in parallel on, "
+            + "one test per setup at a time (tests must be independent)",
+        )
+        run_cmd.add_argument(
+            "--durations-file",
+            default=os.path.expanduser("~/.ctf_test_durations.json"),
+            help="JSON file of test durations used to balance sharded suites",
+        )
+        run_cmd.add_argument(
+            "--shard-log-dir",
+            default="/tmp/ctf_shards/",
+            help="Directory of the logs of each test of a sharded suite",
+        )
+        run_cmd.add_argument(
+            "--suite-report",
+            help="JSON file to write the results of a sharded suite to",
+        )
         run_cmd.add_argument(
             "--json_args",
             type=str,
@@ -140,6 +197,42 @@ class CtfRunner:
             const="/tmp/ctf_logs/",
             help="Store the logs locally. NOTE: Disk space has to be managed by user.",
         )
+        run_cmd.add_argument(
+            "--step-durations-db",
+            help="SQLite database of past step durations, used to derive timeouts "
+            + "and report slower steps (defaults to the app data directory in "
+            + "serverless mode)",
+        )
+        run_cmd.add_argument(
+            "--adaptive-timeouts",
+            nargs="?",
+            type=float,
+            const=DEFAULT_TIMEOUT_MARGIN,
+            help="Bound the default timeouts of each test step by a deadline "
+            + "derived from its past durations on the setup (p99 times this "
+            + "margin)",
+        )
+        run_cmd.add_argument(
+            "--cmd-cache",
+            action="store_true",
+            help="Reuse the results of the test's idempotent device commands "
+            + "(see IDEMPOTENT_COMMANDS) until they expire or the device changes, "
+            + "and log cache hits and misses at the end of the run",
+        )
+        run_cmd.add_argument(
+            "--profile",
+            nargs="?",
+            const="/tmp/ctf_profiles/",
+            help="Profile the run and export a Chrome trace-event (Perfetto) JSON "
+            + "to this file, or to a file in this directory if it ends with '/' "
+            + "(also logs the durations of log_call-decorated functions)",
+        )
+        run_cmd.add_argument(
+            "--profile-capacity",
+            type=int,
+            default=DEFAULT_CAPACITY,
+            help="Maximum number of profiler spans kept (the oldest are dropped)",
+        )
         run_cmd.set_defaults(func=self._run_test)
 
         # "list-tests" subcommand
@@ -220,6 +313,8 @@ class CtfRunner:
             return test.execute()
         elif args.testname in self.test_suites:
             # If it's a test suite, run all the component tests
+            if args.setup_pool:
+                return self._run_test_suite_sharded(args)
             return self._run_test_suite(args)
         else:
             # Find the desired test
@@ -285,6 +380,90 @@ class CtfRunner:
 
         return suite_ret
 
+    def _run_shard_test(self, test_name: str, args) -> Dict:
+        """Run a test of a sharded suite, on a setup reserved by the scheduler"""
+        test = self.tests[test_name](args)
+        ret = test.execute(acquire=False)
+        return {"ret": ret, "url": test.test_url()}
+
+    def _run_test_suite_sharded(self, args) -> int:
+        """Run the tests of the test suite in parallel across a pool of test
+        setups, in separate processes, and report the merged results."""
+        test_names = [tc.__name__ for tc in self.test_suites[args.testname]]
+        test_setup_ids = [args.test_setup_id] + args.setup_pool
+        log_dir = os.path.join(args.shard_log_dir, args.testname)
+        logger.info(
+            "\n================================================================\n"
+            + f" Starting sharded test suite: {args.testname}\n"
+            + f" Test setups: {test_setup_ids}, logs: {log_dir}\n"
+            + "================================================================\n"
+        )
+
+        ctf_helper = CtfHelpers(args)
+        step_durations = open_step_durations(
+            args.step_durations_db,
+            ctf_helper.ctf_api.ctf_client_app_data if ctf_helper.serverless else None,
+        )
+        scheduler = SuiteScheduler(
+            ctf_helper.ctf_api,
+            test_setup_ids,
+            self._run_shard_test,
+            log_dir,
+            DurationHistory(args.durations_file, step_durations),
+            team_id=args.team_id,
+            abort_on_failure=args.abort_suite_on_failure,
+        )
+        # Free reserved setups and stop shards on SIGTERM/SIGINT
+        atexit.register(scheduler.shutdown)
+        results = scheduler.run(test_names, args)
+
+        report = []
+        suite_ret = 0
+        for res in results:
+            if res.skipped:
+                status = "SKIPPED"
+            elif res.ret:
+                suite_ret = res.ret
+                status = "FAIL"
+            else:
+                status = "PASS"
+            report.append(
+                {
+                    "name": res.test_name,
+                    "status": status,
+                    "ret": res.ret,
+                    "test_setup_id": res.test_setup_id,
+                    "duration": round(res.seconds, 1),
+                    "url": res.url,
+                    "log_file": res.log_file,
+                    "error": res.error,
+                }
+            )
+        columns = {
+            "name": "Test",
+            "status": "Status",
+            "test_setup_id": "Setup",
+            "duration": "Duration (s)",
+            "url": "URL",
+            "log_file": "Log file",
+        }
+        logger.info(
+            "\n================================================================\n"
+            + f" Results for test suite: {args.testname}\n"
+            + "================================================================\n"
+            + f"{dict_to_pretty_table(report, columns)}"
+        )
+        if args.suite_report:
+            with open(args.suite_report, "w") as f:
+                json.dump(
+                    {"suite": args.testname, "ret": suite_ret, "tests": report},
+                    f,
+                    indent=2,
+                )
+            logger.info(f"Suite report written to {args.suite_report}")
+
+        return suite_ret
+
     def _list_tests(self, args) -> int:
         """'list-tests' command handler."""
         print("Available tests:")
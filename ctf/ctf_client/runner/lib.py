@@ -12,21 +12,29 @@ Library containing CTF test utilities.
 import datetime
 import json
 import logging
+import math
 import re
+import sqlite3
 import sys
 import threading
 import time
 import warnings
 from argparse import Namespace
 from collections.abc import Mapping
-from concurrent.futures import as_completed, ThreadPoolExecutor, TimeoutError
+from concurrent.futures import (
+    as_completed,
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError,
+)
 from contextlib import contextmanager
 from distutils.util import strtobool
-from os import makedirs, path
+from os import makedirs, path, remove
 from pathlib import Path
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+from tempfile import mkdtemp, NamedTemporaryFile, TemporaryDirectory
 from typing import Any, cast, Dict, Generator, List, Optional, Sequence, Set, Tuple
 
+from ctf.common import profiling
 from ctf.common.connections.SSHConnection import SSHConnection
 from ctf.common.constants import (
     ActionTag as _ActionTag,
@@ -34,7 +42,12 @@ from ctf.common.constants import (
     TOTAL_LOGS_FILE_NAME,
 )
 from ctf.common.enums import TagLevel as _TagLevel
-from ctf.common.logging_utils import log_call
+from ctf.common.logging_utils import (
+    CallHistogram,
+    get_call_histogram,
+    log_call,
+    set_call_histogram,
+)
 
 # To avoid lint warning of unused imports
 ActionTag = _ActionTag
@@ -43,18 +56,47 @@ TagLevel = _TagLevel
 from ctf.ctf_client.lib.connections_helper import (
     create_ssh_connection as _create_ssh_connection,
     get_ssh_connection_class as _get_ssh_connection_class,
+    set_device_init_workers,
 )
 from ctf.ctf_client.lib.constants import TestActionStatusEnum
+from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
 from ctf.ctf_client.server_gateway.api_gateway import get_ctf_api
 
 # To avoid lint warning of unused import
 get_ssh_connection_class = _get_ssh_connection_class
 create_ssh_connection = _create_ssh_connection
 
+from .command_cache import CommandCache
 from .exceptions import DeviceCmdError, DeviceConfigError, TestUsageError
+from .step_durations import (
+    adaptive_timeout,
+    DEFAULT_TIMEOUT_MARGIN,
+    find_regressions,
+    MIN_ADAPTIVE_TIMEOUT,
+    open_step_durations,
+)
+from .transfer_scheduler import (
+    DEFAULT_MAX_SESSIONS_PER_NODE,
+    DEFAULT_MAX_UPLOADS,
+    NodeTransferProgress,
+    PRIORITY_DEFAULT,
+    PRIORITY_FAILURE,
+    TransferScheduler,
+)
+from .waiter import (
+    Backoff,
+    DEFAULT_WATCH_INTERVAL,
+    remote_wait_cmd,
+    SharedPoll,
+    tcp_port_open,
+    WATCH_TIMEOUT_MARGIN,
+)
 
 logger = logging.getLogger(__name__)
 
+# Timeout of the TCP probe of a device's SSH port, see _test_can_connect()
+SSH_PORT_PROBE_TIMEOUT = 3
+
 # Silence this warning, as some versions of paramiko will raise
 # ResourceWarnings when connections are opened/closed.
 warnings.simplefilter("ignore", ResourceWarning)
@@ -72,6 +114,7 @@ class ThreadLocal(threading.local):
 
     Thread specific attributes:
         step_idx: int  # the 1-based index of the current test step
+        step_deadline: Optional[float]  # adaptive deadline of the current test step
 
     References:
         https://docs.python.org/3/library/threading.html?highlight=local#thread-local-data
@@ -99,6 +142,7 @@ class ThreadLocal(threading.local):
         time a thread accesses ThreadLocal.
         """
         self.step_idx = step_idx
+        self.step_deadline = None
         ThreadLocal.initialized = True
 
     @log_call(params=False, returned=False, result=False)
@@ -111,6 +155,7 @@ class ThreadLocal(threading.local):
         Invoked automatically once per thread the first time it accesses ThreadLocal.
         """
 
+        self.step_deadline = None
         if step_idx:
             self.step_idx = step_idx
             ThreadLocal.initialized = True
@@ -139,6 +184,11 @@ class BaseCtfTest:
     # If `self.NODES_DATA_FORMAT` is set, is it optional?
     NODES_DATA_OPTIONAL: bool = False
 
+    # Commands that only read device state, as regular expressions (matching
+    # whole commands) mapped to how long their results can be reused, in
+    # seconds. Cached by run_cmd() with --cmd-cache, see CommandCache.
+    IDEMPOTENT_COMMANDS: Dict[str, float] = {}
+
     def __init__(self, args: Namespace) -> None:
         #### Task execution ####
         # Number of thread pool workers
@@ -149,6 +199,51 @@ class BaseCtfTest:
             thread_name_prefix="NodeWorkers", max_workers=self.max_workers
         )
 
+        # Scheduler for log file transfers, with separate limits for device
+        # reads, uploads to CTF and sessions per node. See TransferScheduler.
+        self.transfer_scheduler = TransferScheduler(
+            max_fetches=(
+                args.max_log_fetches
+                if getattr(args, "max_log_fetches", None)
+                else self.max_workers
+            ),
+            max_uploads=(
+                args.max_log_uploads
+                if getattr(args, "max_log_uploads", None)
+                else DEFAULT_MAX_UPLOADS
+            ),
+            max_sessions_per_node=(
+                args.max_node_sessions
+                if getattr(args, "max_node_sessions", None)
+                else DEFAULT_MAX_SESSIONS_PER_NODE
+            ),
+            progress_fn=self._log_transfer_progress,
+        )
+
+        # Number of devices initialized (and checked for connectivity)
+        # concurrently in init_test_run()
+        self.device_init_workers: int = (
+            args.device_init_workers
+            if getattr(args, "device_init_workers", None)
+            else self.max_workers
+        )
+        # Try to connect to all devices in init_test_run()
+        self.check_connectivity: bool = not getattr(
+            args, "skip_connectivity_check", False
+        )
+        # Map from node ID to the connection error of unreachable devices
+        self.unreachable_devices: Dict[int, str] = {}
+
+        # In-flight polls of try_until_timeout_noexcept(), shared between
+        # concurrent waiters on the same function and arguments
+        self.shared_poll = SharedPoll()
+        # Results of IDEMPOTENT_COMMANDS reused by run_cmd(), if enabled
+        self.command_cache: Optional[CommandCache] = (
+            CommandCache(self.IDEMPOTENT_COMMANDS)
+            if getattr(args, "cmd_cache", False)
+            else None
+        )
+
         # CTF run mode flag. Running in serverless mode or CTF server APIs
         self.serverless = (
             False if not args.serverless else bool(strtobool(args.serverless))
@@ -219,12 +314,64 @@ class BaseCtfTest:
         # Protects: ctf_keyed_json_objects
         self.ctf_keyed_json_objects_lock = threading.Lock()
 
+        # Map from test step index to local files to push as step artifacts,
+        # as (file path, CTF constructive path directory) tuples
+        self.ctf_step_files: Dict[int, List[Tuple[str, str]]] = {}
+        # Lock for thread safe step files update
+        # Protects: ctf_step_files
+        self.ctf_step_files_lock = threading.Lock()
+
         # Lock for thread safe data push to CTF
         # Protects
         #   save_test_action_result()
         #   save_test_action_result_json_data()
         self.ctf_push_lock = threading.Lock()
 
+        #### Profiling ####
+        # Output file (or directory) of the run profile, in Chrome trace-event
+        # format. Profiling is disabled unless set. See ctf.common.profiling.
+        self.profile_path: Optional[str] = getattr(args, "profile", None)
+        self.profiler: Optional[profiling.Profiler] = None
+        # Durations of log_call-decorated functions, recorded while profiling
+        self.call_histogram: Optional[CallHistogram] = None
+        if self.profile_path:
+            self.profiler = profiling.Profiler(
+                capacity=(
+                    args.profile_capacity
+                    if getattr(args, "profile_capacity", None)
+                    else profiling.DEFAULT_CAPACITY
+                )
+            )
+            profiling.set_profiler(self.profiler)
+            self.call_histogram = CallHistogram()
+            set_call_histogram(self.call_histogram)
+            # Record the time spent waiting for the shared CTF locks
+            self.ctf_log_lock = profiling.ProfiledLock(
+                self.ctf_log_lock, "ctf_log_lock"
+            )
+            self.ctf_push_lock = profiling.ProfiledLock(
+                self.ctf_push_lock, "ctf_push_lock"
+            )
+
+        #### Step durations ####
+        # History of step durations, persisted in --step-durations-db or in
+        # the serverless app data directory. See step_durations.
+        self.step_durations = open_step_durations(
+            getattr(args, "step_durations_db", None),
+            self.ctf_api.ctf_client_app_data if self.serverless else None,
+        )
+        # Past durations of each step of this test on this setup, loaded
+        # when the test steps start
+        self.step_history: Dict[str, List[float]] = {}
+        # Durations of the steps of this run that succeeded
+        self.step_run_durations: Dict[str, float] = {}
+        self.step_run_durations_lock = threading.Lock()
+        # If set, default step timeouts are derived from past step durations
+        # (p99 times this margin) instead of --timeout/--log-collect-timeout
+        self.adaptive_timeout_margin: Optional[float] = getattr(
+            args, "adaptive_timeouts", None
+        )
+
         # Thread-local data. See ThreadLocal for details.
         self.thread_local = ThreadLocal()
 
@@ -280,6 +427,7 @@ class BaseCtfTest:
 
     def __del__(self) -> None:
         self.cleanupThreadPool(self.thread_pool)
+        self.transfer_scheduler.shutdown(wait=False)
 
     @staticmethod
     def test_params() -> Dict[str, Dict]:
@@ -393,6 +541,7 @@ class BaseCtfTest:
             },
         ]
         post_run_idx = len(steps) - 2  # post_run(), collect_logfiles()
+        self.load_step_history()
         ret: int = self.run_test_steps(steps, post_run_idx)
         self.finish_test_run(ret)
         return ret
@@ -417,6 +566,21 @@ class BaseCtfTest:
 
         self.log_to_ctf(f"Test command:\n{' '.join(sys.argv)}")
         self.log_to_ctf(f"Devices:\n{devices}")
+        if self.unreachable_devices:
+            rows = [
+                {
+                    "node_id": node_id,
+                    "name": self.device_info[node_id].metadata.get("name", ""),
+                    "address": getattr(
+                        self.device_info[node_id].connection, "ip_address", ""
+                    ),
+                    "error": error,
+                }
+                for node_id, error in self.unreachable_devices.items()
+            ]
+            self.log_to_ctf(
+                f"Unreachable devices:\n{dict_to_pretty_table(rows)}", "warning"
+            )
 
     def pre_run(self) -> None:
         """Function to run before all test steps."""
@@ -467,6 +631,7 @@ class BaseCtfTest:
         Returns a non-zero integer upon error.
         """
         # Get the configuration
+        set_device_init_workers(self.device_init_workers)
         self.device_info = self.ctf_api.get_test_setup_devices_and_connections(
             test_setup_id=self.test_setup_id,
         )
@@ -483,6 +648,13 @@ class BaseCtfTest:
                 device.connection.enable_verbose_logs(self.ssh_debug)
                 device.connection.enable_sftp(False)
 
+        # Report unreachable devices in the test info, rather than failing
+        # in the first step using them
+        if self.check_connectivity:
+            self.unreachable_devices = self.check_device_connectivity()
+            for node_id, error in self.unreachable_devices.items():
+                logger.warning(f"Device {node_id} is unreachable: {error}")
+
         self.test_start_time = int(time.time())
         result = self.ctf_api.create_test_run_result(
             name=self.TEST_NAME,
@@ -576,12 +748,19 @@ class BaseCtfTest:
             self.log_to_ctf(
                 f"Delaying step {step_idx} {step['name']} for {delay_sec} s"
             )
-            time.sleep(delay_sec)
+            with profiling.span("delay", "sleep"):
+                time.sleep(delay_sec)
 
         # Run the test step
         step_outcome: int = 0  # 0=success, otherwise failed step_idx
+        hang_timer = self._start_step_hang_timer(step["name"], step_idx)
+        function_start = time.monotonic()
         try:
             step["function"](*step["function_args"])
+            with self.step_run_durations_lock:
+                self.step_run_durations[step["name"]] = (
+                    time.monotonic() - function_start
+                )
             if step["success_msg"]:
                 self.log_to_ctf(step["success_msg"], "info")
         except Exception as e:
@@ -589,6 +768,10 @@ class BaseCtfTest:
             err_msg = f"Failed to run step [{step['name']}]: {e} ({type(e)})"
             logger.exception(err_msg)
             self.log_to_ctf(err_msg, "error")
+        finally:
+            if hang_timer:
+                hang_timer.cancel()
+            self.thread_local.step_deadline = None
 
         # Negate step result
         if step.get("negate_result", False):
@@ -617,7 +800,8 @@ class BaseCtfTest:
             self.log_to_ctf(
                 f"Waiting for {post_delay_sec}s after executing step {step_idx} {step['name']}"
             )
-            time.sleep(post_delay_sec)
+            with profiling.span("post_delay", "sleep"):
+                time.sleep(post_delay_sec)
 
         # Get log files and tags for this step
         step_meta_data = self.get_meta_data_for_step(step=step)
@@ -636,7 +820,7 @@ class BaseCtfTest:
 
         # Save the action result
         # TODO: Return `action_result` to avoid ctf_push_lock
-        with self.ctf_push_lock:
+        with self.ctf_push_lock, profiling.span("save_test_action_result", "upload"):
             action_result = self.ctf_api.save_test_action_result(
                 test_run_id=self.test_exe_id,
                 description=step["name"],
@@ -657,7 +841,9 @@ class BaseCtfTest:
 
         # Save CTF Json Data
         if len(ctf_json_data) > 0:
-            with self.ctf_push_lock:
+            with self.ctf_push_lock, profiling.span(
+                "save_test_action_result_json_data", "upload"
+            ):
                 save_json_data_result = self.ctf_api.save_test_action_result_json_data(
                     test_action_result_id=test_action_result_id,
                     ctf_json_data_all=json.dumps(ctf_json_data),
@@ -685,8 +871,30 @@ class BaseCtfTest:
                         f"Recorded CTF Test Action Result key JSON: {save_test_action_result_keyed_json}"
                     )
 
+        # Push step artifact files
+        with self.ctf_step_files_lock:
+            ctf_step_files = self.ctf_step_files.pop(step_idx, [])
+        for file_path, constructive_path in ctf_step_files:
+            try:
+                result = self.ctf_api.save_action_log_file(
+                    source_file_path=file_path,
+                    constructive_path=constructive_path,
+                    test_exe_id=self.test_exe_id,
+                    test_action_result_id=test_action_result_id,
+                    move_source=True,
+                )
+                if result.get("error"):
+                    logger.error(f"Failed to push {file_path}: {result['message']}")
+            finally:
+                # Not consumed by every CTF API
+                if path.exists(file_path):
+                    remove(file_path)
+
         # Pull the log files from node and push to CTF
-        self.collect_logfiles_for_action(log_files, test_action_result_id)
+        with profiling.span("collect_logfiles_for_action", "log collection"):
+            self.collect_logfiles_for_action(
+                log_files, test_action_result_id, failed=step_outcome != 0
+            )
         # Use this method to do any post processing
         self.secondary_step_action(test_action_result_id, step)
 
@@ -708,6 +916,55 @@ class BaseCtfTest:
         )
         return ret_val
 
+    def _start_step_hang_timer(
+        self, step_name: str, step_idx: int
+    ) -> Optional[threading.Timer]:
+        """Publish the adaptive deadline of a step, and start a timer warning
+        if the step runs longer (i.e. is probably hung).
+
+        Does nothing for steps without enough past durations.
+        """
+        timeout = adaptive_timeout(
+            self.step_history.get(step_name, []),
+            self.adaptive_timeout_margin or DEFAULT_TIMEOUT_MARGIN,
+        )
+        if not timeout:
+            return None
+        if self.adaptive_timeout_margin:
+            self.thread_local.step_deadline = time.monotonic() + timeout
+        hang_timer = threading.Timer(
+            timeout,
+            self._thread_main,
+            (
+                self.log_to_ctf,
+                (
+                    f"Step {step_idx} {step_name} is still running after {timeout}s, "
+                    + "far longer than in past runs: it may be hung",
+                    "warning",
+                ),
+                step_idx,
+            ),
+        )
+        hang_timer.daemon = True
+        hang_timer.start()
+        return hang_timer
+
+    def step_timeout(self, default: int) -> int:
+        """Return the timeout of waits in the current test step: `default`,
+        or the time left until its adaptive deadline if shorter (see
+        --adaptive-timeouts), but at least MIN_ADAPTIVE_TIMEOUT.
+        """
+        deadline = self.thread_local.step_deadline
+        if deadline is None:
+            return default
+        time_left = math.ceil(deadline - time.monotonic())
+        return min(default, max(time_left, MIN_ADAPTIVE_TIMEOUT))
+
+    def _run_profiled_test_step(self, step: Dict, step_idx: int) -> int:
+        """Run _run_test_step() in a profiler span covering the whole step"""
+        with profiling.context(step=step_idx), profiling.span(step["name"], "step"):
+            return self._run_test_step(step, step_idx)
+
     def secondary_step_action(self, test_action_result_id: int, step: Dict) -> None:
         """Use this method to do any post processing after the step result is saved on CTF"""
         return
@@ -759,7 +1016,7 @@ class BaseCtfTest:
             while not done:
                 futures[
                     step_thread_pool.submit(
-                        self._run_test_step, step=steps[idx], step_idx=idx + 1
+                        self._run_profiled_test_step, step=steps[idx], step_idx=idx + 1
                     )
                 ] = idx
                 if (
@@ -869,8 +1126,106 @@ class BaseCtfTest:
         for device in self.device_info.values():
             device.connection.disconnect()  # TODO Introduce disconnectAllThreads()
 
+        self.save_step_durations()
+        self.log_command_cache_stats()
+        self.export_profile()
         return 0
 
+    def load_step_history(self) -> None:
+        """Load the past durations of this test's steps on this setup"""
+        if not self.step_durations:
+            return
+        try:
+            self.step_history = self.step_durations.load(
+                self.TEST_NAME, self.test_setup_id
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load past step durations: {e}")
+
+    def save_step_durations(self) -> None:
+        """Report the steps that were much slower than in past runs, and
+        add this run's step durations to the history.
+        """
+        if not self.step_durations:
+            return
+        with self.step_run_durations_lock:
+            durations = dict(self.step_run_durations)
+        regressions = find_regressions(self.step_history, durations)
+        if regressions:
+            logger.warning(
+                "Steps slower than in past runs on this setup:\n"
+                + f"{dict_to_pretty_table(regressions)}"
+            )
+        try:
+            self.step_durations.record(self.TEST_NAME, self.test_setup_id, durations)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save step durations: {e}")
+
+    def log_command_cache_stats(self) -> None:
+        """Log the hits and misses of the command cache, if enabled"""
+        if not self.command_cache:
+            return
+        rows = self.command_cache.rows()
+        if rows:
+            logger.info(
+                "Command cache (invalidated "
+                + f"{self.command_cache.invalidations} results):\n"
+                + dict_to_pretty_table(rows)
+            )
+
+    def invalidate_device_state(self, node_ids: Optional[List[int]] = None) -> None:
+        """Forget the state cached about devices (all devices if empty) after
+        they were rebooted, upgraded or reconfigured.
+
+        Subclasses caching other device state extend this.
+        """
+        if self.command_cache:
+            self.command_cache.invalidate(node_ids)
+
+    def export_profile(self) -> Optional[str]:
+        """Export the run profile and log the top time sinks, if profiling
+        is enabled. Returns the path of the exported trace.
+
+        The trace (Chrome trace-event JSON) can be opened in Perfetto
+        (https://ui.perfetto.dev) or chrome://tracing.
+        """
+        if not self.profiler:
+            return None
+        profile_path = self.profile_path
+        if path.isdir(profile_path) or profile_path.endswith("/"):
+            makedirs(profile_path, exist_ok=True)
+            profile_path = path.join(
+                profile_path,
+                f"ctf_profile_{self.test_exe_id or self.test_start_time}.json",
+            )
+        try:
+            self.profiler.export_chrome_trace(profile_path)
+        except OSError as e:
+            logger.error(f"Failed to export the run profile: {e}")
+            return None
+        finally:
+            if profiling.get_profiler() is self.profiler:
+                profiling.set_profiler(None)
+            if get_call_histogram() is self.call_histogram:
+                set_call_histogram(None)
+
+        top_sinks = self.profiler.top_sinks()
+        if top_sinks:
+            logger.info(f"Top time sinks:\n{dict_to_pretty_table(top_sinks)}")
+        call_durations = self.call_histogram.rows()
+        if call_durations:
+            logger.info(
+                "Logged call durations:\n"
+                + dict_to_pretty_table(call_durations[: profiling.DEFAULT_TOP_SINKS])
+            )
+        if self.profiler.dropped:
+            logger.warning(
+                f"{self.profiler.dropped} oldest profiler spans were dropped, "
+                + "increase --profile-capacity to keep them"
+            )
+        logger.info(f"Run profile exported to {profile_path}")
+        return profile_path
+
     def test_url(self) -> str:
         """Return a URL to access test results (after `self.init_test_run()`)."""
         # TODO replace this when added to CTF API
@@ -894,46 +1249,22 @@ class BaseCtfTest:
 
         self.log_to_ctf(f"Collecting log files: [{logfiles}]", "info")
 
-        futures: Dict = {}
+        node_logfiles: Dict[int, List[str]] = {}
         for node_id, device in self.device_info.items():
             if device.device_type() in logfiles and logfiles[device.device_type()]:
-                futures[
-                    self.thread_pool.submit(
-                        self._fetch_and_submit_logfiles,
-                        node_id,
-                        device.connection,
-                        logfiles[device.device_type()],
-                        self.thread_local.step_idx,
-                    )
-                ] = node_id
-
-        failed_nodes = []
-        for future in as_completed(futures.keys(), timeout=self.log_collect_timeout):
-            result = future.result()
-            node_id = futures[future]
-            if result:
-                self.log_to_ctf(
-                    f"Node {node_id} finished fetching and pushing log files"
-                )
-            else:
-                failed_nodes.append(node_id)
-                self.log_to_ctf(
-                    f"Failed to collect log files from node {node_id}", "error"
-                )
+                node_logfiles[node_id] = logfiles[device.device_type()]
 
-        if failed_nodes:
-            raise DeviceCmdError(
-                f"Errors were raised during log collection on {len(failed_nodes)} "
-                + f"node(s): {sorted(failed_nodes)}"
-            )
+        self._collect_node_logfiles(node_logfiles)
 
     def collect_logfiles_for_action(
         self,
         logfiles: Dict[int, List[str]],
         test_action_result_id: int,
+        failed: bool = False,
     ) -> None:
         """Collect any requested log files from the test devices and submit
         them to CTF action log.
+        Log files of failed actions are transferred before any other log files.
         """
         if not logfiles:
             self.log_to_ctf(
@@ -949,22 +1280,43 @@ class BaseCtfTest:
             "info",
         )
 
+        node_logfiles: Dict[int, List[str]] = {
+            node_id: logfiles[node_id]
+            for node_id in self.device_info
+            if logfiles.get(node_id, None)
+        }
+        self._collect_node_logfiles(
+            node_logfiles,
+            test_action_result_id,
+            priority=PRIORITY_FAILURE if failed else PRIORITY_DEFAULT,
+        )
+
+    def _collect_node_logfiles(
+        self,
+        node_logfiles: Dict[int, List[str]],
+        test_action_result_id: Optional[int] = None,
+        priority: int = PRIORITY_DEFAULT,
+    ) -> None:
+        """Transfer the log files of each node through the transfer scheduler
+        and wait for all of them (at most log_collect_timeout seconds).
+        """
         futures: Dict = {}
-        for node_id, device in self.device_info.items():
-            if logfiles.get(node_id, None):
-                futures[
-                    self.thread_pool.submit(
-                        self._fetch_and_submit_logfiles,
-                        node_id,
-                        device.connection,
-                        logfiles[node_id],
-                        self.thread_local.step_idx,
-                        test_action_result_id,
-                    )
-                ] = node_id
+        for node_id, logfiles in node_logfiles.items():
+            futures[
+                self._submit_logfiles(
+                    node_id,
+                    self.device_info[node_id].connection,
+                    logfiles,
+                    self.thread_local.step_idx,
+                    test_action_result_id,
+                    priority,
+                )
+            ] = node_id
 
         failed_nodes = []
-        for future in as_completed(futures.keys(), timeout=self.log_collect_timeout):
+        for future in as_completed(
+            futures.keys(), timeout=self.step_timeout(self.log_collect_timeout)
+        ):
             result = future.result()
             node_id = futures[future]
             if result:
@@ -994,107 +1346,136 @@ class BaseCtfTest:
         """Collect the requested log files and submit them to CTF.
         If test_action_result_id is mentioned save logs against given action else
         save logs for test run"""
+        return self._submit_logfiles(
+            node_id, connection, logfiles, step_idx, test_action_result_id
+        ).result()
 
-        if step_idx:
-            # We are in a new thread. Publish step_idx in thread local data.
-            # See also: ThreadLocal
-            self.thread_local.init(step_idx)
-
-        try:
-            connection.connect()
-        except Exception as e:
-            self.log_to_ctf(
-                f"Connection failed to {connection.ip_address}: {str(e)}", "error"
-            )
-            raise
-
-        result: Dict = {}
-        success: bool = True
+    def _submit_logfiles(
+        self,
+        node_id: int,
+        connection: SSHConnection,
+        logfiles: Sequence[str],
+        step_idx: Optional[int] = None,
+        test_action_result_id: Optional[int] = None,
+        priority: int = PRIORITY_DEFAULT,
+    ) -> Future:
+        """Schedule fetching the requested log files of a node and submitting
+        them to CTF. Returns a future resolving to True upon success.
+        """
         if self.store_logs_locally:
             local_dir = path.join(
                 self.store_logs_locally, str(self.test_exe_id), str(node_id)
             )
             makedirs(local_dir, exist_ok=True)
+            on_done = None
         else:
             tmp_dir = TemporaryDirectory(prefix="logfiles-")
             local_dir = tmp_dir.name
-
-        for logfile in logfiles:
-            # Fetch log file from test device
-            self.log_to_ctf(f"Fetching {logfile} to local dir: {local_dir}")
-            if not self.fetch_file(connection, local_dir, logfile, recursive=True):
-                success = False
-                # attempt to reconnect and try to fetch the next file
-                try:
-                    connection.connect()
-                except Exception as e:
-                    self.log_to_ctf(
-                        f"Connection failed to {connection.ip_address}: {str(e)}",
-                        "error",
-                    )
-                continue
-
-            # Push to CTF
-            local_path = Path(f"{local_dir}/{Path(logfile).name}")
-            # use step to form log destination path
-            step = f"step_{step_idx}_" if step_idx else ""
-            if local_path.is_dir():
+            on_done = tmp_dir.cleanup
+        # Fetched files are only kept around when storing logs locally,
+        # otherwise the API may consume them instead of copying them.
+        move_source = not self.store_logs_locally
+        # use step to form log destination path
+        step = f"step_{step_idx}_" if step_idx else ""
+
+        def logfile_dir(logfile: str) -> str:
+            # Mirror the remote path: logs sharing a name (e.g. the "current"
+            # logs of several services) are fetched while others are being
+            # uploaded, and must not overwrite each other
+            return str(Path(local_dir, logfile.lstrip("/")).parent)
+
+        def fetch(logfile: str) -> Optional[List[str]]:
+            if step_idx:
+                # We are in a new thread. Publish step_idx in thread local data.
+                # See also: ThreadLocal
+                self.thread_local.init(step_idx)
+            fetch_dir = logfile_dir(logfile)
+            makedirs(fetch_dir, exist_ok=True)
+            with profiling.context(step=step_idx, node=node_id):
+                return self.fetch_logfile(node_id, connection, fetch_dir, logfile)
+
+        def upload(logfile: str, local_file: str) -> bool:
+            if step_idx:
+                self.thread_local.init(step_idx)
+            if Path(local_file).parent == Path(local_dir, logfile.lstrip("/")):
+                # File from a fetched directory
                 dest_path = (
                     f"{node_id}/{step}{test_action_result_id}{logfile}"
                     if test_action_result_id
                     else f"{node_id}{logfile}"
                 )
-                for f in local_path.glob("*"):
-                    if f.is_file():
-                        self.log_to_ctf(f"Pushing {f} to CTF path: {dest_path}")
-                        if test_action_result_id:
-                            result = self.ctf_api.save_action_log_file(
-                                source_file_path=f,
-                                constructive_path=dest_path,
-                                test_exe_id=self.test_exe_id,
-                                test_action_result_id=test_action_result_id,
-                            )
-                        else:
-                            result = self.ctf_api.save_log_file(
-                                test_exe_id=self.test_exe_id,
-                                source_file_path=f,
-                                constructive_path=dest_path,
-                            )
-                        if result["error"]:
-                            success = False
-                            self.log_to_ctf(result["message"], "error")
-                if "error" in result and result["error"]:
-                    success = False
             else:
                 dest_path = (
                     f"{node_id}/{step}{test_action_result_id}{Path(logfile).parent}"
                     if test_action_result_id
                     else f"{node_id}{Path(logfile).parent}"
                 )
-                self.log_to_ctf(f"Pushing {local_path} to CTF path: {dest_path}")
+            # Push to CTF
+            self.log_to_ctf(f"Pushing {local_file} to CTF path: {dest_path}")
+            with profiling.span(
+                "upload_log_file", "upload", step=step_idx, node=node_id
+            ) as span:
+                if profiling.enabled():
+                    span.set(bytes=profiling.path_size(local_file))
                 if test_action_result_id:
                     result = self.ctf_api.save_action_log_file(
-                        source_file_path=local_path,
+                        source_file_path=local_file,
                         constructive_path=dest_path,
                         test_exe_id=self.test_exe_id,
                         test_action_result_id=test_action_result_id,
+                        move_source=move_source,
                     )
                 else:
                     result = self.ctf_api.save_log_file(
                         test_exe_id=self.test_exe_id,
-                        source_file_path=local_path,
+                        source_file_path=local_file,
                         constructive_path=dest_path,
+                        move_source=move_source,
                     )
-                if result["error"]:
-                    success = False
-                    self.log_to_ctf(result["message"], "error")
-            # Break if log push to ctf fails and store_logs_locally is disabled
-            if not success and not self.store_logs_locally:
-                break
-        if not self.store_logs_locally:
-            tmp_dir.cleanup()
+            if result.get("error"):
+                self.log_to_ctf(result["message"], "error")
+                return False
+            return True
 
-        return success
+        return self.transfer_scheduler.submit(
+            node_id,
+            list(logfiles),
+            fetch,
+            upload,
+            priority=priority,
+            on_done=on_done,
+        )
+
+    def fetch_logfile(
+        self, node_id: int, connection: SSHConnection, local_dir: str, logfile: str
+    ) -> Optional[List[str]]:
+        """Fetch a log file (or directory) of a node into `local_dir`, and
+        return the local files to push to CTF, or None upon failure.
+
+        Subclasses can override this to produce some log files differently
+        (e.g. stream them from a command).
+        """
+        # Fetch log file from test device
+        self.log_to_ctf(f"Fetching {logfile} to local dir: {local_dir}")
+        try:
+            if not self.fetch_file(connection, local_dir, logfile, recursive=True):
+                # attempt to reconnect, so the next file can be fetched
+                connection.connect()
+                return None
+        except Exception as e:
+            self.log_to_ctf(
+                f"Connection failed to {connection.ip_address}: {str(e)}",
+                "error",
+            )
+            return None
+        local_path = Path(f"{local_dir}/{Path(logfile).name}")
+        if local_path.is_dir():
+            return [str(f) for f in local_path.glob("*") if f.is_file()]
+        return [str(local_path)]
+
+    def _log_transfer_progress(self, progress: NodeTransferProgress) -> None:
+        severity = "info" if progress.done == progress.total else "debug"
+        self.log_to_ctf(f"Log transfer progress of {progress}", severity)
 
     def log_to_ctf(self, msg: str, severity: Optional[str] = "debug") -> None:
         """Record a log message for the current thread.
@@ -1138,8 +1519,16 @@ class BaseCtfTest:
                 )
 
     def ping_output_to_ctf_table(
-        self, ping_summary: str, ping_stats: str, from_node_id: int, dest_ip: str
+        self,
+        ping_summary: str,
+        ping_stats: str,
+        from_node_id: int,
+        dest_ip: str,
+        extra_json_data: Optional[Dict] = None,
     ) -> None:
+        """Record ping summary and stats tables for the current test step.
+        Tables, charts and data in `extra_json_data` are recorded with them.
+        """
         packets_transmitted = re.search(r"(\S+) packets transmitted", ping_summary)
         if packets_transmitted:
             packets_transmitted = packets_transmitted.group(1)
@@ -1197,6 +1586,8 @@ class BaseCtfTest:
             "ctf_tables": [json_table_summary, json_table_stats],
             "ctf_data": [json_data],
         }
+        for key, values in (extra_json_data or {}).items():
+            ctf_json_data_all.setdefault(key, []).extend(values)
         self.save_ctf_json_data(ctf_json_data_all)
 
     def save_ctf_json_data(self, json_data: Dict) -> None:
@@ -1213,6 +1604,60 @@ class BaseCtfTest:
         with self.ctf_json_data_lock:
             self.ctf_json_data[step_idx] = json_data
 
+    def add_ctf_json_data(self, json_data: Dict[str, List]) -> None:
+        """Add CTF JSON data (tables, charts, data...) to the data already
+        recorded for the current test step, unlike save_ctf_json_data().
+        """
+
+        step_idx = self.thread_local.step_idx
+        if step_idx < 1:
+            raise ValueError(f"Invalid step_idx {step_idx}. See ThreadLocal.")
+
+        with self.ctf_json_data_lock:
+            step_json_data = dict(self.ctf_json_data.get(step_idx, {}))
+            for key, values in json_data.items():
+                step_json_data[key] = step_json_data.get(key, []) + list(values)
+            self.ctf_json_data[step_idx] = step_json_data
+
+    def step_file_path(self, constructive_path: str, file_name: str) -> str:
+        """Return a local path to write the artifact `file_name` of the
+        current test step to, before recording it with save_ctf_step_file().
+
+        Artifacts are pushed under their local file name, so the path is
+        unique to the test step and `constructive_path`.
+        """
+
+        step_idx = self.thread_local.step_idx
+        if step_idx < 1:
+            raise ValueError(f"Invalid step_idx {step_idx}. See ThreadLocal.")
+
+        if self.tempdir is None:
+            # Not running in run_test()
+            self.tempdir = mkdtemp(prefix="ctf_")
+        local_dir = path.join(
+            self.tempdir, "step_files", str(step_idx), constructive_path
+        )
+        makedirs(local_dir, exist_ok=True)
+        return path.join(local_dir, file_name)
+
+    def save_ctf_step_file(self, file_path: str, constructive_path: str) -> None:
+        """Record a local file to push to CTF as an artifact of the current
+        test step, in the `constructive_path` directory and under its own
+        file name (see step_file_path()).
+
+        The file is pushed, then removed, once the test step result is
+        recorded in run_test_steps().
+        """
+
+        step_idx = self.thread_local.step_idx
+        if step_idx < 1:
+            raise ValueError(f"Invalid step_idx {step_idx}. See ThreadLocal.")
+
+        with self.ctf_step_files_lock:
+            self.ctf_step_files.setdefault(step_idx, []).append(
+                (file_path, constructive_path)
+            )
+
     def save_ctf_test_action_result_with_key(self, key: str, json_object: Dict) -> Dict:
         """Record CTF JSON objects for the current test step.
 
@@ -1252,18 +1697,23 @@ class BaseCtfTest:
         node_ids: Optional[List[int]] = None,
         device_type: str = "generic",
         timeout: Optional[int] = None,
+        cache: bool = True,
     ) -> Dict[Any, int]:
         """Run a given command on a list of test devices.
 
         If 'node_ids' is empty, the command will run on all devices of a given
         type.
 
+        With the command cache enabled, results of IDEMPOTENT_COMMANDS may be
+        reused (unless 'cache' is False), and other commands invalidate the
+        cached results of the devices they run on.
+
         Returns a map of Future objects to the associated 'node_id'. Typically,
         wait_for_cmds() is invoked on this return value.
         """
         futures: Dict = {}
         node_set: Set = set(node_ids or [])
-        cmd_timeout: int = timeout if timeout else self.timeout
+        cmd_timeout: int = timeout if timeout else self.step_timeout(self.timeout)
 
         for node_id, device in self.device_info.items():
             if node_ids:
@@ -1271,14 +1721,33 @@ class BaseCtfTest:
                     continue
             elif device.device_type() != device_type:
                 continue
-            futures[
-                self.thread_pool.submit(
-                    device.action_custom_command, cmd, cmd_timeout - 1
+            fn = device.action_custom_command
+            fn_args: Tuple = (cmd, cmd_timeout - 1)
+            if self.profiler:
+                fn = self._profiled_custom_command
+                fn_args = (node_id, *fn_args, self.thread_local.step_idx)
+            if self.command_cache and cache:
+                future = self.thread_pool.submit(
+                    self.command_cache.run, node_id, cmd, fn, *fn_args
                 )
-            ] = node_id
+            else:
+                future = self.thread_pool.submit(fn, *fn_args)
+            futures[future] = node_id
 
         return futures
 
+    def _profiled_custom_command(
+        self, node_id: int, cmd: str, timeout: int, step_idx: int
+    ) -> Dict:
+        """Run action_custom_command() on a device in a profiler span"""
+        device = self.device_info[node_id]
+        with profiling.context(step=step_idx, node=node_id), profiling.span(
+            "action_custom_command", "command", cmd=cmd[: profiling.MAX_CMD_CHARS]
+        ) as span:
+            result = device.action_custom_command(cmd, timeout)
+            span.set(bytes=len(result.get("message") or ""))
+        return result
+
     def wait_for_cmds(
         self, futures: Dict[Any, int], timeout: Optional[int] = None
     ) -> Generator[Dict[str, Any], None, None]:
@@ -1296,7 +1765,7 @@ class BaseCtfTest:
 
         If a connection error is encountered, raises `DeviceCmdError`.
         """
-        cmd_timeout: int = timeout if timeout else self.timeout
+        cmd_timeout: int = timeout if timeout else self.step_timeout(self.timeout)
         for future in as_completed(futures.keys(), timeout=cmd_timeout):
             result = future.result()
             node_id = futures[future]
@@ -1338,6 +1807,9 @@ class BaseCtfTest:
         truthy value or None, or until the timeout is reached.
 
         `Exception` raised by `fn` during the retries is ignored.
+        Retries back off from retry_interval / 4 up to `retry_interval`, and
+        concurrent callers with the same `fn` and `fn_args` share in-flight
+        calls (see SharedPoll).
         The actual max timeout is (timeout + 6 * retry_interval)
 
         Returns: True if `fn` ran successfully
@@ -1346,22 +1818,17 @@ class BaseCtfTest:
         time_left = float(timeout)
         start_time = time.monotonic()
         end_time = start_time + time_left
+        backoff = Backoff(retry_interval)
+        step_idx = self.thread_local.step_idx
         while True:
             try:
-                future = next(
-                    as_completed(
-                        [
-                            self.thread_pool.submit(
-                                self._thread_main,
-                                fn,
-                                fn_args,
-                                self.thread_local.step_idx,
-                            )
-                        ],
-                        timeout=time_left,
-                    )
+                future = self.shared_poll.poll(
+                    (fn, fn_args),
+                    lambda: self.thread_pool.submit(
+                        self._thread_main, fn, fn_args, step_idx
+                    ),
                 )
-                ret = future.result()
+                ret = future.result(timeout=time_left)
                 if type(ret) is dict:
                     success = "error" not in ret or str(ret["error"]) == "0"
                 else:
@@ -1382,32 +1849,97 @@ class BaseCtfTest:
                 return False
 
             elapsed = now - start_time
+            interval = backoff.next()
             self.log_to_ctf(
-                f"try_until_timeout {fn.__name__} | elapsed {elapsed} | retrying in {retry_interval}"
+                f"try_until_timeout {fn.__name__} | elapsed {elapsed} | retrying in {interval}"
             )
             time_left = max(timeout - elapsed, 5.0 * retry_interval)
-            time.sleep(retry_interval)
+            with profiling.span("try_until_timeout", "sleep", fn=fn.__name__):
+                time.sleep(interval)
         return False
 
-    def _test_can_connect(self, connection: SSHConnection) -> bool:
+    def wait_for_nodes(
+        self,
+        check_cmd: str,
+        node_ids: List[int],
+        timeout: float,
+        interval: float = DEFAULT_WATCH_INTERVAL,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Wait until the shell command `check_cmd` succeeds on the given nodes.
+
+        Every node runs a single watcher command that re-checks `check_cmd`
+        locally every `interval` seconds (see remote_wait_cmd()), and reports
+        back as soon as it succeeds or `timeout` seconds have passed.
+
+        Returns a map from node IDs to the wait_for_cmds() result of the last
+        check on each node. Raises `DeviceCmdError` on connection errors.
+        """
+        cmd = remote_wait_cmd(check_cmd, timeout, interval)
+        cmd_timeout = int(math.ceil(timeout)) + WATCH_TIMEOUT_MARGIN
+        futures: Dict = self.run_cmd(cmd, node_ids, timeout=cmd_timeout)
+        return {
+            result["node_id"]: result
+            for result in self.wait_for_cmds(futures, timeout=cmd_timeout)
+        }
+
+    def _connection_error(self, connection: SSHConnection) -> Optional[str]:
         """Try to connect/disconnect a test device.
 
-        Return: True if connect/disconnect are both successful.
+        Return: None if connect/disconnect are both successful, else the error.
 
         Note that threads can only disconnect SSHConnection's that
         they established. See ThreadSafeSshConnection in CTF for
         more details.
         """
+        # Skip the (slow) SSH login until the device accepts TCP connections
+        if (
+            isinstance(connection, SSHConnection)
+            and not connection.is_jump_host
+            and not tcp_port_open(
+                connection.ip_address, connection.port, SSH_PORT_PROBE_TIMEOUT
+            )
+        ):
+            return f"SSH port {connection.port} is not open"
         result = connection.connect()
         if result["error"] != 0:
-            return False
+            return result.get("message") or "Connect failed"
         result = connection.disconnect()
         if "error" in result and result["error"] != 0:
             logger.error(
                 f'_test_can_connect | disconnect failed | f{result["message"]}'
             )
-            return False
-        return True
+            return f'Disconnect failed: {result["message"]}'
+        return None
+
+    def _test_can_connect(self, connection: SSHConnection) -> bool:
+        """Try to connect/disconnect a test device.
+
+        Return: True if connect/disconnect are both successful.
+        """
+        return self._connection_error(connection) is None
+
+    def check_device_connectivity(self) -> Dict[int, str]:
+        """Try to connect/disconnect all test devices concurrently (with
+        `self.device_init_workers` threads).
+
+        Return: a map from node ID to the error of unreachable devices.
+        """
+
+        def connection_error(node_id: int) -> Optional[str]:
+            try:
+                return self._connection_error(self.device_info[node_id].connection)
+            except Exception as e:
+                return f"{type(e).__name__}: {e}"
+
+        node_ids = list(self.device_info)
+        workers = max(1, min(self.device_init_workers, len(node_ids)))
+        with ThreadPoolExecutor(
+            thread_name_prefix="ConnectivityCheck", max_workers=workers
+        ) as pool:
+            errors = list(pool.map(connection_error, node_ids))
+        return {
+            node_id: error for node_id, error in zip(node_ids, errors) if error
+        }
 
     def test_can_connect(
         self,
@@ -1477,11 +2009,22 @@ class BaseCtfTest:
 
         The connection object must be initialized before calling this function.
         """
-        connection.connect(timeout=self.scp_timeout)
-        result: Dict = connection.copy_files_from_remote(
-            local_path, remote_path, recursive
-        )
-        connection.disconnect()
+        with profiling.span(
+            "fetch_file", "transfer", host=connection.ip_address, path=remote_path
+        ) as span:
+            connection.connect(timeout=self.scp_timeout)
+            result: Dict = connection.copy_files_from_remote(
+                local_path, remote_path, recursive
+            )
+            connection.disconnect()
+            if profiling.enabled() and not result["error"]:
+                span.set(
+                    bytes=profiling.path_size(
+                        path.join(local_path, path.basename(remote_path))
+                        if path.isdir(local_path)
+                        else local_path
+                    )
+                )
         if result["error"]:
             self.log_to_ctf(
                 f"Failed to fetch remote file '{remote_path}' to '{local_path}': "
@@ -1510,11 +2053,25 @@ class BaseCtfTest:
             # See also: ThreadLocal
             self.thread_local.init(step_idx)
 
-        connection.connect(timeout=self.scp_timeout)
-        result: Dict = connection.copy_files_to_remote(
-            local_path, remote_path, recursive
-        )
-        connection.disconnect()
+        with profiling.span(
+            "push_file", "transfer", host=connection.ip_address, path=remote_path
+        ) as span:
+            if profiling.enabled():
+                span.set(bytes=profiling.path_size(local_path))
+            connection.connect(timeout=self.scp_timeout)
+            result: Dict = connection.copy_files_to_remote(
+                local_path, remote_path, recursive
+            )
+            connection.disconnect()
+        if self.command_cache:
+            # Cached file reads are stale (all devices if none matches)
+            self.command_cache.invalidate(
+                [
+                    node_id
+                    for node_id, device in self.device_info.items()
+                    if device.connection is connection
+                ]
+            )
 
         if result["error"]:
             self.log_to_ctf(
@@ -1580,7 +2137,9 @@ class BaseCtfTest:
                 )
             ] = node_id
 
-        for future in as_completed(futures.keys(), timeout=self.scp_timeout):
+        for future in as_completed(
+            futures.keys(), timeout=self.step_timeout(self.scp_timeout)
+        ):
             result = future.result()
             node_id = futures[future]
             if result:
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+SQLite backed history of test step durations.
+
+The durations of the latest `window` successful runs of every
+(test, step name, test setup) are kept, so that runs can derive timeouts
+from how long steps actually take on a setup instead of static guesses,
+warn about steps running far longer than usual (likely hung), and report
+steps that got slower. Concurrent test processes (e.g. sharded suites) can
+share the same database.
+"""
+
+import logging
+import math
+import sqlite3
+import statistics
+import threading
+import time
+from contextlib import closing, contextmanager
+from os import makedirs, path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STEP_DURATIONS_DB_FILENAME = "step_durations.sqlite3"
+# Durations kept per (test, step, setup)
+DEFAULT_WINDOW = 50
+# Durations needed before deriving timeouts or flagging regressions
+MIN_SAMPLES = 5
+# Percentile of the durations that timeouts are derived from
+TIMEOUT_PERCENTILE = 99
+# Timeouts are this many times the percentile of past durations
+DEFAULT_TIMEOUT_MARGIN = 1.5
+# Adaptive timeouts are never shorter than this (in seconds)
+MIN_ADAPTIVE_TIMEOUT = 10
+# A step regressed if it took this many times its median duration...
+DEFAULT_REGRESSION_RATIO = 1.5
+# ...and at least this many seconds longer
+MIN_REGRESSION_SECONDS = 5.0
+# How long a writer waits for the database lock (in seconds)
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS step_durations (
+    test_name TEXT NOT NULL,
+    step_name TEXT NOT NULL,
+    test_setup_id INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS step_durations_key_idx
+    ON step_durations (test_name, test_setup_id, step_name, recorded_at);
+"""
+
+
+def open_step_durations(
+    db_path: Optional[str], app_data_dir: Optional[str]
+) -> Optional["StepDurationStore"]:
+    """Open the step durations database at `db_path`, or in the serverless
+    app data directory `app_data_dir` if not given. Returns None if neither
+    is set or the database cannot be opened.
+    """
+    if not db_path and app_data_dir:
+        db_path = path.join(app_data_dir, STEP_DURATIONS_DB_FILENAME)
+    if not db_path:
+        return None
+    try:
+        return StepDurationStore(db_path)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Failed to open step durations database {db_path}: {e}")
+        return None
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Linearly interpolated `q`th percentile of non-empty `samples`"""
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def adaptive_timeout(
+    samples: List[float], margin: float, min_samples: int = MIN_SAMPLES
+) -> Optional[int]:
+    """Timeout (in seconds) of a step with the given past durations, or None
+    without enough of them
+    """
+    if len(samples) < min_samples:
+        return None
+    return max(
+        int(math.ceil(percentile(samples, TIMEOUT_PERCENTILE) * margin)),
+        MIN_ADAPTIVE_TIMEOUT,
+    )
+
+
+def find_regressions(
+    history: Dict[str, List[float]],
+    durations: Dict[str, float],
+    ratio: float = DEFAULT_REGRESSION_RATIO,
+    min_samples: int = MIN_SAMPLES,
+) -> List[Dict]:
+    """Return the steps of `durations` that took `ratio` times (and at least
+    MIN_REGRESSION_SECONDS) longer than their median duration in `history`
+    """
+    regressions = []
+    for step_name, seconds in durations.items():
+        samples = history.get(step_name, [])
+        if len(samples) < min_samples:
+            continue
+        median = statistics.median(samples)
+        if seconds > median * ratio and seconds - median >= MIN_REGRESSION_SECONDS:
+            regressions.append(
+                {
+                    "step": step_name,
+                    "median (s)": round(median, 1),
+                    "p99 (s)": round(percentile(samples, TIMEOUT_PERCENTILE), 1),
+                    "this run (s)": round(seconds, 1),
+                    "ratio": round(seconds / median, 2) if median else math.inf,
+                }
+            )
+    return regressions
+
+
+class StepDurationStore:
+    # Database paths whose schema was already created by this process
+    _initialized_paths = set()
+    _initialized_paths_lock = threading.Lock()
+
+    def __init__(
+        self,
+        db_path: str,
+        window: int = DEFAULT_WINDOW,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+    ) -> None:
+        self.db_path = db_path
+        self.window = window
+        self.busy_timeout = busy_timeout
+        self._create_schema()
+
+    def record(
+        self, test_name: str, test_setup_id: int, durations: Dict[str, float]
+    ) -> None:
+        """Add the step durations of a test run, dropping the oldest
+        durations beyond the window
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO step_durations VALUES (?, ?, ?, ?, ?)",
+                [
+                    (test_name, step_name, test_setup_id, seconds, now)
+                    for step_name, seconds in durations.items()
+                ],
+            )
+            for step_name in durations:
+                db.execute(
+                    "DELETE FROM step_durations WHERE rowid IN ("
+                    + "SELECT rowid FROM step_durations WHERE test_name = ? "
+                    + "AND test_setup_id = ? AND step_name = ? "
+                    + "ORDER BY recorded_at DESC LIMIT -1 OFFSET ?)",
+                    (test_name, test_setup_id, step_name, self.window),
+                )
+
+    def load(self, test_name: str, test_setup_id: int) -> Dict[str, List[float]]:
+        """Return the durations of each step of a test on a setup"""
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT step_name, seconds FROM step_durations "
+                + "WHERE test_name = ? AND test_setup_id = ? ORDER BY recorded_at",
+                (test_name, test_setup_id),
+            ).fetchall()
+        history: Dict[str, List[float]] = {}
+        for step_name, seconds in rows:
+            history.setdefault(step_name, []).append(seconds)
+        return history
+
+    def test_duration(self, test_name: str) -> Optional[float]:
+        """Expected duration of a test (sum of the median duration of its
+        steps on any setup), or None if it never ran
+        """
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT step_name, seconds FROM step_durations WHERE test_name = ?",
+                (test_name,),
+            ).fetchall()
+        if not rows:
+            return None
+        steps: Dict[str, List[float]] = {}
+        for step_name, seconds in rows:
+            steps.setdefault(step_name, []).append(seconds)
+        return sum(statistics.median(samples) for samples in steps.values())
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are managed explicitly
+        return sqlite3.connect(
+            self.db_path, timeout=self.busy_timeout, isolation_level=None
+        )
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _create_schema(self) -> None:
+        with self._initialized_paths_lock:
+            if self.db_path in self._initialized_paths:
+                return
+            makedirs(path.dirname(path.abspath(self.db_path)), exist_ok=True)
+            with closing(self._connect()) as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.executescript(_SCHEMA)
+            self._initialized_paths.add(self.db_path)
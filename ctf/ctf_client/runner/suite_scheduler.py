@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Sharded execution of a test suite across a pool of identical test setups.
+
+Each test of the suite runs in its own process, on whichever setup of the
+pool is free. Tests are dispatched longest first, by their expected duration
+from the durations of earlier runs, which keeps the shards balanced (longest
+processing time first scheduling). The scheduler reserves every setup before
+dispatching a test to it and frees it once the test exits, so test processes
+run without acquiring setups themselves.
+
+Tests of a sharded suite run in any order and concurrently, so they must
+not depend on each other.
+"""
+
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import time
+from argparse import Namespace
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .step_durations import StepDurationStore
+
+logger = logging.getLogger(__name__)
+
+# Expected duration of tests without any recorded run (seconds)
+DEFAULT_TEST_DURATION = 600.0
+# Weight of the latest run in a test's expected duration
+DURATION_SMOOTHING = 0.3
+# Interval between attempts to reserve busy setups (seconds)
+SETUP_POLL_INTERVAL = 30.0
+
+# Runs a test in a shard process: (test name, args) -> {"ret", "url", ...}
+RunTestFn = Callable[[str, Namespace], Dict[str, Any]]
+
+
+class DurationHistory:
+    def __init__(
+        self, path: Optional[str], step_durations: Optional[StepDurationStore] = None
+    ) -> None:
+        """Expected test durations, kept in a JSON file across runs as
+        {test name: {"seconds": <smoothed duration>, "runs": <count>}}
+
+        Tests that never ran in a sharded suite are estimated from the
+        history of their step durations, if available.
+        """
+        self.path = path
+        self.step_durations = step_durations
+        self.durations: Dict[str, Dict[str, float]] = {}
+        if path:
+            try:
+                with open(path) as f:
+                    self.durations = json.load(f)
+            except FileNotFoundError:
+                pass
+            except ValueError:
+                logger.warning(f"Ignoring malformed test durations file {path}")
+
+    def expected(self, test_name: str) -> float:
+        """Expected duration of a test, defaulting to the mean of the known
+        durations for tests that never ran
+        """
+        if test_name in self.durations:
+            return self.durations[test_name]["seconds"]
+        if self.step_durations:
+            seconds = self.step_durations.test_duration(test_name)
+            if seconds is not None:
+                return seconds
+        if self.durations:
+            return sum(d["seconds"] for d in self.durations.values()) / len(
+                self.durations
+            )
+        return DEFAULT_TEST_DURATION
+
+    def record(self, test_name: str, seconds: float) -> None:
+        entry = self.durations.get(test_name)
+        if entry:
+            entry["seconds"] += DURATION_SMOOTHING * (seconds - entry["seconds"])
+            entry["runs"] += 1
+        else:
+            self.durations[test_name] = {"seconds": seconds, "runs": 1}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.durations, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def longest_first(test_names: List[str], durations: DurationHistory) -> List[str]:
+    """Order tests by decreasing expected duration (stable for ties)"""
+    return sorted(test_names, key=lambda name: -durations.expected(name))
+
+
+def expected_makespan(
+    test_names: List[str], durations: DurationHistory, num_setups: int
+) -> float:
+    """Expected duration of a suite when dispatching tests longest first
+    to `num_setups` setups
+    """
+    setups = [0.0] * max(num_setups, 1)
+    for name in longest_first(test_names, durations):
+        heapq.heapreplace(setups, setups[0] + durations.expected(name))
+    return max(setups)
+
+
+@dataclass
+class ShardResult:
+    test_name: str
+    test_setup_id: Optional[int] = None
+    ret: Optional[int] = None
+    url: str = ""
+    log_file: str = ""
+    seconds: float = 0.0
+    skipped: bool = False
+    error: str = ""
+
+
+@dataclass
+class _Shard:
+    process: Any
+    conn: Connection
+    result: ShardResult
+    start: float = field(default_factory=time.monotonic)
+
+
+def _shard_main(
+    run_test: RunTestFn, test_name: str, args: Namespace, log_file: str, conn
+) -> None:
+    """Entry point of shard processes: run a test with logs going to its own
+    file, and send the result back to the scheduler
+    """
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(
+        logging.Formatter(
+            "[%(asctime)s] %(levelname)s: %(message)s (%(filename)s:%(lineno)d)"
+        )
+    )
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.DEBUG if args.debug else logging.INFO)
+
+    try:
+        result = run_test(test_name, args)
+    except BaseException as e:
+        logging.exception(f"Test {test_name} raised {type(e).__name__}")
+        result = {"ret": -1, "error": f"{type(e).__name__}: {e}"}
+    conn.send(result)
+    conn.close()
+
+
+class SuiteScheduler:
+    def __init__(
+        self,
+        ctf_api,
+        test_setup_ids: List[int],
+        run_test: RunTestFn,
+        log_dir: str,
+        durations: DurationHistory,
+        team_id: Optional[int] = None,
+        abort_on_failure: bool = False,
+        poll_interval: float = SETUP_POLL_INTERVAL,
+    ) -> None:
+        """Schedule suite tests across the setups `test_setup_ids`.
+
+        `run_test` runs in a forked process per test, with args for the
+        setup the test was dispatched to; logs of each test go to a file in
+        `log_dir`.
+        """
+        self.ctf_api = ctf_api
+        self.test_setup_ids = list(dict.fromkeys(test_setup_ids))
+        self.run_test = run_test
+        self.log_dir = log_dir
+        self.durations = durations
+        self.team_id = team_id
+        self.abort_on_failure = abort_on_failure
+        self.poll_interval = poll_interval
+        # Shard processes are forked: the CLI entry point is not importable
+        # by spawned processes, and the scheduler runs no threads.
+        self.mp_context = multiprocessing.get_context("fork")
+        # Setups reserved by the scheduler
+        self.reserved: List[int] = []
+        self.running: Dict[int, _Shard] = {}
+
+    def _reserve_setup(self, test_setup_id: int) -> bool:
+        try:
+            if not self.ctf_api.check_if_test_setup_is_free(
+                test_setup_id, team_id=self.team_id
+            ):
+                return False
+            if not self.ctf_api.set_test_setup_and_devices_busy(
+                test_setup_id, team_id=self.team_id
+            ):
+                return False
+        except Exception as e:
+            logger.info(f"Test setup {test_setup_id} not reserved: {e}")
+            return False
+        self.reserved.append(test_setup_id)
+        return True
+
+    def _free_setup(self, test_setup_id: int) -> None:
+        try:
+            self.ctf_api.set_test_setup_and_devices_free(
+                test_setup_id, team_id=self.team_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to free test setup {test_setup_id}: {e}")
+        self.reserved.remove(test_setup_id)
+
+    def _start(self, test_name: str, test_setup_id: int, args: Namespace) -> None:
+        shard_args = Namespace(**vars(args))
+        shard_args.test_setup_id = test_setup_id
+        log_file = os.path.join(self.log_dir, f"{test_name}_setup{test_setup_id}.log")
+        recv_conn, send_conn = self.mp_context.Pipe(duplex=False)
+        process = self.mp_context.Process(
+            target=_shard_main,
+            args=(self.run_test, test_name, shard_args, log_file, send_conn),
+            name=f"shard-{test_name}",
+        )
+        process.start()
+        send_conn.close()
+        logger.info(f"Started {test_name} on test setup {test_setup_id}: {log_file}")
+        self.running[test_setup_id] = _Shard(
+            process,
+            recv_conn,
+            ShardResult(test_name, test_setup_id, log_file=log_file),
+        )
+
+    def _finish(self, test_setup_id: int) -> ShardResult:
+        shard = self.running.pop(test_setup_id)
+        result = shard.result
+        try:
+            data = shard.conn.recv() if shard.conn.poll() else {}
+        except EOFError:
+            data = {}
+        shard.conn.close()
+        shard.process.join()
+        result.seconds = time.monotonic() - shard.start
+        result.ret = data.get("ret", shard.process.exitcode or -1)
+        result.url = data.get("url", "")
+        result.error = data.get("error", "")
+        if result.ret == 0:
+            self.durations.record(result.test_name, result.seconds)
+        self._free_setup(test_setup_id)
+        status = "PASS" if result.ret == 0 else "FAIL"
+        logger.info(
+            f"[{status}] {result.test_name} on test setup {test_setup_id} "
+            + f"({result.seconds:.0f}s)"
+        )
+        return result
+
+    def run(self, test_names: List[str], args: Namespace) -> List[ShardResult]:
+        """Run the tests and return their results, in suite order"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        pending = longest_first(test_names, self.durations)
+        logger.info(
+            f"Sharding {len(test_names)} tests across test setups "
+            + f"{self.test_setup_ids}, expected duration "
+            + f"{expected_makespan(test_names, self.durations, len(self.test_setup_ids)):.0f}s"
+        )
+        results: Dict[str, ShardResult] = {}
+        abort = False
+        try:
+            while (pending and not abort) or self.running:
+                if not abort:
+                    for test_setup_id in self.test_setup_ids:
+                        if not pending:
+                            break
+                        if test_setup_id in self.running or not self._reserve_setup(
+                            test_setup_id
+                        ):
+                            continue
+                        self._start(pending.pop(0), test_setup_id, args)
+
+                if not self.running:
+                    logger.info(
+                        f"No test setup available, retrying in {self.poll_interval}s"
+                    )
+                    time.sleep(self.poll_interval)
+                    continue
+
+                # Wait for a shard to exit, or for the next setup poll
+                sentinels = {
+                    shard.process.sentinel: test_setup_id
+                    for test_setup_id, shard in self.running.items()
+                }
+                timeout = self.poll_interval if pending and not abort else None
+                for sentinel in wait(list(sentinels), timeout=timeout):
+                    result = self._finish(sentinels[sentinel])
+                    results[result.test_name] = result
+                    if result.ret != 0 and self.abort_on_failure:
+                        abort = True
+        finally:
+            self.shutdown()
+            self.durations.save()
+
+        for test_name in test_names:
+            if test_name not in results:
+                results[test_name] = ShardResult(test_name, skipped=True)
+        return [results[test_name] for test_name in test_names]
+
+    def shutdown(self) -> None:
+        """Stop running shards and free the reserved setups"""
+        for shard in self.running.values():
+            shard.process.terminate()
+            shard.process.join()
+        self.running.clear()
+        for test_setup_id in list(self.reserved):
+            self._free_setup(test_setup_id)
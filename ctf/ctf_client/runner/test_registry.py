@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Lazy registry of CTF test classes.
+
+Test catalogs register each test by name and module instead of importing
+every test module (and their heavy dependencies) up front:
+
+    TESTS = lazy_tests({"TestFoo": "my.tests.test_foo"})
+    SUITES = {"Nightly": [TESTS["TestFoo"]]}
+
+Registered tests stand in for their classes in CtfRunner: the class is
+imported when the test is run or described. Listing tests only needs their
+TEST_NAME and DESCRIPTION, which are read from the test module sources
+(following base classes across modules) without importing them, and cached
+on disk until those sources change. The class is only imported when these
+attributes are not plain literals.
+"""
+
+import ast
+import atexit
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Class attributes read from sources without importing test modules
+STATIC_ATTRIBUTES = ("TEST_NAME", "DESCRIPTION")
+# Maximum depth of the base classes (and imports) followed in test sources
+MAX_BASE_DEPTH = 16
+# Cache of attributes read from sources, unless overridden by
+# $CTF_TEST_REGISTRY_CACHE
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "ctf", "test_registry.json"
+)
+
+_MISSING = object()
+_UNASSIGNED = object()
+
+
+class _ModuleInfo(NamedTuple):
+    path: str
+    # Map from class name to definition
+    classes: Dict[str, ast.ClassDef]
+    # Map from imported name to its (module, name)
+    imports: Dict[str, tuple]
+
+
+_module_infos: Dict[str, Optional[_ModuleInfo]] = {}
+# Protects: _module_infos
+_module_infos_lock = threading.Lock()
+
+
+def _parse_module(module_name: str, sources: Set[str]) -> Optional[_ModuleInfo]:
+    """Parse the source of a module (without importing it), or None if it
+    has no Python source. The source path is added to `sources`.
+    """
+    with _module_infos_lock:
+        parsed = module_name in _module_infos
+        info = _module_infos.get(module_name)
+    if not parsed:
+        try:
+            spec = importlib.util.find_spec(module_name)
+            if spec and spec.origin and spec.origin.endswith(".py"):
+                with open(spec.origin) as f:
+                    tree = ast.parse(f.read(), spec.origin)
+                package = module_name.rpartition(".")[0]
+                info = _ModuleInfo(spec.origin, {}, {})
+                for node in tree.body:
+                    if isinstance(node, ast.ClassDef):
+                        info.classes[node.name] = node
+                    elif isinstance(node, ast.ImportFrom):
+                        source = importlib.util.resolve_name(
+                            "." * node.level + (node.module or ""), package
+                        )
+                        for alias in node.names:
+                            info.imports[alias.asname or alias.name] = (
+                                source,
+                                alias.name,
+                            )
+        except (ImportError, OSError, SyntaxError, ValueError) as e:
+            logger.debug(f"Cannot parse module {module_name}: {e}")
+        with _module_infos_lock:
+            _module_infos[module_name] = info
+    if info:
+        sources.add(info.path)
+    return info
+
+
+def _find_class(
+    module_name: str, class_name: str, sources: Set[str], depth: int = 0
+) -> Optional[tuple]:
+    """Return the (module, class name) defining a class visible in a module
+    (following `from ... import` statements), or None if not found
+    """
+    info = _parse_module(module_name, sources)
+    if info is None or depth > MAX_BASE_DEPTH:
+        return None
+    if class_name in info.classes:
+        return module_name, class_name
+    if class_name in info.imports:
+        return _find_class(*info.imports[class_name], sources, depth + 1)
+    return None
+
+
+def _static_mro(cls: tuple, sources: Set[str], depth: int = 0) -> Optional[List]:
+    """Return the method resolution order (C3 linearization) of a class from
+    its source, or None if any of its bases cannot be found statically
+    """
+    if depth > MAX_BASE_DEPTH:
+        return None
+    module_name, class_name = cls
+    node = _parse_module(module_name, sources).classes[class_name]
+    base_mros = []
+    for base in node.bases:
+        if not isinstance(base, ast.Name):
+            return None
+        if base.id == "object":
+            continue
+        base_cls = _find_class(module_name, base.id, sources)
+        base_mro = base_cls and _static_mro(base_cls, sources, depth + 1)
+        if not base_mro:
+            return None
+        base_mros.append(base_mro)
+
+    mro = [cls]
+    sequences = base_mros + [[base_mro[0] for base_mro in base_mros]]
+    while any(sequences):
+        for sequence in sequences:
+            if not sequence:
+                continue
+            head = sequence[0]
+            if not any(head in s[1:] for s in sequences):
+                break
+        else:
+            return None  # inconsistent hierarchy, left to Python to report
+        mro.append(head)
+        sequences = [s[1:] if s and s[0] == head else s for s in sequences]
+    return mro
+
+
+def _literal(node: ast.AST) -> Any:
+    """Evaluate a literal expression, including concatenated strings"""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _literal(node.left) + _literal(node.right)
+    return ast.literal_eval(node)
+
+
+def _class_body_value(cls: tuple, attr: str, sources: Set[str]) -> Any:
+    """Return the literal value assigned to an attribute in a class body,
+    _MISSING if it is not a literal, or _UNASSIGNED
+    """
+    module_name, class_name = cls
+    node = _parse_module(module_name, sources).classes[class_name]
+    for statement in node.body:
+        if isinstance(statement, ast.Assign):
+            targets = statement.targets
+        elif isinstance(statement, ast.AnnAssign) and statement.value:
+            targets = [statement.target]
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == attr for t in targets):
+            try:
+                return _literal(statement.value)
+            except (TypeError, ValueError):
+                return _MISSING
+    return _UNASSIGNED
+
+
+def static_class_attribute(
+    module_name: str, class_name: str, attr: str, sources: Optional[Set] = None
+) -> Any:
+    """Return the literal value of a class attribute from the sources of the
+    class and its base classes (without importing them), or _MISSING.
+    The paths of the sources read are added to `sources`.
+    """
+    sources = set() if sources is None else sources
+    cls = _find_class(module_name, class_name, sources)
+    if cls is None:
+        return _MISSING
+    # Test classes usually set their own attributes, sparing the parsing of
+    # their base classes' modules
+    value = _class_body_value(cls, attr, sources)
+    if value is not _UNASSIGNED:
+        return value
+    for base in _static_mro(cls, sources) or []:
+        value = _class_body_value(base, attr, sources)
+        if value is not _UNASSIGNED:
+            return value
+    return _MISSING
+
+
+def _source_stamp(path: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class StaticAttributeCache:
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH) -> None:
+        """Cache of test class attributes read from sources, stored as JSON
+        in `path` (not stored if None). Entries are valid while the sources
+        they were read from are unchanged.
+        """
+        self.path = path
+        # Map from "module:class" to sources and attributes
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._dirty = False
+        # Protects: _entries, _dirty
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path:
+                try:
+                    with open(self.path) as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.debug(f"Ignoring test registry cache {self.path}: {e}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached attributes of a test class, or None"""
+        with self._lock:
+            entry = self._load().get(key)
+        if entry and all(
+            _source_stamp(path) == stamp for path, stamp in entry["sources"].items()
+        ):
+            return entry["attributes"]
+        return None
+
+    def put(self, key: str, attributes: Dict[str, Any], sources: Set[str]) -> None:
+        """Cache the attributes of a test class read from `sources`"""
+        entry = {
+            "sources": {path: _source_stamp(path) for path in sorted(sources)},
+            "attributes": attributes,
+        }
+        with self._lock:
+            self._load()[key] = entry
+            if not self._dirty and self.path:
+                atexit.register(self.save)
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache to disk, if modified"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, "w") as f:
+                    json.dump(self._entries, f, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                logger.debug(f"Failed to write test registry cache: {e}")
+
+
+_cache: Optional[StaticAttributeCache] = None
+_cache_lock = threading.Lock()
+
+
+def set_static_attribute_cache(cache: Optional[StaticAttributeCache]) -> None:
+    """Replace the process-wide attribute cache (None to reset it)"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def get_static_attribute_cache() -> StaticAttributeCache:
+    """Return the process-wide attribute cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StaticAttributeCache(
+                os.environ.get("CTF_TEST_REGISTRY_CACHE", DEFAULT_CACHE_PATH)
+            )
+        return _cache
+
+
+class LazyTest:
+    def __init__(self, name: str, module_name: str) -> None:
+        """Test class `name` of module `module_name`, imported on first use"""
+        self.__name__ = name
+        self.module_name = module_name
+        self._class: Optional[type] = None
+        self._static: Optional[Dict[str, Any]] = None
+
+    def resolve(self) -> type:
+        """Import and return the test class"""
+        if self._class is None:
+            module = importlib.import_module(self.module_name)
+            self._class = getattr(module, self.__name__)
+        return self._class
+
+    def _static_attributes(self) -> Dict[str, Any]:
+        """Return the STATIC_ATTRIBUTES read from the test sources (omitting
+        the ones that are not literals)
+        """
+        if self._static is None:
+            cache = get_static_attribute_cache()
+            key = f"{self.module_name}:{self.__name__}"
+            self._static = cache.get(key)
+            if self._static is None:
+                sources = set()
+                self._static = {}
+                for attr in STATIC_ATTRIBUTES:
+                    value = static_class_attribute(
+                        self.module_name, self.__name__, attr, sources
+                    )
+                    if value is not _MISSING:
+                        self._static[attr] = value
+                if all(isinstance(v, str) for v in self._static.values()):
+                    cache.put(key, self._static, sources)
+        return self._static
+
+    def _static_attribute(self, attr: str) -> Any:
+        if self._class is None and self.module_name not in sys.modules:
+            static = self._static_attributes()
+            if attr in static:
+                return static[attr]
+            logger.debug(f"Importing {self.__name__} to get its {attr}")
+        return getattr(self.resolve(), attr)
+
+    @property
+    def TEST_NAME(self) -> str:
+        return self._static_attribute("TEST_NAME")
+
+    @property
+    def DESCRIPTION(self) -> str:
+        return self._static_attribute("DESCRIPTION")
+
+    def test_params(self) -> Dict[str, Dict]:
+        return self.resolve().test_params()
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr: str) -> Any:
+        # Any other class attribute
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self) -> str:
+        return f"LazyTest({self.module_name}.{self.__name__})"
+
+
+def lazy_tests(tests: Dict[str, str]) -> Dict[str, LazyTest]:
+    """Return the map from test name to LazyTest for a map from test class
+    name to the module defining it
+    """
+    return {name: LazyTest(name, module_name) for name, module_name in tests.items()}
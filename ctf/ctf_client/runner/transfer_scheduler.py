@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Scheduler for log file transfers (device -> local -> CTF).
+
+Transfers are grouped in per-node batches. Each batch is a list of remote
+paths; every remote path is fetched from the device and each resulting local
+file is uploaded to CTF. The scheduler keeps separate limits for:
+
+  - concurrent device reads (fetches) across all nodes,
+  - concurrent uploads to CTF,
+  - concurrent sessions per node, so a single device is never overloaded.
+
+Fetches run in priority order (lower value first), so failure artifacts can
+jump ahead of routine log collection. Uploads run in their own pool, which
+lets the next fetch start while the previous file is still being uploaded.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Transfers of failed test steps are fetched before anything else
+PRIORITY_FAILURE = 0
+PRIORITY_DEFAULT = 10
+
+DEFAULT_MAX_UPLOADS = 4
+DEFAULT_MAX_SESSIONS_PER_NODE = 1
+
+
+class NodeTransferProgress:
+    """Progress and throughput of a node's transfer batch."""
+
+    def __init__(self, node_id: Any, total: int) -> None:
+        self.node_id = node_id
+        # Number of remote paths in the batch
+        self.total = total
+        # Number of remote paths fetched and uploaded (or failed)
+        self.done = 0
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.start_time = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def throughput(self) -> float:
+        """Bytes transferred per second"""
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the batch completes, None until one path is done"""
+        if not self.done:
+            return None
+        return self.elapsed / self.done * (self.total - self.done)
+
+    def __str__(self) -> str:
+        eta = f"{self.eta:.1f}s" if self.eta is not None else "unknown"
+        return (
+            f"node {self.node_id}: {self.done}/{self.total} paths, {self.files} files, "
+            + f"{self.bytes} bytes at {self.throughput / 1024:.1f} KiB/s, ETA {eta}"
+        )
+
+
+class _Batch:
+    def __init__(
+        self,
+        node_id: Any,
+        remote_paths: List[str],
+        fetch_fn: Callable[[str], Optional[List[str]]],
+        upload_fn: Callable[[str, str], bool],
+        priority: int,
+        abort_on_failure: bool,
+        on_done: Optional[Callable[[], None]],
+    ) -> None:
+        self.node_id = node_id
+        self.fetch_fn = fetch_fn
+        self.upload_fn = upload_fn
+        self.priority = priority
+        self.abort_on_failure = abort_on_failure
+        self.on_done = on_done
+        self.progress = NodeTransferProgress(node_id, len(remote_paths))
+        self.future: Future = Future()
+        self.success = True
+        self.lock = threading.Lock()
+        # Pending uploads per remote path
+        self.pending_uploads: Dict[str, int] = {}
+        # Remote paths with at least one failed upload
+        self.failed_paths: Set[str] = set()
+
+
+class TransferScheduler:
+    def __init__(
+        self,
+        max_fetches: int,
+        max_uploads: int = DEFAULT_MAX_UPLOADS,
+        max_sessions_per_node: int = DEFAULT_MAX_SESSIONS_PER_NODE,
+        progress_fn: Optional[Callable[[NodeTransferProgress], None]] = None,
+    ) -> None:
+        self.max_fetches = max(int(max_fetches), 1)
+        self.max_uploads = max(int(max_uploads), 1)
+        self.max_sessions_per_node = max(int(max_sessions_per_node), 1)
+        self.progress_fn = progress_fn
+        self._fetch_pool = ThreadPoolExecutor(
+            thread_name_prefix="LogFetchWorkers", max_workers=self.max_fetches
+        )
+        self._upload_pool = ThreadPoolExecutor(
+            thread_name_prefix="LogUploadWorkers", max_workers=self.max_uploads
+        )
+        # Heap of (priority, sequence, batch, remote_path)
+        self._queue: List = []
+        self._sequence = itertools.count()
+        # Number of running fetches per node
+        self._sessions: Dict[Any, int] = {}
+        self._cond = threading.Condition()
+
+    def submit(
+        self,
+        node_id: Any,
+        remote_paths: List[str],
+        fetch_fn: Callable[[str], Optional[List[str]]],
+        upload_fn: Callable[[str, str], bool],
+        priority: int = PRIORITY_DEFAULT,
+        abort_on_failure: bool = False,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> Future:
+        """Schedule a batch of transfers for a node.
+
+        :param fetch_fn: fetch_fn(remote_path) fetches the remote path and
+            returns the local files to upload, or None on failure.
+        :param upload_fn: upload_fn(remote_path, local_file) uploads a local
+            file and returns True upon success.
+        :param priority: lower values are fetched first.
+        :param abort_on_failure: skip the remaining paths of the batch after a
+            failed fetch or upload.
+        :param on_done: called once every path of the batch is processed.
+        :return: future resolving to True if every transfer succeeded
+        """
+        batch = _Batch(
+            node_id,
+            remote_paths,
+            fetch_fn,
+            upload_fn,
+            priority,
+            abort_on_failure,
+            on_done,
+        )
+        if not remote_paths:
+            self._finish_batch(batch)
+            return batch.future
+
+        with self._cond:
+            for remote_path in remote_paths:
+                heapq.heappush(
+                    self._queue,
+                    (priority, next(self._sequence), batch, remote_path),
+                )
+            # Fetch workers waiting for busy nodes may run the new paths
+            self._cond.notify_all()
+        # One fetch task per queued path; each task runs whichever path is
+        # the most urgent when a fetch worker becomes available.
+        for _ in remote_paths:
+            self._fetch_pool.submit(self._run_next_fetch)
+        return batch.future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._fetch_pool.shutdown(wait=wait)
+        self._upload_pool.shutdown(wait=wait)
+
+    def _pop_next(self):
+        """Pop the most urgent queued path whose node has a free session.
+        Must be called with self._cond held.
+        """
+        skipped = []
+        entry = None
+        while self._queue:
+            candidate = heapq.heappop(self._queue)
+            node_id = candidate[2].node_id
+            if self._sessions.get(node_id, 0) < self.max_sessions_per_node:
+                entry = candidate
+                break
+            skipped.append(candidate)
+        for candidate in skipped:
+            heapq.heappush(self._queue, candidate)
+        return entry
+
+    def _run_next_fetch(self) -> None:
+        with self._cond:
+            entry = self._pop_next()
+            while entry is None:
+                # All queued paths belong to nodes with busy sessions
+                self._cond.wait()
+                entry = self._pop_next()
+            _priority, _seq, batch, remote_path = entry
+            self._sessions[batch.node_id] = self._sessions.get(batch.node_id, 0) + 1
+
+        try:
+            self._fetch(batch, remote_path)
+        finally:
+            with self._cond:
+                self._sessions[batch.node_id] -= 1
+                self._cond.notify_all()
+
+    def _fetch(self, batch: _Batch, remote_path: str) -> None:
+        if batch.abort_on_failure and not batch.success:
+            self._path_done(batch, remote_path, success=False)
+            return
+
+        try:
+            local_files = batch.fetch_fn(remote_path)
+        except Exception as e:
+            logger.exception(f"Failed to fetch {remote_path} from {batch.node_id}: {e}")
+            local_files = None
+
+        if local_files is None:
+            self._path_done(batch, remote_path, success=False)
+            return
+        if not local_files:
+            self._path_done(batch, remote_path, success=True)
+            return
+
+        with batch.lock:
+            batch.pending_uploads[remote_path] = len(local_files)
+        for local_file in local_files:
+            self._upload_pool.submit(self._upload, batch, remote_path, local_file)
+
+    def _upload(self, batch: _Batch, remote_path: str, local_file: str) -> None:
+        size = os.path.getsize(local_file) if os.path.isfile(local_file) else 0
+        try:
+            success = bool(batch.upload_fn(remote_path, local_file))
+        except Exception as e:
+            logger.exception(f"Failed to upload {local_file} from {batch.node_id}: {e}")
+            success = False
+
+        with batch.lock:
+            batch.progress.files += 1
+            if success:
+                batch.progress.bytes += size
+            else:
+                batch.failed_paths.add(remote_path)
+            batch.pending_uploads[remote_path] -= 1
+            if batch.pending_uploads[remote_path]:
+                return
+            del batch.pending_uploads[remote_path]
+            path_success = remote_path not in batch.failed_paths
+        self._path_done(batch, remote_path, success=path_success)
+
+    def _path_done(self, batch: _Batch, remote_path: str, success: bool) -> None:
+        with batch.lock:
+            batch.progress.done += 1
+            if not success:
+                batch.success = False
+                batch.progress.failed += 1
+            finished = batch.progress.done == batch.progress.total
+
+        if self.progress_fn:
+            try:
+                self.progress_fn(batch.progress)
+            except Exception as e:
+                logger.debug(f"Transfer progress callback failed: {e}")
+        if finished:
+            self._finish_batch(batch)
+
+    def _finish_batch(self, batch: _Batch) -> None:
+        try:
+            if batch.on_done:
+                batch.on_done()
+        except Exception as e:
+            logger.exception(f"Transfer cleanup failed for {batch.node_id}: {e}")
+        batch.future.set_result(batch.success)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Building blocks for readiness waits.
+
+Rather than re-running a command fan-out on a fixed interval, waits use:
+
+  - remote watchers: one long-running command per node which re-checks a
+    condition locally on the device and exits as soon as it holds, so the
+    runner learns about the change without extra SSH round trips
+    (see remote_wait_cmd()),
+  - adaptive backoff for the polls that have to run from the runner,
+  - shared polls, so concurrent waiters on the same condition reuse a single
+    in-flight poll instead of each issuing their own.
+"""
+
+import math
+import socket
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional
+
+# Interval at which remote watchers re-check their condition on the device
+DEFAULT_WATCH_INTERVAL = 0.5
+
+# Extra time given to a remote watcher to report back, on top of its timeout
+WATCH_TIMEOUT_MARGIN = 30
+
+
+class Backoff:
+    """Poll intervals growing geometrically from `initial` up to `maximum`.
+
+    The first polls come quickly, so waits return soon after a condition that
+    is almost met; later polls are spaced out to `maximum` to spare devices
+    that are slow to come up.
+    """
+
+    def __init__(
+        self, maximum: float, initial: Optional[float] = None, factor: float = 2.0
+    ) -> None:
+        self.maximum = max(float(maximum), 0.0)
+        self.initial = min(
+            self.maximum / 4 if initial is None else float(initial), self.maximum
+        )
+        self.factor = factor
+        self._next = self.initial
+
+    def next(self) -> float:
+        interval = self._next
+        self._next = min(self._next * self.factor, self.maximum)
+        return interval
+
+    def reset(self) -> None:
+        self._next = self.initial
+
+
+class SharedPoll:
+    """Share in-flight polls among concurrent waiters.
+
+    Waiters polling with the same key while a poll is running get the future
+    of that poll instead of starting a new one. Polls with unhashable keys
+    are never shared.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+
+    def poll(self, key: Hashable, submit_fn: Callable[[], Future]) -> Future:
+        try:
+            hash(key)
+        except TypeError:
+            return submit_fn()
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = submit_fn()
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+def remote_wait_cmd(
+    check_cmd: str, timeout: float, interval: float = DEFAULT_WATCH_INTERVAL
+) -> str:
+    """Shell command re-running `check_cmd` on the device every `interval`
+    seconds until it succeeds or `timeout` seconds have passed.
+
+    Prints the output of the last check and exits with its status.
+    """
+    return (
+        f"end=$(($(date +%s) + {int(math.ceil(timeout))})); "
+        + f"while true; do out=$({{ {check_cmd}; }} 2>&1); rc=$?; "
+        + "{ [ $rc -eq 0 ] || [ $(date +%s) -ge $end ]; } && break; "
+        + f"sleep {interval}; done; "
+        + 'echo "$out"; exit $rc'
+    )
+
+
+def tcp_port_open(host: str, port: int, timeout: float) -> bool:
+    """Is `host` accepting TCP connections on `port`?
+
+    Much cheaper than a full SSH login when waiting for a device to boot.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
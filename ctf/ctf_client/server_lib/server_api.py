@@ -269,7 +269,9 @@ class ServerApi(CtfApis):
         test_exe_id,
         test_action_result_id,
         data_processing_config_key: str = None,
+        move_source: bool = False,
     ):
+        # move_source is unused, the file is uploaded to the CTF server
         return _save_action_log_file(
             source_file_path=source_file_path,
             constructive_path=constructive_path,
@@ -285,6 +287,7 @@ class ServerApi(CtfApis):
         test_exe_id,
         log_type: int = None,
         data_processing_config_key: str = None,
+        move_source: bool = False,
     ):
         # using ctf/api_server/core/file_server/api_manager.py as an example
         return _save_log_file(
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Content addressed, deduplicated storage for serverless test artifacts.
+
+Every artifact is stored once as a read-only blob named after its sha256
+digest under `<blob_dir>/<digest[:2]>/<digest>`. The file in the test result
+tree is a hard link to that blob, so identical logs collected by several
+steps, nodes or test runs cost disk space (and a copy) only once.
+
+Sources that the caller no longer needs (e.g. files fetched into a temporary
+directory) can be moved into the blob store instead of being copied. When the
+result tree and the blob store are on different filesystems, or the
+filesystem does not support hard links, files are copied as before.
+
+Each test run gets a manifest (`artifact_manifest.jsonl`) in its result dir
+listing the stored artifacts and their digests.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_BLOBS_DIRNAME = ".artifact_blobs"
+ARTIFACT_MANIFEST_FILENAME = "artifact_manifest.jsonl"
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """Return the hex sha256 digest of the given file"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, blob_dir: str) -> None:
+        self.blob_dir = blob_dir
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {
+                "files": 0,
+                "bytes": 0,
+                "deduplicated_files": 0,
+                "deduplicated_bytes": 0,
+                "moved_bytes": 0,
+                "copied_bytes": 0,
+                "copy_seconds": 0.0,
+                "linked_files": 0,
+            }
+
+    def store(
+        self,
+        source_file_path: str,
+        destination_path: str,
+        move_source: bool = False,
+        manifest_dir: Optional[str] = None,
+    ) -> Dict:
+        """Store `source_file_path` at `destination_path` (a file path).
+
+        :param move_source: the caller no longer needs the source file, it
+            may be moved into the blob store instead of being copied.
+        :param manifest_dir: directory of the manifest to record the artifact in.
+        :return: dict with the artifact digest, size and whether it was a duplicate
+        """
+        source_file_path = str(source_file_path)
+        size = os.path.getsize(source_file_path)
+        digest = file_sha256(source_file_path)
+        blob_path = os.path.join(self.blob_dir, digest[:2], digest)
+
+        deduplicated = os.path.exists(blob_path)
+        if not deduplicated:
+            self._add_blob(source_file_path, blob_path, move_source)
+        elif move_source:
+            os.unlink(source_file_path)
+
+        linked = self._materialize(blob_path, destination_path)
+
+        with self._lock:
+            self._stats["files"] += 1
+            self._stats["bytes"] += size
+            if deduplicated:
+                self._stats["deduplicated_files"] += 1
+                self._stats["deduplicated_bytes"] += size
+            if linked:
+                self._stats["linked_files"] += 1
+
+        artifact = {
+            "path": destination_path,
+            "sha256": digest,
+            "size": size,
+            "deduplicated": deduplicated,
+            "linked": linked,
+        }
+        if manifest_dir:
+            self._append_to_manifest(manifest_dir, artifact)
+        return artifact
+
+    def get_stats(self) -> Dict:
+        """Return the storage counters and the estimated savings.
+
+        `copy_seconds_saved` extrapolates the copy throughput measured for
+        the bytes that had to be copied to the bytes that were not.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        saved_bytes = max(stats["bytes"] - stats["copied_bytes"], 0)
+        stats["disk_bytes_saved"] = stats["deduplicated_bytes"]
+        stats["copy_bytes_saved"] = saved_bytes
+        stats["copy_seconds_saved"] = (
+            saved_bytes * stats["copy_seconds"] / stats["copied_bytes"]
+            if stats["copied_bytes"]
+            else 0.0
+        )
+        return stats
+
+    def prune(self) -> int:
+        """Delete blobs that are no longer linked from any result dir.
+        Returns the number of deleted blobs.
+        """
+        pruned = 0
+        if not os.path.isdir(self.blob_dir):
+            return pruned
+        for dirpath, _dirnames, filenames in os.walk(self.blob_dir):
+            for filename in filenames:
+                blob_path = os.path.join(dirpath, filename)
+                if os.stat(blob_path).st_nlink == 1:
+                    os.unlink(blob_path)
+                    pruned += 1
+        logger.debug(f"Pruned {pruned} unreferenced artifact blobs")
+        return pruned
+
+    def _add_blob(self, source_file_path: str, blob_path: str, move_source: bool):
+        blob_parent = os.path.dirname(blob_path)
+        os.makedirs(blob_parent, exist_ok=True)
+        size = os.path.getsize(source_file_path)
+
+        if move_source:
+            try:
+                os.rename(source_file_path, blob_path)
+                os.chmod(blob_path, 0o444)
+                with self._lock:
+                    self._stats["moved_bytes"] += size
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+
+        # Copy next to the blob and rename it in place, so a concurrent
+        # reader never sees a partially written blob.
+        start = time.monotonic()
+        fd, tmp_path = tempfile.mkstemp(dir=blob_parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_file_path, tmp_path)
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._stats["copied_bytes"] += size
+            self._stats["copy_seconds"] += time.monotonic() - start
+        if move_source:
+            os.unlink(source_file_path)
+
+    def _materialize(self, blob_path: str, destination_path: str) -> bool:
+        """Hard link the blob at destination_path, falling back to a copy.
+        Returns True if the blob was linked.
+        """
+        if os.path.lexists(destination_path):
+            os.unlink(destination_path)
+        try:
+            os.link(blob_path, destination_path)
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+        start = time.monotonic()
+        shutil.copyfile(blob_path, destination_path)
+        with self._lock:
+            self._stats["copied_bytes"] += os.path.getsize(destination_path)
+            self._stats["copy_seconds"] += time.monotonic() - start
+        return False
+
+    def _append_to_manifest(self, manifest_dir: str, artifact: Dict) -> None:
+        entry = dict(artifact)
+        entry["path"] = os.path.relpath(artifact["path"], manifest_dir)
+        with self._lock:
+            with open(os.path.join(manifest_dir, ARTIFACT_MANIFEST_FILENAME), "a") as f:
+                f.write(json.dumps(entry) + "\n")
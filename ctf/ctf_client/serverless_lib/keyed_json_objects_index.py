@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+SQLite backed index of Test Action Result Keyed Json Objects.
+
+Every save creates a new version row for (team_id, key). Version numbers are
+allocated inside a write transaction, so concurrent writers (threads or
+processes sharing the same ctf_client_app_data directory) never produce
+duplicate versions. The database runs in WAL mode so readers are never
+blocked by a writer.
+
+Payloads are stored as compact JSON, zlib compressed once they grow past
+`compress_threshold` bytes. Test run and test action IDs are matched as
+strings, but returned with the type they were saved with.
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing, contextmanager
+from typing import Any, Dict, List, Optional, Union
+
+from ctf.ctf_client.serverless_lib.ctf_file_system import exists, join, mkdir
+
+logger = logging.getLogger(__name__)
+
+KEYED_JSON_OBJECTS_INDEX_DB_FILENAME = "index.sqlite3"
+# Payloads larger than this (in bytes) are zlib compressed
+DEFAULT_COMPRESS_THRESHOLD = 1024
+# How long a writer waits for the database lock (in seconds)
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+ENCODING_JSON = "json"
+ENCODING_JSON_ZLIB = "json+zlib"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyed_json_objects (
+    team_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    test_run_execution_id TEXT NOT NULL,
+    test_action_result_id TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    ids_json TEXT,
+    PRIMARY KEY (team_id, key, version)
+);
+CREATE INDEX IF NOT EXISTS keyed_json_objects_test_run_execution_idx
+    ON keyed_json_objects (test_run_execution_id, test_action_result_id);
+"""
+
+_COLUMNS = (
+    "team_id, key, version, test_run_execution_id, test_action_result_id, "
+    "encoding, payload, ids_json"
+)
+_INSERT = (
+    "INTO keyed_json_objects (team_id, key, version, test_run_execution_id, "
+    "test_action_result_id, encoding, size, payload, created_at, ids_json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _ids_json(test_exe_id: Union[str, int], test_action_result_id: Union[str, int]):
+    """JSON of the IDs of a json object, preserving their type (int or str)"""
+    return json.dumps([test_exe_id, test_action_result_id])
+
+
+class KeyedJsonObjectsIndex:
+    # (path, inode) of the databases whose schema was already created by this
+    # process (a deleted and recreated database gets a new inode)
+    _initialized_paths = set()
+    _initialized_paths_lock = threading.Lock()
+
+    def __init__(
+        self,
+        index_dirname: str,
+        compress: bool = True,
+        compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+    ) -> None:
+        self.index_dirname = index_dirname
+        self.db_path = join(index_dirname, KEYED_JSON_OBJECTS_INDEX_DB_FILENAME)
+        self.compress = compress
+        self.compress_threshold = compress_threshold
+        self.busy_timeout = busy_timeout
+        self._create_schema()
+
+    def save(
+        self,
+        team_id: Union[str, int],
+        test_exe_id: Union[str, int],
+        test_action_result_id: Union[str, int],
+        key: str,
+        json_object: Dict[str, Optional[Any]],
+    ) -> Dict:
+        """Store a new version of `key` and return the indexed json object"""
+        encoding, payload = self._encode(json_object)
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT MAX(version) FROM keyed_json_objects WHERE team_id = ? AND key = ?",
+                (str(team_id), key),
+            ).fetchone()
+            version = (row[0] or 0) + 1
+            db.execute(
+                f"INSERT {_INSERT}",
+                (
+                    str(team_id),
+                    key,
+                    version,
+                    str(test_exe_id),
+                    str(test_action_result_id),
+                    encoding,
+                    len(payload),
+                    payload,
+                    time.time(),
+                    _ids_json(test_exe_id, test_action_result_id),
+                ),
+            )
+        logger.debug(
+            f"Indexed Test Action Result Keyed Json Object {key} version {version} "
+            + f"({encoding}, {len(payload)} bytes)"
+        )
+        return {
+            "test_run_execution_id": test_exe_id,
+            "test_action_result_id": test_action_result_id,
+            "json_object": json_object,
+            "key": key,
+            "version": version,
+        }
+
+    def get(self, team_id: Union[str, int], key: str) -> Optional[Dict]:
+        """Return the latest version of `key`, or None if it is not indexed"""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                f"SELECT {_COLUMNS} FROM keyed_json_objects "
+                + "WHERE team_id = ? AND key = ? ORDER BY version DESC LIMIT 1",
+                (str(team_id), key),
+            ).fetchone()
+        return self._row_to_json_object(row) if row else None
+
+    def get_version(self, team_id: Union[str, int], key: str) -> int:
+        """Return the latest version number of `key`, 0 if it is not indexed"""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT MAX(version) FROM keyed_json_objects WHERE team_id = ? AND key = ?",
+                (str(team_id), key),
+            ).fetchone()
+        return row[0] or 0
+
+    def delete(self, team_id: Union[str, int], key: str) -> int:
+        """Delete all versions of `key` and return the number of deleted rows"""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM keyed_json_objects WHERE team_id = ? AND key = ?",
+                (str(team_id), key),
+            )
+            return cursor.rowcount
+
+    def import_json_object(self, team_id: Union[str, int], indexed_json_object: Dict):
+        """Insert an already versioned json object, e.g. from a legacy index file"""
+        encoding, payload = self._encode(indexed_json_object["json_object"])
+        with self._transaction() as db:
+            db.execute(
+                f"INSERT OR IGNORE {_INSERT}",
+                (
+                    str(team_id),
+                    indexed_json_object["key"],
+                    int(indexed_json_object["version"]),
+                    str(indexed_json_object["test_run_execution_id"]),
+                    str(indexed_json_object["test_action_result_id"]),
+                    encoding,
+                    len(payload),
+                    payload,
+                    time.time(),
+                    _ids_json(
+                        indexed_json_object["test_run_execution_id"],
+                        indexed_json_object["test_action_result_id"],
+                    ),
+                ),
+            )
+
+    def list_for_test_run_execution(
+        self,
+        test_exe_id: Union[str, int],
+        test_action_result_id: Optional[Union[str, int]] = None,
+        page: int = 1,
+        offset: int = 10,
+    ) -> Dict:
+        """List the json objects saved by a test run (and optionally one of its
+        test actions), paginated like the CTF server list APIs.
+        """
+        page = max(int(page), 1)
+        offset = max(int(offset), 1)
+        where = "WHERE test_run_execution_id = ?"
+        params: List[Any] = [str(test_exe_id)]
+        if test_action_result_id is not None:
+            where += " AND test_action_result_id = ?"
+            params.append(str(test_action_result_id))
+
+        with closing(self._connect()) as db:
+            total = db.execute(
+                f"SELECT COUNT(*) FROM keyed_json_objects {where}", params
+            ).fetchone()[0]
+            rows = db.execute(
+                f"SELECT {_COLUMNS} FROM keyed_json_objects {where} "
+                + "ORDER BY created_at, key, version LIMIT ? OFFSET ?",
+                params + [offset, (page - 1) * offset],
+            ).fetchall()
+
+        return {
+            "json_objects": [self._row_to_json_object(row) for row in rows],
+            "total_no_of_pages": max(math.ceil(total / offset), 1),
+            "total_no_of_records": total,
+            "current_page": page,
+            "current_page_offset": offset,
+        }
+
+    def _encode(self, json_object: Dict[str, Optional[Any]]):
+        payload = json.dumps(json_object, separators=(",", ":")).encode("utf-8")
+        if self.compress and len(payload) > self.compress_threshold:
+            return ENCODING_JSON_ZLIB, zlib.compress(payload)
+        return ENCODING_JSON, payload
+
+    def _decode(self, encoding: str, payload: bytes) -> Dict[str, Optional[Any]]:
+        if encoding == ENCODING_JSON_ZLIB:
+            payload = zlib.decompress(payload)
+        elif encoding != ENCODING_JSON:
+            raise ValueError(f"Unknown keyed json object encoding {encoding}")
+        return json.loads(payload)
+
+    def _row_to_json_object(self, row) -> Dict:
+        (
+            _team_id,
+            key,
+            version,
+            test_exe_id,
+            test_action_result_id,
+            encoding,
+            payload,
+            ids_json,
+        ) = row
+        if ids_json:
+            test_exe_id, test_action_result_id = json.loads(ids_json)
+        return {
+            "test_run_execution_id": test_exe_id,
+            "test_action_result_id": test_action_result_id,
+            "json_object": self._decode(encoding, payload),
+            "key": key,
+            "version": version,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        # The database may have been deleted since the schema was created
+        self._create_schema()
+        return self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are managed explicitly
+        return sqlite3.connect(
+            self.db_path, timeout=self.busy_timeout, isolation_level=None
+        )
+
+    def _inode(self) -> Optional[int]:
+        try:
+            return os.stat(self.db_path).st_ino
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as db:
+            # Take the write lock up front so that read-modify-write sequences
+            # (e.g. version increments) are atomic across writers.
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _create_schema(self) -> None:
+        with self._initialized_paths_lock:
+            if (self.db_path, self._inode()) in self._initialized_paths:
+                return
+            if not exists(self.index_dirname):
+                mkdir(self.index_dirname, exist_ok=True)
+                logger.debug(
+                    f"Created Test Action Result Keyed Json Object index directory at {self.index_dirname}"
+                )
+            with closing(self._open()) as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.executescript(_SCHEMA)
+                columns = [
+                    row[1]
+                    for row in db.execute("PRAGMA table_info(keyed_json_objects)")
+                ]
+                if "ids_json" not in columns:
+                    # Indexes created before IDs kept their type
+                    db.execute(
+                        "ALTER TABLE keyed_json_objects ADD COLUMN ids_json TEXT"
+                    )
+            self._initialized_paths.add((self.db_path, self._inode()))
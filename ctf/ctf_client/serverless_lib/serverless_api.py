@@ -8,16 +8,22 @@ import glob
 import json
 import logging
 import re
-import shutil
 from os import makedirs, path
 from typing import Any, Dict, List, Optional, Union
 
+import humanize
+
 from ctf.common.logging_utils import log_call
 from ctf.ctf_client.lib.connections_helper import get_devices_and_connections
 from ctf.ctf_client.lib.constants import TestActionStatusEnum
 
 from ctf.ctf_client.lib.ctf_apis import CtfApis
 
+from ctf.ctf_client.serverless_lib.artifact_store import (
+    ARTIFACT_BLOBS_DIRNAME,
+    ArtifactStore,
+)
+
 from ctf.ctf_client.serverless_lib.exceptions import (
     ResourceNotFoundException,
     ServerlessConfigException,
@@ -53,6 +59,8 @@ class ServerlessApi(CtfApis):
         self._test_result_dir_path: str = None
         # Absolute path to store files and data unique to ctf.
         self._ctf_client_app_data = None
+        # Content addressed store backing all saved log files, see artifact_store
+        self._artifact_store: Optional[ArtifactStore] = None
 
     def set_serverless_config(self):
         """This will setup serverless variables using ~/.ctf_serverless_config file
@@ -184,6 +192,7 @@ class ServerlessApi(CtfApis):
                 self._test_results_storage_path, test_result_dir
             )
             makedirs(self._test_result_dir_path)
+            self.artifact_store.reset_stats()
             logger.info(f"Created test result dir at {self._test_result_dir_path}")
             result: Dict = {
                 "data": {
@@ -280,51 +289,59 @@ class ServerlessApi(CtfApis):
         constructive_path,
         test_exe_id,
         test_action_result_id,
+        data_processing_config_key: str = None,
+        move_source: bool = False,
     ):
         """
         Saves the action log file under <_test_result_dir_path>/<ACTION_LOGS_DIR>/<test_action_result_id>/<constructive_path>
         """
-        try:
-            local_test_action_result_storage_path = path.join(
-                self._test_result_dir_path,
-                ACTION_LOGS_DIR,
-                test_action_result_id,
-                constructive_path,
-            )
-            makedirs(local_test_action_result_storage_path, exist_ok=True)
-            shutil.copy(source_file_path, local_test_action_result_storage_path)
-            logger.info(
-                f"Logs saved for test action {test_action_result_id} at {local_test_action_result_storage_path}"
-            )
-            result: Dict = {"success": True}
-            return result
-        except Exception as e:
-            # TODO TBD Do we want to exit here or continue even on failure
-            logger.exception(str(e))
-            raise
+        local_test_action_result_storage_path = path.join(
+            self._test_result_dir_path,
+            ACTION_LOGS_DIR,
+            test_action_result_id,
+            constructive_path,
+        )
+        result = self._copy_save_file(
+            source_file_path,
+            local_test_action_result_storage_path,
+            move_source=move_source,
+        )
+        logger.info(
+            f"Logs saved for test action {test_action_result_id} at {local_test_action_result_storage_path}"
+        )
+        return result
 
-    def save_log_file(self, source_file_path, constructive_path, test_exe_id):
+    def save_log_file(
+        self,
+        source_file_path,
+        constructive_path,
+        test_exe_id,
+        log_type: int = None,
+        data_processing_config_key: str = None,
+        move_source: bool = False,
+    ):
         """
         Saves the log file under <_test_result_dir_path>/<TEST_LOGS_DIR>/<constructive_path>
         """
-        try:
-            _test_results_storage_path = path.join(
-                self._test_result_dir_path, TEST_LOGS_DIR, constructive_path
-            )
-            makedirs(_test_results_storage_path, exist_ok=True)
-            shutil.copy(source_file_path, _test_results_storage_path)
-            logger.info(
-                f"Logs saved for test {test_exe_id} at {_test_results_storage_path}"
-            )
-            result: Dict = {"success": True}
-            return result
-        except Exception as e:
-            # TODO TBD Do we want to exit here or continue even on failure
-            logger.exception(str(e))
-            raise
+        _test_results_storage_path = path.join(
+            self._test_result_dir_path, TEST_LOGS_DIR, constructive_path
+        )
+        result = self._copy_save_file(
+            source_file_path,
+            _test_results_storage_path,
+            move_source=move_source,
+        )
+        logger.info(f"Logs saved for test {test_exe_id} at {_test_results_storage_path}")
+        return result
 
     @log_call
-    def save_total_logs_file(self, source_file_path, constructive_path, test_exe_id):
+    def save_total_logs_file(
+        self,
+        source_file_path,
+        constructive_path,
+        test_exe_id,
+        data_processing_config_key: str = None,
+    ):
         """
         Saves the total log file under <_test_result_dir_path>/<TEST_LOGS_DIR>
         """
@@ -339,22 +356,53 @@ class ServerlessApi(CtfApis):
 
         logger.info("result dir is not yet set, unable to save total logs.")
 
+    @property
+    def ctf_client_app_data(self) -> Optional[str]:
+        """Directory for files and data unique to ctf (e.g. indexes)"""
+        return self._ctf_client_app_data
+
+    @property
+    def artifact_store(self) -> ArtifactStore:
+        """Deduplicating blob store shared by all test runs in _test_results_storage_path"""
+        blob_dir = path.join(self._test_results_storage_path, ARTIFACT_BLOBS_DIRNAME)
+        if self._artifact_store is None or self._artifact_store.blob_dir != blob_dir:
+            self._artifact_store = ArtifactStore(blob_dir)
+        return self._artifact_store
+
+    def get_artifact_storage_stats(self) -> Dict:
+        """
+        Returns the artifact storage counters of this test run, including
+        the disk space and copy time saved by deduplication and hard links.
+        """
+        return self.artifact_store.get_stats()
+
     def _copy_save_file(
-        self, source_file_path, destination_dir, destination_file_name=None
+        self,
+        source_file_path,
+        destination_dir,
+        destination_file_name=None,
+        move_source: bool = False,
     ):
         """
         Generic file saver code. Specify a destination_file_name to rename the file as well.
+        Files are stored through the artifact store, so identical files share a
+        single blob. Set move_source if the source file can be consumed.
         """
-        destination_path = destination_dir
-
-        if destination_file_name:
-            destination_path = path.join(destination_path, destination_file_name)
+        destination_file_name = destination_file_name or path.basename(
+            str(source_file_path)
+        )
+        destination_path = path.join(destination_dir, destination_file_name)
 
         try:
             makedirs(destination_dir, exist_ok=True)
-            shutil.copy(source_file_path, destination_path)
+            artifact = self.artifact_store.store(
+                source_file_path,
+                destination_path,
+                move_source=move_source,
+                manifest_dir=self._test_result_dir_path,
+            )
 
-            result: Dict = {"success": True}
+            result: Dict = {"success": True, "error": False, "data": artifact}
             return result
         except Exception as e:
             # TODO TBD Do we want to exit here or continue even on failure
@@ -382,6 +430,7 @@ class ServerlessApi(CtfApis):
             result = path.join(self._test_result_dir_path, f"result_{status}.txt")
             with open(result, "w") as f:
                 f.write(s)
+            self._log_artifact_storage_stats()
             msg = f"Test run outcome saved to {result}"
             result: Dict = {"message": msg}
             return result
@@ -389,6 +438,18 @@ class ServerlessApi(CtfApis):
             logger.exception(str(e))
             raise
 
+    def _log_artifact_storage_stats(self) -> None:
+        stats = self.get_artifact_storage_stats()
+        if not stats["files"]:
+            return
+        logger.info(
+            f"Stored {stats['files']} artifacts ({humanize.naturalsize(stats['bytes'])}): "
+            + f"{stats['deduplicated_files']} deduplicated, "
+            + f"{humanize.naturalsize(stats['disk_bytes_saved'])} disk space saved, "
+            + f"{humanize.naturalsize(stats['copy_bytes_saved'])} "
+            + f"(~{stats['copy_seconds_saved']:.2f}s) of copying avoided"
+        )
+
     @log_call(result=False)
     def get_list_of_user_team_test_setups(self, team_id: int):
         """
@@ -523,6 +584,51 @@ class ServerlessApi(CtfApis):
 
         return test_action_result_keyed_json
 
+    def list_keyed_json_object_for_test_run_execution(
+        self,
+        test_exec_id: Union[str, int],
+        page: int = 1,
+        offset: int = 10,
+    ):
+        """
+        Lists the JSON Objects saved by the given test run, served from the local index.
+        :param test_exec_id: Test run identifier.
+        :param page: 1-based page number.
+        :param offset: number of JSON Objects per page.
+        :return: returns Dict with the page of JSON Objects and pagination details
+        {
+            "json_objects": [<Stored Dict, see get_test_action_result_keyed_json_object>],
+            "total_no_of_pages": 1,
+            "total_no_of_records": 1,
+            "current_page": 1,
+            "current_page_offset": 10
+        }
+        """
+        keyed_json_objects_respository = TestActionResultKeyedJsonObjectsRepository(
+            self._test_results_storage_path, self._ctf_client_app_data
+        )
+        return keyed_json_objects_respository.list_keyed_json_object_for_test_run_execution(
+            test_exec_id, page, offset
+        )
+
+    def list_keyed_json_object_for_test_action_result(
+        self,
+        test_exec_id: Union[str, int],
+        test_action_result_id: Union[str, int],
+        page: int = 1,
+        offset: int = 10,
+    ):
+        """
+        Lists the JSON Objects saved by the given test action, served from the local index.
+        See list_keyed_json_object_for_test_run_execution() for the returned format.
+        """
+        keyed_json_objects_respository = TestActionResultKeyedJsonObjectsRepository(
+            self._test_results_storage_path, self._ctf_client_app_data
+        )
+        return keyed_json_objects_respository.list_keyed_json_object_for_test_action_result(
+            test_exec_id, test_action_result_id, page, offset
+        )
+
     def save_heatmap_files(
         self,
         test_exe_id: int,
@@ -18,6 +18,9 @@ from ctf.ctf_client.serverless_lib.ctf_file_system import (
 )
 
 from ctf.ctf_client.serverless_lib.exceptions import ResourceNotFoundException
+from ctf.ctf_client.serverless_lib.keyed_json_objects_index import (
+    KeyedJsonObjectsIndex,
+)
 
 DEFAULT_INDEX_DIRECTORY = "/tmp/ctf"
 ACTION_LOGS_DIRNAME = "step_logs"
@@ -35,12 +38,16 @@ class TestActionResultKeyedJsonObjectsRepository:
         self,
         test_results_base_path: str,
         test_action_results_keys_index: str,
+        compress: bool = True,
     ) -> None:
         self.test_results_base_path = test_results_base_path
         if not test_action_results_keys_index:
             self.keyed_json_objects_index_dirname = DEFAULT_INDEX_DIRECTORY
         else:
             self.keyed_json_objects_index_dirname = test_action_results_keys_index
+        self.index = KeyedJsonObjectsIndex(
+            self._get_keyed_json_objects_index_dirname(), compress=compress
+        )
 
     def save_test_action_result_keyed_json_object(
         self,
@@ -75,22 +82,44 @@ class TestActionResultKeyedJsonObjectsRepository:
 
     def get_test_action_result_keyed_json_object(self, key: str, team_id: int):
         team_id = str(team_id)
-        keyed_json_object_path = join(
-            self._get_keyed_json_objects_index_dirname(), team_id, key
-        )
-        if not exists(keyed_json_object_path):
+        indexed_json_object = self.index.get(team_id, key)
+        if indexed_json_object is None:
+            indexed_json_object = self._migrate_legacy_index_file(key, team_id)
+        if indexed_json_object is None:
             raise ResourceNotFoundException(f"Json Object with key {key} not found.")
 
-        return get_json_object(keyed_json_object_path)
+        return indexed_json_object
 
     def delete_test_action_result_keyed_json_object(self, key: str, team_id: int):
-        keyed_json_object_path = join(
-            self._get_keyed_json_objects_index_dirname(), str(team_id), key
-        )
-        if not exists(keyed_json_object_path):
+        team_id = str(team_id)
+        deleted = self.index.delete(team_id, key)
+        legacy_path = self._get_legacy_index_file_path(key, team_id)
+        if exists(legacy_path):
+            rm(legacy_path)
+            deleted += 1
+        if not deleted:
             raise ResourceNotFoundException(f"Json Object with key {key} not found.")
 
-        rm(keyed_json_object_path)
+    def list_keyed_json_object_for_test_run_execution(
+        self,
+        test_exe_id: Union[str, int],
+        page: int = 1,
+        offset: int = 10,
+    ):
+        return self.index.list_for_test_run_execution(
+            test_exe_id, page=page, offset=offset
+        )
+
+    def list_keyed_json_object_for_test_action_result(
+        self,
+        test_exe_id: Union[str, int],
+        test_action_result_id: Union[str, int],
+        page: int = 1,
+        offset: int = 10,
+    ):
+        return self.index.list_for_test_run_execution(
+            test_exe_id, test_action_result_id, page=page, offset=offset
+        )
 
     def _save_to_test_action_result_dir(
         self,
@@ -126,19 +155,15 @@ class TestActionResultKeyedJsonObjectsRepository:
         json_object: Dict[str, Optional[Any]],
     ):
         team_id = str(team_id)
-        self._create_keyed_json_objects_index_dir(team_id)
-        indexed_file_path = join(
-            self._get_keyed_json_objects_index_dirname(), team_id, key
+        # Keep version numbers continuous for keys saved before the index existed
+        if not self.index.get_version(team_id, key):
+            self._migrate_legacy_index_file(key, team_id)
+        indexed_json_object = self.index.save(
+            team_id, test_exe_id, test_action_result_id, key, json_object
         )
-        indexed_json_object = self._build_index_json_object(
-            test_exe_id,
-            test_action_result_id,
-            key,
-            json_object,
-            self._get_keyed_json_object_version(key, team_id) + 1,
+        logger.debug(
+            f"Indexed Test Action Result Keyed Json Object {key} for team {team_id}"
         )
-        put_json_object(indexed_file_path, indexed_json_object)
-        logger.debug("Created Test Action Result Keyed Json Object index directory")
         return indexed_json_object
 
     def _create_test_action_result_keyed_json_objects_dir(
@@ -152,39 +177,23 @@ class TestActionResultKeyedJsonObjectsRepository:
             )
         return test_action_result_keyed_json_objects_dirname
 
-    def _create_keyed_json_objects_index_dir(self, team_id: str):
-        keyed_json_objects_index_dirname = self._get_keyed_json_objects_index_dirname()
-        path = join(keyed_json_objects_index_dirname, team_id)
-        if not exists(path):
-            mkdir(path)
-            logger.debug(
-                f"Created Test Action Result Keyed Json Object index directory at {path}"
-            )
+    def _get_legacy_index_file_path(self, key: str, team_id: str):
+        return join(self._get_keyed_json_objects_index_dirname(), team_id, key)
 
-    def _get_keyed_json_object_version(self, key: str, team_id: str):
-        try:
-            keyed_json_object = self.get_test_action_result_keyed_json_object(
-                key, int(team_id)
-            )
-            return keyed_json_object["version"]
-        except ResourceNotFoundException:
-            return 0
+    def _migrate_legacy_index_file(self, key: str, team_id: str):
+        """Move an index file written by the directory based index into the
+        SQLite index. Returns the migrated json object, or None."""
+        legacy_path = self._get_legacy_index_file_path(key, team_id)
+        if not exists(legacy_path):
+            return None
 
-    def _build_index_json_object(
-        self,
-        test_exe_id: Union[str, int],
-        test_action_result_id: Union[str, int],
-        key: str,
-        json_object: Dict[str, Optional[Any]],
-        version: int,
-    ):
-        return {
-            "test_run_execution_id": test_exe_id,
-            "test_action_result_id": test_action_result_id,
-            "json_object": json_object,
-            "key": key,
-            "version": version,
-        }
+        indexed_json_object = get_json_object(legacy_path)
+        self.index.import_json_object(team_id, indexed_json_object)
+        rm(legacy_path)
+        logger.debug(
+            f"Migrated Test Action Result Keyed Json Object {key} from {legacy_path}"
+        )
+        return self.index.get(team_id, key)
 
     def _build_test_action_result_keyed_json_objects_dirname(
         self, test_exe_id: str, test_action_result_id: str
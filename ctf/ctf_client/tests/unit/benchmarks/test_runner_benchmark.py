@@ -0,0 +1,132 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+
+from ctf.ctf_client.benchmarks import runner_benchmark
+from ctf.ctf_client.benchmarks.runner_benchmark import compare, percentile
+from ctf.ctf_client.benchmarks.simulated_nodes import (
+    simulated_nodes,
+    SimulatedNodeConfig,
+)
+
+
+class TestSimulatedNodes:
+    def test_commands(self) -> None:
+        # Arrange
+        nodes = simulated_nodes(2, SimulatedNodeConfig(latency_ms=0, output_bytes=100))
+
+        # Act
+        tg2 = nodes[1].action_custom_command("tg2 minion status")
+        generic = nodes[2].action_custom_command("cat /tmp/file")
+
+        # Assert
+        assert json.loads(tg2["message"])["status"] == "ONLINE_INITIATOR"
+        assert len(generic["message"]) == 100
+        assert nodes[2].cmds == ["cat /tmp/file"]
+
+    def test_failures_are_reproducible(self) -> None:
+        # Arrange
+        config = SimulatedNodeConfig(latency_ms=0, failure_rate=0.5)
+
+        # Act
+        runs = []
+        for _ in range(2):
+            node = simulated_nodes(1, config, seed=7)[1]
+            runs.append([node.action_custom_command("ls")["error"] for _ in range(20)])
+
+        # Assert
+        assert runs[0] == runs[1]
+        assert 0 < sum(runs[0]) < 20
+
+    def test_fetch_writes_log_file(self, tmp_path) -> None:
+        # Arrange
+        node = simulated_nodes(1, SimulatedNodeConfig(latency_ms=0, log_file_bytes=64))[
+            1
+        ]
+
+        # Act
+        result = node.connection.copy_files_from_remote(
+            str(tmp_path), "/var/log/messages"
+        )
+
+        # Assert
+        assert result["error"] == 0
+        assert (tmp_path / "messages").stat().st_size == 64
+
+
+class TestRunnerBenchmark:
+    def test_percentile(self) -> None:
+        # Arrange
+        values = [4.0, 1.0, 3.0, 2.0]
+
+        # Act
+        p50, p100 = percentile(values, 50), percentile(values, 100)
+
+        # Assert
+        assert p50 == 2.5
+        assert p100 == 4.0
+
+    def test_compare_flags_regressions(self) -> None:
+        # Arrange
+        baseline = {"scenarios": {"fanout": {"ops/s": 100, "p50 ms": 10, "p99 ms": 20}}}
+        results = {"scenarios": {"fanout": {"ops/s": 80, "p50 ms": 10.5, "p99 ms": 15}}}
+
+        # Act
+        rows = compare(results, baseline, max_regression=0.1)
+
+        # Assert
+        assert {row["metric"]: row["regression"] for row in rows} == {
+            "ops/s": True,
+            "p50 ms": False,
+            "p99 ms": False,
+        }
+
+    def test_main(self, tmp_path) -> None:
+        # Arrange
+        output = tmp_path / "results.json"
+        argv = [
+            "--nodes=3",
+            "--iterations=2",
+            "--latency-ms=0",
+            "--log-file-bytes=1000",
+            "--image-bytes=1000",
+            f"--output={output}",
+        ]
+
+        # Act
+        ret = runner_benchmark.main(argv)
+
+        # Assert
+        assert ret == 0
+        results = json.loads(output.read_text())
+        assert set(results["scenarios"]) == set(runner_benchmark.SCENARIOS)
+        for summary in results["scenarios"].values():
+            assert summary["iterations"] == 2
+            assert summary["errors"] == 0
+        assert results["scenarios"]["fanout"]["ops"] == 6
+        assert results["meta"]["params"]["nodes"] == 3
+
+    def test_log_collection_keeps_logs_with_same_name(self, tmp_path) -> None:
+        # Arrange
+        nodes = simulated_nodes(2, SimulatedNodeConfig(latency_ms=0, log_file_bytes=10))
+        test = runner_benchmark.create_test(nodes, str(tmp_path), max_workers=4)
+        test.store_logs_locally = str(tmp_path / "local")
+        logfiles = ["/var/log/e2e_minion/current", "/var/log/openr/current"]
+
+        # Act
+        test._collect_node_logfiles({node_id: logfiles for node_id in nodes})
+
+        # Assert
+        (run_dir,) = tmp_path.glob("runner_benchmark_*")
+        local_dir = tmp_path / "local" / str(test.test_exe_id)
+        for node_id in nodes:
+            for logfile in logfiles:
+                for stored in (
+                    run_dir / "collected_device_logs" / f"{node_id}{logfile}",
+                    local_dir / f"{node_id}{logfile}",
+                ):
+                    content = stored.read_text()
+                    assert content.startswith(f"node {node_id} {logfile}\n")
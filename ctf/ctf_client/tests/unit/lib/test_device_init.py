@@ -0,0 +1,107 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import base64
+import time
+from typing import Dict, List, Optional
+
+import pytest
+from ctf.common.plugins.driver_registry import DriverRegistry, set_driver_registry
+from ctf.ctf_client.benchmarks.driver_loading_benchmark import fake_setup
+from ctf.ctf_client.lib.connections_helper import (
+    DeviceInitError,
+    get_devices_and_connections,
+)
+
+# Initialization time of each slow device
+INIT_DELAY = 0.2
+
+
+def slow_driver_source(node_number: int, delay: float, error: Optional[str]) -> str:
+    """Source of a fake driver sleeping (and possibly failing) on init"""
+    lines = [
+        "import time",
+        "",
+        "",
+        f"class SlowDriver{node_number}:",
+        "    def __init__(self, module=None):",
+        f"        time.sleep({delay})",
+        "        self.module = module",
+    ]
+    if error:
+        lines.append(f"        raise RuntimeError({error!r})")
+    return "\n".join(lines) + "\n"
+
+
+def slow_setup(delays: List[float], errors: Dict[int, str]) -> List[Dict]:
+    """Fake test setup whose device N takes delays[N - 1] seconds to
+    initialize, failing with errors[N] if set
+    """
+    setup = fake_setup(devices=len(delays), drivers=1)
+    for result, delay in zip(setup, delays):
+        node_number = result["node_number"]
+        source = slow_driver_source(node_number, delay, errors.get(node_number))
+        result["driver_file"] = base64.b64encode(source.encode()).decode()
+        result["driver_file_name"] = f"slow_driver_{node_number}.py"
+    return setup
+
+
+@pytest.fixture(autouse=True)
+def driver_registry(tmp_path):
+    set_driver_registry(DriverRegistry(str(tmp_path)))
+    yield
+    set_driver_registry(None)
+
+
+class TestDeviceInit:
+    def test_devices_in_setup_order(self) -> None:
+        # Arrange
+        # Later devices finish initializing first
+        setup = slow_setup([0.1, 0.05, 0.0, 0.0], {})
+
+        # Act
+        devices = get_devices_and_connections(setup, max_workers=4)
+
+        # Assert
+        assert list(devices) == [1, 2, 3, 4]
+        assert [d.metadata["name"] for d in devices.values()] == [
+            "node-1",
+            "node-2",
+            "node-3",
+            "node-4",
+        ]
+        assert all(d.driver.module is d for d in devices.values())
+
+    def test_errors_are_aggregated(self) -> None:
+        # Arrange
+        setup = slow_setup([0.0, 0.1, 0.0, 0.0], {1: "boom 1", 3: "boom 3"})
+
+        # Act
+        with pytest.raises(DeviceInitError) as e:
+            get_devices_and_connections(setup, max_workers=2)
+
+        # Assert
+        assert e.value.errors == {
+            1: "RuntimeError: boom 1",
+            3: "RuntimeError: boom 3",
+        }
+        assert "Failed to initialize 2 device(s)" in str(e.value)
+
+    def test_wall_clock_scales_with_workers(self) -> None:
+        # Arrange
+        setup = slow_setup([INIT_DELAY] * 8, {})
+        get_devices_and_connections(setup)  # compile the drivers
+
+        # Act
+        start = time.perf_counter()
+        get_devices_and_connections(setup, max_workers=1)
+        serial = time.perf_counter() - start
+        start = time.perf_counter()
+        get_devices_and_connections(setup, max_workers=8)
+        parallel = time.perf_counter() - start
+
+        # Assert
+        assert serial >= 8 * INIT_DELAY
+        assert parallel < 3 * INIT_DELAY
@@ -0,0 +1,98 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import base64
+import os
+
+from ctf.common.plugins.driver_registry import DriverRegistry, set_driver_registry
+from ctf.common.plugins.plugin_manager import PluginManager
+from ctf.ctf_client.benchmarks.driver_loading_benchmark import fake_setup
+from ctf.ctf_client.lib.connections_helper import get_devices_and_connections
+
+DRIVER_SOURCE = """
+class Helper:
+    pass
+
+
+class Driver:
+    def __init__(self, module=None):
+        self.module = module
+"""
+
+
+def encode(source: str) -> str:
+    return base64.b64encode(source.encode()).decode()
+
+
+class TestDriverRegistry:
+    def test_driver_is_loaded_once(self, tmp_path) -> None:
+        # Arrange
+        registry = DriverRegistry(str(tmp_path))
+
+        # Act
+        first = registry.get_driver_class(encode(DRIVER_SOURCE), "a.py")
+        second = registry.get_driver_class(encode(DRIVER_SOURCE), "b.py")
+
+        # Assert
+        assert first is second
+        assert first.__name__ == "Helper"
+        assert len(os.listdir(tmp_path)) == 1
+
+    def test_disk_cache(self, tmp_path) -> None:
+        # Arrange
+        driver_file = encode(DRIVER_SOURCE.replace("Helper", "CachedHelper"))
+        DriverRegistry(str(tmp_path)).get_driver_class(driver_file, "a.py")
+
+        # Act
+        registry = DriverRegistry(str(tmp_path))
+        registry._compile = None  # a cache miss would fail
+        driver_class = registry.get_driver_class(driver_file, "a.py")
+
+        # Assert
+        assert driver_class.__name__ == "CachedHelper"
+
+    def test_invalid_driver(self, tmp_path) -> None:
+        # Arrange
+        registry = DriverRegistry(str(tmp_path))
+
+        # Act
+        driver_class = registry.get_driver_class(encode("def broken(:\n"), "a.py")
+
+        # Assert
+        assert driver_class is None
+        assert os.listdir(tmp_path) == []
+
+
+class TestDeviceLoading:
+    def test_plugin_lookup_is_cached(self) -> None:
+        # Arrange
+        pm = PluginManager()
+
+        # Act
+        first = pm.load_plugin_function("GenericInterface", "custom_fun")
+        second = pm.load_plugin_function("GenericInterface", ["custom_fun"])
+        third = pm.load_plugin_function("GenericInterface", "custom_fun")
+
+        # Assert
+        assert first is second is third
+
+    def test_devices_share_driver_classes(self, tmp_path) -> None:
+        # Arrange
+        set_driver_registry(DriverRegistry(str(tmp_path)))
+        setup = fake_setup(devices=6, drivers=2)
+
+        # Act
+        try:
+            devices = get_devices_and_connections(setup)
+        finally:
+            set_driver_registry(None)
+
+        # Assert
+        assert sorted(devices) == [1, 2, 3, 4, 5, 6]
+        assert type(devices[1].driver) is type(devices[3].driver)
+        assert type(devices[1].driver) is not type(devices[2].driver)
+        assert devices[1].driver is not devices[3].driver
+        assert devices[1].driver.module is devices[1]
+        assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,134 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import logging
+
+import pytest
+from ctf.common.logging_utils import (
+    CallHistogram,
+    log_call,
+    set_call_histogram,
+    summarize,
+)
+
+LOGGER = "ctf.common.logging_utils"
+
+
+class Payload:
+    """Value counting how many times it was formatted"""
+
+    formatted = 0
+
+    def __repr__(self) -> str:
+        Payload.formatted += 1
+        return "Payload()"
+
+    __str__ = __repr__
+
+
+@log_call(debug=True)
+def get_payload(payload: Payload) -> Payload:
+    return payload
+
+
+@log_call(result=False, timer=True)
+def get_stats(count: int) -> dict:
+    return {f"counter.{i}": i for i in range(count)}
+
+
+@log_call(exception=True)
+def fail() -> None:
+    raise ValueError("failed")
+
+
+class TestLogCall:
+    def test_disabled_level_formats_nothing(self, caplog) -> None:
+        # Arrange
+        caplog.set_level(logging.INFO, logger=LOGGER)
+        Payload.formatted = 0
+
+        # Act
+        result = get_payload(Payload())
+
+        # Assert
+        assert isinstance(result, Payload)
+        assert Payload.formatted == 0
+        assert caplog.records == []
+
+    def test_enabled_level(self, caplog) -> None:
+        # Arrange
+        caplog.set_level(logging.DEBUG, logger=LOGGER)
+
+        # Act
+        get_payload(Payload())
+
+        # Assert
+        assert caplog.messages == [
+            "get_payload called with args: (Payload(),) and kwargs: {}",
+            "get_payload returned. Result: Payload()",
+        ]
+        assert caplog.records[0].filename_override == __name__
+
+    def test_result_flag_and_timer(self, caplog) -> None:
+        # Arrange
+        caplog.set_level(logging.INFO, logger=LOGGER)
+
+        # Act
+        stats = get_stats(3)
+
+        # Assert
+        assert len(stats) == 3
+        assert caplog.messages[0] == "get_stats called with args: (3,) and kwargs: {}"
+        assert caplog.messages[1].startswith("get_stats took ")
+        assert "Result" not in caplog.messages[1]
+
+    def test_exception(self, caplog) -> None:
+        # Arrange
+        caplog.set_level(logging.WARNING, logger=LOGGER)
+
+        # Act
+        with pytest.raises(ValueError):
+            fail()
+
+        # Assert
+        assert caplog.messages == ["ValueError was raised during call of fail"]
+
+    def test_call_histogram(self, caplog) -> None:
+        # Arrange
+        caplog.set_level(logging.WARNING, logger=LOGGER)
+        histogram = CallHistogram()
+
+        # Act
+        set_call_histogram(histogram)
+        try:
+            for count in range(10):
+                get_stats(count)
+        finally:
+            set_call_histogram(None)
+        get_stats(1)
+
+        # Assert
+        (row,) = histogram.rows()
+        assert row["function"] == "get_stats"
+        assert row["calls"] == 10
+        assert 0 <= row["p50 ms"] <= row["p99 ms"] <= row["max ms"]
+        assert caplog.records == []
+
+
+class TestSummarize:
+    def test_small_values(self) -> None:
+        assert summarize({"b": 1, "a": [1, "x"]}) == "{'b': 1, 'a': [1, 'x']}"
+        assert summarize(b"data") == "b'data'"
+
+    def test_large_values(self) -> None:
+        # Act
+        text = summarize("x" * 5000, max_chars=20)
+        items = summarize({i: i for i in range(1000)})
+        nested = summarize([{"log": "y" * 5000}] * 3, max_chars=100)
+
+        # Assert
+        assert len(text) < 40 and text.endswith(" (5000 chars)")
+        assert items.endswith(", ...} (dict of 1000 items)")
+        assert len(nested) <= 103
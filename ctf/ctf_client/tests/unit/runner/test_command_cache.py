@@ -0,0 +1,238 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ctf.ctf_client.runner.command_cache import CommandCache
+
+TIMEOUT = 10
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeDevice:
+    def __init__(self) -> None:
+        self.calls = []
+        self.returncode = 0
+
+    def action_custom_command(self, cmd: str, timeout: int = 60):
+        self.calls.append(cmd)
+        return {
+            "error": 0,
+            "returncode": self.returncode,
+            "message": f"{cmd} #{len(self.calls)}",
+            "stderr": "",
+        }
+
+
+def _cache(clock=None) -> CommandCache:
+    return CommandCache(
+        {r"cat /etc/version": 60, r"tg2 minion status( --json)?": 5},
+        **({"clock": clock} if clock else {}),
+    )
+
+
+class TestCommandCache:
+    def test_reuses_results_until_expired(self) -> None:
+        # Arrange
+        clock = FakeClock()
+        cache = _cache(clock)
+        device = FakeDevice()
+        cmd = "tg2 minion status --json"
+
+        # Act
+        first = cache.run(1, cmd, device.action_custom_command, cmd)
+        clock.now = 4
+        second = cache.run(1, cmd, device.action_custom_command, cmd)
+        clock.now = 6
+        third = cache.run(1, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        assert first["message"] == second["message"] == f"{cmd} #1"
+        assert third["message"] == f"{cmd} #2"
+        stats = cache.stats[r"tg2 minion status( --json)?"]
+        assert (stats.hits, stats.misses) == (1, 2)
+
+    def test_results_are_per_device(self) -> None:
+        # Arrange
+        cache = _cache()
+        devices = {1: FakeDevice(), 2: FakeDevice()}
+
+        # Act
+        for node_id in (1, 2, 1, 2):
+            cache.run(
+                node_id,
+                "cat /etc/version",
+                devices[node_id].action_custom_command,
+                "cat /etc/version",
+            )
+
+        # Assert
+        assert len(devices[1].calls) == len(devices[2].calls) == 1
+
+    def test_other_commands_are_not_cached(self) -> None:
+        # Arrange
+        cache = _cache()
+        device = FakeDevice()
+
+        # Act
+        for cmd in ("cat /etc/version; reboot", "cat /etc/version; reboot"):
+            cache.run(1, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        assert len(device.calls) == 2
+
+    def test_failures_are_not_cached(self) -> None:
+        # Arrange
+        cache = _cache()
+        device = FakeDevice()
+        device.returncode = 1
+        cmd = "cat /etc/version"
+
+        # Act
+        cache.run(1, cmd, device.action_custom_command, cmd)
+        cache.run(1, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        assert len(device.calls) == 2
+
+    def test_mutating_command_invalidates_device(self) -> None:
+        # Arrange
+        cache = _cache()
+        devices = {1: FakeDevice(), 2: FakeDevice()}
+        cmd = "cat /etc/version"
+        for node_id, device in devices.items():
+            cache.run(node_id, cmd, device.action_custom_command, cmd)
+
+        # Act
+        cache.run(1, "echo 2 > /etc/version", devices[1].action_custom_command, "")
+        result = cache.run(1, cmd, devices[1].action_custom_command, cmd)
+        cache.run(2, cmd, devices[2].action_custom_command, cmd)
+
+        # Assert
+        assert result["message"] == f"{cmd} #3"
+        assert len(devices[2].calls) == 1
+        assert cache.invalidations == 1
+
+    def test_explicit_invalidation(self) -> None:
+        # Arrange
+        cache = _cache()
+        devices = {1: FakeDevice(), 2: FakeDevice()}
+        cmd = "cat /etc/version"
+        for node_id, device in devices.items():
+            cache.run(node_id, cmd, device.action_custom_command, cmd)
+
+        # Act
+        cache.invalidate()
+        for node_id, device in devices.items():
+            cache.run(node_id, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        assert [len(device.calls) for device in devices.values()] == [2, 2]
+        assert cache.invalidations == 2
+
+    def test_concurrent_callers_share_command(self) -> None:
+        # Arrange
+        cache = _cache()
+        pool = ThreadPoolExecutor(max_workers=4)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        cmd = "cat /etc/version"
+
+        def run(cmd: str):
+            calls.append(cmd)
+            started.set()
+            release.wait(TIMEOUT)
+            return {"error": 0, "returncode": 0, "message": "v1", "stderr": ""}
+
+        # Act
+        first = pool.submit(cache.run, 1, cmd, run, cmd)
+        started.wait(TIMEOUT)
+        others = [pool.submit(cache.run, 1, cmd, run, cmd) for _ in range(3)]
+        while cache.stats[r"cat /etc/version"].shared < 3:
+            release.wait(0.01)
+        release.set()
+
+        # Assert
+        results = [f.result(timeout=TIMEOUT) for f in [first] + others]
+        assert [r["message"] for r in results] == ["v1"] * 4
+        assert len(calls) == 1
+        pool.shutdown()
+
+    def test_command_running_across_mutation_is_not_cached(self) -> None:
+        # Arrange
+        cache = _cache()
+        pool = ThreadPoolExecutor(max_workers=2)
+        started = threading.Event()
+        release = threading.Event()
+        device = FakeDevice()
+        cmd = "cat /etc/version"
+
+        def slow_read(cmd: str):
+            started.set()
+            release.wait(TIMEOUT)
+            return device.action_custom_command(cmd)
+
+        # Act
+        read = pool.submit(cache.run, 1, cmd, slow_read, cmd)
+        started.wait(TIMEOUT)
+        cache.run(1, "upgrade", device.action_custom_command, "upgrade")
+        release.set()
+        read.result(timeout=TIMEOUT)
+        result = cache.run(1, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        assert result["message"] == f"{cmd} #3"
+        pool.shutdown()
+
+    def test_bypassed_while_mutating(self) -> None:
+        # Arrange
+        cache = _cache()
+        device = FakeDevice()
+        cmd = "cat /etc/version"
+
+        def mutate(cmd: str):
+            # Read the device while it is being changed
+            return cache.run(1, "cat /etc/version", device.action_custom_command, cmd)
+
+        # Act
+        cache.run(1, "echo 2 > /etc/version", mutate, cmd)
+        cache.run(1, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        stats = cache.stats[r"cat /etc/version"]
+        assert (stats.bypassed, stats.misses) == (1, 1)
+        assert len(device.calls) == 2
+
+    def test_rows(self) -> None:
+        # Arrange
+        cache = _cache()
+        device = FakeDevice()
+        cmd = "cat /etc/version"
+
+        # Act
+        for _ in range(4):
+            cache.run(1, cmd, device.action_custom_command, cmd)
+
+        # Assert
+        assert cache.rows() == [
+            {
+                "command": "cat /etc/version",
+                "ttl s": "60",
+                "hits": "3",
+                "shared": "0",
+                "misses": "1",
+                "bypassed": "0",
+                "hit rate": "75%",
+            }
+        ]
@@ -0,0 +1,193 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import threading
+import time
+
+from ctf.common import profiling
+from ctf.common.profiling import ProfiledLock, Profiler
+
+
+class TestProfiler:
+    def test_span_records_args_and_context(self) -> None:
+        # Arrange
+        profiler = Profiler()
+
+        # Act
+        with profiler.context(step=2, node=7):
+            with profiler.span("fetch", "transfer", path="/tmp/x") as span:
+                span.set(bytes=42)
+        with profiler.span("outside"):
+            pass
+
+        # Assert
+        fetch, outside = profiler.spans
+        assert fetch.name == "fetch"
+        assert fetch.category == "transfer"
+        assert fetch.args == {"step": 2, "node": 7, "path": "/tmp/x", "bytes": 42}
+        assert fetch.duration_ns >= 0
+        assert outside.args == {}
+
+    def test_span_records_errors(self) -> None:
+        # Arrange
+        profiler = Profiler()
+
+        # Act
+        try:
+            with profiler.span("connect"):
+                raise ConnectionError("refused")
+        except ConnectionError:
+            pass
+
+        # Assert
+        assert profiler.spans[0].args == {"error": "ConnectionError"}
+
+    def test_ring_drops_oldest_spans(self) -> None:
+        # Arrange
+        profiler = Profiler(capacity=3)
+
+        # Act
+        for i in range(5):
+            profiler.record(f"op{i}", "", 0, 1)
+
+        # Assert
+        assert [span.name for span in profiler.spans] == ["op2", "op3", "op4"]
+        assert profiler.dropped == 2
+
+    def test_chrome_trace(self, tmp_path) -> None:
+        # Arrange
+        profiler = Profiler()
+        profiler.record("cmd", "command", profiler.origin_ns + 5000, 2000, {"node": 1})
+        trace_path = tmp_path / "trace.json"
+
+        # Act
+        profiler.export_chrome_trace(str(trace_path))
+
+        # Assert
+        trace = json.loads(trace_path.read_text())
+        span_event, thread_event = trace["traceEvents"]
+        assert span_event["ph"] == "X"
+        assert span_event["name"] == "cmd"
+        assert span_event["cat"] == "command"
+        assert span_event["ts"] == 5.0
+        assert span_event["dur"] == 2.0
+        assert span_event["args"] == {"node": 1}
+        assert thread_event["ph"] == "M"
+        assert thread_event["tid"] == span_event["tid"]
+        assert thread_event["args"] == {"name": threading.current_thread().name}
+
+    def test_top_sinks(self) -> None:
+        # Arrange
+        profiler = Profiler()
+        profiler.record("scp_get", "transfer", 0, 3_000_000_000, {"bytes": 10})
+        profiler.record("scp_get", "transfer", 0, 1_000_000_000, {"bytes": 5})
+        profiler.record("ssh_connect", "connect", 0, 2_000_000_000)
+        profiler.record("delay", "sleep", 0, 1_000_000)
+
+        # Act
+        rows = profiler.top_sinks(count=2)
+
+        # Assert
+        assert rows == [
+            {
+                "category": "transfer",
+                "name": "scp_get",
+                "count": 2,
+                "total s": 4.0,
+                "mean ms": 2000.0,
+                "max ms": 3000.0,
+                "bytes": 15,
+            },
+            {
+                "category": "connect",
+                "name": "ssh_connect",
+                "count": 1,
+                "total s": 2.0,
+                "mean ms": 2000.0,
+                "max ms": 2000.0,
+                "bytes": 0,
+            },
+        ]
+
+
+class TestProfiledLock:
+    def teardown_method(self) -> None:
+        profiling.set_profiler(None)
+
+    def test_records_contended_waits_only(self) -> None:
+        # Arrange
+        profiler = Profiler()
+        profiling.set_profiler(profiler)
+        lock = ProfiledLock(threading.Lock(), "ctf_push_lock")
+        holding = threading.Event()
+
+        def hold() -> None:
+            with lock:
+                holding.set()
+                time.sleep(0.05)
+
+        # Act
+        with lock:
+            pass
+        thread = threading.Thread(target=hold)
+        thread.start()
+        holding.wait()
+        with lock:
+            pass
+        thread.join()
+
+        # Assert
+        (wait,) = profiler.spans
+        assert wait.name == "ctf_push_lock"
+        assert wait.category == "lock wait"
+        assert wait.duration_ns > 0
+        assert not lock.locked()
+
+
+class TestModuleProfiler:
+    def teardown_method(self) -> None:
+        profiling.set_profiler(None)
+
+    def test_disabled_spans_are_noops(self) -> None:
+        # Arrange
+        profiling.set_profiler(None)
+
+        # Act
+        with profiling.context(step=1), profiling.span("cmd") as span:
+            span.set(bytes=1)
+
+        # Assert
+        assert not profiling.enabled()
+        assert profiling.span("cmd") is profiling.span("other")
+
+    def test_installed_profiler_records_spans(self) -> None:
+        # Arrange
+        profiler = Profiler()
+        profiling.set_profiler(profiler)
+
+        # Act
+        with profiling.context(step=3):
+            with profiling.span("ssh_command", "command", host="10.0.0.1"):
+                pass
+
+        # Assert
+        assert profiling.enabled()
+        (span,) = profiler.spans
+        assert span.args == {"step": 3, "host": "10.0.0.1"}
+
+    def test_path_size(self, tmp_path) -> None:
+        # Arrange
+        (tmp_path / "a").write_bytes(b"x" * 10)
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "b").write_bytes(b"x" * 5)
+
+        # Act
+        file_size = profiling.path_size(str(tmp_path / "a"))
+        dir_size = profiling.path_size(str(tmp_path))
+
+        # Assert
+        assert file_size == 10
+        assert dir_size == 15
@@ -0,0 +1,96 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from ctf.ctf_client.runner.step_durations import (
+    adaptive_timeout,
+    find_regressions,
+    MIN_ADAPTIVE_TIMEOUT,
+    open_step_durations,
+    percentile,
+    StepDurationStore,
+    STEP_DURATIONS_DB_FILENAME,
+)
+from ctf.ctf_client.runner.suite_scheduler import DurationHistory
+
+
+class TestStepDurationStore:
+    def test_record_and_load(self, tmp_path) -> None:
+        # Arrange
+        store = StepDurationStore(str(tmp_path / "durations.sqlite3"), window=3)
+
+        # Act
+        for seconds in (1.0, 2.0, 3.0, 4.0):
+            store.record("test", 1, {"boot": seconds, "ping": seconds * 10})
+        store.record("test", 2, {"boot": 100.0})
+        store.record("other", 1, {"boot": 5.0})
+
+        # Assert
+        assert store.load("test", 1) == {
+            "boot": [2.0, 3.0, 4.0],
+            "ping": [20.0, 30.0, 40.0],
+        }
+        assert store.load("test", 2) == {"boot": [100.0]}
+        assert store.load("test", 3) == {}
+
+    def test_test_duration(self, tmp_path) -> None:
+        # Arrange
+        store = StepDurationStore(str(tmp_path / "durations.sqlite3"))
+        for seconds in (10.0, 20.0, 30.0):
+            store.record("test", 1, {"boot": seconds, "ping": 1.0})
+
+        # Act
+        seconds = store.test_duration("test")
+        history = DurationHistory(None, store)
+
+        # Assert
+        assert seconds == 21.0
+        assert store.test_duration("never_ran") is None
+        assert history.expected("test") == 21.0
+
+    def test_open_in_app_data_dir(self, tmp_path) -> None:
+        # Act
+        store = open_step_durations(None, str(tmp_path / "app_data"))
+
+        # Assert
+        assert store.db_path == str(tmp_path / "app_data" / STEP_DURATIONS_DB_FILENAME)
+        assert open_step_durations(None, None) is None
+
+
+class TestAdaptiveTimeouts:
+    def test_percentile(self) -> None:
+        # Arrange
+        samples = [float(i) for i in range(1, 101)]
+
+        # Act
+        p50, p99 = percentile(samples, 50), percentile(samples, 99)
+
+        # Assert
+        assert p50 == 50.5
+        assert round(p99, 2) == 99.01
+
+    def test_adaptive_timeout(self) -> None:
+        # Arrange
+        samples = [100.0, 110.0, 120.0, 90.0, 100.0]
+
+        # Act
+        timeout = adaptive_timeout(samples, margin=1.5)
+
+        # Assert
+        assert timeout == 180
+        assert adaptive_timeout(samples[:4], margin=1.5) is None
+        assert adaptive_timeout([0.1] * 5, margin=1.5) == MIN_ADAPTIVE_TIMEOUT
+
+    def test_find_regressions(self) -> None:
+        # Arrange
+        history = {"boot": [60.0] * 5, "ping": [2.0] * 5, "new": [1.0]}
+
+        # Act
+        regressions = find_regressions(
+            history, {"boot": 120.0, "ping": 5.0, "new": 100.0, "other": 1.0}
+        )
+
+        # Assert
+        assert [r["step"] for r in regressions] == ["boot"]
+        assert regressions[0]["ratio"] == 2.0
@@ -0,0 +1,101 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from pathlib import Path
+
+from ctf.ctf_client.benchmarks import runner_benchmark
+from ctf.ctf_client.benchmarks.simulated_nodes import (
+    simulated_nodes,
+    SimulatedNodeConfig,
+)
+from ctf.ctf_client.serverless_lib.serverless_api import ACTION_LOGS_DIR
+
+
+def _run_step(test, fn) -> None:
+    step = {
+        "name": "Save step files",
+        "function": fn,
+        "function_args": (),
+        "success_msg": "",
+    }
+    assert not test._run_test_step(step, step_idx=1)
+
+
+class TestStepFiles:
+    def test_artifact_path(self, tmp_path) -> None:
+        # Arrange
+        nodes = simulated_nodes(1, SimulatedNodeConfig(latency_ms=0))
+        test = runner_benchmark.create_test(nodes, str(tmp_path), max_workers=2)
+        local_files = []
+
+        def save() -> None:
+            for constructive_path in ("1", "scans"):
+                file_path = test.step_file_path(constructive_path, "replies.npz")
+                Path(file_path).write_text(constructive_path)
+                test.save_ctf_step_file(file_path, constructive_path)
+                local_files.append(file_path)
+
+        # Act
+        _run_step(test, save)
+
+        # Assert
+        (run_dir,) = tmp_path.glob("runner_benchmark_*")
+        (action_dir,) = (run_dir / ACTION_LOGS_DIR).iterdir()
+        for constructive_path in ("1", "scans"):
+            artifact = action_dir / constructive_path / "replies.npz"
+            assert artifact.read_text() == constructive_path
+        assert len(set(local_files)) == 2
+        assert not any(Path(f).exists() for f in local_files)
+
+    def test_copied_files_are_removed(self, tmp_path) -> None:
+        # Arrange
+        nodes = simulated_nodes(1, SimulatedNodeConfig(latency_ms=0))
+        test = runner_benchmark.create_test(nodes, str(tmp_path), max_workers=2)
+        save_action_log_file = test.ctf_api.save_action_log_file
+        pushed = []
+
+        def copy_action_log_file(**kwargs):
+            # Like the CTF server API, which uploads a copy of the file
+            kwargs["move_source"] = False
+            pushed.append(kwargs["source_file_path"])
+            return save_action_log_file(**kwargs)
+
+        test.ctf_api.save_action_log_file = copy_action_log_file
+
+        def save() -> None:
+            file_path = test.step_file_path("1", "replies.npz")
+            Path(file_path).write_text("replies")
+            test.save_ctf_step_file(file_path, "1")
+
+        # Act
+        _run_step(test, save)
+
+        # Assert
+        assert len(pushed) == 1
+        assert not Path(pushed[0]).exists()
+
+
+class TestStepJsonData:
+    def test_add_merges_step_data(self, tmp_path) -> None:
+        # Arrange
+        nodes = simulated_nodes(1, SimulatedNodeConfig(latency_ms=0))
+        test = runner_benchmark.create_test(nodes, str(tmp_path), max_workers=2)
+        ping_table = {"title": "Ping Summary", "data_source_list": "ping"}
+        pcap_table = {"title": "DSCP", "data_source_list": "pcap"}
+        test.save_ctf_json_data(
+            {"ctf_tables": [ping_table], "ctf_data": [{"data_source": "ping"}]}
+        )
+
+        # Act
+        test.add_ctf_json_data(
+            {"ctf_tables": [pcap_table], "ctf_charts": [{"title": "Packets"}]}
+        )
+
+        # Assert
+        assert test.ctf_json_data[1] == {
+            "ctf_tables": [ping_table, pcap_table],
+            "ctf_data": [{"data_source": "ping"}],
+            "ctf_charts": [{"title": "Packets"}],
+        }
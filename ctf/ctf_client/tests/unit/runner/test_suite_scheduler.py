@@ -0,0 +1,159 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import logging
+import os
+from argparse import Namespace
+
+from ctf.ctf_client.runner.suite_scheduler import (
+    DurationHistory,
+    expected_makespan,
+    longest_first,
+    SuiteScheduler,
+)
+
+
+class FakeCtfApi:
+    def __init__(self, busy=()) -> None:
+        # Setups busy with other users' tests
+        self.busy = set(busy)
+        self.calls = []
+
+    def check_if_test_setup_is_free(self, test_setup_id, team_id=None) -> bool:
+        return test_setup_id not in self.busy
+
+    def set_test_setup_and_devices_busy(self, test_setup_id, team_id=None) -> bool:
+        self.calls.append(("busy", test_setup_id))
+        self.busy.add(test_setup_id)
+        return True
+
+    def set_test_setup_and_devices_free(self, test_setup_id, team_id=None) -> bool:
+        self.calls.append(("free", test_setup_id))
+        self.busy.discard(test_setup_id)
+        return True
+
+
+def run_test(test_name: str, args: Namespace) -> dict:
+    logging.info(f"running {test_name} on setup {args.test_setup_id}")
+    return {"ret": 1 if test_name.startswith("fail") else 0, "url": test_name}
+
+
+def make_scheduler(tmp_path, api, setups, durations=None, **kwargs):
+    return SuiteScheduler(
+        api,
+        setups,
+        run_test,
+        str(tmp_path / "logs"),
+        durations or DurationHistory(None),
+        poll_interval=0.01,
+        **kwargs,
+    )
+
+
+class TestDurationHistory:
+    def test_record_and_save(self, tmp_path) -> None:
+        # Arrange
+        path = str(tmp_path / "durations.json")
+        durations = DurationHistory(path)
+
+        # Act
+        durations.record("a", 100.0)
+        durations.record("a", 200.0)
+        durations.record("b", 10.0)
+        durations.save()
+        loaded = DurationHistory(path)
+
+        # Assert
+        assert loaded.expected("a") == 130.0
+        assert loaded.durations["a"]["runs"] == 2
+        assert loaded.expected("unknown") == 70.0
+
+    def test_longest_first(self) -> None:
+        # Arrange
+        durations = DurationHistory(None)
+        for name, seconds in (("short", 1.0), ("long", 10.0), ("mid", 5.0)):
+            durations.record(name, seconds)
+
+        # Act
+        order = longest_first(["short", "mid", "long"], durations)
+        makespan = expected_makespan(["short", "mid", "long"], durations, 2)
+
+        # Assert
+        assert order == ["long", "mid", "short"]
+        assert makespan == 10.0
+
+
+class TestSuiteScheduler:
+    def test_runs_tests_across_setups(self, tmp_path) -> None:
+        # Arrange
+        api = FakeCtfApi()
+        scheduler = make_scheduler(tmp_path, api, [1, 2])
+        args = Namespace(test_setup_id=1, debug=False)
+
+        # Act
+        results = scheduler.run(["t1", "t2", "t3", "fail4"], args)
+
+        # Assert
+        assert [r.test_name for r in results] == ["t1", "t2", "t3", "fail4"]
+        assert [r.ret for r in results] == [0, 0, 0, 1]
+        assert {r.test_setup_id for r in results} == {1, 2}
+        assert api.busy == set()
+        assert api.calls.count(("busy", 1)) == api.calls.count(("free", 1))
+        for r in results:
+            with open(r.log_file) as f:
+                log = f.read()
+            assert f"running {r.test_name} on setup {r.test_setup_id}" in log
+            assert len(log.splitlines()) == 1
+        # Only passing tests are recorded
+        assert set(scheduler.durations.durations) == {"t1", "t2", "t3"}
+
+    def test_skips_busy_setups(self, tmp_path) -> None:
+        # Arrange
+        api = FakeCtfApi(busy=[2])
+        scheduler = make_scheduler(tmp_path, api, [1, 2])
+
+        # Act
+        results = scheduler.run(["t1", "t2"], Namespace(debug=False))
+
+        # Assert
+        assert [r.test_setup_id for r in results] == [1, 1]
+        assert ("busy", 2) not in api.calls
+
+    def test_abort_on_failure(self, tmp_path) -> None:
+        # Arrange
+        api = FakeCtfApi()
+        durations = DurationHistory(None)
+        durations.record("fail1", 100.0)
+        durations.record("t2", 1.0)
+        scheduler = make_scheduler(
+            tmp_path, api, [1], durations=durations, abort_on_failure=True
+        )
+
+        # Act
+        results = scheduler.run(["t2", "fail1"], Namespace(debug=False))
+
+        # Assert
+        assert results[0].skipped
+        assert results[1].ret == 1
+        assert api.busy == set()
+
+    def test_shard_exceptions_are_failures(self, tmp_path) -> None:
+        # Arrange
+        def raise_error(test_name: str, args: Namespace) -> dict:
+            raise RuntimeError("no devices")
+
+        api = FakeCtfApi()
+        scheduler = make_scheduler(tmp_path, api, [1])
+        scheduler.run_test = raise_error
+
+        # Act
+        (result,) = scheduler.run(["t1"], Namespace(debug=False))
+
+        # Assert
+        assert result.ret == -1
+        assert result.error == "RuntimeError: no devices"
+        assert os.path.getsize(result.log_file) > 0
+        assert json.dumps(scheduler.durations.durations) == "{}"
@@ -0,0 +1,139 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import importlib
+import os
+import sys
+import uuid
+
+import pytest
+from ctf.ctf_client.runner.test_registry import (
+    lazy_tests,
+    set_static_attribute_cache,
+    StaticAttributeCache,
+)
+
+BASE_SOURCE = """
+class Base:
+    TEST_NAME = "base"
+    DESCRIPTION = "Base test"
+
+    def __init__(self, args):
+        self.args = args
+
+    @staticmethod
+    def test_params():
+        return {"count": {"desc": "Count", "default": 1}}
+
+
+class Left(Base):
+    pass
+
+
+class Right(Base):
+    TEST_NAME = "right"
+"""
+
+TESTS_SOURCE = """
+import os
+
+from .base import Base, Left, Right as RightAlias
+
+
+class TestDiamond(Left, RightAlias):
+    DESCRIPTION = (
+        "Concatenated "
+        + "description"
+    )
+
+
+class TestComputed(Base):
+    TEST_NAME = "computed"
+    DESCRIPTION = os.path.join("not", "a", "literal")
+"""
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """Name of a new package of test modules"""
+    name = f"fake_tests_{uuid.uuid4().hex}"
+    os.makedirs(tmp_path / name)
+    (tmp_path / name / "base.py").write_text(BASE_SOURCE)
+    (tmp_path / name / "tests.py").write_text(TESTS_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+    set_static_attribute_cache(StaticAttributeCache(None))
+    yield name
+    set_static_attribute_cache(None)
+
+
+class TestLazyTests:
+    def test_attributes_read_from_sources(self, package) -> None:
+        # Arrange
+        tests = lazy_tests(
+            {"TestDiamond": f"{package}.tests", "Left": f"{package}.base"}
+        )
+
+        # Act
+        attributes = [(t.TEST_NAME, t.DESCRIPTION) for t in tests.values()]
+
+        # Assert
+        assert attributes == [
+            ("right", "Concatenated description"),
+            ("base", "Base test"),
+        ]
+        assert not any(m.startswith(package + ".") for m in sys.modules)
+        test_class = importlib.import_module(f"{package}.tests").TestDiamond
+        assert test_class.TEST_NAME == "right"
+
+    def test_non_literal_attribute_imports_class(self, package) -> None:
+        # Arrange
+        tests = lazy_tests({"TestComputed": f"{package}.tests"})
+
+        # Act
+        test_name = tests["TestComputed"].TEST_NAME
+        imported = f"{package}.tests" in sys.modules
+        description = tests["TestComputed"].DESCRIPTION
+
+        # Assert
+        assert test_name == "computed"
+        assert not imported
+        assert description == os.path.join("not", "a", "literal")
+
+    def test_selected_test_is_resolved(self, package) -> None:
+        # Arrange
+        tests = lazy_tests({"TestDiamond": f"{package}.tests"})
+
+        # Act
+        test = tests["TestDiamond"]("args")
+
+        # Assert
+        assert type(test) is tests["TestDiamond"].resolve()
+        assert test.args == "args"
+        assert tests["TestDiamond"].test_params() == {
+            "count": {"desc": "Count", "default": 1}
+        }
+
+    def test_cache(self, package, tmp_path) -> None:
+        # Arrange
+        cache_path = str(tmp_path / "cache.json")
+        cache = StaticAttributeCache(cache_path)
+        set_static_attribute_cache(cache)
+        lazy_tests({"TestDiamond": f"{package}.tests"})["TestDiamond"].TEST_NAME
+        cache.save()
+
+        # Act
+        cache = StaticAttributeCache(cache_path)
+        cached = cache.get(f"{package}.tests:TestDiamond")
+        with open(tmp_path / package / "base.py", "a") as f:
+            f.write("\n# Modified\n")
+        modified = cache.get(f"{package}.tests:TestDiamond")
+
+        # Assert
+        assert cached == {
+            "TEST_NAME": "right",
+            "DESCRIPTION": "Concatenated description",
+        }
+        assert modified is None
@@ -0,0 +1,181 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import threading
+import time
+
+from ctf.ctf_client.runner.transfer_scheduler import (
+    PRIORITY_DEFAULT,
+    PRIORITY_FAILURE,
+    TransferScheduler,
+)
+
+TIMEOUT = 10
+
+
+class TestTransferScheduler:
+    def test_transfers_all_files(self) -> None:
+        # Arrange
+        scheduler = TransferScheduler(max_fetches=2, max_uploads=2)
+        uploaded = []
+        done = threading.Event()
+
+        # Act
+        future = scheduler.submit(
+            1,
+            ["/var/log/a", "/var/log/b"],
+            lambda remote_path: [f"{remote_path}.1", f"{remote_path}.2"],
+            lambda remote_path, local_file: uploaded.append(local_file) or True,
+            on_done=done.set,
+        )
+
+        # Assert
+        assert future.result(timeout=TIMEOUT)
+        assert done.is_set()
+        assert sorted(uploaded) == [
+            "/var/log/a.1",
+            "/var/log/a.2",
+            "/var/log/b.1",
+            "/var/log/b.2",
+        ]
+
+    def test_failed_fetch_fails_batch(self) -> None:
+        # Arrange
+        scheduler = TransferScheduler(max_fetches=1)
+        fetched = []
+
+        def fetch(remote_path):
+            fetched.append(remote_path)
+            return None
+
+        # Act
+        future = scheduler.submit(
+            1, ["/a", "/b"], fetch, lambda *_: True, abort_on_failure=True
+        )
+
+        # Assert
+        assert not future.result(timeout=TIMEOUT)
+        assert fetched == ["/a"]
+
+    def test_failed_upload_fails_batch(self) -> None:
+        # Arrange
+        scheduler = TransferScheduler(max_fetches=1, max_uploads=1)
+
+        # Act
+        future = scheduler.submit(
+            1,
+            ["/a"],
+            lambda remote_path: ["x", "y"],
+            lambda remote_path, local_file: local_file == "y",
+        )
+
+        # Assert
+        assert not future.result(timeout=TIMEOUT)
+
+    def test_failure_artifacts_fetched_first(self) -> None:
+        # Arrange
+        scheduler = TransferScheduler(max_fetches=1)
+        release = threading.Event()
+        order = []
+
+        def fetch(remote_path):
+            release.wait(TIMEOUT)
+            order.append(remote_path)
+            return []
+
+        # The single fetch worker is busy with "/blocker" while the rest queue up
+        blocker = scheduler.submit(0, ["/blocker"], fetch, lambda *_: True)
+        time.sleep(0.1)
+        routine = scheduler.submit(
+            1, ["/routine"], fetch, lambda *_: True, priority=PRIORITY_DEFAULT
+        )
+        failure = scheduler.submit(
+            2, ["/failure"], fetch, lambda *_: True, priority=PRIORITY_FAILURE
+        )
+
+        # Act
+        release.set()
+
+        # Assert
+        for future in (blocker, routine, failure):
+            assert future.result(timeout=TIMEOUT)
+        assert order == ["/blocker", "/failure", "/routine"]
+
+    def test_sessions_per_node_limit(self) -> None:
+        # Arrange
+        scheduler = TransferScheduler(max_fetches=8, max_sessions_per_node=2)
+        lock = threading.Lock()
+        active = {1: 0, 2: 0}
+        peak = {1: 0, 2: 0}
+
+        def make_fetch(node_id):
+            def fetch(remote_path):
+                with lock:
+                    active[node_id] += 1
+                    peak[node_id] = max(peak[node_id], active[node_id])
+                time.sleep(0.02)
+                with lock:
+                    active[node_id] -= 1
+                return []
+
+            return fetch
+
+        # Act
+        futures = [
+            scheduler.submit(
+                node_id,
+                [f"/log/{i}" for i in range(6)],
+                make_fetch(node_id),
+                lambda *_: True,
+            )
+            for node_id in (1, 2)
+        ]
+
+        # Assert
+        assert all(f.result(timeout=TIMEOUT) for f in futures)
+        assert peak == {1: 2, 2: 2}
+
+    def test_new_node_wakes_waiting_fetch(self) -> None:
+        # Arrange
+        scheduler = TransferScheduler(max_fetches=2, max_sessions_per_node=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_fetch(remote_path):
+            started.set()
+            release.wait()
+            return []
+
+        try:
+            busy = scheduler.submit(1, ["/a", "/b", "/c"], slow_fetch, lambda *_: True)
+            assert started.wait(TIMEOUT)
+            # Let the second fetch worker wait for node 1's session
+            time.sleep(0.05)
+
+            # Act
+            other = scheduler.submit(2, ["/a"], lambda _: [], lambda *_: True)
+
+            # Assert
+            assert other.result(timeout=TIMEOUT)
+            assert not busy.done()
+        finally:
+            release.set()
+        assert busy.result(timeout=TIMEOUT)
+
+    def test_progress_reports_eta(self) -> None:
+        # Arrange
+        reports = []
+        scheduler = TransferScheduler(
+            max_fetches=1, progress_fn=lambda p: reports.append((p.done, p.eta))
+        )
+
+        # Act
+        scheduler.submit(1, ["/a", "/b"], lambda _: [], lambda *_: True).result(
+            timeout=TIMEOUT
+        )
+
+        # Assert
+        assert [done for done, _ in reports] == [1, 2]
+        assert reports[-1][1] == 0
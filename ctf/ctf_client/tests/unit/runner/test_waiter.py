@@ -0,0 +1,147 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ctf.ctf_client.runner.waiter import (
+    Backoff,
+    remote_wait_cmd,
+    SharedPoll,
+    tcp_port_open,
+)
+
+TIMEOUT = 10
+
+
+def _run_sh(cmd: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["sh", "-c", cmd], capture_output=True, text=True, timeout=TIMEOUT
+    )
+
+
+class TestBackoff:
+    def test_grows_to_maximum(self) -> None:
+        # Arrange
+        backoff = Backoff(4)
+
+        # Act
+        intervals = [backoff.next() for _ in range(5)]
+
+        # Assert
+        assert intervals == [1, 2, 4, 4, 4]
+
+    def test_reset(self) -> None:
+        # Arrange
+        backoff = Backoff(8, initial=0.5)
+        backoff.next()
+        backoff.next()
+
+        # Act
+        backoff.reset()
+
+        # Assert
+        assert backoff.next() == 0.5
+
+
+class TestSharedPoll:
+    def test_concurrent_waiters_share_poll(self) -> None:
+        # Arrange
+        shared_poll = SharedPoll()
+        pool = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        calls = []
+
+        def poll():
+            calls.append(1)
+            release.wait(TIMEOUT)
+            return True
+
+        # Act
+        futures = [
+            shared_poll.poll(("topology", 1), lambda: pool.submit(poll))
+            for _ in range(3)
+        ]
+        release.set()
+
+        # Assert
+        assert all(f.result(timeout=TIMEOUT) for f in futures)
+        assert len(calls) == 1
+        pool.shutdown()
+
+    def test_finished_poll_is_not_reused(self) -> None:
+        # Arrange
+        shared_poll = SharedPoll()
+        pool = ThreadPoolExecutor(max_workers=1)
+        first = shared_poll.poll("key", lambda: pool.submit(lambda: 1))
+        first.result(timeout=TIMEOUT)
+
+        # Act
+        second = shared_poll.poll("key", lambda: pool.submit(lambda: 2))
+
+        # Assert
+        assert second.result(timeout=TIMEOUT) == 2
+        pool.shutdown()
+
+    def test_unhashable_key_is_not_shared(self) -> None:
+        # Arrange
+        shared_poll = SharedPoll()
+        pool = ThreadPoolExecutor(max_workers=2)
+        release = threading.Event()
+
+        # Act
+        first = shared_poll.poll(({},), lambda: pool.submit(release.wait, TIMEOUT))
+        second = shared_poll.poll(({},), lambda: pool.submit(lambda: "second"))
+        release.set()
+
+        # Assert
+        assert second.result(timeout=TIMEOUT) == "second"
+        assert first.result(timeout=TIMEOUT)
+        pool.shutdown()
+
+
+class TestRemoteWaitCmd:
+    def test_returns_once_check_succeeds(self, tmp_path) -> None:
+        # Arrange
+        flag = tmp_path / "ready"
+        timer = threading.Timer(0.5, flag.write_text, args=("up\n",))
+        timer.start()
+        start = time.monotonic()
+
+        # Act
+        result = _run_sh(remote_wait_cmd(f"cat {flag}", timeout=TIMEOUT, interval=0.1))
+
+        # Assert
+        assert result.returncode == 0
+        assert result.stdout == "up\n"
+        assert time.monotonic() - start < TIMEOUT / 2
+
+    def test_times_out(self) -> None:
+        # Act
+        result = _run_sh(remote_wait_cmd("echo down; false", timeout=1, interval=0.1))
+
+        # Assert
+        assert result.returncode == 1
+        assert result.stdout == "down\n"
+
+
+class TestTcpPortOpen:
+    def test_listening_port(self) -> None:
+        # Arrange
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+
+        # Act
+        is_open = tcp_port_open("127.0.0.1", port, timeout=1)
+        server.close()
+
+        # Assert
+        assert is_open
+        assert not tcp_port_open("127.0.0.1", port, timeout=1)
@@ -0,0 +1,163 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import errno
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+from ctf.ctf_client.serverless_lib.artifact_store import (
+    ARTIFACT_MANIFEST_FILENAME,
+    ArtifactStore,
+    file_sha256,
+)
+from ctf.ctf_client.serverless_lib.serverless_api import ServerlessApi
+
+CONTENT = b"kernel: wlan0 link up\n" * 100
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "blobs"))
+
+
+def _write(path, content=CONTENT):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+class TestArtifactStore:
+    def test_store_links_blob(self, store, tmp_path) -> None:
+        # Arrange
+        source = _write(tmp_path / "src" / "messages")
+        destination = tmp_path / "run" / "messages"
+        destination.parent.mkdir()
+
+        # Act
+        artifact = store.store(source, str(destination))
+
+        # Assert
+        assert destination.read_bytes() == CONTENT
+        assert source.exists()
+        assert artifact["sha256"] == file_sha256(str(source))
+        assert artifact["linked"] and not artifact["deduplicated"]
+        assert os.stat(destination).st_nlink == 2
+
+    def test_store_deduplicates(self, store, tmp_path) -> None:
+        # Arrange
+        run_dir = tmp_path / "run"
+        run_dir.mkdir()
+        sources = [_write(tmp_path / "src" / f"node_{i}.log") for i in range(3)]
+
+        # Act
+        artifacts = [
+            store.store(s, str(run_dir / s.name), manifest_dir=str(run_dir))
+            for s in sources
+        ]
+
+        # Assert
+        assert [a["deduplicated"] for a in artifacts] == [False, True, True]
+        assert os.stat(run_dir / "node_0.log").st_ino == os.stat(
+            run_dir / "node_2.log"
+        ).st_ino
+        stats = store.get_stats()
+        assert stats["files"] == 3
+        assert stats["disk_bytes_saved"] == 2 * len(CONTENT)
+        assert stats["copied_bytes"] == len(CONTENT)
+        with open(run_dir / ARTIFACT_MANIFEST_FILENAME) as f:
+            manifest = [json.loads(line) for line in f]
+        assert [m["path"] for m in manifest] == [s.name for s in sources]
+
+    def test_store_moves_source(self, store, tmp_path) -> None:
+        # Arrange
+        source = _write(tmp_path / "tmp" / "messages")
+        destination = tmp_path / "run" / "messages"
+        destination.parent.mkdir()
+
+        # Act
+        store.store(source, str(destination), move_source=True)
+
+        # Assert
+        assert not source.exists()
+        assert destination.read_bytes() == CONTENT
+        stats = store.get_stats()
+        assert stats["copied_bytes"] == 0
+        assert stats["moved_bytes"] == len(CONTENT)
+
+    def test_store_refetched_source_does_not_change_blob(
+        self, store, tmp_path
+    ) -> None:
+        # Arrange
+        source = _write(tmp_path / "local_logs" / "messages")
+        first = tmp_path / "step_1" / "messages"
+        first.parent.mkdir()
+        store.store(source, str(first))
+
+        # Act
+        with open(source, "wb") as f:
+            f.write(b"rotated\n")
+
+        # Assert
+        assert first.read_bytes() == CONTENT
+
+    def test_store_falls_back_to_copy(self, store, tmp_path) -> None:
+        # Arrange
+        source = _write(tmp_path / "src" / "messages")
+        destination = tmp_path / "run" / "messages"
+        destination.parent.mkdir()
+
+        # Act
+        with patch(
+            "ctf.ctf_client.serverless_lib.artifact_store.os.link",
+            side_effect=OSError(errno.EXDEV, "Invalid cross-device link"),
+        ):
+            artifact = store.store(source, str(destination))
+
+        # Assert
+        assert not artifact["linked"]
+        assert destination.read_bytes() == CONTENT
+        assert os.stat(destination).st_nlink == 1
+
+    def test_prune(self, store, tmp_path) -> None:
+        # Arrange
+        destination = tmp_path / "run" / "messages"
+        destination.parent.mkdir()
+        store.store(_write(tmp_path / "src" / "messages"), str(destination))
+        destination.unlink()
+
+        # Act
+        pruned = store.prune()
+
+        # Assert
+        assert pruned == 1
+
+
+class TestServerlessApiArtifacts:
+    def test_save_log_files_share_blob(self, tmp_path) -> None:
+        # Arrange
+        serverless_api = ServerlessApi()
+        serverless_api.override_serverless_config(
+            str(tmp_path / "setups"), str(tmp_path / "results")
+        )
+        run_dir = serverless_api.create_test_run_result("run", 1, "desc")["data"][
+            "test_result_dir_path"
+        ]
+        source = _write(tmp_path / "fetched" / "messages")
+
+        # Act
+        action_result = serverless_api.save_action_log_file(
+            source, "1/step_1_2/var/log", "run", "2"
+        )
+        log_result = serverless_api.save_log_file(source, "1/var/log", "run")
+
+        # Assert
+        assert not action_result["error"] and not log_result["error"]
+        assert log_result["data"]["deduplicated"]
+        assert os.stat(
+            os.path.join(run_dir, "step_logs", "2", "1/step_1_2/var/log", "messages")
+        ).st_nlink == 3
+        assert serverless_api.get_artifact_storage_stats()["files"] == 2
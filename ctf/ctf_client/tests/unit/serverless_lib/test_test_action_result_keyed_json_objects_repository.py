@@ -5,12 +5,15 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-from unittest.mock import call, mock
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
-from ctf.ctf_client.serverless_lib.exceptions import (
-    DuplicateResourceException,
-    ResourceNotFoundException,
+from ctf.ctf_client.serverless_lib.exceptions import ResourceNotFoundException
+from ctf.ctf_client.serverless_lib.keyed_json_objects_index import (
+    ENCODING_JSON_ZLIB,
+    KeyedJsonObjectsIndex,
 )
 from ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository import (
     ACTION_LOGS_DIRNAME,
@@ -26,23 +29,6 @@ TEST_EXEC_ID = "test_name_1"
 TEST_ACTION_RESULT_ID = "action_name_1"
 KEY = "unique_key"
 JSON_OBJECT = {"key": {"nested_1_key": {" nested_2_key": "value_2"}}, "key_2": "hey"}
-DEFAULT_TEST_RESULTS_LOGS_DIRECTORY = "user_defined_index_dirname"
-
-TEST_ACTION_RESULT_KEYED_JSON_OBJECTS_DIRNAME = (
-    f"{DEFAULT_TEST_RESULTS_LOGS_DIRECTORY}/"
-    f"{TEST_EXEC_ID}/"
-    f"{ACTION_LOGS_DIRNAME}/"
-    f"{TEST_ACTION_RESULT_ID}/"
-    f"{ACTION_LOGS_KEYED_JSON_OBJECTS_DIRNAME}"
-)
-KEYED_JSON_OBJECTS_INDEX_DIRNAME = (
-    f"{DEFAULT_TEST_RESULTS_LOGS_DIRECTORY}/{KEYED_JSON_OBJECTS_INDEX_PATH}"
-)
-TEST_ACTION_RESULT_KEYED_JSON_OBJECT_PATH = (
-    f"{TEST_ACTION_RESULT_KEYED_JSON_OBJECTS_DIRNAME}/{KEY}.json"
-)
-TEAM_INDEX_DIRNAME = f"{KEYED_JSON_OBJECTS_INDEX_DIRNAME}/{TEAM_ID}"
-INDEXED_FILE_PATH = f"{KEYED_JSON_OBJECTS_INDEX_DIRNAME}/{TEAM_ID}/{KEY}"
 STORED_JSON_OBJECT = {
     "json_object": JSON_OBJECT,
     "key": KEY,
@@ -56,38 +42,15 @@ INDEX_STORED_JSON_OBJECT_WITH_VERSION = {
 }
 
 
-class TestTestActionResultKeyedJsonObjectsRepository:
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.mkdir"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.join"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.put_json_object"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.exists"
+@pytest.fixture
+def keyed_json_objects_repo(tmp_path):
+    return TestActionResultKeyedJsonObjectsRepository(
+        str(tmp_path / "results"), str(tmp_path / "app_data")
     )
-    def test_save_success(
-        self, mocked_exists, mocked_put_json_object, mocked_join, mocked_mkdir
-    ) -> None:
-        # Arrange
-        keyed_json_objects_repo = TestActionResultKeyedJsonObjectsRepository(
-            DEFAULT_TEST_RESULTS_LOGS_DIRECTORY, KEYED_JSON_OBJECTS_INDEX_PATH
-        )
-        mocked_exists.return_value = False
-        mocked_join.side_effect = [
-            TEST_ACTION_RESULT_KEYED_JSON_OBJECTS_DIRNAME,
-            TEST_ACTION_RESULT_KEYED_JSON_OBJECT_PATH,
-            KEYED_JSON_OBJECTS_INDEX_DIRNAME,
-            TEAM_INDEX_DIRNAME,
-            KEYED_JSON_OBJECTS_INDEX_DIRNAME,
-            INDEXED_FILE_PATH,
-            KEYED_JSON_OBJECTS_INDEX_DIRNAME,
-            INDEXED_FILE_PATH,
-        ]
 
+
+class TestTestActionResultKeyedJsonObjectsRepository:
+    def test_save_success(self, keyed_json_objects_repo, tmp_path) -> None:
         # Act
         actual_keyed_json_object = (
             keyed_json_objects_repo.save_test_action_result_keyed_json_object(
@@ -97,39 +60,58 @@ class TestTestActionResultKeyedJsonObjectsRepository:
 
         # Assert
         assert actual_keyed_json_object == INDEX_STORED_JSON_OBJECT_WITH_VERSION
-        assert mocked_put_json_object.call_count == 2
-        mocked_put_json_object.assert_has_calls(
-            [
-                call(TEST_ACTION_RESULT_KEYED_JSON_OBJECT_PATH, STORED_JSON_OBJECT),
-                call(INDEXED_FILE_PATH, INDEX_STORED_JSON_OBJECT_WITH_VERSION),
-            ]
+        action_result_path = os.path.join(
+            tmp_path,
+            "results",
+            TEST_EXEC_ID,
+            ACTION_LOGS_DIRNAME,
+            TEST_ACTION_RESULT_ID,
+            ACTION_LOGS_KEYED_JSON_OBJECTS_DIRNAME,
+            f"{KEY}.json",
         )
-        mocked_mkdir.assert_has_calls(
-            [
-                call(TEST_ACTION_RESULT_KEYED_JSON_OBJECTS_DIRNAME),
-                call(TEAM_INDEX_DIRNAME),
-            ]
+        with open(action_result_path) as f:
+            assert json.load(f) == STORED_JSON_OBJECT
+
+    def test_save_increments_version(self, keyed_json_objects_repo) -> None:
+        # Act
+        for _ in range(3):
+            keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+                TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, JSON_OBJECT
+            )
+
+        # Assert
+        actual_keyed_json_object = (
+            keyed_json_objects_repo.get_test_action_result_keyed_json_object(
+                KEY, TEAM_ID
+            )
         )
+        assert actual_keyed_json_object["version"] == 3
 
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.get_json_object"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.join"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.exists"
-    )
-    def test_get_success(
-        self, mocked_exists, mocked_join, mocked_get_json_object
-    ) -> None:
+    def test_save_concurrent_writers(self, keyed_json_objects_repo) -> None:
+        # Arrange
+        writers = 8
+        saves_per_writer = 10
+
+        def save_many(writer):
+            return [
+                keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+                    TEAM_ID, TEST_EXEC_ID, f"action_{writer}", KEY, {"i": i}
+                )["version"]
+                for i in range(saves_per_writer)
+            ]
+
+        # Act
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            versions = [v for vs in pool.map(save_many, range(writers)) for v in vs]
+
+        # Assert
+        assert sorted(versions) == list(range(1, writers * saves_per_writer + 1))
+
+    def test_get_success(self, keyed_json_objects_repo) -> None:
         # Arrange
-        keyed_json_objects_repo = TestActionResultKeyedJsonObjectsRepository(
-            DEFAULT_TEST_RESULTS_LOGS_DIRECTORY, KEYED_JSON_OBJECTS_INDEX_PATH
+        keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+            TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, JSON_OBJECT
         )
-        mocked_exists.return_value = True
-        mocked_get_json_object.return_value = STORED_JSON_OBJECT
-        mocked_join.side_effect = [INDEXED_FILE_PATH, INDEXED_FILE_PATH]
 
         # Act
         actual_keyed_json_object = (
@@ -139,28 +121,9 @@ class TestTestActionResultKeyedJsonObjectsRepository:
         )
 
         # Assert
-        assert actual_keyed_json_object == STORED_JSON_OBJECT
-        mocked_get_json_object.assert_called_with(INDEXED_FILE_PATH)
-
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.get_json_object"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.join"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.exists"
-    )
-    def test_get_not_exists(
-        self, mocked_exists, mocked_join, mocked_get_json_object
-    ) -> None:
-        # Arrange
-        keyed_json_objects_repo = TestActionResultKeyedJsonObjectsRepository(
-            DEFAULT_TEST_RESULTS_LOGS_DIRECTORY, KEYED_JSON_OBJECTS_INDEX_PATH
-        )
-        mocked_exists.return_value = False
-        mocked_join.side_effect = [INDEXED_FILE_PATH, INDEXED_FILE_PATH]
+        assert actual_keyed_json_object == INDEX_STORED_JSON_OBJECT_WITH_VERSION
 
+    def test_get_not_exists(self, keyed_json_objects_repo) -> None:
         # Act
         with pytest.raises(ResourceNotFoundException) as rnf:
             keyed_json_objects_repo.get_test_action_result_keyed_json_object(
@@ -169,58 +132,51 @@ class TestTestActionResultKeyedJsonObjectsRepository:
 
         # Assert
         assert f"{KEY} not found" in str(rnf)
-        assert not mocked_get_json_object.called
 
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.rm"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.get_json_object"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.join"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.exists"
-    )
-    def test_delete_success(
-        self, mocked_exists, mocked_join, mocked_get_json_object, mocked_rm
+    def test_get_migrates_legacy_index_file(
+        self, keyed_json_objects_repo, tmp_path
     ) -> None:
         # Arrange
-        keyed_json_objects_repo = TestActionResultKeyedJsonObjectsRepository(
-            DEFAULT_TEST_RESULTS_LOGS_DIRECTORY, KEYED_JSON_OBJECTS_INDEX_PATH
-        )
-        mocked_exists.return_value = True
-        mocked_get_json_object.return_value = STORED_JSON_OBJECT
-        mocked_join.side_effect = [INDEXED_FILE_PATH, INDEXED_FILE_PATH]
+        legacy_dir = tmp_path / "app_data" / KEYED_JSON_OBJECTS_INDEX_PATH / str(TEAM_ID)
+        legacy_dir.mkdir(parents=True)
+        legacy_object = {**INDEX_STORED_JSON_OBJECT_WITH_VERSION, "version": 7}
+        (legacy_dir / KEY).write_text(json.dumps(legacy_object))
 
         # Act
-        keyed_json_objects_repo.delete_test_action_result_keyed_json_object(
-            KEY, TEAM_ID
+        actual_keyed_json_object = (
+            keyed_json_objects_repo.get_test_action_result_keyed_json_object(
+                KEY, TEAM_ID
+            )
+        )
+        saved_keyed_json_object = (
+            keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+                TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, JSON_OBJECT
+            )
         )
 
         # Assert
-        mocked_rm.assert_has_calls([call(INDEXED_FILE_PATH)])
+        assert actual_keyed_json_object == legacy_object
+        assert saved_keyed_json_object["version"] == 8
+        assert not (legacy_dir / KEY).exists()
 
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.get_json_object"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.join"
-    )
-    @mock.patch(
-        "ctf.ctf_client.serverless_lib.test_action_result_keyed_json_objects_repository.exists"
-    )
-    def test_delete_not_exists(
-        self, mocked_exists, mocked_join, mocked_get_json_object
-    ) -> None:
+    def test_delete_success(self, keyed_json_objects_repo) -> None:
         # Arrange
-        keyed_json_objects_repo = TestActionResultKeyedJsonObjectsRepository(
-            DEFAULT_TEST_RESULTS_LOGS_DIRECTORY, KEYED_JSON_OBJECTS_INDEX_PATH
+        keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+            TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, JSON_OBJECT
         )
-        mocked_exists.return_value = False
-        mocked_join.side_effect = [INDEXED_FILE_PATH, INDEXED_FILE_PATH]
 
+        # Act
+        keyed_json_objects_repo.delete_test_action_result_keyed_json_object(
+            KEY, TEAM_ID
+        )
+
+        # Assert
+        with pytest.raises(ResourceNotFoundException):
+            keyed_json_objects_repo.get_test_action_result_keyed_json_object(
+                KEY, TEAM_ID
+            )
+
+    def test_delete_not_exists(self, keyed_json_objects_repo) -> None:
         # Act
         with pytest.raises(ResourceNotFoundException) as rnf:
             keyed_json_objects_repo.delete_test_action_result_keyed_json_object(
@@ -229,3 +185,93 @@ class TestTestActionResultKeyedJsonObjectsRepository:
 
         # Assert
         assert f"{KEY} not found" in str(rnf)
+
+    def test_list_for_test_run_execution(self, keyed_json_objects_repo) -> None:
+        # Arrange
+        for i in range(5):
+            keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+                TEAM_ID, TEST_EXEC_ID, f"action_{i % 2}", f"key_{i}", {"i": i}
+            )
+        keyed_json_objects_repo.save_test_action_result_keyed_json_object(
+            TEAM_ID, "other_test_run", TEST_ACTION_RESULT_ID, KEY, JSON_OBJECT
+        )
+
+        # Act
+        first_page = keyed_json_objects_repo.list_keyed_json_object_for_test_run_execution(
+            TEST_EXEC_ID, page=1, offset=3
+        )
+        second_page = keyed_json_objects_repo.list_keyed_json_object_for_test_run_execution(
+            TEST_EXEC_ID, page=2, offset=3
+        )
+        action_page = (
+            keyed_json_objects_repo.list_keyed_json_object_for_test_action_result(
+                TEST_EXEC_ID, "action_1"
+            )
+        )
+
+        # Assert
+        assert first_page["total_no_of_records"] == 5
+        assert first_page["total_no_of_pages"] == 2
+        assert [o["key"] for o in first_page["json_objects"]] == [
+            "key_0",
+            "key_1",
+            "key_2",
+        ]
+        assert [o["key"] for o in second_page["json_objects"]] == ["key_3", "key_4"]
+        assert [o["json_object"] for o in action_page["json_objects"]] == [
+            {"i": 1},
+            {"i": 3},
+        ]
+
+
+class TestKeyedJsonObjectsIndex:
+    def test_large_payload_compressed(self, tmp_path) -> None:
+        # Arrange
+        index = KeyedJsonObjectsIndex(str(tmp_path), compress_threshold=16)
+        json_object = {"calibration": [0.5] * 1000}
+
+        # Act
+        index.save(TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, json_object)
+
+        # Assert
+        assert index.get(TEAM_ID, KEY)["json_object"] == json_object
+        with index._transaction() as db:
+            encoding, size = db.execute(
+                "SELECT encoding, size FROM keyed_json_objects"
+            ).fetchone()
+        assert encoding == ENCODING_JSON_ZLIB
+        assert size < len(json.dumps(json_object))
+
+    def test_ids_keep_their_type(self, tmp_path) -> None:
+        # Arrange
+        index = KeyedJsonObjectsIndex(str(tmp_path))
+
+        # Act
+        saved = index.save(TEAM_ID, 42, 7, KEY, JSON_OBJECT)
+        index.save(TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, "other_key", {})
+
+        # Assert
+        for json_object in (
+            saved,
+            index.get(TEAM_ID, KEY),
+            index.list_for_test_run_execution(42)["json_objects"][0],
+            index.list_for_test_run_execution("42", "7")["json_objects"][0],
+        ):
+            assert json_object["test_run_execution_id"] == 42
+            assert json_object["test_action_result_id"] == 7
+        other = index.get(TEAM_ID, "other_key")
+        assert other["test_run_execution_id"] == TEST_EXEC_ID
+        assert other["test_action_result_id"] == TEST_ACTION_RESULT_ID
+
+    def test_deleted_database_is_recreated(self, tmp_path) -> None:
+        # Arrange
+        index = KeyedJsonObjectsIndex(str(tmp_path))
+        index.save(TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, JSON_OBJECT)
+        for name in os.listdir(tmp_path):
+            os.remove(tmp_path / name)
+
+        # Act
+        index.save(TEAM_ID, TEST_EXEC_ID, TEST_ACTION_RESULT_ID, KEY, {"new": 1})
+
+        # Assert
+        assert KeyedJsonObjectsIndex(str(tmp_path)).get(TEAM_ID, KEY)["version"] == 1
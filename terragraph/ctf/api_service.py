@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Direct HTTP client for the Terragraph api_service.
+
+Requests are sent from the runner through a persistent ssh port forward to
+the api_service host, over a keep-alive HTTP session, rather than running
+`curl` on the host for every request.
+"""
+
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from ctf.common.connections.SshPortForwarder import SshPortForwarder
+from requests.adapters import HTTPAdapter
+
+# Maximum number of concurrent (pooled) HTTP connections
+DEFAULT_MAX_CONNECTIONS = 8
+# Bytes per chunk when streaming responses
+STREAM_CHUNK_BYTES = 65536
+
+
+class ApiServiceClient:
+    def __init__(
+        self,
+        connection,
+        port: int,
+        host: str = "localhost",
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    ) -> None:
+        """Forward a local port to api_service at `host`:`port` (as seen from
+        the ssh server behind `connection`) and open an HTTP session to it.
+
+        Raises ConnectionError if the port forward cannot be established.
+        """
+        self.forwarder = SshPortForwarder(connection, host, port)
+        self.forwarder.start()
+        self.base_url = (
+            f"http://{self.forwarder.local_host}:{self.forwarder.local_port}/api"
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+
+    def request(
+        self,
+        method: str,
+        data: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Send an api_service request and return the parsed JSON response,
+        including the JSON error bodies of HTTP errors (as curl does).
+
+        Raises requests.RequestException on transport errors and HTTP errors
+        without a JSON body, and ValueError on invalid JSON.
+        """
+        response = self.session.post(
+            f"{self.base_url}/{method}", json=data if data else {}, timeout=timeout
+        )
+        if not response.ok:
+            try:
+                return response.json()
+            except ValueError:
+                response.raise_for_status()
+        return response.json()
+
+    def stream(
+        self,
+        method: str,
+        data: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = STREAM_CHUNK_BYTES,
+    ) -> Iterator[bytes]:
+        """Send an api_service request and yield the raw response body in
+        chunks, without buffering the whole response. HTTP error bodies are
+        yielded whole if they are JSON (see request()).
+        """
+        with self.session.post(
+            f"{self.base_url}/{method}",
+            json=data if data else {},
+            timeout=timeout,
+            stream=True,
+        ) as response:
+            if not response.ok:
+                try:
+                    response.json()
+                except ValueError:
+                    response.raise_for_status()
+                yield response.content
+                return
+            yield from response.iter_content(chunk_size=chunk_size)
+
+    def close(self) -> None:
+        self.session.close()
+        self.forwarder.close()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+On-node crash log scanning.
+
+All crash signatures are searched in a single `grep -E` pass over each log
+file on the node, which only returns the byte offsets of matching lines,
+a few lines of context and a checksum of the file head, instead of the logs
+themselves.
+
+The runner keeps an index of the scanned files of each node, keyed by
+(path, inode, size): unchanged files are not read again, and files that
+only grew (same inode and head checksum) are scanned from their previous
+size, so repeated inspections only read new log lines.
+
+Signatures are extended regular expressions, also matched locally with
+Python's `re` to tell which signature a line matched (so they must mean the
+same in both).
+"""
+
+import re
+import shlex
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Application logs scanned for crashes
+DEFAULT_CRASH_LOG_FILES = ["/var/log/e2e_minion/current", "/var/log/openr/current"]
+
+DEFAULT_CRASH_SIGNATURES = {
+    # C++ abort text
+    #   *** Aborted at 1602198897 (unix time) try "date -d @1602198897" if you are using GNU date ***
+    "abort": r"^\*\*\* Aborted at",
+    # glog (Google logging) abort text
+    #   *** Check failure stack trace: ***
+    "check_failure": r"^\*\*\* Check failure stack trace",
+    # Terragraph ExceptionHandler abort text
+    #   *** Terminated due to exception: ***
+    "exception": r"\*\*\* Terminated due to exception",
+}
+
+# Lines of trailing context returned after matching lines
+DEFAULT_CONTEXT_LINES = 3
+# Maximum output lines (matches and context) returned per file and scan
+MAX_OUTPUT_LINES = 2000
+# Bytes of the file head checksummed to tell appended files from new ones
+HEAD_CHECKSUM_BYTES = 65536
+
+# scan <path> <inode> <size> <head checksum>: print the file's state, and
+# the grep output of the part of the file that was not scanned yet
+_SCAN_FUNCTION = (
+    "scan() {{ "
+    + '[ -f "$1" ] || {{ echo "@missing $1"; return; }}; '
+    + 'set -- "$1" "$2" "$3" "$4" $(stat -L -c \'%i %s\' "$1"); '
+    + '[ "$5" = "$2" ] && [ "$6" = "$3" ] && {{ echo "@unchanged $1"; return; }}; '
+    + f"c=$(head -c {HEAD_CHECKSUM_BYTES} \"$1\" | cksum | cut -d' ' -f1); start=0; "
+    + '[ "$5" = "$2" ] && [ "$6" -gt "$3" ] && [ "$c" = "$4" ] && start=$3; '
+    + 'echo "@file $5 $6 $c $start $1"; '
+    + 'tail -c +$((start + 1)) "$1" | head -c $(($6 - start)) | '
+    + "grep -a -b -A{context} -E {patterns} | head -n {max_lines}; }}"
+)
+
+_GREP_LINE_RE = re.compile(r"^(\d+)([:-])(.*)$")
+
+
+class CrashMatch(NamedTuple):
+    # Byte offset of the matching line in the file
+    offset: int
+    signature: str
+    line: str
+    # Lines following the matching line
+    context: List[str]
+
+
+@dataclass
+class LogFileState:
+    """Scanned part of a log file, and the crashes found in it"""
+
+    inode: int
+    size: int
+    checksum: str
+    matches: List[CrashMatch] = field(default_factory=list)
+    # Were matches dropped (too many output lines)?
+    truncated: bool = False
+
+
+def scan_cmd(
+    paths: Iterable[str],
+    signatures: Dict[str, str],
+    known: Dict[str, LogFileState],
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    max_lines: int = MAX_OUTPUT_LINES,
+) -> str:
+    """Shell command scanning log files for all crash signatures, skipping
+    the parts of `known` files scanned before
+    """
+    patterns = " ".join(f"-e {shlex.quote(p)}" for p in signatures.values())
+    cmd = _SCAN_FUNCTION.format(
+        context=int(context_lines), patterns=patterns, max_lines=int(max_lines)
+    )
+    for path in paths:
+        state = known.get(path)
+        args = (state.inode, state.size, state.checksum) if state else (0, 0, 0)
+        cmd += f"; scan {shlex.quote(path)} {args[0]} {args[1]} {args[2]}"
+    return cmd
+
+
+def parse_scan(
+    output: str,
+    signatures: Dict[str, str],
+    known: Dict[str, LogFileState],
+    max_lines: int = MAX_OUTPUT_LINES,
+) -> Dict[str, LogFileState]:
+    """Parse the output of scan_cmd() into the new state of the scanned
+    files (extending the matches of `known` files that only grew). Missing
+    files are omitted.
+    """
+    compiled = {name: re.compile(pattern) for name, pattern in signatures.items()}
+    states: Dict[str, LogFileState] = {}
+    state: Optional[LogFileState] = None
+    start = 0
+    lines = 0
+    for line in output.splitlines():
+        if line.startswith("@"):
+            kind, _, rest = line[1:].partition(" ")
+            state = None
+            if kind == "unchanged" and rest in known:
+                states[rest] = known[rest]
+            elif kind == "file":
+                inode, size, checksum, start_str, path = rest.split(" ", 4)
+                start = int(start_str)
+                lines = 0
+                previous = known.get(path)
+                state = LogFileState(int(inode), int(size), checksum)
+                if start and previous:
+                    state.matches = list(previous.matches)
+                    state.truncated = previous.truncated
+                states[path] = state
+            continue
+        match = _GREP_LINE_RE.match(line)
+        if state is None or not match:
+            continue  # "--" group separators
+        lines += 1
+        state.truncated |= lines >= max_lines
+        offset, kind, text = match.groups()
+        if kind == ":":
+            signature = next(
+                (name for name, regex in compiled.items() if regex.search(text)), ""
+            )
+            state.matches.append(CrashMatch(start + int(offset), signature, text, []))
+        elif state.matches:
+            state.matches[-1].context.append(text)
+    return states
+
+
+class CrashLogIndex:
+    def __init__(
+        self,
+        signatures: Optional[Dict[str, str]] = None,
+        context_lines: int = DEFAULT_CONTEXT_LINES,
+    ) -> None:
+        """Index of the crashes found in the log files of each node"""
+        self.signatures = signatures or DEFAULT_CRASH_SIGNATURES
+        self.context_lines = context_lines
+        # Map from node ID to the state of its scanned log files
+        self.files: Dict[int, Dict[str, LogFileState]] = {}
+        # Protects: files
+        self.lock = threading.Lock()
+
+    def scan_cmd(self, node_id: int, paths: Iterable[str]) -> str:
+        """Shell command scanning the new parts of log files on a node"""
+        with self.lock:
+            known = dict(self.files.get(node_id, {}))
+        return scan_cmd(paths, self.signatures, known, self.context_lines)
+
+    def update(self, node_id: int, output: str) -> Dict[str, List[CrashMatch]]:
+        """Index the output of scan_cmd() on a node, and return all crashes
+        found in its log files so far
+        """
+        with self.lock:
+            known = self.files.get(node_id, {})
+            self.files[node_id] = parse_scan(output, self.signatures, known)
+            return {
+                path: state.matches
+                for path, state in self.files[node_id].items()
+                if state.matches
+            }
+
+    def invalidate(self, node_ids: Optional[List[int]] = None) -> None:
+        """Drop the index of the given nodes (all if empty)"""
+        with self.lock:
+            if node_ids:
+                for node_id in node_ids:
+                    self.files.pop(node_id, None)
+            else:
+                self.files.clear()
+
+
+def format_matches(matches: Dict[str, List[CrashMatch]]) -> str:
+    """Format the crashes found in the log files of a node"""
+    lines = []
+    for path, file_matches in matches.items():
+        for match in file_matches:
+            lines.append(f"{path} @ byte {match.offset} [{match.signature}]")
+            lines += [match.line] + match.context
+    return "\n".join(lines)
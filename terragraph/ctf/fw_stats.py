@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Helpers for segmented firmware stats capture.
+
+In segmented mode `tg2 stats driver-if` output is rotated on the node into
+gzip compressed segments (`seg_<seq>.gz`), bounded by size and age. Segments
+are numbered sequentially and only renamed into place once complete, so the
+runner can track per-node offsets and fetch just the segments it has not
+seen yet.
+
+Stat lines have the form "<timestamp>, <key>, <value>".
+"""
+
+import gzip
+import shutil
+from typing import Dict, Iterable, List, Optional
+
+FW_STATS_SEGMENTS_DIR = "fw_stats_segments"
+FW_STATS_SEGMENTS_PATH = f"/tmp/{FW_STATS_SEGMENTS_DIR}"
+FW_STATS_SEGMENT_PREFIX = "seg_"
+FW_STATS_SEGMENT_SUFFIX = ".gz"
+# Tag identifying the segment rotator process on the node
+FW_STATS_ROTATOR_TAG = "ctf_fw_stats_rotator"
+
+# Lines parsed per chunk when decoding segments
+PARSE_CHUNK_LINES = 100000
+
+# Rotate stdin into numbered gzip segments. A segment is written to a hidden
+# temporary file and renamed once it reaches max_bytes (uncompressed) or
+# max_secs, or when the input ends.
+_ROTATOR_AWK = (
+    "function open_seg() { seq++; "
+    + 'tmp = sprintf("%s/.%s%08d", dir, prefix, seq); '
+    + 'out = "gzip > " tmp; n = 0; start = systime() } '
+    + "function close_seg() { close(out); "
+    + 'if (n) system(sprintf("mv %s %s/%s%08d%s", tmp, dir, prefix, seq, suffix)); '
+    + 'else { system("rm -f " tmp); seq-- } } '
+    + "BEGIN { open_seg() } "
+    + "{ print | out; n += length($0) + 1; "
+    + "if (n >= max_bytes || systime() - start >= max_secs) { close_seg(); open_seg() } } "
+    + "END { close_seg() }"
+)
+
+
+def segment_name(seq: int) -> str:
+    return f"{FW_STATS_SEGMENT_PREFIX}{seq:08d}{FW_STATS_SEGMENT_SUFFIX}"
+
+
+def segment_seq(name: str) -> Optional[int]:
+    """Return the sequence number of a segment file name, or None"""
+    if not (
+        name.startswith(FW_STATS_SEGMENT_PREFIX)
+        and name.endswith(FW_STATS_SEGMENT_SUFFIX)
+    ):
+        return None
+    seq = name[len(FW_STATS_SEGMENT_PREFIX) : -len(FW_STATS_SEGMENT_SUFFIX)]
+    return int(seq) if seq.isdigit() else None
+
+
+def segment_count_cmd(segments_dir: str = FW_STATS_SEGMENTS_PATH) -> str:
+    """Shell command printing the number of complete segments"""
+    return f"ls {segments_dir} 2>/dev/null | grep -c '^{FW_STATS_SEGMENT_PREFIX}'"
+
+
+def start_rotator_cmd(
+    stats_cmd: str,
+    max_bytes: int,
+    max_secs: int,
+    segments_dir: str = FW_STATS_SEGMENTS_PATH,
+) -> str:
+    """Shell command running `stats_cmd` in the background, rotating its
+    output into segments that continue the existing sequence.
+    """
+    awk = (
+        f"awk -v tag={FW_STATS_ROTATOR_TAG} -v dir={segments_dir} "
+        + f"-v prefix={FW_STATS_SEGMENT_PREFIX} -v suffix={FW_STATS_SEGMENT_SUFFIX} "
+        + f"-v max_bytes={int(max_bytes)} -v max_secs={int(max_secs)} "
+        + f"-v seq=$({segment_count_cmd(segments_dir)}) '{_ROTATOR_AWK}'"
+    )
+    return (
+        f"mkdir -p {segments_dir}; "
+        + f"({stats_cmd} | {awk}) < /dev/null > /dev/null 2>&1 &"
+    )
+
+
+def stop_rotator_cmd(stats_cmd: str, timeout_iterations: int = 50) -> str:
+    """Shell command stopping `stats_cmd` and waiting (up to
+    timeout_iterations * 0.2s) for the rotator to flush its last segment.
+    """
+    # The bracket expressions keep pkill/pgrep from matching this shell
+    stats_pattern = f"[{stats_cmd[0]}]{stats_cmd[1:]}"
+    rotator_pattern = f"[{FW_STATS_ROTATOR_TAG[0]}]{FW_STATS_ROTATOR_TAG[1:]}"
+    return (
+        f"pkill -f '{stats_pattern}'; i=0; "
+        + f"while [ $i -lt {timeout_iterations} ] && pgrep -f '{rotator_pattern}' > /dev/null; "
+        + "do sleep 0.2; i=$((i+1)); done; true"
+    )
+
+
+def fetch_segments_cmd(
+    seqs: Iterable[int], archive: str, segments_dir: str = FW_STATS_SEGMENTS_PATH
+) -> str:
+    """Shell command bundling the given segments in an (uncompressed) tar
+    archive, the segments themselves are already compressed.
+    """
+    names = " ".join(segment_name(seq) for seq in sorted(seqs))
+    return f"tar -C {segments_dir} -cf {archive} {names}"
+
+
+def concat_segments(segment_paths: Iterable[str], output_path: str) -> None:
+    """Decompress segments (in order) into a single stats text file"""
+    with open(output_path, "wb") as out:
+        for segment_path in segment_paths:
+            with gzip.open(segment_path, "rb") as segment:
+                shutil.copyfileobj(segment, out)
+
+
+def parse_segments(
+    segment_paths: List[str], chunk_lines: int = PARSE_CHUNK_LINES
+) -> Dict:
+    """Decode segments into compact columnar arrays.
+
+    Segments are streamed in chunks of `chunk_lines` lines, each parsed with
+    vectorized operations. Keys are dictionary encoded.
+    Returns
+    {
+        "keys": <array of unique stat keys>,
+        "timestamp": <int64 array>,
+        "key_idx": <int32 array, index into keys>,
+        "value": <float64 array>,
+    }
+    """
+    import numpy as np
+    import pandas as pd
+
+    key_index: Dict[str, int] = {}
+    timestamps: List = []
+    key_idxs: List = []
+    values: List = []
+    for segment_path in segment_paths:
+        reader = pd.read_csv(
+            segment_path,
+            compression="gzip",
+            header=None,
+            names=["timestamp", "key", "value"],
+            skipinitialspace=True,
+            dtype=str,
+            on_bad_lines="skip",
+            chunksize=chunk_lines,
+        )
+        for chunk in reader:
+            timestamp = pd.to_numeric(chunk["timestamp"], errors="coerce")
+            value = pd.to_numeric(chunk["value"], errors="coerce")
+            valid = timestamp.notna() & value.notna() & chunk["key"].notna()
+            if not valid.any():
+                continue
+            codes, uniques = pd.factorize(chunk["key"][valid].str.strip())
+            # Map chunk local codes to global key indices
+            mapping = np.array(
+                [key_index.setdefault(key, len(key_index)) for key in uniques],
+                dtype=np.int32,
+            )
+            key_idxs.append(mapping[codes])
+            timestamps.append(timestamp[valid].to_numpy(dtype=np.int64))
+            values.append(value[valid].to_numpy(dtype=np.float64))
+
+    return {
+        "keys": np.array(list(key_index), dtype=str),
+        "timestamp": (
+            np.concatenate(timestamps) if timestamps else np.array([], dtype=np.int64)
+        ),
+        "key_idx": (
+            np.concatenate(key_idxs) if key_idxs else np.array([], dtype=np.int32)
+        ),
+        "value": np.concatenate(values) if values else np.array([], dtype=np.float64),
+    }
+
+
+def save_link_arrays(output_path: str, arrays_per_node: Dict[str, Dict]) -> None:
+    """Save parsed arrays (see parse_segments) of the nodes of a link into a
+    single compressed .npz file, with arrays named "<node>.<array>".
+    """
+    import numpy as np
+
+    np.savez_compressed(
+        output_path,
+        **{
+            f"{node}.{name}": array
+            for node, arrays in arrays_per_node.items()
+            for name, array in arrays.items()
+        },
+    )
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Batched device inventory (software/firmware versions, kernel, hardware info).
+
+One command per device prints every inventory field as a marked section,
+so a single round trip per device replaces one fan-out per field.
+Inventories can also be kept in a persistent cache keyed by the kernel boot
+ID, which changes on every reboot (and so on every image upgrade).
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+# Marker line preceding each inventory field
+SECTION_MARKER = "@@inventory "
+
+BOOT_ID_CMD = "cat /proc/sys/kernel/random/boot_id"
+# get_hw_info fields collected (unknown fields are left out)
+HW_INFO_FIELDS = ("NODE_ID", "HW_BOARD_ID", "HW_MODEL", "HW_VENDOR", "HW_REV")
+
+# Inventory field -> command printing it
+DEFAULT_SECTIONS: Dict[str, str] = {
+    "boot_id": BOOT_ID_CMD,
+    "tg_version": "cat /etc/tgversion 2>/dev/null || cat /etc/version",
+    "fw_version": "get_fw_version",
+    "kernel": "uname -r",
+    **{f"hw_info.{field}": f"get_hw_info {field}" for field in HW_INFO_FIELDS},
+}
+
+
+def inventory_cmd(sections: Dict[str, str]) -> str:
+    """Shell command printing the output of each section command after a
+    section marker. Failing section commands leave their section empty.
+    """
+    return (
+        "; ".join(
+            f'echo "{SECTION_MARKER}{name}"; ({cmd}) 2>/dev/null'
+            for name, cmd in sections.items()
+        )
+        + "; true"
+    )
+
+
+def parse_inventory(output: str) -> Dict[str, str]:
+    """Parse the output of inventory_cmd() into {field: output}.
+    Field outputs keep their trailing newline (like `cat`); empty fields
+    are left out.
+    """
+    inventory: Dict[str, str] = {}
+    name: Optional[str] = None
+    lines: List[str] = []
+
+    def flush() -> None:
+        text = "\n".join(lines).strip("\n")
+        if name is not None and text.strip():
+            inventory[name] = text + "\n"
+
+    for line in output.splitlines():
+        if line.startswith(SECTION_MARKER):
+            flush()
+            name = line[len(SECTION_MARKER) :].strip()
+            lines = []
+        else:
+            lines.append(line)
+    flush()
+    return inventory
+
+
+def inventory_rows(inventories: Dict[int, Dict[str, str]]) -> List[Dict[str, str]]:
+    """Inventory table rows (one per node), with every field as a column"""
+    fields: List[str] = []
+    for inventory in inventories.values():
+        fields += [field for field in inventory if field not in fields]
+    return [
+        {
+            "node_id": str(node_id),
+            **{field: inventories[node_id].get(field, "").strip() for field in fields},
+        }
+        for node_id in sorted(inventories)
+    ]
+
+
+class InventoryCache:
+    def __init__(self, path: str) -> None:
+        """Persistent inventory cache (a JSON file), keyed by boot ID"""
+        self.path = path
+        # Protects: entries, and writes to the cache file
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, str]] = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            # Corrupt cache: start over
+            self.entries = {}
+
+    def get(self, boot_id: str) -> Optional[Dict[str, str]]:
+        with self.lock:
+            return self.entries.get(boot_id.strip())
+
+    def put(self, inventories: List[Dict[str, str]]) -> None:
+        """Store inventories (by their "boot_id" field) and save the cache"""
+        with self.lock:
+            for inventory in inventories:
+                if inventory.get("boot_id"):
+                    self.entries[inventory["boot_id"].strip()] = inventory
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Network namespace address discovery for traffic generators.
+
+A single command per device dumps `ip -json addr` of the default namespace
+and of every named namespace. The output is indexed by
+(device, netns, interface, family), so stream configuration and pings
+resolve addresses from memory instead of one ssh round trip per lookup.
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Marker line preceding the addresses of each namespace
+NETNS_MARKER = "@@netns "
+# Dump `ip -json addr` of the default namespace ("") and all named namespaces
+NETNS_ADDRS_CMD = (
+    f'echo "{NETNS_MARKER}"; ip -json addr show; '
+    + "for ns in $(ip netns list | cut -d' ' -f1); do "
+    + f'echo "{NETNS_MARKER}$ns"; ip netns exec "$ns" ip -json addr show; done'
+)
+
+FAMILY_IPV4 = "inet"
+FAMILY_IPV6 = "inet6"
+
+# (netns, interface, family) -> addresses, in `ip addr` order
+NetnsAddrs = Dict[Tuple[str, str, str], List[str]]
+
+
+def parse_netns_addrs(output: str) -> NetnsAddrs:
+    """Parse the output of NETNS_ADDRS_CMD.
+    IPv6 addresses are limited to global scope (as CPE prefix addresses are).
+    Raises ValueError on malformed output.
+    """
+    addrs: NetnsAddrs = {}
+    netns: Optional[str] = None
+    lines: List[str] = []
+
+    def flush() -> None:
+        if netns is None or not "".join(lines).strip():
+            return
+        for link in json.loads("".join(lines)):
+            for addr in link.get("addr_info", []):
+                family = addr.get("family")
+                if family == FAMILY_IPV6 and addr.get("scope") != "global":
+                    continue
+                if family in (FAMILY_IPV4, FAMILY_IPV6):
+                    key = (netns, link["ifname"], family)
+                    addrs.setdefault(key, []).append(addr["local"])
+
+    for line in output.splitlines():
+        if line.startswith(NETNS_MARKER):
+            flush()
+            netns = line[len(NETNS_MARKER) :].strip()
+            lines = []
+        else:
+            lines.append(line)
+    flush()
+    return addrs
+
+
+class AddressMap:
+    def __init__(self) -> None:
+        """Thread safe map of discovered addresses per device"""
+        # device_id -> addresses of that device
+        self.devices: Dict[int, NetnsAddrs] = {}
+        # Protects: devices
+        self.lock = threading.Lock()
+
+    def update(self, device_id: int, addrs: NetnsAddrs) -> None:
+        with self.lock:
+            self.devices[device_id] = addrs
+
+    def invalidate(self, device_id: Optional[int] = None) -> None:
+        """Forget the addresses of a device (or of all devices), e.g. after
+        its namespaces or addresses are reconfigured
+        """
+        with self.lock:
+            if device_id is None:
+                self.devices.clear()
+            else:
+                self.devices.pop(device_id, None)
+
+    def known(self, device_id: int) -> bool:
+        with self.lock:
+            return device_id in self.devices
+
+    def lookup(
+        self, device_id: int, netns: str, intf: str, ipv6: bool = True
+    ) -> Optional[str]:
+        """Return the first address of an interface, or None if unknown"""
+        family = FAMILY_IPV6 if ipv6 else FAMILY_IPV4
+        with self.lock:
+            addrs = self.devices.get(device_id, {}).get((netns, intf, family))
+        return addrs[0] if addrs else None
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Batched node config edits.
+
+A NodeConfigTransaction collects `config_set` edits (set/bool/int/delete of
+dotted config paths) per node. On commit, the edits are reduced to the
+minimal set that changes the cached node config (`node_configs`), and each
+node gets a single `config_set` invocation with all of its edits.
+"""
+
+import shlex
+from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple
+
+# config_set options per edit type
+CONFIG_SET_STRING = "-s"
+CONFIG_SET_INT = "-i"
+CONFIG_SET_BOOL = "-b"
+CONFIG_DELETE = "-d"
+
+# Marker for missing config paths
+_MISSING = object()
+
+
+def _get_path(config: Dict, keys: List[str]) -> Any:
+    for key in keys:
+        if not isinstance(config, dict) or key not in config:
+            return _MISSING
+        config = config[key]
+    return config
+
+
+def _set_path(config: Dict, keys: List[str], value: Any) -> None:
+    for key in keys[:-1]:
+        if not isinstance(config.get(key), dict):
+            config[key] = {}
+        config = config[key]
+    config[keys[-1]] = value
+
+
+def _delete_path(config: Dict, keys: List[str]) -> None:
+    parent = _get_path(config, keys[:-1])
+    if isinstance(parent, dict):
+        parent.pop(keys[-1], None)
+
+
+class NodeConfigTransaction:
+    def __init__(self, node_configs: Dict[int, Dict]) -> None:
+        # Cached node configs to diff against (not modified)
+        self.node_configs = node_configs
+        # node_id -> {path: (option, value)}, in edit order
+        self.edits: Dict[int, Dict[str, Tuple[str, Any]]] = {}
+
+    def set(self, node_id: int, path: str, value: str) -> None:
+        self._add(node_id, path, CONFIG_SET_STRING, str(value))
+
+    def set_int(self, node_id: int, path: str, value: int) -> None:
+        self._add(node_id, path, CONFIG_SET_INT, int(value))
+
+    def set_bool(self, node_id: int, path: str, value: bool) -> None:
+        self._add(node_id, path, CONFIG_SET_BOOL, bool(value))
+
+    def delete(self, node_id: int, path: str) -> None:
+        self._add(node_id, path, CONFIG_DELETE, None)
+
+    def add_config_set_args(self, node_id: int, args: str) -> None:
+        """Add the edits of `config_set` arguments, such as
+        "-i envParams.DPDK_ENABLED 0". Raises ValueError on unsupported
+        arguments.
+        """
+        tokens = shlex.split(args)
+        while tokens:
+            option = tokens.pop(0)
+            if option == CONFIG_DELETE and tokens:
+                self.delete(node_id, tokens.pop(0))
+            elif option == CONFIG_SET_STRING and len(tokens) >= 2:
+                self.set(node_id, tokens.pop(0), tokens.pop(0))
+            elif option == CONFIG_SET_INT and len(tokens) >= 2:
+                self.set_int(node_id, tokens.pop(0), int(tokens.pop(0)))
+            elif option == CONFIG_SET_BOOL and len(tokens) >= 2:
+                path, value = tokens.pop(0), tokens.pop(0)
+                if value.lower() not in ("true", "false"):
+                    raise ValueError(f"Invalid config_set bool value: {value}")
+                self.set_bool(node_id, path, value.lower() == "true")
+            else:
+                raise ValueError(f"Unsupported config_set arguments: {args}")
+
+    def node_ids(self) -> List[int]:
+        """Nodes with at least one edit"""
+        return list(self.edits)
+
+    def diff(self, node_id: int) -> Tuple[List[str], Optional[Dict]]:
+        """Return the `config_set` arguments for the edits of `node_id` that
+        change its config, and the resulting config (None if the node config
+        is not cached, in which case every edit is kept).
+        """
+        cached = self.node_configs.get(node_id)
+        config = deepcopy(cached) if cached is not None else None
+        args: List[str] = []
+        for path, (option, value) in self.edits.get(node_id, {}).items():
+            keys = path.split(".")
+            if config is not None:
+                current = _get_path(config, keys)
+                if option == CONFIG_DELETE:
+                    if current is _MISSING:
+                        continue
+                    _delete_path(config, keys)
+                else:
+                    if current is not _MISSING and (
+                        type(current) is type(value) and current == value
+                    ):
+                        continue
+                    _set_path(config, keys, value)
+
+            if option == CONFIG_DELETE:
+                args += [option, shlex.quote(path)]
+            else:
+                if option == CONFIG_SET_BOOL:
+                    value = "true" if value else "false"
+                args += [option, shlex.quote(path), shlex.quote(str(value))]
+        return args, config
+
+    def _add(self, node_id: int, path: str, option: str, value: Any) -> None:
+        node_edits = self.edits.setdefault(node_id, {})
+        # The last edit of a path wins, and is applied after earlier edits
+        # of other paths (e.g. deleting a parent path)
+        node_edits.pop(path, None)
+        node_edits[path] = (option, value)
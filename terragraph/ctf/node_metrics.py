@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Helpers for node-resident metrics sampling.
+
+A single awk process pushed to each node samples CPU, memory and interface
+counters from /proc (and optionally the output of a stats command, such as
+`tg2 stats --dump system`) at a fixed interval. Each sample is one line
+appended to a samples file, which is rotated once (to `samples.1`) when it
+reaches a size limit, so at most two files' worth of samples are kept.
+
+Sample lines have the form
+    "<run> <seq> <time> <uptime> <name>=<value> ..."
+where <run> identifies the sampler process (its start time) and <seq>
+numbers its samples from 1. The runner tracks the last (run, seq) fetched
+from each node and only fetches newer samples. Wall clock times are
+accurate to a second, intervals between samples to the resolution of
+/proc/uptime (10ms).
+"""
+
+import shlex
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NODE_METRICS_PATH = "/tmp/ctf_node_metrics"
+NODE_METRICS_FILE = "samples"
+# Tag identifying the sampler process on the node
+NODE_METRICS_SAMPLER_TAG = "ctf_node_metrics_sampler"
+
+DEFAULT_INTERVAL_SECS = 0.5
+# Size of the samples file before it is rotated
+DEFAULT_MAX_BYTES = 1 << 20
+# Interfaces sampled by default
+DEFAULT_IFACES = "^(nic|terra|eth|vnet|tap)"
+# Samples arriving later than this many intervals after the previous one
+# start a new segment (so no rates are derived across them)
+GAP_FACTOR = 1.5
+# Sampled values older than this many sampling periods are stale (the
+# sampler may have stopped)
+STALE_FACTOR = 3
+
+# Counters converted to per second rates
+RATE_SUFFIXES = (
+    ".rx_bytes",
+    ".rx_packets",
+    ".rx_errors",
+    ".tx_bytes",
+    ".tx_packets",
+    ".tx_errors",
+)
+
+# Sample the `proc` files (and `stats_cmd` every `stats_every` samples)
+# every `interval` seconds into `file`, rotating it at `max_bytes`. CPU lines
+# report busy and total jiffies (user to steal), interface lines the
+# /proc/net/dev counters of the interfaces matching `ifaces`.
+_SAMPLER_AWK = (
+    'function uptime(  line, f) { getline line < "/proc/uptime"; '
+    + 'close("/proc/uptime"); split(line, f, " "); return f[1] } '
+    + "function sample(  out, line, f, n, i, total, name) { up = uptime(); seq++; "
+    + 'out = run " " seq " " sprintf("%.2f", base + up) " " up; '
+    + 'while ((getline line < (proc "/stat")) > 0) { '
+    + 'n = split(line, f, " "); if (f[1] !~ /^cpu/) continue; total = 0; '
+    + "for (i = 2; i <= 9 && i <= n; i++) total += f[i]; "
+    + 'out = out " " f[1] ".busy=" (total - f[5] - f[6]) " " f[1] ".total=" total } '
+    + 'close(proc "/stat"); '
+    + 'while ((getline line < (proc "/meminfo")) > 0) { split(line, f, " "); '
+    + 'if (f[1] == "MemTotal:") out = out " mem.total=" f[2]; '
+    + 'else if (f[1] == "MemAvailable:") out = out " mem.available=" f[2] } '
+    + 'close(proc "/meminfo"); '
+    + 'while ((getline line < (proc "/net/dev")) > 0) { '
+    + 'i = index(line, ":"); if (!i) continue; name = substr(line, 1, i - 1); '
+    + 'gsub(/ /, "", name); if (name !~ ifaces) continue; '
+    + 'split(substr(line, i + 1), f, " "); name = " if." name; '
+    + 'out = out name ".rx_bytes=" f[1] name ".rx_packets=" f[2] '
+    + 'name ".rx_errors=" f[3] name ".tx_bytes=" f[9] '
+    + 'name ".tx_packets=" f[10] name ".tx_errors=" f[11] } '
+    + 'close(proc "/net/dev"); '
+    + 'if (stats_cmd != "" && seq % stats_every == 0) { '
+    + 'while ((stats_cmd | getline line) > 0) { n = split(line, f, ","); '
+    + 'if (n < 3) continue; gsub(/ /, "", f[2]); gsub(/ /, "", f[3]); '
+    + 'if (nkeys && !(f[2] in keep)) continue; out = out " stat." f[2] "=" f[3] } '
+    + "close(stats_cmd) } "
+    + "print out >> file; close(file); bytes += length(out) + 1; "
+    + 'if (bytes >= max_bytes) { system("mv " file " " file ".1"); bytes = 0 } } '
+    + 'BEGIN { nkeys = split(keys, f, ","); for (i = 1; i <= nkeys; i++) keep[f[i]]; '
+    + "run = systime(); base = run - uptime(); start = uptime(); "
+    + "while (1) { sample(); d = start + seq * interval - uptime(); "
+    + 'if (d > 0) system(sprintf("sleep %.3f", d)) } }'
+)
+
+
+def samples_path(metrics_dir: str = NODE_METRICS_PATH) -> str:
+    return f"{metrics_dir}/{NODE_METRICS_FILE}"
+
+
+def start_sampler_cmd(
+    interval: float = DEFAULT_INTERVAL_SECS,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    stats_cmd: str = "",
+    stats_keys: Iterable[str] = (),
+    stats_every: int = 1,
+    ifaces: str = DEFAULT_IFACES,
+    metrics_dir: str = NODE_METRICS_PATH,
+    proc: str = "/proc",
+) -> str:
+    """Shell command starting the sampler in the background.
+
+    `stats_cmd` output lines have the form "<timestamp>, <key>, <value>";
+    only `stats_keys` are kept (all keys if empty).
+    """
+    awk = (
+        f"awk -v tag={NODE_METRICS_SAMPLER_TAG} -v proc={shlex.quote(proc)} "
+        + f"-v file={samples_path(metrics_dir)} -v interval={float(interval)} "
+        + f"-v max_bytes={int(max_bytes)} -v ifaces={shlex.quote(ifaces)} "
+        + f"-v stats_cmd={shlex.quote(stats_cmd)} "
+        + f"-v keys={shlex.quote(','.join(stats_keys))} "
+        + f"-v stats_every={max(1, int(stats_every))} '{_SAMPLER_AWK}'"
+    )
+    return f"mkdir -p {metrics_dir}; {awk} < /dev/null > /dev/null 2>&1 &"
+
+
+def stop_sampler_cmd() -> str:
+    """Shell command stopping the sampler"""
+    # The bracket expression keeps pkill from matching this shell
+    pattern = f"[{NODE_METRICS_SAMPLER_TAG[0]}]{NODE_METRICS_SAMPLER_TAG[1:]}"
+    return f"pkill -f '{pattern}'; true"
+
+
+def fetch_samples_cmd(
+    offset: Tuple[int, int] = (0, 0), metrics_dir: str = NODE_METRICS_PATH
+) -> str:
+    """Shell command printing the samples after `offset` (run, seq)"""
+    path = samples_path(metrics_dir)
+    run, seq = offset
+    return (
+        f"cat {path}.1 {path} 2>/dev/null | "
+        + f"awk '$1 > {int(run)} || ($1 == {int(run)} && $2 > {int(seq)})'"
+    )
+
+
+def sample_offset(line: str) -> Tuple[int, int]:
+    """Return the (run, seq) of a sample line"""
+    run, seq = line.split(maxsplit=2)[:2]
+    return int(run), int(seq)
+
+
+def parse_samples(
+    text: str,
+    interval: Optional[float] = None,
+    previous: Optional[str] = None,
+) -> Dict:
+    """Parse sample lines into columnar arrays.
+
+    A sample starts a new segment ("gap") when it is not the next sample of
+    the previous one's sampler run, or arrives more than GAP_FACTOR
+    intervals after it (`interval` defaults to the median interval). Rates
+    are derived from consecutive samples of a segment only (and not across
+    counter resets):
+    - "<cpu>.util": CPU utilization % of "cpu" (all cores) and "cpu<N>"
+    - "mem.util": memory utilization %
+    - "if.<iface>.<counter>/s": interface counter rates
+    If `previous` (the last sample line of the previous call) is given, the
+    first samples' rates are derived from it.
+    Returns
+    {
+        "run": <int64 array>,
+        "seq": <int64 array>,
+        "time": <float64 array, seconds since epoch>,
+        "uptime": <float64 array>,
+        "gap": <bool array>,
+        "missed": <number of samples lost (e.g. rotated before fetched)>,
+        "columns": {<name>: <float64 array, NaN if not sampled>},
+    }
+    """
+    import numpy as np
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    if previous:
+        lines.insert(0, previous)
+    runs: List[int] = []
+    seqs: List[int] = []
+    times: List[float] = []
+    uptimes: List[float] = []
+    rows: List[Dict[str, float]] = []
+    for line in lines:
+        fields = line.split()
+        try:
+            header = (int(fields[0]), int(fields[1]), float(fields[2]))
+            up = float(fields[3])
+        except (IndexError, ValueError):
+            continue  # truncated line
+        runs.append(header[0])
+        seqs.append(header[1])
+        times.append(header[2])
+        uptimes.append(up)
+        row: Dict[str, float] = {}
+        for field in fields[4:]:
+            name, _, value = field.partition("=")
+            try:
+                row[name] = float(value)
+            except ValueError:
+                pass
+        rows.append(row)
+
+    run = np.array(runs, dtype=np.int64)
+    seq = np.array(seqs, dtype=np.int64)
+    uptime = np.array(uptimes, dtype=np.float64)
+    names = sorted({name for row in rows for name in row})
+    columns = {
+        name: np.array([row.get(name, np.nan) for row in rows], dtype=np.float64)
+        for name in names
+    }
+
+    consecutive = (run[1:] == run[:-1]) & (seq[1:] == seq[:-1] + 1)
+    dt = np.diff(uptime)
+    if interval is None:
+        interval = float(np.median(dt[consecutive])) if consecutive.any() else 0.0
+    gap = np.ones(len(rows), dtype=bool)
+    gap[1:] = ~consecutive | (dt <= 0)
+    if interval > 0:
+        gap[1:] |= dt > GAP_FACTOR * interval
+    same_run = run[1:] == run[:-1]
+    missed = int(np.sum(np.maximum(seq[1:] - seq[:-1] - 1, 0)[same_run]))
+
+    def delta(values):
+        diff = np.full(len(values), np.nan)
+        diff[1:] = np.diff(values)
+        diff[gap | ~(diff >= 0)] = np.nan
+        return diff
+
+    derived = {}
+    interval_secs = np.full(len(rows), np.nan)
+    interval_secs[1:] = dt
+    for name, values in columns.items():
+        if name.endswith(".busy") and f"{name[:-5]}.total" in columns:
+            total = delta(columns[f"{name[:-5]}.total"])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                derived[f"{name[:-5]}.util"] = np.where(
+                    total > 0, 100 * delta(values) / total, np.nan
+                )
+        elif name.endswith(RATE_SUFFIXES):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                derived[f"{name}/s"] = delta(values) / interval_secs
+    if "mem.total" in columns and "mem.available" in columns:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            derived["mem.util"] = 100 * (
+                1 - columns["mem.available"] / columns["mem.total"]
+            )
+    columns.update(derived)
+
+    start = 1 if previous and rows else 0
+    return {
+        "run": run[start:],
+        "seq": seq[start:],
+        "time": np.array(times, dtype=np.float64)[start:],
+        "uptime": uptime[start:],
+        "gap": gap[start:],
+        "missed": missed,
+        "columns": {name: values[start:] for name, values in columns.items()},
+    }
+
+
+def concat_samples(parsed: List[Dict]) -> Dict:
+    """Concatenate parsed samples (see parse_samples) in order"""
+    import numpy as np
+
+    names = sorted({name for p in parsed for name in p["columns"]})
+    return {
+        "run": np.concatenate([p["run"] for p in parsed] or [np.array([], np.int64)]),
+        "seq": np.concatenate([p["seq"] for p in parsed] or [np.array([], np.int64)]),
+        "time": np.concatenate([p["time"] for p in parsed] or [np.array([])]),
+        "uptime": np.concatenate([p["uptime"] for p in parsed] or [np.array([])]),
+        "gap": np.concatenate([p["gap"] for p in parsed] or [np.array([], bool)]),
+        "missed": sum(p["missed"] for p in parsed),
+        "columns": {
+            name: np.concatenate(
+                [p["columns"].get(name, np.full(len(p["seq"]), np.nan)) for p in parsed]
+            )
+            for name in names
+        },
+    }
+
+
+def latest_value(
+    samples: Dict, name: str, since: Optional[float] = None
+) -> Optional[float]:
+    """Return the last sampled value of a column, or None (also if it was
+    sampled before the wall clock time `since`)
+    """
+    import numpy as np
+
+    values = samples["columns"].get(name)
+    if values is None:
+        return None
+    sampled = ~np.isnan(values)
+    if not sampled.any():
+        return None
+    last = np.flatnonzero(sampled)[-1]
+    if since is not None and samples["time"][last] < since:
+        return None
+    return float(values[last])
+
+
+def summary_row(node_id: int, samples: Dict) -> Dict[str, str]:
+    """Summarize the samples of a node as a table row"""
+    import numpy as np
+
+    def stat(name: str, fn) -> str:
+        values = samples["columns"].get(name)
+        if values is None or np.isnan(values).all():
+            return ""
+        return f"{fn(values[~np.isnan(values)]):.1f}"
+
+    return {
+        "node_id": str(node_id),
+        "samples": str(len(samples["seq"])),
+        "gaps": str(max(int(np.sum(samples["gap"])) - 1, 0)),
+        "missed": str(samples["missed"]),
+        "cpu p50 %": stat("cpu.util", np.median),
+        "cpu max %": stat("cpu.util", np.max),
+        "mem max %": stat("mem.util", np.max),
+    }
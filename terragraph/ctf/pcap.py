@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+On-device packet capture and compact pcap summarization.
+
+Captures run `tcpdump -w` with a header-only snaplen into a ring buffer of
+files (`-C`/`-W`), so disk usage on the device stays bounded however long a
+test runs. Fetched ring files are read in chunks of records; per chunk, the
+record headers and the first HEADER_BYTES of every packet are gathered into
+numpy arrays and decoded column-wise (DSCP, protocol, addresses, ports).
+Chunks are folded into per-flow and per-DSCP counters and time series, so
+memory stays bounded by the chunk size, not the capture size.
+"""
+
+import ipaddress
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# tcpdump snaplen: enough for L2 + IPv6 (with an extension header) + L4 ports
+DEFAULT_SNAPLEN = 128
+# Ring buffer file size (tcpdump -C, in units of 1,000,000 bytes) and count
+DEFAULT_FILE_SIZE_MB = 10
+DEFAULT_FILE_COUNT = 10
+# Bytes of each packet decoded (VLAN + IPv4 with options + L4 ports)
+HEADER_BYTES = 96
+# Bytes read from a pcap file per chunk
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+# Time series bin width in seconds
+DEFAULT_INTERVAL = 1.0
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAP_HEADER_BYTES = 24
+RECORD_HEADER_BYTES = 16
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_VLAN = 0x8100
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+
+IP_PROTOS = {1: "icmp", 6: "tcp", 17: "udp", 58: "icmpv6"}
+
+# Flow key byte layout: src (16), dst (16), proto (1), sport (2), dport (2),
+# dscp (1). IPv4 addresses are stored IPv4-mapped.
+_FLOW_KEY_BYTES = 38
+
+
+def capture_path(interface: str, name: str) -> str:
+    """On-device path prefix of the ring buffer files of a capture"""
+    return f"/tmp/ctf_pcap_{interface}_{name}.pcap"
+
+
+def start_capture_cmd(
+    interface: str,
+    path: str,
+    netns: str = "",
+    snaplen: int = DEFAULT_SNAPLEN,
+    file_size_mb: int = DEFAULT_FILE_SIZE_MB,
+    file_count: int = DEFAULT_FILE_COUNT,
+    capture_filter: str = "",
+) -> str:
+    """Shell command starting a background ring buffer capture on
+    `interface` (in network namespace `netns`, if given) into
+    `path`0..`path`<file_count - 1>
+    """
+    netns_exec = f"ip netns exec {netns} " if netns else ""
+    return (
+        f"rm -f {path}*; {netns_exec}nohup tcpdump -i {interface} -n -s {snaplen} "
+        + f"-C {file_size_mb} -W {file_count} -Z root -w {path} {capture_filter} "
+        + f"> {path}.log 2>&1 &"
+    )
+
+
+def stop_capture_cmd(path: str, archive: str, timeout: int = 10) -> str:
+    """Shell command stopping the capture writing to `path`, waiting for
+    tcpdump to flush its output and exit, then moving the ring buffer files
+    into the tar `archive`
+    """
+    # Bracket the first letter so the pattern does not match this shell
+    pattern = f"[t]cpdump .*-w {path}( |$)"
+    directory, name = path.rsplit("/", 1)
+    return (
+        f"pkill -INT -f '{pattern}'; "
+        + f"for i in $(seq {timeout * 5}); do "
+        + f"pgrep -f '{pattern}' > /dev/null || break; sleep 0.2; done; "
+        + f"cd {directory} && tar -cf {archive} {name}[0-9]* && "
+        + f"rm -f {name}[0-9]* {name}.log"
+    )
+
+
+def _open_pcap(f: BinaryIO) -> Tuple[str, float, int]:
+    """Read the pcap global header.
+    Returns (struct byte order, timestamp fraction scale, link type)
+    """
+    header = f.read(PCAP_HEADER_BYTES)
+    if len(header) < PCAP_HEADER_BYTES:
+        raise ValueError("truncated pcap header")
+    for endian in ("<", ">"):
+        magic = struct.unpack_from(f"{endian}I", header)[0]
+        if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            scale = 1e-6 if magic == PCAP_MAGIC_US else 1e-9
+            linktype = struct.unpack_from(f"{endian}I", header, 20)[0] & 0xFFFF
+            return endian, scale, linktype
+    raise ValueError("not a pcap file (pcapng is not supported)")
+
+
+def first_timestamp(path: str) -> Optional[float]:
+    """Timestamp of the first packet of a pcap file, or None if empty"""
+    with open(path, "rb") as f:
+        endian, scale, _ = _open_pcap(f)
+        record = f.read(RECORD_HEADER_BYTES)
+    if len(record) < RECORD_HEADER_BYTES:
+        return None
+    ts_sec, ts_frac = struct.unpack_from(f"{endian}II", record)
+    return ts_sec + ts_frac * scale
+
+
+def order_ring_files(paths: List[str]) -> List[str]:
+    """Order ring buffer files by their first packet (the ring wraps, so file
+    numbers do not give the capture order); empty files are dropped
+    """
+    first = [(first_timestamp(path), path) for path in paths]
+    return [path for ts, path in sorted((t, p) for t, p in first if t is not None)]
+
+
+def read_pcap(
+    path: str, chunk_bytes: int = READ_CHUNK_BYTES
+) -> Iterator[Dict[str, Any]]:
+    """Read a pcap file in chunks of complete records.
+    Yields, per chunk,
+    {
+        "timestamp": <float64 array>,
+        "length": <uint32 array, original packet length>,
+        "headers": <uint8 array (packets, HEADER_BYTES), zero padded>,
+        "linktype": <pcap link type>,
+    }
+    A truncated trailing record (capture still being written) is ignored.
+    """
+    with open(path, "rb") as f:
+        endian, scale, linktype = _open_pcap(f)
+        record = np.dtype(
+            [
+                ("ts_sec", f"{endian}u4"),
+                ("ts_frac", f"{endian}u4"),
+                ("caplen", f"{endian}u4"),
+                ("length", f"{endian}u4"),
+            ]
+        )
+        caplen_at = struct.Struct(f"{endian}I").unpack_from
+        pending = b""
+        while True:
+            data = f.read(chunk_bytes)
+            buf = pending + data
+            # Records are variable length: walk the record offsets, then
+            # gather all fields with vectorized indexing
+            offsets: List[int] = []
+            pos = 0
+            while pos + RECORD_HEADER_BYTES <= len(buf):
+                end = pos + RECORD_HEADER_BYTES + caplen_at(buf, pos + 8)[0]
+                if end > len(buf):
+                    break
+                offsets.append(pos)
+                pos = end
+            pending = buf[pos:]
+            if offsets:
+                yield _gather_records(buf, np.array(offsets), record, scale, linktype)
+            if not data:
+                return
+
+
+def _gather_records(
+    buf: bytes, offsets: np.ndarray, record: np.dtype, scale: float, linktype: int
+) -> Dict[str, Any]:
+    data = np.frombuffer(buf, dtype=np.uint8)
+    headers = data[offsets[:, None] + np.arange(RECORD_HEADER_BYTES)]
+    headers = np.ascontiguousarray(headers).view(record).ravel()
+
+    columns = np.arange(HEADER_BYTES)
+    index = offsets[:, None] + RECORD_HEADER_BYTES + columns
+    valid = columns < headers["caplen"][:, None].astype(np.int64)
+    packets = np.where(valid, data[np.minimum(index, len(data) - 1)], 0)
+    return {
+        "timestamp": headers["ts_sec"] + headers["ts_frac"] * scale,
+        "length": headers["length"].astype(np.uint32),
+        "headers": packets.astype(np.uint8),
+        "linktype": linktype,
+    }
+
+
+def decode_headers(headers: np.ndarray, linktype: int) -> Dict[str, np.ndarray]:
+    """Decode IP headers of packets (rows of `headers`), column-wise.
+    Returns {"ip", "dscp", "proto", "src", "dst", "sport", "dport"}, where
+    "ip" masks IP packets (other fields are meaningless for non-IP packets),
+    and "src"/"dst" are (packets, 16) arrays of IPv6 or IPv4-mapped addresses.
+    """
+    rows = np.arange(len(headers))[:, None]
+    width = headers.shape[1]
+
+    def at(offset: np.ndarray, count: int = 1) -> np.ndarray:
+        index = np.minimum(offset[:, None] + np.arange(count), width - 1)
+        return headers[rows, index].astype(np.int64)
+
+    def u16(offset: np.ndarray) -> np.ndarray:
+        pair = at(offset, 2)
+        return (pair[:, 0] << 8) | pair[:, 1]
+
+    n = len(headers)
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = u16(np.full(n, 12))
+        vlan = ethertype == ETHERTYPE_VLAN
+        l3 = np.where(vlan, 18, 14)
+        ethertype = np.where(vlan, u16(np.full(n, 16)), ethertype)
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = u16(np.full(n, 14))
+        l3 = np.full(n, 16)
+    elif linktype == LINKTYPE_RAW:
+        l3 = np.zeros(n, dtype=np.int64)
+        version = at(l3)[:, 0] >> 4
+        ethertype = np.where(version == 6, ETHERTYPE_IPV6, ETHERTYPE_IPV4)
+    else:
+        raise ValueError(f"unsupported pcap link type {linktype}")
+
+    first = at(l3, 2)
+    version = first[:, 0] >> 4
+    ipv4 = (ethertype == ETHERTYPE_IPV4) & (version == 4)
+    ipv6 = (ethertype == ETHERTYPE_IPV6) & (version == 6)
+
+    traffic_class = np.where(
+        ipv4, first[:, 1], ((first[:, 0] & 0x0F) << 4) | (first[:, 1] >> 4)
+    )
+    proto = np.where(ipv4, at(l3 + 9)[:, 0], at(l3 + 6)[:, 0])
+    l4 = np.where(ipv4, l3 + (first[:, 0] & 0x0F) * 4, l3 + 40)
+    has_ports = np.isin(proto, (6, 17))
+
+    mapped = np.zeros((n, 12), dtype=np.int64)
+    mapped[:, 10:] = 0xFF
+    src = np.where(ipv4[:, None], np.hstack((mapped, at(l3 + 12, 4))), at(l3 + 8, 16))
+    dst = np.where(ipv4[:, None], np.hstack((mapped, at(l3 + 16, 4))), at(l3 + 24, 16))
+    return {
+        "ip": ipv4 | ipv6,
+        "dscp": traffic_class >> 2,
+        "proto": proto,
+        "src": src.astype(np.uint8),
+        "dst": dst.astype(np.uint8),
+        "sport": np.where(has_ports, u16(l4), 0),
+        "dport": np.where(has_ports, u16(l4 + 2), 0),
+    }
+
+
+def _flow_keys(fields: Dict[str, np.ndarray]) -> np.ndarray:
+    """Pack decoded fields into one fixed size key per packet"""
+    keys = np.empty((len(fields["dscp"]), _FLOW_KEY_BYTES), dtype=np.uint8)
+    keys[:, :16] = fields["src"]
+    keys[:, 16:32] = fields["dst"]
+    keys[:, 32] = fields["proto"]
+    keys[:, 33:35] = np.stack((fields["sport"] >> 8, fields["sport"] & 0xFF), axis=1)
+    keys[:, 35:37] = np.stack((fields["dport"] >> 8, fields["dport"] & 0xFF), axis=1)
+    keys[:, 37] = fields["dscp"]
+    return keys.view(f"V{_FLOW_KEY_BYTES}").ravel()
+
+
+def _flow_fields(key: bytes) -> Dict[str, Any]:
+    def address(raw: bytes) -> str:
+        ip = ipaddress.IPv6Address(raw)
+        return str(ip.ipv4_mapped or ip)
+
+    proto = key[32]
+    return {
+        "src": address(key[:16]),
+        "dst": address(key[16:32]),
+        "proto": IP_PROTOS.get(proto, str(proto)),
+        "sport": int.from_bytes(key[33:35], "big"),
+        "dport": int.from_bytes(key[35:37], "big"),
+        "dscp": key[37],
+    }
+
+
+class _GroupStats:
+    """Packet, byte and inter-arrival counters of a group of packets"""
+
+    def __init__(self) -> None:
+        self.packets = 0
+        self.bytes = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.gaps = 0
+        self.gap_sum = 0.0
+        self.gap_sum_sq = 0.0
+        self.gap_max = 0.0
+
+    def row(self) -> Dict[str, Any]:
+        duration = (self.last - self.first) if self.packets > 1 else 0.0
+        gap_mean = self.gap_sum / self.gaps if self.gaps else 0.0
+        gap_var = self.gap_sum_sq / self.gaps - gap_mean**2 if self.gaps else 0.0
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "duration s": round(duration, 3),
+            "pps": round(self.packets / duration, 2) if duration else None,
+            "Mbps": round(self.bytes * 8 / duration / 1e6, 3) if duration else None,
+            "inter-arrival mean ms": round(gap_mean * 1e3, 3),
+            "inter-arrival stddev ms": round(max(gap_var, 0.0) ** 0.5 * 1e3, 3),
+            "inter-arrival max ms": round(self.gap_max * 1e3, 3),
+        }
+
+
+def _accumulate(
+    groups: Dict[Any, _GroupStats],
+    keys: np.ndarray,
+    timestamp: np.ndarray,
+    length: np.ndarray,
+) -> None:
+    """Fold a chunk of packets into per-key stats (packets in time order)"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    group = inverse[order]
+    ts = timestamp[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    ends = np.r_[starts[1:], len(group)] - 1
+
+    gaps = np.diff(ts)
+    same = group[1:] == group[:-1]
+    gap_group = group[1:][same]
+    gaps = gaps[same]
+    count = len(unique)
+    packets = np.bincount(group, minlength=count)
+    sizes = np.bincount(group, weights=length[order], minlength=count)
+    gap_count = np.bincount(gap_group, minlength=count)
+    gap_sum = np.bincount(gap_group, weights=gaps, minlength=count)
+    gap_sum_sq = np.bincount(gap_group, weights=gaps**2, minlength=count)
+    gap_max = np.zeros(count)
+    np.maximum.at(gap_max, gap_group, gaps)
+
+    for i, key in enumerate(unique.tolist()):
+        stats = groups.setdefault(key, _GroupStats())
+        first, last = float(ts[starts[i]]), float(ts[ends[i]])
+        if stats.last is not None:
+            # Gap spanning the previous chunk
+            gap = first - stats.last
+            stats.gaps += 1
+            stats.gap_sum += gap
+            stats.gap_sum_sq += gap**2
+            stats.gap_max = max(stats.gap_max, gap)
+        else:
+            stats.first = first
+        stats.last = last
+        stats.packets += int(packets[i])
+        stats.bytes += int(sizes[i])
+        stats.gaps += int(gap_count[i])
+        stats.gap_sum += float(gap_sum[i])
+        stats.gap_sum_sq += float(gap_sum_sq[i])
+        stats.gap_max = max(stats.gap_max, float(gap_max[i]))
+
+
+class PcapSummary:
+    def __init__(self, interval: float = DEFAULT_INTERVAL) -> None:
+        """Per-flow and per-DSCP summary of captured packets, with per-DSCP
+        time series in bins of `interval` seconds.
+        Feed packets in time order, with add_file() or add_chunk().
+        """
+        self.interval = interval
+        self.start: Optional[float] = None
+        self.non_ip_packets = 0
+        self.flows: Dict[bytes, _GroupStats] = {}
+        self.dscps: Dict[int, _GroupStats] = {}
+        # (dscp, time bin) -> [packets, bytes]
+        self.series: Dict[Tuple[int, int], List[int]] = {}
+
+    def add_file(self, path: str, chunk_bytes: int = READ_CHUNK_BYTES) -> None:
+        for chunk in read_pcap(path, chunk_bytes):
+            self.add_chunk(chunk)
+
+    def add_chunk(self, chunk: Dict[str, Any]) -> None:
+        """Add a chunk of packets (see read_pcap)"""
+        fields = decode_headers(chunk["headers"], chunk["linktype"])
+        ip = fields["ip"]
+        self.non_ip_packets += int(np.count_nonzero(~ip))
+        if not ip.any():
+            return
+        fields = {name: values[ip] for name, values in fields.items()}
+        timestamp = chunk["timestamp"][ip]
+        length = chunk["length"][ip]
+        if self.start is None:
+            self.start = float(timestamp[0])
+
+        _accumulate(self.flows, _flow_keys(fields), timestamp, length)
+        _accumulate(self.dscps, fields["dscp"], timestamp, length)
+
+        bins = ((timestamp - self.start) // self.interval).astype(np.int64)
+        series_keys = np.stack((fields["dscp"], bins), axis=1)
+        unique, inverse = np.unique(series_keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        packets = np.bincount(inverse, minlength=len(unique))
+        sizes = np.bincount(inverse, weights=length, minlength=len(unique))
+        for (dscp, time_bin), n, size in zip(unique.tolist(), packets, sizes):
+            counts = self.series.setdefault((dscp, time_bin), [0, 0])
+            counts[0] += int(n)
+            counts[1] += int(size)
+
+    def dscp_rows(self) -> List[Dict[str, Any]]:
+        return [{"dscp": dscp, **self.dscps[dscp].row()} for dscp in sorted(self.dscps)]
+
+    def flow_rows(self) -> List[Dict[str, Any]]:
+        rows = [
+            {**_flow_fields(key), **stats.row()} for key, stats in self.flows.items()
+        ]
+        return sorted(rows, key=lambda row: -row["packets"])
+
+    def series_rows(self) -> List[Dict[str, Any]]:
+        """Per time bin packet rates, with one "dscp <n> pps" key per DSCP"""
+        rows: Dict[int, Dict[str, Any]] = {}
+        for (dscp, time_bin), (packets, _size) in sorted(self.series.items()):
+            row = rows.setdefault(
+                time_bin,
+                {
+                    "time s": time_bin * self.interval,
+                    **{f"dscp {d} pps": 0 for d in self.dscps},
+                },
+            )
+            row[f"dscp {dscp} pps"] = packets / self.interval
+        return [rows[time_bin] for time_bin in sorted(rows)]
+
+    def ctf_json_data(self, data_source: str) -> Dict[str, List]:
+        """Build CTF tables and the per-DSCP packet rate chart"""
+        dscp_rows = self.dscp_rows()
+        flow_rows = self.flow_rows()
+        dscp_source = f"{data_source} DSCP"
+        flow_source = f"{data_source} flows"
+        series_source = f"{data_source} DSCP rates"
+        json_data: Dict[str, List] = {
+            "ctf_tables": [],
+            "ctf_charts": [],
+            "ctf_data": [],
+        }
+        if dscp_rows:
+            json_data["ctf_tables"].append(
+                {
+                    "title": "Packet Capture DSCP Summary",
+                    "columns": ",".join(dscp_rows[0].keys()),
+                    "data_source_list": dscp_source,
+                }
+            )
+            json_data["ctf_data"].append(
+                {"data_source": dscp_source, "data_list": dscp_rows}
+            )
+        if flow_rows:
+            json_data["ctf_tables"].append(
+                {
+                    "title": "Packet Capture Flow Summary",
+                    "columns": ",".join(flow_rows[0].keys()),
+                    "data_source_list": flow_source,
+                }
+            )
+            json_data["ctf_data"].append(
+                {"data_source": flow_source, "data_list": flow_rows}
+            )
+        if self.series:
+            json_data["ctf_charts"].append(
+                {
+                    "title": "Packet Capture Rate per DSCP",
+                    "axes": {
+                        "x_axis1": {
+                            "key": "time s",
+                            "options": {
+                                "label": "Time s",
+                                "type": "linear",
+                                "position": "bottom",
+                            },
+                        },
+                        "y_axis1": {
+                            "series_list": [
+                                {
+                                    "data_source": series_source,
+                                    "key": f"dscp {dscp} pps",
+                                    "label": f"DSCP {dscp}",
+                                }
+                                for dscp in sorted(self.dscps)
+                            ],
+                            "options": {"label": "packets/s", "fill": "false"},
+                        },
+                    },
+                    "chart_type": "static",
+                    "options": {"display_type": "line", "tension": "false"},
+                }
+            )
+            json_data["ctf_data"].append(
+                {"data_source": series_source, "data_list": self.series_rows()}
+            )
+        return json_data
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Per-packet ping latency analysis.
+
+Every reply line of ping output is parsed into compact numeric arrays
+(seq, rtt, ttl, timestamp), from which latency percentiles, jitter and
+loss bursts are computed with vectorized operations. Reply lines are
+matched one at a time into typed buffers, so memory stays proportional to
+the number of replies (~17 bytes per packet), not to the output size.
+
+Supported reply formats (iputils and busybox, with or without `-D`):
+    [1602198897.123456] 64 bytes from 2001::1: icmp_seq=1 ttl=64 time=0.045 ms
+    64 bytes from 10.0.0.1: seq=0 ttl=64 time=0.123 ms
+"""
+
+import re
+from array import array
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+
+import numpy as np
+
+# Percentiles reported for every ping
+LATENCY_PERCENTILES = (50, 90, 99, 99.9)
+# Number of points of the latency CDF chart
+CDF_POINTS = 100
+# Number of bins of the latency histogram chart
+HISTOGRAM_BINS = 50
+# icmp_seq is a 16 bit counter
+SEQ_MODULO = 1 << 16
+
+_REPLY_RE = re.compile(
+    r"^(?:\[(?P<ts>[\d.]+)\] )?\d+ bytes from .*?"
+    + r"(?P<icmp>icmp_)?seq=(?P<seq>\d+) (?:ttl|hlim)=(?P<ttl>\d+) "
+    + r"time=(?P<rtt>[\d.]+) ms(?P<dup> \(DUP!\))?",
+    re.MULTILINE,
+)
+_TRANSMITTED_RE = re.compile(r"(\d+) packets transmitted")
+
+
+def parse_ping_replies(output: str) -> Dict[str, Any]:
+    """Parse the reply lines of ping output into arrays.
+
+    Duplicate replies are dropped, and sequence numbers are unwrapped so
+    they keep increasing past 65535.
+    Returns
+    {
+        "seq": <int64 array>,
+        "rtt": <float32 array, ms>,
+        "ttl": <uint8 array>,
+        "timestamp": <float64 array, NaN without `-D`>,
+        "seq_base": <first sequence number ping uses (0 or 1)>,
+        "transmitted": <packets transmitted, or None if not reported>,
+    }
+    """
+    seq = array("l")
+    rtt = array("f")
+    ttl = array("B")
+    timestamp = array("d")
+    seq_base = 0
+    for match in _REPLY_RE.finditer(output):
+        if match.group("dup"):
+            continue
+        seq.append(int(match.group("seq")))
+        rtt.append(float(match.group("rtt")))
+        ttl.append(min(int(match.group("ttl")), 255))
+        ts = match.group("ts")
+        timestamp.append(float(ts) if ts else np.nan)
+        if match.group("icmp"):
+            seq_base = 1
+
+    transmitted = _TRANSMITTED_RE.search(output)
+    return {
+        "seq": _unwrap_seq(np.frombuffer(seq, dtype=np.dtype(seq.typecode))),
+        "rtt": np.frombuffer(rtt, dtype=np.float32),
+        "ttl": np.frombuffer(ttl, dtype=np.uint8),
+        "timestamp": np.frombuffer(timestamp, dtype=np.float64),
+        "seq_base": seq_base,
+        "transmitted": int(transmitted.group(1)) if transmitted else None,
+    }
+
+
+def _unwrap_seq(seq: np.ndarray) -> np.ndarray:
+    seq = seq.astype(np.int64)
+    if len(seq) < 2:
+        return seq
+    wraps = np.cumsum(np.diff(seq) < -(SEQ_MODULO // 2))
+    seq[1:] += wraps * SEQ_MODULO
+    return seq
+
+
+def loss_bursts(replies: Dict[str, Any]) -> np.ndarray:
+    """Return the lengths of the runs of consecutive lost packets"""
+    index = replies["seq"] - replies["seq_base"]
+    transmitted = replies["transmitted"]
+    if transmitted is None:
+        transmitted = int(index.max()) + 1 if len(index) else 0
+    received = np.zeros(transmitted, dtype=bool)
+    received[index[(index >= 0) & (index < transmitted)]] = True
+
+    # Boundaries of the runs of lost packets
+    edges = np.diff(np.concatenate(([0], (~received).astype(np.int8), [0])))
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def latency_stats(replies: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Compute latency percentiles, jitter and loss statistics (in ms / %)"""
+    rtt = replies["rtt"].astype(np.float64)
+    bursts = loss_bursts(replies)
+    transmitted = replies["transmitted"] or len(rtt)
+    stats: Dict[str, Optional[float]] = {
+        "transmitted": transmitted,
+        "received": len(rtt),
+        "loss %": 100.0 * (1 - len(rtt) / transmitted) if transmitted else None,
+        "loss bursts": len(bursts),
+        "max loss burst": int(bursts.max()) if len(bursts) else 0,
+    }
+    if not len(rtt):
+        return stats
+
+    # Replies ordered by sequence number
+    rtt_by_seq = rtt[np.argsort(replies["seq"], kind="stable")]
+    stats.update(
+        {
+            "min": float(rtt.min()),
+            "avg": float(rtt.mean()),
+            "max": float(rtt.max()),
+            "stddev": float(rtt.std()),
+            # Mean delay variation between consecutive replies (RFC 3550)
+            "jitter": (
+                float(np.abs(np.diff(rtt_by_seq)).mean()) if len(rtt) > 1 else 0.0
+            ),
+        }
+    )
+    for percentile, value in zip(
+        LATENCY_PERCENTILES, np.percentile(rtt, LATENCY_PERCENTILES)
+    ):
+        stats[f"p{percentile:g}"] = float(value)
+    return stats
+
+
+def latency_cdf(rtt: np.ndarray, points: int = CDF_POINTS) -> List[Dict[str, float]]:
+    """Latency CDF with a bounded number of points, with extra resolution
+    in the tail (p99.9, p99.99)
+    """
+    if not len(rtt):
+        return []
+    percentiles = np.unique(
+        np.concatenate((np.linspace(0, 100, points), [99.9, 99.99]))
+    )
+    values = np.percentile(rtt.astype(np.float64), percentiles)
+    return [
+        {"rtt ms": round(float(v), 3), "percentile": round(float(p), 2)}
+        for p, v in zip(percentiles, values)
+    ]
+
+
+def latency_histogram(
+    rtt: np.ndarray, bins: int = HISTOGRAM_BINS
+) -> List[Dict[str, float]]:
+    if not len(rtt):
+        return []
+    counts, edges = np.histogram(rtt, bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return [
+        {"rtt ms": round(float(c), 3), "packets": int(n)}
+        for c, n in zip(centers, counts)
+    ]
+
+
+def latency_ctf_json_data(
+    replies: Dict[str, Any], stats: Dict[str, Optional[float]], data_source: str
+) -> Dict[str, List]:
+    """Build CTF tables, charts (CDF and histogram) and data for a ping"""
+    stats_source = f"{data_source} latency"
+    cdf_source = f"{data_source} latency CDF"
+    histogram_source = f"{data_source} latency histogram"
+
+    def chart(title: str, source: str, y_key: str) -> Dict:
+        return {
+            "title": title,
+            "axes": {
+                "x_axis1": {
+                    "key": "rtt ms",
+                    "options": {
+                        "label": "RTT ms",
+                        "type": "linear",
+                        "position": "bottom",
+                    },
+                },
+                "y_axis1": {
+                    "series_list": [
+                        {"data_source": source, "key": y_key, "label": data_source}
+                    ],
+                    "options": {"label": y_key, "fill": "false"},
+                },
+            },
+            "chart_type": "static",
+            "options": {"display_type": "line", "tension": "false"},
+        }
+
+    return {
+        "ctf_tables": [
+            {
+                "title": "Ping Latency Distribution",
+                "columns": ",".join(stats.keys()),
+                "data_source_list": stats_source,
+            }
+        ],
+        "ctf_charts": [
+            chart("Ping Latency CDF", cdf_source, "percentile"),
+            chart("Ping Latency Histogram", histogram_source, "packets"),
+        ],
+        "ctf_data": [
+            {"data_source": stats_source, "data_list": [stats]},
+            {"data_source": cdf_source, "data_list": latency_cdf(replies["rtt"])},
+            {
+                "data_source": histogram_source,
+                "data_list": latency_histogram(replies["rtt"]),
+            },
+        ],
+    }
+
+
+def save_replies(output: Union[str, BinaryIO], replies: Dict[str, Any]) -> None:
+    """Save parsed replies (see parse_ping_replies) as a compressed .npz"""
+    np.savez_compressed(
+        output,
+        seq=replies["seq"],
+        rtt=replies["rtt"],
+        ttl=replies["ttl"],
+        timestamp=replies["timestamp"],
+    )
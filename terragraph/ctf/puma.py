@@ -15,14 +15,18 @@ import json
 import logging
 import operator
 import subprocess
+import tarfile
+import threading
 from argparse import Namespace
 from concurrent.futures import as_completed
+from contextlib import contextmanager
 from enum import Enum
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from time import sleep, time
-from typing import Callable, cast, Dict, List, Optional, Set, Tuple
+from typing import Callable, cast, Dict, Generator, List, Optional, Set, Tuple
 
+from ctf.common.connections.SSHConnection import SSHConnection
 from ctf.ctf_client.runner.exceptions import (
     DeviceCmdError,
     DeviceConfigError,
@@ -30,6 +34,32 @@ from ctf.ctf_client.runner.exceptions import (
     TestFailed,
     TestUsageError,
 )
+from terragraph.ctf.crash_logs import (
+    CrashLogIndex,
+    DEFAULT_CRASH_LOG_FILES,
+    DEFAULT_CRASH_SIGNATURES,
+    format_matches,
+)
+from terragraph.ctf.fw_stats import (
+    concat_segments,
+    fetch_segments_cmd,
+    FW_STATS_SEGMENTS_DIR,
+    FW_STATS_SEGMENTS_PATH,
+    parse_segments,
+    save_link_arrays,
+    segment_count_cmd,
+    segment_name,
+    start_rotator_cmd,
+    stop_rotator_cmd,
+)
+from terragraph.ctf.node_config import NodeConfigTransaction
+from terragraph.ctf.node_metrics import latest_value, STALE_FACTOR
+from terragraph.ctf.sysdump import (
+    DEFAULT_MAX_BYTES as DEFAULT_SYSDUMP_MAX_BYTES,
+    stream_sysdump,
+    SYSDUMP_PATHS,
+    SysdumpStream,
+)
 from terragraph.ctf.tg import BaseTgCtfTest, NODE_CONFIG_FILE
 
 LOG = logging.getLogger(__name__)
@@ -40,6 +70,36 @@ FW_STATS_PATH = f"/tmp/{FW_STATS_DIR}"
 FW_STATS_OUTPUT_FILE = f"/tmp/{FW_STATS}"
 FW_STATS_OUTPUT_FILE_COMPRESSED = f"{FW_STATS_OUTPUT_FILE}.gz"
 
+# Node readiness check: succeeds once e2e_minion reports all radios initialized,
+# and prints the minion status report
+MINION_READY_CHECK_CMD = (
+    's=$(/usr/sbin/tg2 minion status --json) && echo "$s" && '
+    + 'echo "$s" | grep -q \'"initialized"\' && '
+    + '! echo "$s" | grep -Eq \'"initialized": *false\''
+)
+# Time budget of one verify_nodes_ready() retry
+NODE_READY_RETRY_SECS = 3
+# System stats command, and node KPIs read from it (with their display name)
+SYSTEM_STATS_CMD = "tg2 stats --dump system"
+KPI_SYSTEM_STATS = {
+    # memory utilization %
+    "mem.util": "mem_util",
+    # 1-min CPU load average
+    "load-1": "cpu_load",
+    # per-core CPU utilization %
+    "core_0.cpu.util": "cpu_util_core_0",
+    "core_1.cpu.util": "cpu_util_core_1",
+    "core_2.cpu.util": "cpu_util_core_2",
+    "core_3.cpu.util": "cpu_util_core_3",
+    # process-specific memory/CPU utilization %
+    "e2e_minion.cpu.util": "e2e_minion-cpu_util",
+    "e2e_minion.mem.util": "e2e_minion-mem_util",
+    "openr.cpu.util": "openr-cpu_util",
+    "openr.mem.util": "openr-mem_util",
+    "stats_agent.cpu.util": "stats_agent-cpu_util",
+    "stats_agent.mem.util": "stats_agent-mem_util",
+}
+
 
 class PumaDpMode(Enum):
     VPP = 1
@@ -59,10 +119,35 @@ class PumaTgCtfTest(BaseTgCtfTest):
     # Enables the easy lookup of responder id's for running commands
     mac_to_node_id_map: Dict[str, int]
 
+    # Application logs scanned for crashes, and the crash signatures (extended
+    # regular expressions) searched in them
+    CRASH_LOG_FILES: List[str] = DEFAULT_CRASH_LOG_FILES
+    CRASH_SIGNATURES: Dict[str, str] = DEFAULT_CRASH_SIGNATURES
+
+    # Paths archived by streamed sysdumps
+    SYSDUMP_PATHS: List[str] = SYSDUMP_PATHS
+
     def __init__(self, args: Namespace) -> None:
         super().__init__(args)
         self.kpi_container = {}
         self.mac_to_node_id_map = {}
+        # Segmented fw stats: highest segment number fetched per node
+        self.fw_stats_segment_offsets: Dict[int, int] = {}
+        # Segmented fw stats: beamforming segment range (first, last) of each
+        # node, per (initiator_id, responder_id) link
+        self.bf_stats_segments: Dict[Tuple[int, int], Dict[int, Tuple[int, int]]] = {}
+        # Local copy of the fetched fw stats segments, created on first use
+        self._fw_stats_segments_dir: Optional[TemporaryDirectory] = None
+        # Crashes found in the application logs of each node (see crash_logs.py)
+        self.crash_log_index = CrashLogIndex(self.CRASH_SIGNATURES)
+        # Streamed sysdumps per node (see sysdump.py)
+        self.sysdump_streams: Dict[int, SysdumpStream] = {}
+        # Protects: sysdump_streams
+        self.sysdump_streams_lock = threading.Lock()
+        # Limits the number of nodes streaming sysdumps at once
+        self.sysdump_stream_slots = threading.BoundedSemaphore(
+            max(1, self.test_args["sysdump_max_streams"])
+        )
 
     @staticmethod
     def test_params() -> Dict[str, Dict]:
@@ -81,6 +166,33 @@ class PumaTgCtfTest(BaseTgCtfTest):
             "default": False,
             "convert": lambda k: k.lower() == "true",
         }
+        test_params["stream_sysdump"] = {
+            "desc": (
+                "Stream sysdumps from the nodes as they are compressed, "
+                + "instead of running the sysdump script and copying its archive "
+                + "(streamed sysdumps only contain the logs, node config and "
+                + "version)"
+            ),
+            "default": False,
+            "convert": lambda k: k.lower() == "true",
+        }
+        test_params["sysdump_max_bytes"] = {
+            "desc": "Maximum compressed size of a streamed sysdump (0 for unlimited)",
+            "default": DEFAULT_SYSDUMP_MAX_BYTES,
+            "convert": int,
+        }
+        test_params["sysdump_compressor"] = {
+            "desc": (
+                "Compressor of streamed sysdumps (zstd or gzip), by default "
+                + "zstd if available on the node and gzip otherwise"
+            ),
+            "default": "",
+        }
+        test_params["sysdump_max_streams"] = {
+            "desc": "Maximum number of nodes streaming sysdumps at once",
+            "default": 4,
+            "convert": int,
+        }
         test_params["disable_gps"] = {
             "desc": "If specified, disable GPS on the nodes",
             "default": False,
@@ -119,6 +231,28 @@ class PumaTgCtfTest(BaseTgCtfTest):
             "default": False,
             "convert": lambda k: k.lower() == "true",
         }
+        test_params["fw_stats_segment_size"] = {
+            "desc": (
+                "If non-zero, rotate collected firmware stats into gzip "
+                + "segments of (at most) this many uncompressed bytes, so that "
+                + "heatmap stats are fetched incrementally"
+            ),
+            "default": 0,
+            "convert": int,
+        }
+        test_params["fw_stats_segment_secs"] = {
+            "desc": "Maximum age of a firmware stats segment, in seconds",
+            "default": 60,
+            "convert": int,
+        }
+        test_params["node_metrics_interval"] = {
+            "desc": (
+                "If non-zero, sample system stats and node KPIs on the nodes "
+                + "every this many seconds during the test"
+            ),
+            "default": 0,
+            "convert": float,
+        }
         test_params["skip_reboot"] = {
             "desc": "Should we skip rebooting nodes during the pre-run step?",
             "default": False,
@@ -238,20 +372,97 @@ class PumaTgCtfTest(BaseTgCtfTest):
                 logfiles["terragraph"].append("/var/log/wil6210/")
 
             if self.test_args["enable_fw_stats"]:
-                if self.test_args["compress_fw_stats"]:
+                if self._fw_stats_segmented():
+                    logfiles["terragraph"].append(FW_STATS_SEGMENTS_PATH)
+                elif self.test_args["compress_fw_stats"]:
                     logfiles["terragraph"].append(FW_STATS_OUTPUT_FILE_COMPRESSED)
                 else:
                     logfiles["terragraph"].append(FW_STATS_OUTPUT_FILE)
 
             # if needed, run the sysdump script and collect the resulting archive
             if self.test_args["save_sysdump"]:
-                sysdump_filename = f"/tmp/sysdump-ctf-{self.test_exe_id}.tgz"
-                self.run_sysdump(sysdump_filename)
-                logfiles["terragraph"].append(sysdump_filename)
+                if self.test_args["stream_sysdump"]:
+                    # Streamed by fetch_logfile()
+                    logfiles["terragraph"].append(self.sysdump_spool_path())
+                else:
+                    sysdump_filename = f"/tmp/sysdump-ctf-{self.test_exe_id}.tgz"
+                    self.run_sysdump(sysdump_filename)
+                    logfiles["terragraph"].append(sysdump_filename)
         except Exception as e:
             self.log_to_ctf(f"Error preparing logfiles: {str(e)}", "error")
 
-        super().collect_logfiles(logfiles)
+        try:
+            super().collect_logfiles(logfiles)
+        finally:
+            self.save_sysdump_table()
+
+    def sysdump_spool_path(self) -> str:
+        """Spool file of streamed sysdumps on the nodes"""
+        return f"/tmp/sysdump-ctf-{self.test_exe_id}"
+
+    def fetch_logfile(
+        self, node_id: int, connection: SSHConnection, local_dir: str, logfile: str
+    ) -> Optional[List[str]]:
+        if logfile != self.sysdump_spool_path() or not self.test_args["stream_sysdump"]:
+            return super().fetch_logfile(node_id, connection, local_dir, logfile)
+
+        def open_channel():
+            channel = connection.get_transport().open_session()
+            channel.settimeout(self.scp_timeout)
+            return channel
+
+        self.log_to_ctf(f"Streaming sysdump to local dir: {local_dir}")
+        with self.sysdump_stream_slots:
+            try:
+                connection.connect(timeout=self.scp_timeout)
+                try:
+                    stream = stream_sysdump(
+                        open_channel,
+                        logfile,
+                        str(Path(local_dir) / Path(logfile).name),
+                        self.SYSDUMP_PATHS,
+                        self.test_args["sysdump_max_bytes"],
+                        compressor=self.test_args["sysdump_compressor"],
+                    )
+                finally:
+                    connection.disconnect()
+            except Exception as e:
+                self.log_to_ctf(f"Node {node_id}: sysdump failed!\n{e}", "error")
+                return None
+
+        with self.sysdump_streams_lock:
+            self.sysdump_streams[node_id] = stream
+        self.log_to_ctf(
+            f"Node {node_id}: sysdump complete ({stream.size} bytes, "
+            + f"sha256 {stream.sha256})."
+        )
+        if stream.truncated:
+            self.log_to_ctf(
+                f"Node {node_id}: sysdump truncated to {stream.size} bytes", "warning"
+            )
+        return [stream.path]
+
+    def save_sysdump_table(self) -> None:
+        """Record the size and checksum of streamed sysdumps as a CTF table"""
+        with self.sysdump_streams_lock:
+            rows = [
+                {"node_id": str(node_id), **stream.row()}
+                for node_id, stream in sorted(self.sysdump_streams.items())
+            ]
+        if not rows:
+            return
+        self.add_ctf_json_data(
+            {
+                "ctf_tables": [
+                    {
+                        "title": "Sysdumps",
+                        "columns": ",".join(rows[0].keys()),
+                        "data_source_list": "sysdumps",
+                    }
+                ],
+                "ctf_data": [{"data_source": "sysdumps", "data_list": rows}],
+            }
+        )
 
     def pre_run(self) -> None:
         super().pre_run()
@@ -285,11 +496,28 @@ class PumaTgCtfTest(BaseTgCtfTest):
                 start=True, compress=self.test_args["compress_fw_stats"]
             )
 
+        if self.test_args["node_metrics_interval"] > 0:
+            interval = self.test_args["node_metrics_interval"]
+            # System stats are only refreshed by the stats agent every second
+            self.start_node_metrics(
+                interval=interval,
+                stats_cmd=SYSTEM_STATS_CMD,
+                stats_keys=KPI_SYSTEM_STATS,
+                stats_every=max(1, round(1 / interval)),
+            )
+
     def post_run(self) -> None:
         super().post_run()
 
+        if self.node_metrics:
+            self.stop_node_metrics()
+
         if self.test_args["enable_fw_stats"]:
             self.collect_fw_stats(start=False)
+        if self._fw_stats_segments_dir is not None:
+            self._fw_stats_segments_dir.cleanup()
+            self._fw_stats_segments_dir = None
+            self.fw_stats_segment_offsets.clear()
 
         if self.test_args["remove_python"]:
             self.set_python_usable(True)
@@ -468,6 +696,10 @@ class PumaTgCtfTest(BaseTgCtfTest):
     ) -> None:
         """Fetch heatmap stats to a local temp directory and push to CTF"""
 
+        if self._fw_stats_segmented():
+            self._fetch_heatmap_stats_segments(test_action_result_id, link_info)
+            return
+
         with TemporaryDirectory(prefix="heatmap_stats-") as tmp_dir:
             futures: Dict = {}
             for node_id in link_info["node_ids"]:
@@ -587,6 +819,211 @@ class PumaTgCtfTest(BaseTgCtfTest):
 
         return True
 
+    def _fw_stats_segmented(self) -> bool:
+        """Are fw stats collected in rotated segments? See fw_stats.py"""
+        return self.test_args.get("fw_stats_segment_size", 0) > 0
+
+    def _count_fw_stats_segments(self, node_ids: List[int]) -> Dict[int, int]:
+        """Return the number of complete fw stats segments on each node"""
+        cmd = f"{segment_count_cmd()}; true"
+        counts: Dict[int, int] = {}
+        futures: Dict = self.run_cmd(cmd, node_ids)
+        for result in self.wait_for_cmds(futures):
+            if not result["success"]:
+                error_msg = (
+                    f"Node {result['node_id']}: '{cmd}' failed: {result['error']}"
+                )
+                self.log_to_ctf(error_msg, "error")
+                raise DeviceCmdError(error_msg)
+            counts[result["node_id"]] = int(result["message"].split()[0])
+        return counts
+
+    def _fetch_fw_stats_segments(self, node_segments: Dict[int, Set[int]]) -> None:
+        """Fetch the given fw stats segments of each node (one archive per node)
+        into the local segments dir, and advance the per-node offsets.
+        """
+        if self._fw_stats_segments_dir is None:
+            self._fw_stats_segments_dir = TemporaryDirectory(
+                prefix="fw_stats_segments-"
+            )
+        archive = f"/tmp/{FW_STATS_SEGMENTS_DIR}_{self.test_exe_id}.tar"
+
+        futures: Dict = {}
+        for node_id, seqs in node_segments.items():
+            futures.update(self.run_cmd(fetch_segments_cmd(seqs, archive), [node_id]))
+        for result in self.wait_for_cmds(futures):
+            if not result["success"]:
+                raise DeviceCmdError(
+                    f"_fetch_fw_stats_segments | node_id {result['node_id']} failed "
+                    + f"to archive segments: {result['error']}"
+                )
+
+        futures.clear()
+        for node_id in node_segments:
+            local_dir = Path(self._fw_stats_segments_dir.name, str(node_id))
+            local_dir.mkdir(exist_ok=True)
+            futures[
+                self.thread_pool.submit(
+                    self.fetch_files,
+                    node_id,
+                    self.device_info[node_id].connection,
+                    [archive],
+                    str(local_dir),
+                    self.thread_local.step_idx,
+                )
+            ] = node_id
+        for future in as_completed(futures.keys(), timeout=self.log_collect_timeout):
+            node_id = futures[future]
+            if not future.result():
+                raise DeviceCmdError(
+                    f"_fetch_fw_stats_segments | failed for node_id {node_id}"
+                )
+            local_dir = Path(self._fw_stats_segments_dir.name, str(node_id))
+            local_archive = local_dir / Path(archive).name
+            with tarfile.open(local_archive) as tar:
+                tar.extractall(local_dir)
+            local_archive.unlink()
+            self.fw_stats_segment_offsets[node_id] = max(
+                max(node_segments[node_id]),
+                self.fw_stats_segment_offsets.get(node_id, 0),
+            )
+            self.log_to_ctf(
+                f"_fetch_fw_stats_segments | node_id {node_id}: fetched "
+                + f"{len(node_segments[node_id])} new segment(s)"
+            )
+
+        futures = self.run_cmd(f"rm -f {archive}", list(node_segments))
+        for _result in self.wait_for_cmds(futures):
+            pass
+
+    def _fetch_heatmap_stats_segments(
+        self, test_action_result_id: int, link_info: Dict
+    ) -> None:
+        """Fetch only the new fw stats segments of the links' beamforming
+        windows, then push the per-link heatmap stats to CTF.
+        """
+        links = [
+            link
+            for link in link_info["links"]
+            if (link["initiator_id"], link["responder_id"]) in self.bf_stats_segments
+        ]
+        node_segments: Dict[int, Set[int]] = {}
+        for link in links:
+            windows = self.bf_stats_segments[
+                (link["initiator_id"], link["responder_id"])
+            ]
+            for node_id, (first, last) in windows.items():
+                offset = self.fw_stats_segment_offsets.get(node_id, 0)
+                new_segments = set(range(max(first, offset + 1), last + 1))
+                if new_segments:
+                    node_segments.setdefault(node_id, set()).update(new_segments)
+        if node_segments:
+            self._fetch_fw_stats_segments(node_segments)
+
+        with TemporaryDirectory(prefix="heatmap_stats-") as tmp_dir:
+            futures: Dict = {}
+            for link in links:
+                link_name = f"{link['initiator_id']}_{link['responder_id']}"
+                futures[
+                    self.thread_pool.submit(
+                        self._push_heatmap_segments_to_ctf,
+                        tmp_dir,
+                        test_action_result_id,
+                        link,
+                        self.thread_local.step_idx,
+                    )
+                ] = link_name
+
+            for future in as_completed(
+                futures.keys(), timeout=self.log_collect_timeout
+            ):
+                result = future.result()
+                link_name = futures[future]
+                if not result:
+                    self.log_to_ctf(
+                        f"Failed to push heatmap stats for link {link_name}",
+                        "error",
+                    )
+
+    def _push_heatmap_segments_to_ctf(
+        self,
+        local_tmp_dir: str,
+        test_action_result_id: int,
+        link: Dict,
+        step_idx: Optional[int] = None,
+    ) -> bool:
+        """Assemble the heatmap stats of a link from the locally fetched
+        segments and push them to CTF, along with the decoded per-node arrays.
+        """
+
+        if step_idx:
+            # We are in a new thread. Publish step_idx in thread local data.
+            # See also: ThreadLocal
+            self.thread_local.init(step_idx)
+
+        initiator_id = link["initiator_id"]
+        responder_id = link["responder_id"]
+        windows = self.bf_stats_segments[(initiator_id, responder_id)]
+        segment_paths: Dict[int, List[str]] = {
+            node_id: [
+                str(
+                    Path(
+                        self._fw_stats_segments_dir.name,
+                        str(node_id),
+                        segment_name(seq),
+                    )
+                )
+                for seq in range(first, last + 1)
+            ]
+            for node_id, (first, last) in windows.items()
+        }
+
+        stats_paths: Dict[int, Path] = {}
+        for node_id in (initiator_id, responder_id):
+            stats_paths[node_id] = Path(
+                local_tmp_dir,
+                f"{FW_STATS}_{node_id}_link_{initiator_id}_{responder_id}",
+            )
+            concat_segments(segment_paths[node_id], str(stats_paths[node_id]))
+
+        self.log_to_ctf(
+            f"Pushing initiator {stats_paths[initiator_id]} and responder "
+            + f"{stats_paths[responder_id]} to CTF for heatmaps"
+        )
+        result = self.ctf_api.save_heatmap_files(
+            test_exe_id=self.test_exe_id,
+            test_action_result_id=test_action_result_id,
+            initiator_file_path=str(stats_paths[initiator_id]),
+            responder_file_path=str(stats_paths[responder_id]),
+            description=f"Link-{initiator_id}-{responder_id}",
+        )
+        if result.get("error"):
+            self.log_to_ctf(result["message"], "error")
+            return False
+
+        # Save the decoded stats instead of the raw text files
+        arrays_path = Path(
+            local_tmp_dir, f"{FW_STATS}_link_{initiator_id}_{responder_id}.npz"
+        )
+        save_link_arrays(
+            str(arrays_path),
+            {
+                "initiator": parse_segments(segment_paths[initiator_id]),
+                "responder": parse_segments(segment_paths[responder_id]),
+            },
+        )
+        result = self.ctf_api.save_action_log_file(
+            source_file_path=str(arrays_path),
+            constructive_path=FW_STATS_DIR,
+            test_exe_id=self.test_exe_id,
+            test_action_result_id=test_action_result_id,
+        )
+        if result.get("error"):
+            self.log_to_ctf(result["message"], "error")
+            return False
+
+        return True
+
     def add_interface_addr(
         self, interface: str = "lo", node_ids: Optional[List[int]] = None
     ) -> None:
@@ -783,10 +1220,32 @@ class PumaTgCtfTest(BaseTgCtfTest):
     ) -> Dict[int, Dict[str, float]]:
         """Get system stats from nodes.
         Returns a map of node ID to collected stats.
+
+        The latest sampled values are used for nodes whose system stats are
+        sampled (see start_node_metrics()), unless they are stale.
         """
-        dump_stats_cmd = "tg2 stats --dump system"
-        futures: Dict = self.run_cmd(dump_stats_cmd, node_ids)
         all_stats: Dict[int, Dict[str, float]] = {}
+        for node_id, samples in self.collect_node_metrics(node_ids).items():
+            period = self.node_metrics_interval * self.node_metrics_stats_every
+            # Sample times are only accurate to a second
+            since = time() - STALE_FACTOR * period - 1
+            stats = {}
+            for key, name in stats_to_display_name.items():
+                value = latest_value(samples, f"stat.{key}", since)
+                if value is not None:
+                    stats[name] = value
+            if stats:
+                all_stats[node_id] = stats
+        node_ids = [
+            node_id
+            for node_id in node_ids or self._inventory_node_ids(None)
+            if node_id not in all_stats
+        ]
+        if not node_ids:
+            return all_stats
+
+        dump_stats_cmd = SYSTEM_STATS_CMD
+        futures: Dict = self.run_cmd(dump_stats_cmd, node_ids)
         for result in self.wait_for_cmds(futures):
             if result["error"]:
                 self.log_to_ctf(f"{dump_stats_cmd}\n{result['error']}")
@@ -805,26 +1264,8 @@ class PumaTgCtfTest(BaseTgCtfTest):
 
     def upload_node_kpis(self, scribe_category: str) -> None:
         """Get and upload the node KPIs to Scuba."""
-        stats_to_display_name = {
-            # memory utilization %
-            "mem.util": "mem_util",
-            # 1-min CPU load average
-            "load-1": "cpu_load",
-            # per-core CPU utilization %
-            "core_0.cpu.util": "cpu_util_core_0",
-            "core_1.cpu.util": "cpu_util_core_1",
-            "core_2.cpu.util": "cpu_util_core_2",
-            "core_3.cpu.util": "cpu_util_core_3",
-            # process-specific memory/CPU utilization %
-            "e2e_minion.cpu.util": "e2e_minion-cpu_util",
-            "e2e_minion.mem.util": "e2e_minion-mem_util",
-            "openr.cpu.util": "openr-cpu_util",
-            "openr.mem.util": "openr-mem_util",
-            "stats_agent.cpu.util": "stats_agent-cpu_util",
-            "stats_agent.mem.util": "stats_agent-mem_util",
-        }
         all_node_mac = self.get_all_node_mac()
-        all_sys_stats = self.get_all_system_stats(stats_to_display_name)
+        all_sys_stats = self.get_all_system_stats(KPI_SYSTEM_STATS)
 
         ts = int(time())
         for node_id in self.get_tg_devices():
@@ -1382,49 +1823,103 @@ class PumaTgCtfTest(BaseTgCtfTest):
         """Fill in missing tunnel config and setup L2 tunnels between nodes. Expects
         `tunnel_destinations` field in node data per node."""
 
-        config_pending_nodes: List[int] = []
         ip_addr_map = self.get_ip(interface="lo", ip_type="global")
 
-        for src_node_id in self.get_tg_devices():
-            dst_nodes = self.read_nodes_data([src_node_id, "tunnel_destinations"])
-            if not dst_nodes:
-                continue
-
-            config_pending_nodes.append(src_node_id)
-            self.log_to_ctf(
-                f"Node {src_node_id}: tunnel destination nodes '{dst_nodes}'"
-            )
-            # Query tunnel destination IP and update the tunnel config runtime.
-            for dst_id in dst_nodes:
-                dst_ip = ip_addr_map[dst_id]
-                config_sub_cmd: str = f" -s tunnelConfig.{dst_id}.dstIp {dst_ip}"
-                self.modify_node_config_runtime(config_sub_cmd, [src_node_id])
-                self.log_to_ctf(f"Tunnel config sent to node {src_node_id}")
-
-                config_sub_cmd: str = f" -b tunnelConfig.{dst_id}.enabled true"
-                self.modify_node_config_runtime(config_sub_cmd, [src_node_id])
-                self.log_to_ctf(f"Sent tunnel disable config to node {src_node_id}")
+        with self.node_config_transaction() as transaction:
+            for src_node_id in self.get_tg_devices():
+                dst_nodes = self.read_nodes_data([src_node_id, "tunnel_destinations"])
+                if not dst_nodes:
+                    continue
 
-        self.sync_node_config_runtime(config_pending_nodes)
+                self.log_to_ctf(
+                    f"Node {src_node_id}: tunnel destination nodes '{dst_nodes}'"
+                )
+                # Query tunnel destination IP and update the tunnel config runtime.
+                for dst_id in dst_nodes:
+                    transaction.set(
+                        src_node_id, f"tunnelConfig.{dst_id}.dstIp", ip_addr_map[dst_id]
+                    )
+                    transaction.set_bool(
+                        src_node_id, f"tunnelConfig.{dst_id}.enabled", True
+                    )
 
     def disable_l2_tunnel_config(self) -> None:
         """Overwrite 'enabled' field in 'tunnelConfig' to be false, and disable tunnels."""
 
-        config_pending_nodes: List[int] = []
+        with self.node_config_transaction() as transaction:
+            for src_node_id in self.get_tg_devices():
+                dst_nodes = self.read_nodes_data([src_node_id, "tunnel_destinations"])
+                if not dst_nodes:
+                    continue
 
-        for src_node_id in self.get_tg_devices():
-            dst_nodes = self.read_nodes_data([src_node_id, "tunnel_destinations"])
-            if not dst_nodes:
+                for dst_id in dst_nodes:
+                    transaction.set_bool(
+                        src_node_id, f"tunnelConfig.{dst_id}.enabled", False
+                    )
+
+    @contextmanager
+    def node_config_transaction(
+        self, sync: bool = True
+    ) -> Generator[NodeConfigTransaction, None, None]:
+        """Collect node config edits, and commit them when the block exits
+        without an exception. See commit_node_config_transaction().
+
+        Usage:
+        ```
+        with self.node_config_transaction() as transaction:
+            transaction.set_int(node_id, "envParams.DPDK_ENABLED", 0)
+        ```
+        """
+        transaction = NodeConfigTransaction(self.node_configs)
+        yield transaction
+        self.commit_node_config_transaction(transaction, sync)
+
+    def commit_node_config_transaction(
+        self, transaction: NodeConfigTransaction, sync: bool = True
+    ) -> None:
+        """Apply the edits of a node config transaction that change the cached
+        node configs. All edits of a node (and the `tg2 minion set_node_config`
+        sync, if `sync` is set) are sent in a single command, and all nodes are
+        updated concurrently. Nodes are synced even if their config is up to
+        date.
+
+        This will update 'self.node_configs'.
+        """
+        futures: Dict = {}
+        new_configs: Dict[int, Optional[Dict]] = {}
+        for node_id in transaction.node_ids():
+            args, new_configs[node_id] = transaction.diff(node_id)
+            cmds = []
+            if args:
+                cmds.append(
+                    f"/usr/sbin/config_set -n {NODE_CONFIG_FILE} {' '.join(args)}"
+                )
+            else:
+                self.log_to_ctf(f"Node {node_id}: node config is up to date")
+            if sync:
+                cmds.append("/usr/sbin/tg2 minion set_node_config")
+            if not cmds:
                 continue
 
-            config_pending_nodes.append(src_node_id)
+            cmd = " && ".join(cmds)
+            self.log_to_ctf(f"Sending node config to node {node_id}: {cmd}")
+            futures.update(self.run_cmd(cmd, [node_id]))
 
-            for dst_id in dst_nodes:
-                config_sub_cmd: str = f" -b tunnelConfig.{dst_id}.enabled false"
-                self.modify_node_config_runtime(config_sub_cmd, [src_node_id])
-                self.log_to_ctf(f"Sent tunnel disable config to node {src_node_id}")
+        for result in self.wait_for_cmds(futures):
+            node_id = result["node_id"]
+            if not result["success"]:
+                error_msg = (
+                    f"Node {node_id}: failed to set node config: " + result["error"]
+                )
+                self.log_to_ctf(error_msg, "error")
+                raise DeviceCmdError(error_msg)
 
-        self.sync_node_config_runtime(config_pending_nodes)
+            new_config = new_configs[node_id]
+            if new_config is not None:
+                self.node_configs[node_id] = new_config
+            self.log_to_ctf(f"Runtime config sent to node {node_id}")
+        if futures:
+            self.invalidate_device_state(transaction.node_ids())
 
     def modify_node_config_runtime(
         self,
@@ -1432,11 +1927,15 @@ class PumaTgCtfTest(BaseTgCtfTest):
         node_ids: Optional[List[int]] = None,
     ) -> None:
         """Modify node config at runtime using `config_set` utility.
-        Accepts the configuration subcommand like "-i envParams.DPDK_ENABLED 0"."""
+        Accepts the configuration subcommand like "-i envParams.DPDK_ENABLED 0".
+
+        This will update 'self.node_configs'.
+        """
 
         base_cmd: str = f"/usr/sbin/config_set -n {NODE_CONFIG_FILE} "
 
         futures: Dict = self.run_cmd(base_cmd + config_sub_cmd, node_ids)
+        stale_node_ids: List[int] = []
         for result in self.wait_for_cmds(futures):
             if not result["success"]:
                 error_msg = (
@@ -1447,6 +1946,20 @@ class PumaTgCtfTest(BaseTgCtfTest):
                 raise DeviceCmdError(error_msg)
 
             self.log_to_ctf(f"Runtime config sent to node {result['node_id']}")
+            node_id = result["node_id"]
+            if node_id not in self.node_configs:
+                continue
+            transaction = NodeConfigTransaction(self.node_configs)
+            try:
+                transaction.add_config_set_args(node_id, config_sub_cmd)
+            except ValueError:
+                stale_node_ids.append(node_id)
+                continue
+            self.node_configs[node_id] = transaction.diff(node_id)[1]
+        if stale_node_ids:
+            # Edits the cached node configs cannot follow
+            self.get_current_node_config(node_ids=stale_node_ids)
+        self.invalidate_device_state(node_ids)
 
     def sync_node_config_runtime(self, node_ids: Optional[List[int]] = None) -> None:
         """Sync node config by sending a command to trigger config actions"""
@@ -1462,6 +1975,7 @@ class PumaTgCtfTest(BaseTgCtfTest):
                 )
                 self.log_to_ctf(error_msg, "error")
                 raise DeviceCmdError(error_msg)
+        self.invalidate_device_state(node_ids)
 
     def _parse_tg2_json(self, s: str) -> Dict:
         """Parse `tg2` CLI JSON output."""
@@ -1531,52 +2045,55 @@ class PumaTgCtfTest(BaseTgCtfTest):
 
         return statuses
 
+    def _radios_initialized(self, status: Dict) -> bool:
+        """Are all radios in the minion status report initialized?"""
+        radio_status = status.get("radioStatus")
+        if not radio_status:
+            return False
+        return all(radio["initialized"] for radio in radio_status.values())
+
     def verify_nodes_ready(self, node_ids: List[int], init_retries: int = 10) -> None:
         """Verify that the given nodes are initialized and radios
-        are configured, with multiple retries. If at least one
-        of the nodes' radios are not configured, we will timeout
-        after init_retries attempts.
+        are configured. Each node is watched until its radios are
+        initialized; if at least one of the nodes' radios are not
+        configured, we will timeout after roughly init_retries attempts
+        (NODE_READY_RETRY_SECS each).
         """
-        node_check_list = node_ids
-        retries = init_retries
-        while retries > 0:
+        node_check_list = list(node_ids)
+        timeout = init_retries * NODE_READY_RETRY_SECS
+        deadline = time() + timeout
+        while True:
+            time_left = max(deadline - time(), 0)
             self.log_to_ctf(
                 f"Check if nodes {node_check_list} are ready"
-                + f" (remaining retries: {retries})",
+                + f" (remaining time: {int(time_left)}s)",
                 "info",
             )
-            statuses = self.minion_get_status(node_check_list)
-            for node_id, status in statuses.items():
-                if "radioStatus" not in status or not status["radioStatus"]:
+            results = self.wait_for_nodes(
+                MINION_READY_CHECK_CMD, node_check_list, timeout=time_left
+            )
+            for node_id, result in results.items():
+                if not result["success"]:
                     continue
-
-                radio_status = status["radioStatus"]
-                ready = True
-                for mac in radio_status.keys():
-                    # If a radio is not ready, skip this node
-                    if not radio_status[mac]["initialized"]:
-                        ready = False
-                        break
-                if ready:
+                try:
+                    status = self._parse_tg2_json(result["message"])
+                except DeviceCmdError:
+                    continue
+                if self._radios_initialized(status):
                     # all radios are configured, no need to check this node again
                     node_check_list.remove(node_id)
-                    continue
 
-            # One or more nodes are still not ready, check again
-            if node_check_list:
-                # We probably still want to sleep for a second even though
-                # the futures + result processing does shave off few seconds
-                sleep(1)
-                retries -= 1
-            else:
+            if not node_check_list:
                 break
-
-        # Timed out with at least one node not ready
-        if node_check_list and not retries:
-            raise DeviceCmdError(
-                f"Nodes {node_check_list} failed to init minion/radios"
-                + f" after {init_retries} attempts"
-            )
+            if time() >= deadline:
+                # Timed out with at least one node not ready
+                raise DeviceCmdError(
+                    f"Nodes {node_check_list} failed to init minion/radios"
+                    + f" after {timeout} seconds"
+                )
+            # The watcher saw the radios initialized, but the status report
+            # disagreed; check again shortly
+            sleep(1)
 
         self.log_to_ctf("All nodes are configured and ready", "info")
 
@@ -1755,6 +2272,8 @@ class PumaTgCtfTest(BaseTgCtfTest):
                 rxGolayIdx=link.get("rxGolayIdx", None),
                 verify_link=True,
             )
+        # Prefixes may be reallocated as links come up
+        self.invalidate_device_state()
 
     def minion_assoc(
         self,
@@ -1851,6 +2370,20 @@ class PumaTgCtfTest(BaseTgCtfTest):
         initiator_id: int = self._get_node_id(initiator_mac)
         responder_id: int = self._get_node_id(responder_mac)
 
+        if self._fw_stats_segmented():
+            # Restarting flushes the current segment, so the beamforming
+            # stats start in the next one
+            self._set_fw_stats_config(
+                True, "TGF_STATS_BF", [initiator_id, responder_id]
+            )
+            self.restart_fw_stats(node_ids=[initiator_id, responder_id])
+            return {
+                node_id: count + 1
+                for node_id, count in self._count_fw_stats_segments(
+                    [initiator_id, responder_id]
+                ).items()
+            }
+
         fw_stats_count: Dict = {
             initiator_id: 1,
             responder_id: 1,
@@ -1906,6 +2439,10 @@ class PumaTgCtfTest(BaseTgCtfTest):
         initiator_id: int = self._get_node_id(initiator_mac)
         responder_id: int = self._get_node_id(responder_mac)
 
+        if self._fw_stats_segmented():
+            self._stop_bf_stats_segments(initiator_id, responder_id, fw_stats_count)
+            return
+
         fw_stats_file = (
             FW_STATS_OUTPUT_FILE_COMPRESSED
             if self.test_args["compress_fw_stats"]
@@ -1943,6 +2480,32 @@ class PumaTgCtfTest(BaseTgCtfTest):
             # Stop fw stats collection - which was only enabled for beamforming
             self.collect_fw_stats(start=False, node_ids=[initiator_id, responder_id])
 
+    def _stop_bf_stats_segments(
+        self, initiator_id: int, responder_id: int, first_segments: Dict
+    ) -> None:
+        """Stop beamforming stats and record the range of fw stats segments
+        holding the last beamforming event on each node of the link.
+        """
+        node_ids = [initiator_id, responder_id]
+        # Stopping flushes the last beamforming segment
+        self.collect_fw_stats(start=False, node_ids=node_ids)
+        last_segments = self._count_fw_stats_segments(node_ids)
+        self.bf_stats_segments[(initiator_id, responder_id)] = {
+            node_id: (first_segments[node_id], last_segments[node_id])
+            for node_id in node_ids
+        }
+        self.log_to_ctf(
+            f"_stop_bf_stats | link {initiator_id}_{responder_id} segments "
+            + f"{self.bf_stats_segments[(initiator_id, responder_id)]}",
+            "info",
+        )
+
+        # Disable beamforming stats
+        self._set_fw_stats_config(False, "TGF_STATS_BF", node_ids)
+        if self.test_args["enable_fw_stats"]:
+            # Resume fw stats collection without beamforming stats
+            self.collect_fw_stats(start=True, node_ids=node_ids)
+
     def minion_dissoc(
         self, initiator_id: int, initiator_mac: str, responder_mac: str
     ) -> None:
@@ -1970,33 +2533,40 @@ class PumaTgCtfTest(BaseTgCtfTest):
         """
 
         if node_id is not None:
-            self.__check_sync(node_id)
+            self.__check_sync([node_id])
         else:
             # No need to check initiators in assoc order, but
             # __get_initiator_node_order() raises convenient exceptions
-            for initiator in self.__get_initiator_node_order():
-                self.__check_sync(initiator[1])
+            self.__check_sync(
+                [initiator[1] for initiator in self.__get_initiator_node_order()]
+            )
 
-    def __check_sync(self, node_id: int) -> None:
+    def __check_sync(self, node_ids: List[int]) -> None:
         """Check that the timing synchronization mode matches expectations
-        in `node_id`.
+        in `node_ids`. All nodes are checked concurrently.
         """
 
-        # validate node_id argument
-        if node_id not in self.device_info:
-            err = f"Unable to find node ID {node_id}"
-            self.log_to_ctf(err, "error")
-            raise TestUsageError(err)
+        # validate node_ids argument
+        for node_id in node_ids:
+            if node_id not in self.device_info:
+                err = f"Unable to find node ID {node_id}"
+                self.log_to_ctf(err, "error")
+                raise TestUsageError(err)
 
         # look up node data
-        fw_params = self.read_nodes_data(
-            [node_id, "node_config", "radioParamsBase", "fwParams"], required=False
-        )
-        expected_mode_rf = fw_params and fw_params.get("forceGpsDisable", None) == 1
+        expected_mode_rf: Dict[int, bool] = {}
+        for node_id in node_ids:
+            fw_params = self.read_nodes_data(
+                [node_id, "node_config", "radioParamsBase", "fwParams"],
+                required=False,
+            )
+            expected_mode_rf[node_id] = bool(
+                fw_params and fw_params.get("forceGpsDisable", None) == 1
+            )
 
-        # fetch stats
+        # fetch stats (the stream is closed as soon as syncModeGps shows up)
         stats_cmd = "tg2 stats driver-if | sed -e '/syncModeGps/q' | tail -1"
-        futures: Dict = self.run_cmd(stats_cmd, [node_id])
+        futures: Dict = self.run_cmd(stats_cmd, node_ids)
         for result in self.wait_for_cmds(futures):
             if not result["success"]:
                 error_msg = f"Node {result['node_id']}: '{stats_cmd}' failed"
@@ -2006,8 +2576,8 @@ class PumaTgCtfTest(BaseTgCtfTest):
             output = result["message"].strip()
             self.log_to_ctf(f"Node {result['node_id']}: {output}")
 
-            if (expected_mode_rf and "syncModeGps, 1" in output) or (
-                (not expected_mode_rf) and "syncModeGps, 0" in output
+            if (expected_mode_rf[result["node_id"]] and "syncModeGps, 1" in output) or (
+                (not expected_mode_rf[result["node_id"]]) and "syncModeGps, 0" in output
             ):
                 raise DeviceError(f"Unexpected synchronization mode: {output}")
 
@@ -2550,7 +3120,23 @@ class PumaTgCtfTest(BaseTgCtfTest):
         """Start or stop firmware stats collection"""
         cmd: str = ""
         stats_cmd: str = "tg2 stats driver-if"
-        if start:
+        if self._fw_stats_segmented():
+            # Segments always continue the existing sequence (compressed)
+            if start:
+                if mac_addr:
+                    stats_cmd = f"{stats_cmd} -m {mac_addr}"
+                cmd = start_rotator_cmd(
+                    stats_cmd,
+                    self.test_args["fw_stats_segment_size"],
+                    self.test_args["fw_stats_segment_secs"],
+                )
+                self.log_to_ctf(
+                    f"Starting segmented firmware stats collection on all nodes: {cmd}"
+                )
+            else:
+                cmd = stop_rotator_cmd(stats_cmd)
+                self.log_to_ctf("Stopping firmware stats collection on all nodes")
+        elif start:
             outfile: str = (
                 FW_STATS_OUTPUT_FILE_COMPRESSED if compress else FW_STATS_OUTPUT_FILE
             )
@@ -2607,37 +3193,22 @@ class PumaTgCtfTest(BaseTgCtfTest):
             self.log_to_ctf("No core dumps found.", "info")
 
     def inspect_crash_logs(self, node_ids: Optional[List[int]] = None) -> None:
-        """Try to locate any application crash logs and log them to CTF."""
-        # List of application logs that we care about here
-        APP_LOGS = ["/var/log/e2e_minion/current", "/var/log/openr/current"]
-
-        # Scan application logs and output crash lines with surrounding context.
-        #
-        # 'grep' flags:
-        # -a   Process a binary file as if it were text
-        # -A3  Print NUM=3 lines of trailing context after matching lines
-        # -E   Extended regular expression
-        # -e   Used to specify multiple patterns
-        #
-        # Patterns:
-        # > C++ abort text
-        #   *** Aborted at 1602198897 (unix time) try "date -d @1602198897" if you are using GNU date ***
-        # > glog (Google logging) abort text
-        #   *** Check failure stack trace: ***
-        # > Terragraph ExceptionHandler abort text
-        #   *** Terminated due to exception: ***
-        cmd: str = (
-            "grep -a -A3 -E "
-            + "-e '^*** Aborted at' "
-            + "-e '^*** Check failure stack trace' "
-            + "-e '*** Terminated due to exception' "
-            + " ".join(APP_LOGS)
-        )
-        futures = self.run_cmd(cmd, node_ids)
+        """Try to locate any application crash logs and log them to CTF.
+
+        All crash signatures are searched in one pass over each log on the
+        nodes, which only scans the parts of the logs not seen before.
+        """
+        futures: Dict = {}
+        for node_id in self._inventory_node_ids(node_ids):
+            cmd = self.crash_log_index.scan_cmd(node_id, self.CRASH_LOG_FILES)
+            futures.update(self.run_cmd(cmd, [node_id]))
         logs_per_node = {}
         for result in self.wait_for_cmds(futures):
-            if result["success"]:
-                logs_per_node[result["node_id"]] = result["message"]
+            if not result["success"]:
+                continue
+            matches = self.crash_log_index.update(result["node_id"], result["message"])
+            if matches:
+                logs_per_node[result["node_id"]] = format_matches(matches)
 
         if len(logs_per_node):
             msg_lines = [f"Found {len(logs_per_node)} node(s) with crash logs:"]
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Batched reboot orchestration.
+
+Nodes are rebooted in waves (optionally leaves first, by hop distance). Each
+node of a wave goes through
+    REBOOTING -> DOWN -> UP -> READY
+where DOWN and UP are detected with TCP connects to the node's SSH port,
+which are much cheaper than SSH logins: the port is probed every
+DOWN_PROBE_INTERVAL seconds until it closes, then with exponential backoff
+until it opens again. Only then is the (slow) readiness check, usually an
+SSH login, attempted. The next wave is rebooted once every node of the
+current wave is READY or FAILED.
+
+Time, sleeps and probes are injected so the state machine can be driven
+by a fake clock.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ctf.ctf_client.runner.waiter import Backoff, tcp_port_open
+
+LOG = logging.getLogger(__name__)
+
+# Interval between probes of a node going down (seconds)
+DOWN_PROBE_INTERVAL = 1.0
+# Time for a node to go down after its reboot command (seconds)
+DEFAULT_DOWN_TIMEOUT = 120.0
+# Time for a node to be READY after its reboot command (seconds)
+DEFAULT_REBOOT_TIMEOUT = 600.0
+# Backoff of the probes (and readiness checks) of a node coming back up
+MIN_UP_PROBE_INTERVAL = 1.0
+MAX_UP_PROBE_INTERVAL = 10.0
+# Timeout of a TCP connect probe (seconds)
+PROBE_TIMEOUT = 1.0
+# Nodes without a probe address are assumed down after this long (seconds)
+REBOOT_GRACE_SECS = 5.0
+
+# Issues the reboot of nodes: node IDs -> {node ID: error} of failed ones
+RebootFn = Callable[[List[int]], Dict[int, str]]
+# Checks that a node is ready (e.g. accepts SSH logins): node ID -> ready?
+ReadyFn = Callable[[int], bool]
+# Probes a TCP port: (host, port, timeout) -> open?
+ProbeFn = Callable[[str, int, float], bool]
+
+
+class RebootState(Enum):
+    REBOOTING = 1
+    DOWN = 2
+    UP = 3
+    READY = 4
+    FAILED = 5
+
+
+_FINAL_STATES = (RebootState.READY, RebootState.FAILED)
+
+
+@dataclass
+class NodeReboot:
+    """Reboot progress of a node. Times are clock values, None until the
+    node reaches the state.
+    """
+
+    node_id: int
+    wave: int
+    # Address probed with TCP connects, None if not probed
+    host: Optional[str] = None
+    port: int = 22
+    state: RebootState = RebootState.REBOOTING
+    reboot_at: Optional[float] = None
+    down_at: Optional[float] = None
+    up_at: Optional[float] = None
+    ready_at: Optional[float] = None
+    error: str = ""
+    next_probe: float = 0.0
+    backoff: Backoff = field(
+        default_factory=lambda: Backoff(MAX_UP_PROBE_INTERVAL, MIN_UP_PROBE_INTERVAL)
+    )
+
+    @property
+    def downtime(self) -> Optional[float]:
+        """Time between the node going down and coming back up"""
+        if self.down_at is None or self.up_at is None:
+            return None
+        return self.up_at - self.down_at
+
+    @property
+    def reboot_time(self) -> Optional[float]:
+        """Time between the reboot command and the node being ready"""
+        if self.reboot_at is None or self.ready_at is None:
+            return None
+        return self.ready_at - self.reboot_at
+
+    def row(self) -> Dict[str, str]:
+        def secs(value: Optional[float]) -> str:
+            return "" if value is None else f"{value:.1f}"
+
+        return {
+            "node_id": str(self.node_id),
+            "wave": str(self.wave),
+            "state": self.state.name,
+            "downtime s": secs(self.downtime),
+            "reboot s": secs(self.reboot_time),
+            "error": self.error,
+        }
+
+
+def hop_distances(
+    links: Iterable[Tuple[int, int]], roots: Iterable[int]
+) -> Dict[int, int]:
+    """Return the hop distance of every node reachable from `roots` over
+    (undirected) `links`
+    """
+    neighbors: Dict[int, List[int]] = {}
+    for a, b in links:
+        neighbors.setdefault(a, []).append(b)
+        neighbors.setdefault(b, []).append(a)
+    hops = {root: 0 for root in roots}
+    frontier = list(hops)
+    while frontier:
+        next_frontier = []
+        for node_id in frontier:
+            for neighbor in neighbors.get(node_id, []):
+                if neighbor not in hops:
+                    hops[neighbor] = hops[node_id] + 1
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return hops
+
+
+def reboot_waves(
+    node_ids: List[int],
+    hops: Optional[Dict[int, int]] = None,
+    wave_size: int = 0,
+) -> List[List[int]]:
+    """Split nodes into reboot waves of at most `wave_size` nodes (0 for
+    unlimited). With `hops`, nodes farthest away are rebooted first, and
+    waves never mix hop distances (nodes of unknown distance come last).
+    """
+    if hops:
+        levels: Dict[int, List[int]] = {}
+        for node_id in node_ids:
+            levels.setdefault(hops.get(node_id, -1), []).append(node_id)
+        groups = [levels[hop] for hop in sorted(levels, reverse=True)]
+    else:
+        groups = [list(node_ids)] if node_ids else []
+    waves = []
+    for group in groups:
+        size = wave_size if wave_size > 0 else len(group)
+        waves += [group[i : i + size] for i in range(0, len(group), size)]
+    return waves
+
+
+class RebootOrchestrator:
+    def __init__(
+        self,
+        reboot_fn: RebootFn,
+        ready_fn: ReadyFn,
+        probe_fn: ProbeFn = tcp_port_open,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        timeout: float = DEFAULT_REBOOT_TIMEOUT,
+        down_timeout: float = DEFAULT_DOWN_TIMEOUT,
+        max_workers: int = 16,
+    ) -> None:
+        """Reboot nodes in waves with `reboot_fn`, and wait (up to `timeout`
+        seconds per wave) for `ready_fn` to succeed on every node.
+        Probes and readiness checks run on up to `max_workers` threads.
+        """
+        self.reboot_fn = reboot_fn
+        self.ready_fn = ready_fn
+        self.probe_fn = probe_fn
+        self.clock = clock
+        self.sleep = sleep
+        self.timeout = timeout
+        self.down_timeout = down_timeout
+        self.max_workers = max_workers
+
+    def run(
+        self,
+        waves: List[List[int]],
+        addresses: Dict[int, Tuple[Optional[str], int]],
+    ) -> Dict[int, NodeReboot]:
+        """Reboot `waves` of nodes, probing the (host, port) of each node in
+        `addresses`. Returns the reboot progress of every node (in wave
+        order), nodes that did not come back are FAILED.
+        """
+        reboots: Dict[int, NodeReboot] = {}
+        with ThreadPoolExecutor(
+            max_workers=max(1, self.max_workers), thread_name_prefix="Reboot"
+        ) as pool:
+            for wave_idx, wave in enumerate(waves):
+                nodes = [
+                    NodeReboot(node_id, wave_idx, *addresses.get(node_id, (None, 22)))
+                    for node_id in wave
+                ]
+                reboots.update((node.node_id, node) for node in nodes)
+                self._run_wave(nodes, pool)
+        return reboots
+
+    def _run_wave(self, nodes: List[NodeReboot], pool: ThreadPoolExecutor) -> None:
+        LOG.info(f"Rebooting nodes {[node.node_id for node in nodes]}")
+        errors = self.reboot_fn([node.node_id for node in nodes])
+        start = self.clock()
+        for node in nodes:
+            node.reboot_at = start
+            node.next_probe = start + DOWN_PROBE_INTERVAL
+            if node.node_id in errors:
+                self._fail(node, f"Reboot failed: {errors[node.node_id]}")
+
+        while True:
+            now = self.clock()
+            for node in nodes:
+                if node.state in _FINAL_STATES:
+                    continue
+                if now - start > self.timeout:
+                    self._fail(node, f"Timed out ({node.state.name})")
+                elif (
+                    node.state == RebootState.REBOOTING
+                    and now - start > self.down_timeout
+                ):
+                    self._fail(node, "Did not go down")
+            active = [node for node in nodes if node.state not in _FINAL_STATES]
+            if not active:
+                return
+            due = [node for node in active if node.next_probe <= now]
+            if due:
+                # All probes complete before the clock is read again
+                list(pool.map(self._step, due))
+            else:
+                self.sleep(min(node.next_probe for node in active) - now)
+
+    def _fail(self, node: NodeReboot, error: str) -> None:
+        LOG.warning(f"Node {node.node_id} reboot failed: {error}")
+        node.state = RebootState.FAILED
+        node.error = error
+
+    def _port_open(self, node: NodeReboot) -> bool:
+        assert node.host is not None
+        return self.probe_fn(node.host, node.port, PROBE_TIMEOUT)
+
+    def _step(self, node: NodeReboot) -> None:
+        """Probe a node and advance its state"""
+        if node.state == RebootState.REBOOTING:
+            if node.host is None:
+                # Not probed: give it time to go down
+                assert node.reboot_at is not None
+                if self.clock() - node.reboot_at >= REBOOT_GRACE_SECS:
+                    node.state = RebootState.DOWN
+                else:
+                    node.next_probe = node.reboot_at + REBOOT_GRACE_SECS
+                    return
+            elif self._port_open(node):
+                node.next_probe = self.clock() + DOWN_PROBE_INTERVAL
+                return
+            else:
+                node.state = RebootState.DOWN
+                node.down_at = self.clock()
+                LOG.info(f"Node {node.node_id} is down")
+            node.backoff.reset()
+
+        if node.state == RebootState.DOWN:
+            if node.host is not None and not self._port_open(node):
+                node.next_probe = self.clock() + node.backoff.next()
+                return
+            node.state = RebootState.UP
+            node.up_at = self.clock() if node.host is not None else None
+            LOG.info(f"Node {node.node_id} is up")
+            node.backoff.reset()
+        elif node.state == RebootState.UP:
+            if node.host is not None and not self._port_open(node):
+                # Went down again (e.g. rebooted twice by an upgrade)
+                node.state = RebootState.DOWN
+                node.up_at = None
+                node.next_probe = self.clock() + node.backoff.next()
+                return
+
+        if self.ready_fn(node.node_id):
+            node.state = RebootState.READY
+            node.ready_at = self.clock()
+            LOG.info(f"Node {node.node_id} is ready")
+        else:
+            node.next_probe = self.clock() + node.backoff.next()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Columnar tables of beamforming scan results.
+
+api_service `getScanStatus` results ({"scans": {token: scan}}) are parsed
+incrementally, one scan at a time, from a stream of response chunks, and
+every route measurement is normalized into a row of a NumPy structured
+array. Node MAC addresses are stored once, in `nodes`, and referenced by
+index. The table is persisted as a compressed .npz file, and per-response
+summaries (route counts, best beam pair...) are computed from the columns
+without iterating over measurements in Python.
+"""
+
+import codecs
+import json
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple, Union
+
+# Scan result fields, by table. Node fields are indexes into `nodes`.
+SCAN_FIELDS = [
+    ("token", "i4"),
+    ("type", "i1"),
+    ("sub_type", "i1"),
+    ("mode", "i1"),
+    ("tx_node", "i4"),
+    ("start_bwgd", "i8"),
+    ("apply", "?"),
+]
+RESPONSE_FIELDS = [
+    ("token", "i4"),
+    ("node", "i4"),
+    ("status", "i2"),
+    ("old_beam", "i2"),
+    ("new_beam", "i2"),
+    ("routes", "i4"),
+]
+MEASUREMENT_FIELDS = [
+    ("token", "i4"),
+    ("tx_node", "i4"),
+    ("rx_node", "i4"),
+    ("tx_beam", "i2"),
+    ("rx_beam", "i2"),
+    ("packet_idx", "i1"),
+    ("snr", "f4"),
+    ("rssi", "f4"),
+    ("post_snr", "f4"),
+    ("rx_start", "i4"),
+]
+# Characters decoded per chunk when parsing files
+PARSE_CHUNK_CHARS = 1 << 20
+# Growth of the buffer before decoding an incomplete value again
+RETRY_GROWTH = 4
+# Field of the scan status result holding the scans
+_SCANS_KEY = "scans"
+
+_WHITESPACE = " \t\n\r"
+
+
+class _ChunkReader:
+    """Incremental JSON decoding of a stream of text (or UTF-8) chunks"""
+
+    def __init__(self, chunks: Iterable[Union[str, bytes]]) -> None:
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> bool:
+        """Append the next chunk to the buffer, False at the end"""
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            chunk = self.decoder.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            chunk = self.decoder.decode(chunk)
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at the end)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of `chars`"""
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Expected one of {chars!r} at {self.pos}, got {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        """Decode the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buf, self.pos)
+                # A number may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            # Incomplete: grow the buffered value geometrically before
+            # retrying, so large values are not decoded again for each chunk
+            pending = len(self.buf) - self.pos
+            while len(self.buf) - self.pos < RETRY_GROWTH * pending and self._read():
+                pass
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over the keys of the next JSON object. The caller must
+        consume the value of each key (e.g. with value()) before the next.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+
+def iter_scans(chunks: Iterable[Union[str, bytes]]) -> Iterator[Tuple[str, Dict]]:
+    """Yield the (token, scan) pairs of a getScanStatus result, given as a
+    stream of text (or UTF-8) chunks, decoding one scan at a time
+    """
+    reader = _ChunkReader(chunks)
+    for key in reader.keys():
+        if key != _SCANS_KEY:
+            reader.value()
+            continue
+        for token in reader.keys():
+            yield token, reader.value()
+
+
+def read_chunks(path: str, chunk_chars: int = PARSE_CHUNK_CHARS) -> Iterator[str]:
+    """Yield the contents of a text file in chunks"""
+    with open(path) as f:
+        for chunk in iter(lambda: f.read(chunk_chars), ""):
+            yield chunk
+
+
+class ScanTable:
+    def __init__(self, scans, responses, measurements, nodes: List[str]) -> None:
+        """Scan results as structured arrays (see the *_FIELDS lists)"""
+        self.scans = scans
+        self.responses = responses
+        self.measurements = measurements
+        # Node MAC addresses, indexed by the node fields
+        self.nodes = nodes
+
+    @classmethod
+    def from_scans(cls, scans: Iterable[Tuple[str, Dict]]) -> "ScanTable":
+        """Normalize (token, scan) pairs (e.g. from iter_scans())"""
+        import numpy as np
+
+        node_index: Dict[str, int] = {}
+
+        def node(mac: str) -> int:
+            return node_index.setdefault(mac, len(node_index))
+
+        scan_rows = []
+        response_rows = []
+        chunks = []
+        nan = float("nan")
+        for token, scan in scans:
+            token = int(token)
+            tx_node = node(scan.get("txNode", ""))
+            scan_rows.append(
+                (
+                    token,
+                    scan.get("type", 0),
+                    scan.get("subType", 0),
+                    scan.get("mode", 0),
+                    tx_node,
+                    scan.get("startBwgdIdx", 0),
+                    scan.get("apply", False),
+                )
+            )
+            for mac, response in scan.get("responses", {}).items():
+                rx_node = node(mac)
+                routes = response.get("routeInfoList", [])
+                response_rows.append(
+                    (
+                        token,
+                        rx_node,
+                        response.get("status", -1),
+                        response.get("oldBeam", -1),
+                        response.get("newBeam", -1),
+                        len(routes),
+                    )
+                )
+                if not routes:
+                    continue
+                # One pass per column: cheaper than building a tuple per route
+                chunk = np.empty(len(routes), dtype=MEASUREMENT_FIELDS)
+                chunk["token"] = token
+                chunk["tx_node"] = tx_node
+                chunk["rx_node"] = rx_node
+                beams = [r["route"] for r in routes]
+                chunk["tx_beam"] = [b["tx"] for b in beams]
+                chunk["rx_beam"] = [b["rx"] for b in beams]
+                chunk["packet_idx"] = [r["packetIdx"] for r in routes]
+                chunk["snr"] = [r["snrEst"] for r in routes]
+                chunk["rssi"] = [r.get("rssi", nan) for r in routes]
+                chunk["post_snr"] = [r.get("postSnr", nan) for r in routes]
+                chunk["rx_start"] = [r.get("rxStart", -1) for r in routes]
+                chunks.append(chunk)
+
+        return cls(
+            np.array(scan_rows, dtype=SCAN_FIELDS),
+            np.array(response_rows, dtype=RESPONSE_FIELDS),
+            (
+                np.concatenate(chunks)
+                if chunks
+                else np.empty(0, dtype=MEASUREMENT_FIELDS)
+            ),
+            list(node_index),
+        )
+
+    def save(self, file: Union[str, BinaryIO]) -> None:
+        """Save the table into a compressed .npz file (path or file object)"""
+        import numpy as np
+
+        np.savez_compressed(
+            file,
+            scans=self.scans,
+            responses=self.responses,
+            measurements=self.measurements,
+            nodes=np.array(self.nodes, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ScanTable":
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(
+                data["scans"],
+                data["responses"],
+                data["measurements"],
+                [str(mac) for mac in data["nodes"]],
+            )
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per scan response with measurements: the number of measurements
+        and unique routes (per packet index), the minimum SNR, and the beam
+        pair with the best mean SNR
+        """
+        import numpy as np
+
+        m = self.measurements
+        if not len(m):
+            return []
+        # Group measurements by response, then by beam pair
+        response_key = (m["token"].astype(np.int64) << 32) | m["rx_node"]
+        responses, group = np.unique(response_key, return_inverse=True)
+        group = group.ravel()
+        beams = (m["tx_beam"].astype(np.int64) & 0xFFFF) << 16 | (
+            m["rx_beam"].astype(np.int64) & 0xFFFF
+        )
+        pair_key = (group.astype(np.int64) << 32) | beams
+        pairs, first, pair_idx = np.unique(
+            pair_key, return_index=True, return_inverse=True
+        )
+        pair_idx = pair_idx.ravel()
+        pair_snr = np.bincount(pair_idx, weights=m["snr"]) / np.bincount(pair_idx)
+        pair_group = pairs >> 32
+        # Best pair of each group: first of each group by descending SNR
+        order = np.lexsort((-pair_snr, pair_group))
+        best = order[np.r_[0, np.flatnonzero(np.diff(pair_group[order])) + 1]]
+
+        counts = np.bincount(group, minlength=len(responses))
+        min_snr = np.full(len(responses), np.inf)
+        np.minimum.at(min_snr, group, m["snr"])
+        route_counts = [
+            np.bincount(
+                np.unique(pair_key[m["packet_idx"] == packet_idx]) >> 32,
+                minlength=len(responses),
+            )
+            for packet_idx in (0, 1)
+        ]
+
+        rows = []
+        for i, key in enumerate(responses):
+            best_measurement = m[first[best[i]]]
+            rows.append(
+                {
+                    "token": int(key >> 32),
+                    "node": self.nodes[int(key & 0xFFFFFFFF)],
+                    "measurements": int(counts[i]),
+                    "routes pkt0": int(route_counts[0][i]),
+                    "routes pkt1": int(route_counts[1][i]),
+                    "min snr": round(float(min_snr[i]), 1),
+                    "best tx": int(best_measurement["tx_beam"]),
+                    "best rx": int(best_measurement["rx_beam"]),
+                    "best snr": round(float(pair_snr[best[i]]), 1),
+                }
+            )
+        return rows
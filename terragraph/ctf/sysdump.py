@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Streaming sysdump collection.
+
+Instead of building an archive on the node and copying it once complete,
+the sysdump is produced as `tar | zstd` (or gzip when zstd is unavailable,
+or when requested) and read from the SSH channel as it is compressed, so
+node CPU, the link and the local disk work concurrently.
+
+The compressed stream is also written to a spool file on the node (`tee`
+ignoring SIGPIPE, so the spool is completed even if the runner goes away).
+When a transfer breaks, it resumes from the bytes already received by
+reading the spool instead of producing a different archive. The stream is
+capped to a byte budget, and verified against the spool's checksum before
+the spool is removed. The spool is only completed if both tar and the
+compressor succeed (the node's shell may not support pipefail, so they
+record their exit status next to the spool); otherwise the stream fails
+and is restarted.
+
+Channels are opened with an injected function returning objects with the
+paramiko Channel interface (exec_command(), recv(), recv_exit_status() and
+close()), so streams can be tested without an SSH server.
+"""
+
+import hashlib
+import logging
+import os
+import shlex
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+LOG = logging.getLogger(__name__)
+
+# Paths archived by the sysdump
+SYSDUMP_PATHS = ["/var/log", "/data/cfg", "/etc/tgversion"]
+# Maximum compressed size of a sysdump (bytes, 0 for unlimited)
+DEFAULT_MAX_BYTES = 512 << 20
+# Attempts to resume a broken stream
+DEFAULT_RETRIES = 2
+# Size of the reads from the channel
+CHUNK_BYTES = 256 << 10
+# Time to wait for a previous stream to complete its spool file (seconds)
+SPOOL_WAIT_SECS = 600
+# Exit code of a resumed stream whose spool file is gone
+EXIT_SPOOL_MISSING = 3
+# Exit code of a stream whose archive could not be produced
+EXIT_ARCHIVE_FAILED = 4
+
+# Compression commands by name (automatically selected if empty)
+COMPRESSORS = {"zstd": "zstd -q -c", "gzip": "gzip -c"}
+
+# Archive suffix by magic number of the compressed stream
+_SUFFIXES = {b"\x28\xb5\x2f\xfd": ".tar.zst", b"\x1f\x8b": ".tar.gz"}
+
+# Opens a channel on the node: () -> paramiko.Channel (or equivalent)
+OpenChannelFn = Callable[[], Any]
+
+
+class SysdumpStreamError(Exception):
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(message)
+        # Exit status of the remote command (-1 if the channel was lost)
+        self.status = status
+
+
+@dataclass
+class SysdumpStream:
+    """A streamed sysdump archive"""
+
+    # Local archive
+    path: str
+    size: int
+    sha256: str
+    # Was the archive cut at the byte budget?
+    truncated: bool
+    # Number of times the stream was resumed
+    resumes: int
+
+    def row(self) -> Dict[str, str]:
+        return {
+            "file": os.path.basename(self.path),
+            "bytes": str(self.size),
+            "sha256": self.sha256,
+            "truncated": str(self.truncated),
+            "resumes": str(self.resumes),
+        }
+
+
+def stream_cmd(
+    spool: str,
+    offset: int,
+    paths: List[str],
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    compressor: str = "",
+) -> str:
+    """Shell command writing a compressed archive of `paths` to its stdout
+    from byte `offset`, spooling it to `spool`. The archive is compressed
+    with the given `COMPRESSORS` entry, or zstd if available on the node
+    (gzip otherwise).
+    """
+    if compressor and compressor not in COMPRESSORS:
+        raise ValueError(f"Unknown sysdump compressor: {compressor}")
+    s = shlex.quote(spool)
+    if offset:
+        # Resume from the spool (once complete)
+        return (
+            "trap '' HUP PIPE; i=0; "
+            + f"while [ -f {s}.part ] && [ $i -lt {SPOOL_WAIT_SECS} ]; "
+            + "do sleep 1; i=$((i + 1)); done; "
+            + f"[ -f {s} ] || exit {EXIT_SPOOL_MISSING}; "
+            + f"tail -c +{int(offset) + 1} {s} 2>/dev/null"
+        )
+    relative_paths = " ".join(shlex.quote(p.lstrip("/")) for p in paths)
+    if compressor:
+        select = f"z={shlex.quote(COMPRESSORS[compressor])}; "
+    else:
+        select = (
+            "if command -v zstd >/dev/null 2>&1; "
+            + f"then z={shlex.quote(COMPRESSORS['zstd'])}; "
+            + f"else z={shlex.quote(COMPRESSORS['gzip'])}; fi; "
+        )
+    limit = f" | head -c {int(max_bytes)}" if max_bytes > 0 else ""
+    # The spool is completed if tar (which exits with 1 when files change
+    # while they are archived) and the compressor succeeded, or if the
+    # stream reached the byte budget (making them fail with EPIPE)
+    succeeded = f"[ \"$(grep -cxE 'tar [01]|compress 0' {s}.rc)\" -eq 2 ]"
+    if max_bytes > 0:
+        succeeded = f'[ "$(wc -c < {s}.part)" -ge {int(max_bytes)} ] || ' + succeeded
+    return (
+        "trap '' HUP PIPE; "
+        + select
+        + f"rm -f {s} {s}.part {s}.rc; "
+        + f"{{ tar -cf - -C / {relative_paths} 2>/dev/null; "
+        + f'echo "tar $?" >> {s}.rc; }} | '
+        + f'{{ $z 2>/dev/null; echo "compress $?" >> {s}.rc; }}{limit} | '
+        + f"tee {s}.part 2>/dev/null; "
+        + f"if {succeeded}; then rm -f {s}.rc; mv {s}.part {s}; "
+        + f"else rm -f {s}.part {s}.rc; exit {EXIT_ARCHIVE_FAILED}; fi"
+    )
+
+
+def finish_cmd(spool: str) -> str:
+    """Shell command printing the checksum of a spool file and removing it"""
+    s = shlex.quote(spool)
+    return f"[ -f {s} ] && sha256sum {s} | cut -d' ' -f1; rm -f {s} {s}.part"
+
+
+def _run(open_channel: OpenChannelFn, cmd: str, f=None) -> bytes:
+    """Run a command on a new channel, appending its output to file `f` (or
+    returning it). Raises on failure.
+    """
+    channel = open_channel()
+    try:
+        channel.exec_command(cmd)
+        output = []
+        while True:
+            chunk = channel.recv(CHUNK_BYTES)
+            if not chunk:
+                break
+            if f:
+                f.write(chunk)
+            else:
+                output.append(chunk)
+        status = channel.recv_exit_status()
+    finally:
+        channel.close()
+    if status != 0:
+        raise SysdumpStreamError(f"Stream ended with status {status}", status)
+    return b"".join(output)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stream_sysdump(
+    open_channel: OpenChannelFn,
+    spool: str,
+    local_path: str,
+    paths: List[str] = SYSDUMP_PATHS,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    retries: int = DEFAULT_RETRIES,
+    compressor: str = "",
+) -> SysdumpStream:
+    """Stream a sysdump archive to `local_path` (plus the compression
+    suffix), resuming broken streams up to `retries` times. Partial output
+    is kept in `local_path`.part, and resumed by later calls.
+
+    See stream_cmd() for the `compressor` names.
+    """
+    part = f"{local_path}.part"
+    resumes = 0
+    while True:
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        try:
+            with open(part, "ab") as f:
+                cmd = stream_cmd(spool, offset, paths, max_bytes, compressor)
+                _run(open_channel, cmd, f)
+            break
+        except Exception as e:
+            status = getattr(e, "status", None)
+            if status == EXIT_SPOOL_MISSING:
+                LOG.warning(f"Sysdump spool {spool} is gone, restarting the stream")
+                os.remove(part)
+            elif status == EXIT_ARCHIVE_FAILED:
+                LOG.warning(f"Sysdump archive of {paths} failed, restarting the stream")
+                os.remove(part)
+            if resumes >= retries:
+                raise
+            resumes += 1
+            LOG.warning(f"Sysdump stream failed ({e}), resuming ({resumes})")
+
+    size = os.path.getsize(part)
+    if not size:
+        os.remove(part)
+        raise ValueError("Empty sysdump archive")
+    sha256 = _file_sha256(part)
+    remote_sha256 = _run(open_channel, finish_cmd(spool)).decode().strip()
+    if remote_sha256 and remote_sha256 != sha256:
+        os.remove(part)
+        raise ValueError(f"Sysdump checksum mismatch: {sha256} != {remote_sha256}")
+
+    with open(part, "rb") as f:
+        magic = f.read(4)
+    suffix = next((s for m, s in _SUFFIXES.items() if magic.startswith(m)), ".tar")
+    os.replace(part, local_path + suffix)
+    return SysdumpStream(
+        local_path + suffix,
+        size,
+        sha256,
+        truncated=max_bytes > 0 and size >= max_bytes,
+        resumes=resumes,
+    )
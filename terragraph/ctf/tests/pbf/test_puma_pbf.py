@@ -6,7 +6,6 @@
 # LICENSE file in the root directory of this source tree.
 
 import datetime
-import json
 import logging
 import os
 from argparse import Namespace
@@ -38,12 +37,16 @@ class TestPBF(TestX86TGIgn):
         self,
         controller_node_id: int,
     ):
-        api_status = self.api_service_request(
-            "getScanStatus",
-        )
-        api_status_json_encoded = json.dumps(api_status)
-        with open("/tmp/api_status.json", "w") as file:
-            file.write(api_status_json_encoded)
+        # Scan results are parsed as they are received, and also saved for
+        # the verification script on the controller
+        table = self.get_scan_table(save_path="/tmp/api_status.json")
+        failed = table.responses[table.responses["status"] != 0]
+        for response in failed:
+            self.log_to_ctf(
+                f"Scan {response['token']}: response from "
+                + f"{table.nodes[response['node']]} has status {response['status']}",
+                "warning",
+            )
 
         status_tg_scan_to_file: str = "mkdir -p /tmp/e2e_custom_logs; touch /tmp/e2e_custom_logs/scan_logs_full.json"
         futures: Dict = self.run_cmd(status_tg_scan_to_file, [controller_node_id])
@@ -7,7 +7,7 @@
 
 import logging
 import re
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from ctf.ctf_client.runner.exceptions import DeviceCmdError, TestFailed
 from terragraph.ctf.sit import SitPumaTgCtfTest
@@ -20,18 +20,30 @@ class TestTgQos(SitPumaTgCtfTest, x86TrafficGenCtfTest):
     def packet_capture(
         self, node_ids: List[int], interface: str, testname: str
     ) -> None:
-        cmd: str = f"ip netns exec {interface} nohup tcpdump -i {interface} > {interface}_{testname}x86.pcap 2>&1 &"
-        futures: Dict = self.run_cmd(cmd, node_ids)
-        for result in self.wait_for_cmds(futures):
-            if not result["success"]:
-                error_msg = (
-                    f"Node {result['node_id']}: {cmd} failed: " + f"{result['error']}"
+        """Start a pcap capture on `interface` (in its own namespace) of the
+        given x86 nodes; summarize it with packet_capture_summary()
+        """
+        self.start_packet_capture(node_ids, interface, f"{testname}x86")
+
+    def packet_capture_summary(
+        self,
+        node_ids: List[int],
+        interface: str,
+        testname: str,
+        expected_dscps: Optional[List[int]] = None,
+    ) -> None:
+        """Stop a capture started with packet_capture() and record its
+        per-DSCP/per-flow summary. Fails if any DSCP in `expected_dscps` was
+        not captured on a node.
+        """
+        dscp_rows = self.stop_packet_capture(node_ids, interface, f"{testname}x86")
+        for node_id, rows in dscp_rows.items():
+            missing = set(expected_dscps or []) - {row["dscp"] for row in rows}
+            if missing:
+                raise TestFailed(
+                    f"Node {node_id}: no packets with DSCP {sorted(missing)} "
+                    + f"captured on {interface}"
                 )
-                self.log_to_ctf(error_msg, "error")
-                raise DeviceCmdError(error_msg)
-            self.log_to_ctf(
-                f"Packet capture cmd {cmd} applied successfully on node {result['node_id']} : {result['message']}"
-            )
 
     def print_policerinfo(self, node_ids: List[int]) -> None:
         cmd: str = "vppctl show policer"
@@ -64,6 +76,8 @@ class TestTgQos(SitPumaTgCtfTest, x86TrafficGenCtfTest):
         ping_options["allow_min_latency"] = ping_options.get("allow_min_latency", -1)
         ping_options["allow_avg_latency"] = ping_options.get("allow_avg_latency", -1)
         ping_options["allow_max_latency"] = ping_options.get("allow_max_latency", -1)
+        ping_options["allow_p99_latency"] = ping_options.get("allow_p99_latency", -1)
+        ping_options["allow_jitter"] = ping_options.get("allow_jitter", -1)
 
         ping_result = self.cpe_ping(
             from_device_id,
@@ -81,6 +95,8 @@ class TestTgQos(SitPumaTgCtfTest, x86TrafficGenCtfTest):
             or ping_options["allow_min_latency"] != -1
             or ping_options["allow_avg_latency"] != -1
             or ping_options["allow_max_latency"] != -1
+            or ping_options["allow_p99_latency"] != -1
+            or ping_options["allow_jitter"] != -1
         ):
             if ping_result:
                 sumry_packet_loss = re.search(
@@ -138,6 +154,19 @@ class TestTgQos(SitPumaTgCtfTest, x86TrafficGenCtfTest):
                     error_msg = f"Cpe ping failed to meet maximum latency criteria of {ping_options['allow_max_latency']} "
                     raise TestFailed(error_msg)
 
+                latency_stats = ping_result["latency_stats"] or {}
+                if ping_options["allow_p99_latency"] != -1 and (
+                    latency_stats.get("p99", -1) > ping_options["allow_p99_latency"]
+                ):
+                    error_msg = f"Cpe ping failed to meet p99 latency criteria of {ping_options['allow_p99_latency']} "
+                    raise TestFailed(error_msg)
+
+                if ping_options["allow_jitter"] != -1 and (
+                    latency_stats.get("jitter", -1) > ping_options["allow_jitter"]
+                ):
+                    error_msg = f"Cpe ping failed to meet jitter criteria of {ping_options['allow_jitter']} "
+                    raise TestFailed(error_msg)
+
     def iterate_iperf(
         self, iterations: int, traffic_profile: List[Dict[str, Any]]
     ) -> None:
@@ -8,22 +8,49 @@
 """
 Library containing Terragraph test utilities.
 """
-import datetime
 import ipaddress
 import json
 import logging
 import os
 import subprocess
+import threading
 import time
 from argparse import Namespace
 from concurrent.futures import as_completed
-from typing import cast, Dict, List, Optional, Set
+from typing import Any, cast, Dict, Iterable, List, Optional, Set
 
+from ctf.common.connections.SSHConnection import SSHConnection
+from ctf.ctf_client.lib.helper_functions import dict_to_pretty_table
 from ctf.ctf_client.runner.exceptions import DeviceCmdError, TestFailed, TestUsageError
 
 from ctf.ctf_client.runner.lib import BaseCtfTest
 
 from .consts import TgCtfConsts
+from .inventory import (
+    BOOT_ID_CMD,
+    DEFAULT_SECTIONS,
+    inventory_cmd,
+    inventory_rows,
+    InventoryCache,
+    parse_inventory,
+)
+from .node_metrics import (
+    concat_samples,
+    DEFAULT_INTERVAL_SECS,
+    fetch_samples_cmd,
+    parse_samples,
+    sample_offset,
+    start_sampler_cmd,
+    stop_sampler_cmd,
+    summary_row,
+)
+from .reboot import (
+    hop_distances,
+    NodeReboot,
+    RebootOrchestrator,
+    RebootState,
+    reboot_waves,
+)
 
 
 try:
@@ -49,6 +76,17 @@ class BaseTgCtfTest(BaseCtfTest):
     # Log files to collect from Terragraph devices
     LOG_FILES: List[str] = []
 
+    # Read-only node queries, reused for this long (in seconds) with
+    # --cmd-cache. Network state queries expire quickly, as commands run on
+    # other nodes (e.g. the controller) can change it.
+    IDEMPOTENT_COMMANDS: Dict[str, float] = {
+        r"get_hw_info \w+": 3600,
+        r"cat /data/cfg/node_config\.json": 300,
+        r"(/usr/sbin/)?tg2 minion (status|links) --json": 5,
+        r"/usr/sbin/puff decision adj \| grep terra": 5,
+        r"ip (-\w+ )*(link|addr)( show)?( \S+)?": 10,
+    }
+
     def __init__(self, args: Namespace) -> None:
         super().__init__(args)
 
@@ -58,6 +96,29 @@ class BaseTgCtfTest(BaseCtfTest):
         # - `get_current_node_config()`
         self.node_configs: Dict[int, Dict] = {}
 
+        # Map from node IDs to inventory fields (versions, kernel, hardware
+        # info), populated by `collect_inventory()` and dropped on reboot
+        self.inventory: Dict[int, Dict[str, str]] = {}
+        # Protects: inventory
+        self.inventory_lock = threading.Lock()
+        # Persistent inventory cache keyed by boot ID (if configured)
+        self.inventory_cache: Optional[InventoryCache] = (
+            InventoryCache(self.test_args["inventory_cache_file"])
+            if self.test_args.get("inventory_cache_file")
+            else None
+        )
+
+        # Node metrics samples fetched from each node (see node_metrics.py),
+        # in fetch order, and the last sample line fetched
+        self.node_metrics: Dict[int, List[Dict]] = {}
+        self.node_metrics_last: Dict[int, str] = {}
+        # Sampling interval of the node metrics samplers, in seconds
+        self.node_metrics_interval: Optional[float] = None
+        # Number of samples between samples of the stats command
+        self.node_metrics_stats_every = 1
+        # Protects: node_metrics, node_metrics_last
+        self.node_metrics_lock = threading.Lock()
+
         # Set Terragraph device log files
         self.logfiles["terragraph"] = self.LOG_FILES
 
@@ -75,6 +136,29 @@ class BaseTgCtfTest(BaseCtfTest):
             "default": False,
             "convert": lambda k: k.lower() == "true",
         }
+        test_params["reboot_wave_size"] = {
+            "desc": (
+                "Maximum number of nodes rebooted at once by reboot_and_wait() "
+                + "(0 for all nodes)"
+            ),
+            "default": 0,
+            "convert": int,
+        }
+        test_params["reboot_leaves_first"] = {
+            "desc": (
+                "Reboot the nodes farthest from the PoPs of the E2E topology "
+                + "first in reboot_and_wait()"
+            ),
+            "default": False,
+            "convert": lambda k: k.lower() == "true",
+        }
+        test_params["inventory_cache_file"] = {
+            "desc": (
+                "If specified, cache device inventories (versions, hardware "
+                + "info) in this file, keyed by boot ID, across test runs"
+            ),
+            "default": "",
+        }
         test_params["kafka_endpoint"] = {
             "desc": "Kafka server end point url for stats collection",
             "default": TgCtfConsts.get("DEFAULT_KAFKA_ENDPOINT", ""),
@@ -191,13 +275,16 @@ class BaseTgCtfTest(BaseCtfTest):
             if device.device_type() == "terragraph"
         ]
 
-    def get_current_node_config(self, path: str = NODE_CONFIG_FILE) -> None:
-        """Retrieve the current node configuration from the test devices.
+    def get_current_node_config(
+        self, path: str = NODE_CONFIG_FILE, node_ids: Optional[List[int]] = None
+    ) -> None:
+        """Retrieve the current node configuration from the test devices (all
+        of them if `node_ids` is empty).
 
         This will update 'self.node_configs' in order with 'self.device_info'.
         """
         self.log_to_ctf(f"Fetching current node configs from: {path}", "info")
-        futures: Dict = self.run_cmd(f"cat {path}")
+        futures: Dict = self.run_cmd(f"cat {path}", node_ids)
 
         for result in self.wait_for_cmds(futures):
             self.log_to_ctf(f"Received node config from node {result['node_id']}")
@@ -426,19 +513,21 @@ class BaseTgCtfTest(BaseCtfTest):
         return ip_addr_map
 
     def wait_for_nodes_global_prefix(
-        self, timeout: int = 60, retry_interval: int = 5
+        self, timeout: int = 60, retry_interval: float = 1
     ) -> None:
         """Wait until all the nodes get assigned global IPv6 prefixes
         by the configured prefix allocation scheme.
+
+        Nodes without a prefix are watched (re-checking every
+        `retry_interval` seconds on the node itself) until they get one.
         """
-        start_time = datetime.datetime.now()
-        end_time = start_time + datetime.timedelta(seconds=timeout)
+        end_time = time.monotonic() + timeout
+        check_cmd = "ip addr show lo scope global | grep global | grep -v deprecated"
 
         # Since nodes can lose prefixes suddenly, wait until all the
         # nodes consistently report prefixes.
         while True:
             ip_addr_map = self.get_ip(interface="lo", ip_type="global")
-            now = datetime.datetime.now()
             pending_node_ids: List[int] = []
             for node_id, prefix in ip_addr_map.items():
                 if not prefix:
@@ -447,12 +536,15 @@ class BaseTgCtfTest(BaseCtfTest):
             if not pending_node_ids:
                 return
 
-            if now > end_time:
+            time_left = end_time - time.monotonic()
+            if time_left <= 0:
                 raise DeviceCmdError(
                     f"Nodes {pending_node_ids} failed to get global IPv6 prefixes"
                     + f" within {timeout} seconds"
                 )
-            time.sleep(retry_interval)
+            self.wait_for_nodes(
+                check_cmd, pending_node_ids, timeout=time_left, interval=retry_interval
+            )
 
     def ping_ip(
         self,
@@ -525,55 +617,230 @@ class BaseTgCtfTest(BaseCtfTest):
             ping_node_id = 2 if node_id == 1 else 1
             self.ping_nodes(node_id, ping_node_id, interface="lo")
 
+    def topology_hops(self) -> Dict[int, int]:
+        """Return the hop distance of each node from the nearest PoP, over
+        the links of the E2E topology in the node data. Topology nodes are
+        matched to node IDs by their name ('topologyInfo.nodeName' in the
+        node config). Returns an empty dict without a topology.
+        """
+        topology = next(
+            (
+                v["e2e_controller"]["topology"]
+                for v in self.nodes_data.values()
+                if "topology" in v.get("e2e_controller", {})
+            ),
+            None,
+        )
+        if not topology:
+            return {}
+        name_hops = hop_distances(
+            [(link["a_node_name"], link["z_node_name"]) for link in topology["links"]],
+            [node["name"] for node in topology["nodes"] if node.get("pop_node")],
+        )
+        hops: Dict[int, int] = {}
+        for node_id, v in self.nodes_data.items():
+            name = v.get("node_config", {}).get("topologyInfo", {}).get("nodeName")
+            if name in name_hops:
+                hops[int(node_id)] = name_hops[name]
+        return hops
+
     def reboot_and_wait(
         self,
         device_info: Dict,
         timeout: float = 600.0,
         device_type: str = "terragraph",
         node_ids: Optional[List[int]] = None,
-    ) -> None:
-        """Reboot all test devices and wait until they are reachable."""
-        # issue reboot command
+        wave_size: Optional[int] = None,
+        hops: Optional[Dict[int, int]] = None,
+    ) -> Dict[int, NodeReboot]:
+        """Reboot all test devices and wait until they are reachable.
+
+        Devices are rebooted in waves of `wave_size` devices (defaults to the
+        "reboot_wave_size" test arg, 0 for a single wave), farthest first if
+        their `hops` distances are given (see reboot.py), or computed from the
+        E2E topology with the "reboot_leaves_first" test arg (see
+        topology_hops()). Per-device downtimes are logged, and returned.
+        """
+        # The devices run_cmd() runs on
+        node_ids = [
+            node_id
+            for node_id, device in device_info.items()
+            if (
+                node_id in node_ids if node_ids else device.device_type() == device_type
+            )
+        ]
+        if wave_size is None:
+            wave_size = self.test_args.get("reboot_wave_size", 0)
+        if hops is None and self.test_args.get("reboot_leaves_first"):
+            hops = self.topology_hops()
+            if not hops:
+                self.log_to_ctf(
+                    "No E2E topology hop distances, rebooting nodes in any order",
+                    "warning",
+                )
+        waves = reboot_waves(node_ids, hops, wave_size)
+        # Dont wait for reconnection when timeout=0 and return early
+        if timeout == 0:
+            errors = self._reboot_nodes(node_ids, device_type)
+            if errors:
+                raise DeviceCmdError(f"Nodes {sorted(errors)} failed to be reboot")
+            return {}
+
+        addresses = {}
+        for node_id in node_ids:
+            connection = device_info[node_id].connection
+            probed = isinstance(connection, SSHConnection) and not getattr(
+                connection, "is_jump_host", False
+            )
+            addresses[node_id] = (
+                connection.ip_address if probed else None,
+                getattr(connection, "port", None) or 22,
+            )
+        step_idx = self.thread_local.step_idx
+
+        def ready(node_id: int) -> bool:
+            if step_idx:
+                # We are in a pool thread. Publish step_idx in thread local data.
+                self.thread_local.init(step_idx)
+            return self._test_can_connect(device_info[node_id].connection)
+
+        self.log_to_ctf(
+            f"Rebooting nodes in {len(waves)} wave(s) {waves}, waiting up to "
+            + f"{timeout}s per wave for them to come back..."
+        )
+        orchestrator = RebootOrchestrator(
+            reboot_fn=lambda wave: self._reboot_nodes(wave, device_type),
+            ready_fn=ready,
+            timeout=timeout,
+            max_workers=self.max_workers,
+        )
+        reboots = orchestrator.run(waves, addresses)
+        # Drop state cached before the nodes went down
+        self.invalidate_device_state(node_ids)
+        rows = [reboot.row() for reboot in reboots.values()]
+        if rows:
+            self.log_to_ctf(f"Reboot downtimes:\n{dict_to_pretty_table(rows)}")
+        failed = [
+            node_id
+            for node_id, reboot in reboots.items()
+            if reboot.state != RebootState.READY
+        ]
+        if failed:
+            raise DeviceCmdError(f"Failed to connect to nodes {failed} after reboot")
+        return reboots
+
+    def _reboot_nodes(self, node_ids: List[int], device_type: str) -> Dict[int, str]:
+        """Issue the reboot of nodes, returning the errors of failed ones"""
         reboot_msg_cmd: str = (
             f"wall -n '==== Rebooting for CTF test {self.test_exe_id} ===='"
         )
         futures: Dict = self.run_cmd(
             f"{reboot_msg_cmd}; reboot", node_ids=node_ids, device_type=device_type
         )
+        self.invalidate_inventory(list(futures.values()))
+        errors: Dict[int, str] = {}
         for result in self.wait_for_cmds(futures):
             self.log_to_ctf(f"Rebooting node {result['node_id']}", "info")
             if not result["success"]:
-                raise DeviceCmdError(f"Node {result['node_id']} failed to be reboot")
+                errors[result["node_id"]] = result["error"] or "reboot failed"
+        return errors
 
-        # Dont wait for reconnection when timeout=0 and return early
-        if timeout == 0:
-            return
+    def _inventory_node_ids(self, node_ids: Optional[List[int]]) -> List[int]:
+        """Nodes that run_cmd() would run on for `node_ids`"""
+        if node_ids:
+            return [node_id for node_id in self.device_info if node_id in node_ids]
+        return [
+            node_id
+            for node_id, device in self.device_info.items()
+            if device.device_type() == "generic"
+        ]
 
-        # wait for nodes to initiate reboot before re-attempting connection
-        time.sleep(5)
+    def inventory_sections(self, node_id: int) -> Dict[str, str]:
+        """Inventory fields to collect from a node, and their commands"""
+        return DEFAULT_SECTIONS
+
+    def collect_inventory(
+        self, node_ids: Optional[List[int]] = None, refresh: bool = False
+    ) -> Dict[int, Dict[str, str]]:
+        """Return the inventory of the given nodes (see inventory.py).
+
+        Inventories are collected with one command per node, and reused for
+        the rest of the test run (until reboot) unless `refresh` is set.
+        With a persistent inventory cache, only node boot IDs are probed
+        for nodes whose inventory is cached.
+        """
+        node_ids = self._inventory_node_ids(node_ids)
+        with self.inventory_lock:
+            missing = [
+                node_id
+                for node_id in node_ids
+                if refresh or node_id not in self.inventory
+            ]
+
+        collected: Dict[int, Dict[str, str]] = {}
+        if missing and self.inventory_cache is not None and not refresh:
+            futures: Dict = self.run_cmd(BOOT_ID_CMD, missing)
+            for result in self.wait_for_cmds(futures):
+                cached = (
+                    self.inventory_cache.get(result["message"])
+                    if result["success"]
+                    else None
+                )
+                if cached is not None:
+                    collected[result["node_id"]] = cached
+            missing = [node_id for node_id in missing if node_id not in collected]
+            if collected:
+                self.log_to_ctf(f"Using cached inventory of nodes {sorted(collected)}")
 
-        # attempt to reconnect
-        self.log_to_ctf(f"Trying to reconnect to all nodes for up to {timeout}s...")
         futures = {}
-        for node_id, device in device_info.items():
-            if device.device_type() == device_type:
-                futures[
-                    self.thread_pool.submit(
-                        self.test_can_connect,
-                        node_id,
-                        retry_interval=5,
-                        # pyre-fixme[6]: For 4th param expected `int` but got `float`.
-                        timeout=timeout - 1,
-                        step_idx=self.thread_local.step_idx,
-                    )
-                ] = node_id
-            for future in as_completed(futures.keys(), timeout=timeout):
-                if future.result():
-                    self.log_to_ctf(f"Can connect to node {futures[future]}")
-                else:
-                    raise DeviceCmdError(
-                        f"Failed to connect to node {futures[future]} after reboot"
-                    )
+        for node_id in missing:
+            futures.update(
+                self.run_cmd(inventory_cmd(self.inventory_sections(node_id)), [node_id])
+            )
+        probed: List[Dict[str, str]] = []
+        for result in self.wait_for_cmds(futures):
+            if not result["success"]:
+                raise DeviceCmdError(
+                    f"Failed to read inventory from node {result['node_id']}"
+                )
+            collected[result["node_id"]] = parse_inventory(result["message"])
+            probed.append(collected[result["node_id"]])
+        if probed and self.inventory_cache is not None:
+            self.inventory_cache.put(probed)
+
+        with self.inventory_lock:
+            self.inventory.update(collected)
+            return {node_id: self.inventory[node_id] for node_id in node_ids}
+
+    def invalidate_inventory(self, node_ids: Optional[List[int]] = None) -> None:
+        """Drop the inventory of the given nodes (all if empty), e.g. after
+        a reboot or upgrade
+        """
+        with self.inventory_lock:
+            if node_ids:
+                for node_id in node_ids:
+                    self.inventory.pop(node_id, None)
+            else:
+                self.inventory.clear()
+
+    def get_inventory_field(
+        self,
+        field: str,
+        desc: str,
+        node_ids: Optional[List[int]] = None,
+        refresh: bool = False,
+    ) -> Set[str]:
+        """Return the distinct values of an inventory field on the given
+        nodes. Raises DeviceCmdError if the field is missing on a node.
+        """
+        values: Set[str] = set()
+        inventories = self.collect_inventory(node_ids, refresh=refresh)
+        for node_id, inventory in sorted(inventories.items()):
+            if field not in inventory:
+                raise DeviceCmdError(f"Failed to read {desc} from node {node_id}")
+            values.add(inventory[field])
+            self.log_to_ctf(f"Node {node_id} {desc}: {inventory[field].strip()}")
+        return values
 
     def tg_verify_versions(self) -> None:
         """Verify that the Terragraph version strings on all test devices
@@ -581,6 +848,8 @@ class BaseTgCtfTest(BaseCtfTest):
 
         Raises TestFailed if any version strings differ or none were found.
         """
+        inventory = self.collect_inventory()
+        self.save_inventory_table(inventory)
         versions = self.get_tg_version()
         fw_versions = self.get_fw_version()
         if len(versions) > 1 or len(fw_versions) > 1:
@@ -592,44 +861,141 @@ class BaseTgCtfTest(BaseCtfTest):
         elif len(versions) < 1 or versions.pop() == "":
             raise TestFailed("No Terragraph versions found")
 
+    def save_inventory_table(self, inventory: Dict[int, Dict[str, Any]]) -> None:
+        """Record the inventory of nodes as a CTF table"""
+        rows = inventory_rows(inventory)
+        if not rows:
+            return
+        self.add_ctf_json_data(
+            {
+                "ctf_tables": [
+                    {
+                        "title": "Device Inventory",
+                        "columns": ",".join(rows[0].keys()),
+                        "data_source_list": "inventory",
+                    }
+                ],
+                "ctf_data": [{"data_source": "inventory", "data_list": rows}],
+            }
+        )
+
     def get_tg_version(self, node_ids: Optional[List[int]] = None) -> Set[str]:
         """Retrieve the Terragraph version strings from test devices.
 
         This checks `/etc/tgversion` first, then falls back to `/etc/version`.
         """
-        futures: Dict = self.run_cmd(
-            "cat /etc/tgversion 2>/dev/null || cat /etc/version", node_ids
-        )
-        versions: Set[str] = set()
-
-        for result in self.wait_for_cmds(futures):
-            if not result["success"]:
-                raise DeviceCmdError(
-                    f"Failed to read version from node {result['node_id']}"
-                )
-
-            ver = result["message"]
-            versions.add(ver)
-            self.log_to_ctf(f"Node {result['node_id']} version: {ver.strip()}")
-
-        return versions
+        return self.get_inventory_field("tg_version", "version", node_ids)
 
     def get_fw_version(self, node_ids: Optional[List[int]] = None) -> Set[str]:
         """Retrieve the wigig firmware version strings from test devices."""
-        futures: Dict = self.run_cmd("get_fw_version", node_ids)
-        versions: Set[str] = set()
+        return self.get_inventory_field("fw_version", "firmware version", node_ids)
 
+    def start_node_metrics(
+        self,
+        node_ids: Optional[List[int]] = None,
+        interval: float = DEFAULT_INTERVAL_SECS,
+        stats_cmd: str = "",
+        stats_keys: Iterable[str] = (),
+        stats_every: int = 1,
+    ) -> None:
+        """Start sampling CPU, memory and interface counters (and the
+        `stats_keys` of `stats_cmd` every `stats_every` samples) on nodes
+        every `interval` seconds, see node_metrics.py. Previously fetched
+        samples are dropped.
+        """
+        node_ids = self._inventory_node_ids(node_ids)
+        # Stopped separately: the start command matches the sampler pattern
+        futures: Dict = self.run_cmd(stop_sampler_cmd(), node_ids)
+        for _result in self.wait_for_cmds(futures):
+            pass
+        cmd = start_sampler_cmd(
+            interval,
+            stats_cmd=stats_cmd,
+            stats_keys=stats_keys,
+            stats_every=stats_every,
+        )
+        self.log_to_ctf(f"Starting node metrics sampling on nodes {node_ids}")
+        futures = self.run_cmd(cmd, node_ids)
         for result in self.wait_for_cmds(futures):
             if not result["success"]:
                 raise DeviceCmdError(
-                    f"Failed to read firmware version from node {result['node_id']}"
+                    f"Failed to start node metrics sampling on node {result['node_id']}"
                 )
+        self.node_metrics_interval = interval
+        self.node_metrics_stats_every = stats_every
+        with self.node_metrics_lock:
+            for node_id in node_ids:
+                self.node_metrics[node_id] = []
+                self.node_metrics_last.pop(node_id, None)
+
+    def collect_node_metrics(
+        self, node_ids: Optional[List[int]] = None
+    ) -> Dict[int, Dict]:
+        """Fetch the node metrics samples taken since the last call, and
+        return all samples of the given nodes (see parse_samples()).
+        """
+        with self.node_metrics_lock:
+            node_ids = [
+                node_id
+                for node_id in self._inventory_node_ids(node_ids)
+                if node_id in self.node_metrics
+            ]
+            offsets = {
+                node_id: (
+                    sample_offset(self.node_metrics_last[node_id])
+                    if node_id in self.node_metrics_last
+                    else (0, 0)
+                )
+                for node_id in node_ids
+            }
 
-            ver = result["message"]
-            versions.add(ver)
-            self.log_to_ctf(f"Node {result['node_id']} firmware version: {ver.strip()}")
-
-        return versions
+        futures: Dict = {}
+        for node_id in node_ids:
+            futures.update(self.run_cmd(fetch_samples_cmd(offsets[node_id]), [node_id]))
+        for result in self.wait_for_cmds(futures):
+            node_id = result["node_id"]
+            if not result["success"]:
+                self.log_to_ctf(
+                    f"Failed to fetch node metrics of node {node_id}: "
+                    + f"{result['error']}",
+                    "error",
+                )
+                continue
+            lines = result["message"].rstrip("\n")
+            if not lines:
+                continue
+            with self.node_metrics_lock:
+                samples = parse_samples(
+                    lines,
+                    self.node_metrics_interval,
+                    self.node_metrics_last.get(node_id),
+                )
+                self.node_metrics[node_id].append(samples)
+                self.node_metrics_last[node_id] = lines.rsplit("\n", 1)[-1]
+
+        with self.node_metrics_lock:
+            return {
+                node_id: concat_samples(self.node_metrics[node_id])
+                for node_id in node_ids
+            }
+
+    def stop_node_metrics(self, node_ids: Optional[List[int]] = None) -> None:
+        """Fetch the last node metrics samples, stop sampling and log a
+        summary of the samples of each node. Their samples are dropped.
+        """
+        all_samples = self.collect_node_metrics(node_ids)
+        futures: Dict = self.run_cmd(stop_sampler_cmd(), list(all_samples))
+        for _result in self.wait_for_cmds(futures):
+            pass
+        with self.node_metrics_lock:
+            for node_id in all_samples:
+                self.node_metrics.pop(node_id, None)
+                self.node_metrics_last.pop(node_id, None)
+        rows = [
+            summary_row(node_id, samples) for node_id, samples in all_samples.items()
+        ]
+        if rows:
+            self.log_to_ctf(f"Node metrics:\n{dict_to_pretty_table(rows)}")
 
     def upgrade_and_reboot_tg_images(
         self,
@@ -648,6 +1014,7 @@ class BaseTgCtfTest(BaseCtfTest):
         futures: Dict = self.run_cmd(
             f"{upgrade_msg_cmd}; {image_file_path} -ur", node_ids
         )
+        self.invalidate_inventory(list(futures.values()))
         try:
             for result in self.wait_for_cmds(futures, timeout=max_upgrade_timeout):
                 self.log_to_ctf(f"Upgrading node {result['node_id']}")
@@ -660,6 +1027,7 @@ class BaseTgCtfTest(BaseCtfTest):
         # attempt to reconnect to nodes after upgrade
         futures = {}
         node_list = node_ids if node_ids else self.get_tg_devices()
+        self.invalidate_device_state(node_list)
         for node_id in node_list:
             futures[
                 self.thread_pool.submit(
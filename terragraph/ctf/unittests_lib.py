@@ -5,14 +5,58 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import gzip
+import ipaddress
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tarfile
+import threading
 import time
+from argparse import Namespace
 from concurrent.futures import as_completed, ThreadPoolExecutor
 from copy import deepcopy
-from typing import Any
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List, Optional
+from unittest import skipUnless
 
+import numpy as np
+import requests
+from ctf.ctf_client.runner.step_durations import MIN_ADAPTIVE_TIMEOUT
 from later.unittest import TestCase
-from terragraph.ctf import unittests_fixtures
+from terragraph.ctf import fw_stats, pcap, ping_latency, unittests_fixtures
+from terragraph.ctf.api_service import ApiServiceClient
+from terragraph.ctf.crash_logs import CrashLogIndex
+from terragraph.ctf.inventory import InventoryCache, inventory_rows
+from terragraph.ctf.netns_addrs import AddressMap, NETNS_ADDRS_CMD, parse_netns_addrs
+from terragraph.ctf.node_config import NodeConfigTransaction
+from terragraph.ctf.puma import PumaTgCtfTest, SYSTEM_STATS_CMD
+from terragraph.ctf.node_metrics import (
+    concat_samples,
+    fetch_samples_cmd,
+    parse_samples,
+    sample_offset,
+    start_sampler_cmd,
+    stop_sampler_cmd,
+)
+from terragraph.ctf.reboot import (
+    hop_distances,
+    reboot_waves,
+    RebootOrchestrator,
+    RebootState,
+)
+from terragraph.ctf.scan_results import iter_scans, ScanTable
+from terragraph.ctf.sysdump import (
+    EXIT_ARCHIVE_FAILED,
+    stream_sysdump,
+    SysdumpStreamError,
+)
 from terragraph.ctf.tg import BaseTgCtfTest
+from terragraph.ctf.x86_traffic_gen import x86TrafficGenCtfTest
 
 
 class TgCtfLibTests(TestCase):
@@ -197,3 +241,1491 @@ class TgCtfLibTests(TestCase):
             )
         )
         self.assertTrue(time.monotonic() <= deadline)
+
+    def test_adaptive_step_timeouts(self) -> None:
+        self.bt.thread_local.init(1)
+        self.bt.step_history = {"boot": [100.0] * 5, "new": [1.0]}
+
+        # Without --adaptive-timeouts, only the hang warning is armed
+        hang_timer = self.bt._start_step_hang_timer("boot", 1)
+        self.assertEqual(150, hang_timer.interval)
+        hang_timer.cancel()
+        self.assertEqual(60, self.bt.step_timeout(60))
+
+        # Waits are bounded by the time left in the step
+        self.bt.adaptive_timeout_margin = 2.0
+        self.bt._start_step_hang_timer("boot", 1).cancel()
+        self.assertEqual(60, self.bt.step_timeout(60))
+        self.assertEqual(200, self.bt.step_timeout(600))
+        self.bt.thread_local.step_deadline = time.monotonic() + 30
+        self.assertEqual(30, self.bt.step_timeout(60))
+        self.bt.thread_local.step_deadline = time.monotonic() - 30
+        self.assertEqual(MIN_ADAPTIVE_TIMEOUT, self.bt.step_timeout(60))
+        self.bt.thread_local.init(2)
+        self.assertIsNone(self.bt._start_step_hang_timer("new", 2))
+        self.assertEqual(60, self.bt.step_timeout(60))
+        self.bt.thread_local.clear()
+
+    def test_topology_hops(self) -> None:
+        def node(name: str) -> Dict:
+            return {"node_config": {"topologyInfo": {"nodeName": name}}}
+
+        topology = {
+            "nodes": [
+                {"name": "pop", "pop_node": True},
+                {"name": "dn", "pop_node": False},
+                {"name": "cn", "pop_node": False},
+            ],
+            "links": [
+                {"a_node_name": "pop", "z_node_name": "dn"},
+                {"a_node_name": "dn", "z_node_name": "cn"},
+            ],
+        }
+        self.bt.nodes_data = {1: node("pop"), 2: node("dn"), 3: node("cn"), 4: {}}
+        self.assertEqual({}, self.bt.topology_hops())
+
+        self.bt.nodes_data[4] = {"e2e_controller": {"topology": topology}}
+        self.assertEqual({1: 0, 2: 1, 3: 2}, self.bt.topology_hops())
+
+
+class FwStatsTests(TestCase):
+    LINES = [
+        "1602198897, tgf.00:00:00:10:0d:40.staPkt.mcs, 9",
+        "1602198897, tgf.00:00:00:10:0d:40.phystatus.ssnrEst, 12.5",
+        "not a stat line",
+        "1602198898, tgf.00:00:00:10:0d:40.staPkt.mcs, 12",
+    ]
+
+    def _write_segments(self, tmp_dir: str):
+        paths = []
+        for seq, lines in enumerate([self.LINES[:2], self.LINES[2:]], start=1):
+            path = os.path.join(tmp_dir, fw_stats.segment_name(seq))
+            with gzip.open(path, "wt") as f:
+                f.write("\n".join(lines) + "\n")
+            paths.append(path)
+        return paths
+
+    def test_segment_name(self) -> None:
+        self.assertEqual("seg_00000042.gz", fw_stats.segment_name(42))
+        self.assertEqual(42, fw_stats.segment_seq(fw_stats.segment_name(42)))
+        self.assertIsNone(fw_stats.segment_seq(".seg_00000043"))
+
+    def test_concat_segments(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "stats")
+            fw_stats.concat_segments(self._write_segments(tmp_dir), output_path)
+            with open(output_path) as f:
+                self.assertEqual(self.LINES, f.read().splitlines())
+
+    def test_parse_segments(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            # Parse one line per chunk to exercise the chunk key mapping
+            arrays = fw_stats.parse_segments(
+                self._write_segments(tmp_dir), chunk_lines=1
+            )
+
+        self.assertEqual(
+            [
+                "tgf.00:00:00:10:0d:40.staPkt.mcs",
+                "tgf.00:00:00:10:0d:40.phystatus.ssnrEst",
+            ],
+            list(arrays["keys"]),
+        )
+        self.assertEqual(
+            [1602198897, 1602198897, 1602198898], list(arrays["timestamp"])
+        )
+        self.assertEqual([0, 1, 0], list(arrays["key_idx"]))
+        self.assertEqual([9.0, 12.5, 12.0], list(arrays["value"]))
+
+
+class PingLatencyTests(TestCase):
+    OUTPUT = "\n".join(
+        [
+            "PING 2001::1(2001::1) 64 data bytes",
+            "[1602198897.100000] 72 bytes from 2001::1: icmp_seq=1 ttl=64 time=1.0 ms",
+            "[1602198897.200000] 72 bytes from 2001::1: icmp_seq=2 ttl=64 time=3.0 ms",
+            "[1602198897.210000] 72 bytes from 2001::1: icmp_seq=2 ttl=64 time=9.0 ms (DUP!)",
+            "[1602198897.500000] 72 bytes from 2001::1: icmp_seq=5 ttl=63 time=2.0 ms",
+            "",
+            "--- 2001::1 ping statistics ---",
+            "6 packets transmitted, 3 received, +1 duplicates, 50% packet loss",
+            "rtt min/avg/max/mdev = 1.0/2.0/3.0/0.816 ms",
+        ]
+    )
+
+    def test_parse_ping_replies(self) -> None:
+        replies = ping_latency.parse_ping_replies(self.OUTPUT)
+        self.assertEqual([1, 2, 5], list(replies["seq"]))
+        self.assertEqual([1.0, 3.0, 2.0], list(replies["rtt"]))
+        self.assertEqual([64, 64, 63], list(replies["ttl"]))
+        self.assertAlmostEqual(1602198897.5, replies["timestamp"][2])
+        self.assertEqual(1, replies["seq_base"])
+        self.assertEqual(6, replies["transmitted"])
+
+    def test_parse_busybox_seq_wraparound(self) -> None:
+        output = "\n".join(
+            f"64 bytes from 10.0.0.1: seq={seq} ttl=64 time=0.5 ms"
+            for seq in [65534, 65535, 0, 1]
+        )
+        replies = ping_latency.parse_ping_replies(output)
+        self.assertEqual([65534, 65535, 65536, 65537], list(replies["seq"]))
+        self.assertEqual(0, replies["seq_base"])
+        self.assertTrue(all(ts != ts for ts in replies["timestamp"]))
+
+    def test_latency_stats(self) -> None:
+        stats = ping_latency.latency_stats(ping_latency.parse_ping_replies(self.OUTPUT))
+        self.assertEqual(3, stats["received"])
+        self.assertAlmostEqual(50.0, stats["loss %"])
+        # Lost: seq 3-4 and seq 6
+        self.assertEqual(2, stats["loss bursts"])
+        self.assertEqual(2, stats["max loss burst"])
+        self.assertEqual(2.0, stats["p50"])
+        # Consecutive RTTs by seq: 1 -> 3 -> 2
+        self.assertAlmostEqual(1.5, stats["jitter"])
+
+    def test_latency_ctf_json_data_is_bounded(self) -> None:
+        output = "\n".join(
+            f"64 bytes from 10.0.0.1: icmp_seq={seq % 65536} ttl=64 "
+            + f"time={seq % 997 / 100} ms"
+            for seq in range(1, 100001)
+        )
+        replies = ping_latency.parse_ping_replies(output)
+        self.assertEqual(100000, len(replies["rtt"]))
+        self.assertEqual(0, len(ping_latency.loss_bursts(replies)))
+
+        json_data = ping_latency.latency_ctf_json_data(
+            replies, ping_latency.latency_stats(replies), "Node 1 to 10.0.0.1"
+        )
+        self.assertEqual(2, len(json_data["ctf_charts"]))
+        cdf, histogram = [d["data_list"] for d in json_data["ctf_data"][1:]]
+        self.assertTrue(len(cdf) <= ping_latency.CDF_POINTS + 2)
+        self.assertEqual(ping_latency.HISTOGRAM_BINS, len(histogram))
+        self.assertEqual(100000, sum(row["packets"] for row in histogram))
+
+    def test_save_replies(self) -> None:
+        replies = ping_latency.parse_ping_replies(self.OUTPUT)
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "ping.npz")
+            ping_latency.save_replies(path, replies)
+            with np.load(path) as saved:
+                self.assertEqual(list(replies["rtt"]), list(saved["rtt"]))
+
+
+class PcapTests(TestCase):
+    @staticmethod
+    def _ipv4_udp(dscp: int) -> bytes:
+        ip = struct.pack(
+            "!BBHHHBBH4s4s",
+            0x45,
+            dscp << 2,
+            28,
+            0,
+            0,
+            64,
+            17,
+            0,
+            ipaddress.IPv4Address("10.0.0.1").packed,
+            ipaddress.IPv4Address("10.0.0.2").packed,
+        )
+        return b"\0" * 12 + b"\x08\x00" + ip + struct.pack("!HHHH", 5000, 5001, 8, 0)
+
+    @staticmethod
+    def _vlan_ipv6_tcp(dscp: int) -> bytes:
+        ip = struct.pack(
+            "!IHBB16s16s",
+            (6 << 28) | (dscp << 22),
+            20,
+            6,
+            64,
+            ipaddress.IPv6Address("2001::1").packed,
+            ipaddress.IPv6Address("2001::2").packed,
+        )
+        vlan = b"\x81\x00\x00\x05\x86\xdd"
+        return b"\0" * 12 + vlan + ip + struct.pack("!HH", 1234, 80)
+
+    def _write_pcap(self, path: str, packets) -> None:
+        with open(path, "wb") as f:
+            f.write(struct.pack("<IHHiIII", pcap.PCAP_MAGIC_US, 2, 4, 0, 0, 128, 1))
+            for ts, packet in packets:
+                sec, usec = divmod(round(ts * 1e6), 1000000)
+                f.write(struct.pack("<IIII", sec, usec, len(packet), len(packet)))
+                f.write(packet)
+
+    def _packets(self, start: float, count: int):
+        arp = b"\xff" * 12 + b"\x08\x06" + b"\0" * 28
+        for i in range(count):
+            ts = start + i * 0.01
+            if i % 50 == 0:
+                yield ts, arp
+            elif i % 2:
+                yield ts, self._ipv4_udp(46)
+            else:
+                yield ts, self._vlan_ipv6_tcp(10)
+
+    def test_summary(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            # Ring buffer wrapped: file 0 holds the newest packets
+            paths = [os.path.join(tmp_dir, f"capture.pcap{i}") for i in range(3)]
+            self._write_pcap(paths[0], self._packets(1002, 200))
+            self._write_pcap(paths[1], self._packets(1000, 200))
+            self._write_pcap(paths[2], [])
+            self.assertEqual(paths[1::-1], pcap.order_ring_files(paths))
+
+            summary = pcap.PcapSummary()
+            # Small chunks exercise records split across reads
+            for path in pcap.order_ring_files(paths):
+                summary.add_file(path, chunk_bytes=1000)
+
+        self.assertEqual(8, summary.non_ip_packets)
+        dscp_rows = {row["dscp"]: row for row in summary.dscp_rows()}
+        self.assertEqual({10, 46}, set(dscp_rows))
+        self.assertEqual(200, dscp_rows[46]["packets"])
+        self.assertEqual(200 * 42, dscp_rows[46]["bytes"])
+        self.assertEqual(20.0, dscp_rows[46]["inter-arrival mean ms"])
+        self.assertEqual(20.0, dscp_rows[46]["inter-arrival max ms"])
+        # DSCP 10 misses packets replaced by ARP
+        self.assertEqual(40.0, dscp_rows[10]["inter-arrival max ms"])
+
+        flows = {row["src"]: row for row in summary.flow_rows()}
+        self.assertEqual(
+            ("10.0.0.2", "udp", 5000, 5001, 46),
+            tuple(
+                flows["10.0.0.1"][k] for k in ("dst", "proto", "sport", "dport", "dscp")
+            ),
+        )
+        self.assertEqual(
+            ("2001::2", "tcp", 1234, 80, 10),
+            tuple(
+                flows["2001::1"][k] for k in ("dst", "proto", "sport", "dport", "dscp")
+            ),
+        )
+
+        series = summary.series_rows()
+        self.assertEqual(4, len(series))
+        self.assertEqual(50, series[0]["dscp 46 pps"])
+        json_data = summary.ctf_json_data("Node 1 eth1")
+        self.assertEqual(2, len(json_data["ctf_tables"]))
+        self.assertEqual(1, len(json_data["ctf_charts"]))
+
+    def test_truncated_record_is_ignored(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "capture.pcap0")
+            self._write_pcap(path, self._packets(1000, 3))
+            with open(path, "ab") as f:
+                f.write(struct.pack("<IIII", 1001, 0, 42, 42) + b"\0" * 10)
+            chunks = list(pcap.read_pcap(path))
+
+        self.assertEqual(3, sum(len(chunk["timestamp"]) for chunk in chunks))
+        self.assertEqual(pcap.HEADER_BYTES, chunks[0]["headers"].shape[1])
+
+
+class NetnsAddrsTests(TestCase):
+    OUTPUT = "\n".join(
+        [
+            "@@netns ",
+            json.dumps(
+                [
+                    {
+                        "ifname": "lo",
+                        "addr_info": [{"family": "inet", "local": "127.0.0.1"}],
+                    }
+                ]
+            ),
+            "@@netns ens1",
+            json.dumps(
+                [
+                    {
+                        "ifname": "ens1",
+                        "addr_info": [
+                            {"family": "inet6", "local": "fe80::1", "scope": "link"},
+                            {"family": "inet6", "local": "2001::10", "scope": "global"},
+                            {"family": "inet6", "local": "2001::11", "scope": "global"},
+                            {"family": "inet", "local": "10.0.0.1", "scope": "global"},
+                        ],
+                    }
+                ],
+                indent=2,
+            ),
+            "@@netns empty",
+        ]
+    )
+
+    def test_parse_netns_addrs(self) -> None:
+        self.assertEqual(
+            {
+                ("", "lo", "inet"): ["127.0.0.1"],
+                ("ens1", "ens1", "inet6"): ["2001::10", "2001::11"],
+                ("ens1", "ens1", "inet"): ["10.0.0.1"],
+            },
+            parse_netns_addrs(self.OUTPUT),
+        )
+        with self.assertRaises(ValueError):
+            parse_netns_addrs("@@netns ens1\nCannot open network namespace")
+
+    def test_address_map(self) -> None:
+        address_map = AddressMap()
+        address_map.update(1, parse_netns_addrs(self.OUTPUT))
+
+        self.assertEqual("2001::10", address_map.lookup(1, "ens1", "ens1"))
+        self.assertEqual("10.0.0.1", address_map.lookup(1, "ens1", "ens1", False))
+        self.assertIsNone(address_map.lookup(1, "empty", "ens1"))
+        self.assertIsNone(address_map.lookup(2, "ens1", "ens1"))
+
+        address_map.invalidate(1)
+        self.assertFalse(address_map.known(1))
+        self.assertIsNone(address_map.lookup(1, "ens1", "ens1"))
+
+
+class _FakeTrafficGen:
+    """Traffic generator with one address, pinging `peer` at its address"""
+
+    def __init__(self, addr: str, peer: Optional["_FakeTrafficGen"] = None) -> None:
+        self.addr = addr
+        self.peer = peer
+        self.cmds = []
+
+    def device_type(self) -> str:
+        return "generic"
+
+    def action_custom_command(self, cmd: str, timeout: int):
+        self.cmds.append(cmd)
+        if cmd == NETNS_ADDRS_CMD:
+            addr_info = [{"family": "inet6", "local": self.addr, "scope": "global"}]
+            output = "@@netns ens1\n" + json.dumps(
+                [{"ifname": "ens1", "addr_info": addr_info}]
+            )
+            return {"error": 0, "returncode": 0, "message": output, "stderr": ""}
+        received = int(cmd.split()[-1] == self.peer.addr)
+        output = (
+            f"1 packets transmitted, {received} received, time 0ms\n"
+            + "rtt min/avg/max/mdev = 0.045/0.045/0.045/0.000 ms\n"
+        )
+        return {"error": 0, "returncode": 1 - received, "message": output}
+
+
+class TrafficGenAddrsTests(TestCase):
+    def setUp(self) -> None:
+        self.bt = x86TrafficGenCtfTest(unittests_fixtures.FAKE_ARGS)
+        self.bt.thread_local.init(1)
+        target = _FakeTrafficGen("2001::2")
+        self.devices = {1: _FakeTrafficGen("2001::1", target), 2: target}
+        self.bt.device_info = self.devices
+
+    def tearDown(self) -> None:
+        self.bt.thread_local.clear()
+
+    def _ping(self) -> Dict:
+        return self.bt.cpe_ping(1, 2, "ens1", "ens1", latency_distribution=False)
+
+    def test_stale_address_is_discovered_again(self) -> None:
+        self._ping()
+        self.devices[2].addr = "2001::20"
+        result = self._ping()
+        self.assertIn("1 received", result["ping_summary"])
+        self.assertEqual(2, self.devices[2].cmds.count(NETNS_ADDRS_CMD))
+        self.assertEqual("2001::20", self.devices[1].cmds[-1].split()[-1])
+
+    def test_invalidated_by_device_changes(self) -> None:
+        self._ping()
+        self.bt.invalidate_device_state([3])
+        self.assertFalse(self.bt.traffic_gen_addrs.known(2))
+        self._ping()
+        self.assertEqual(2, self.devices[2].cmds.count(NETNS_ADDRS_CMD))
+
+
+class _FakeTgDevice:
+    """Runs commands in a local shell with fake Terragraph utilities"""
+
+    FAKE_UTILS = (
+        'cat() { case "$1" in /etc/tgversion) echo RELEASE_M90;; '
+        + '/proc/sys/kernel/random/boot_id) echo "$BOOT_ID";; '
+        + '*) command cat "$@";; esac; }; '
+        + "get_fw_version() { echo 10.11.0.92; }; "
+        + 'get_hw_info() { [ "$1" = NODE_ID ] && echo 00:00:00:10:0d:40; }; '
+    )
+
+    def __init__(self, boot_id: str) -> None:
+        self.boot_id = boot_id
+        self.cmds = []
+
+    def device_type(self) -> str:
+        return "generic"
+
+    def action_custom_command(self, cmd: str, timeout: int):
+        self.cmds.append(cmd)
+        result = subprocess.run(
+            ["sh", "-c", self.FAKE_UTILS + cmd],
+            capture_output=True,
+            text=True,
+            timeout=timeout + 10,
+            env={**os.environ, "BOOT_ID": self.boot_id},
+        )
+        return {
+            "error": 0,
+            "returncode": result.returncode,
+            "message": result.stdout,
+            "stderr": result.stderr,
+        }
+
+
+class InventoryTests(TestCase):
+    def setUp(self) -> None:
+        self.bt = BaseTgCtfTest(unittests_fixtures.FAKE_ARGS)
+        self.bt.thread_local.init(1)
+        self.devices = {1: _FakeTgDevice("boot-1"), 2: _FakeTgDevice("boot-2")}
+        self.bt.device_info = self.devices
+
+    def tearDown(self) -> None:
+        self.bt.thread_local.clear()
+
+    def test_collect_inventory_once(self) -> None:
+        self.assertEqual({"RELEASE_M90\n"}, self.bt.get_tg_version())
+        self.assertEqual({"10.11.0.92\n"}, self.bt.get_fw_version())
+        self.assertEqual(
+            {
+                "boot_id": "boot-1\n",
+                "tg_version": "RELEASE_M90\n",
+                "fw_version": "10.11.0.92\n",
+                "hw_info.NODE_ID": "00:00:00:10:0d:40\n",
+            },
+            {k: v for k, v in self.bt.inventory[1].items() if k != "kernel"},
+        )
+        # One command per device for both versions
+        self.assertEqual([1, 1], [len(d.cmds) for d in self.devices.values()])
+
+        self.bt.invalidate_inventory([2])
+        self.bt.get_tg_version()
+        self.assertEqual([1, 2], [len(d.cmds) for d in self.devices.values()])
+
+        rows = inventory_rows(self.bt.inventory)
+        self.assertEqual(["1", "2"], [row["node_id"] for row in rows])
+        self.assertEqual("RELEASE_M90", rows[0]["tg_version"])
+
+    def test_persistent_cache(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            self.bt.inventory_cache = InventoryCache(os.path.join(tmp_dir, "cache"))
+            self.bt.collect_inventory()
+
+            # A new run (new cache instance) only probes boot IDs
+            self.bt.inventory = {}
+            self.bt.inventory_cache = InventoryCache(os.path.join(tmp_dir, "cache"))
+            self.devices[2].boot_id = "boot-2-rebooted"
+            inventory = self.bt.collect_inventory()
+
+        self.assertEqual("boot-1\n", inventory[1]["boot_id"])
+        self.assertEqual("boot-2-rebooted\n", inventory[2]["boot_id"])
+        # First run: boot ID, inventory. Second run: boot ID (and inventory
+        # for the rebooted node 2)
+        self.assertEqual([3, 4], [len(d.cmds) for d in self.devices.values()])
+
+
+class CommandCacheTests(TestCase):
+    def setUp(self) -> None:
+        self.bt = BaseTgCtfTest(
+            Namespace(**vars(unittests_fixtures.FAKE_ARGS), cmd_cache=True)
+        )
+        self.bt.thread_local.init(1)
+        self.devices = {1: _FakeTgDevice("boot-1"), 2: _FakeTgDevice("boot-2")}
+        self.bt.device_info = self.devices
+
+    def tearDown(self) -> None:
+        self.bt.thread_local.clear()
+
+    def _run(
+        self, cmd: str, node_ids: Optional[List[int]] = None, cache: bool = True
+    ) -> Dict[int, str]:
+        futures = self.bt.run_cmd(cmd, node_ids, cache=cache)
+        return {r["node_id"]: r["message"] for r in self.bt.wait_for_cmds(futures)}
+
+    def test_idempotent_commands(self) -> None:
+        expected = {1: "00:00:00:10:0d:40\n", 2: "00:00:00:10:0d:40\n"}
+        self.assertEqual(expected, self._run("get_hw_info NODE_ID"))
+        self.assertEqual(expected, self._run("get_hw_info NODE_ID"))
+        self.assertEqual([1, 1], [len(d.cmds) for d in self.devices.values()])
+
+        # Other commands invalidate the nodes they run on
+        self._run("touch /dev/null", [2])
+        self._run("get_hw_info NODE_ID")
+        self.assertEqual([1, 3], [len(d.cmds) for d in self.devices.values()])
+        # ...unless the cache is skipped
+        self._run("get_hw_info NODE_ID", [1])
+        self._run("get_hw_info NODE_ID", [1], cache=False)
+        self.assertEqual([2, 3], [len(d.cmds) for d in self.devices.values()])
+
+        rows = self.bt.command_cache.rows()
+        self.assertEqual(
+            [("4", "3", "0")], [(r["hits"], r["misses"], r["bypassed"]) for r in rows]
+        )
+
+    def test_disabled(self) -> None:
+        bt = BaseTgCtfTest(unittests_fixtures.FAKE_ARGS)
+        self.assertIsNone(bt.command_cache)
+
+
+class _FakeDeviceConnection:
+    """Connection that succeeds unless given an error"""
+
+    def __init__(self, ip_address: str, error: str = "") -> None:
+        self.ip_address = ip_address
+        self.error = error
+        self.threads = set()
+
+    def connect(self):
+        self.threads.add(threading.get_ident())
+        return {"error": 1 if self.error else 0, "message": self.error}
+
+    def disconnect(self):
+        return {"error": 0, "message": ""}
+
+
+class _FakeConnectedDevice:
+    def __init__(self, connection: _FakeDeviceConnection) -> None:
+        self.connection = connection
+        self.metadata = {"name": f"node-{connection.ip_address}"}
+
+
+class ConnectivityCheckTests(TestCase):
+    def setUp(self) -> None:
+        self.bt = BaseTgCtfTest(unittests_fixtures.FAKE_ARGS)
+        self.bt.device_info = {
+            1: _FakeConnectedDevice(_FakeDeviceConnection("10.0.0.1")),
+            2: _FakeConnectedDevice(_FakeDeviceConnection("10.0.0.2", "refused")),
+            3: _FakeConnectedDevice(_FakeDeviceConnection("10.0.0.3")),
+            4: _FakeConnectedDevice(_FakeDeviceConnection("10.0.0.4", "timeout")),
+        }
+
+    def test_unreachable_devices(self) -> None:
+        unreachable = self.bt.check_device_connectivity()
+
+        self.assertEqual({2: "refused", 4: "timeout"}, unreachable)
+        # Devices are checked outside of the calling thread
+        for device in self.bt.device_info.values():
+            self.assertNotIn(threading.get_ident(), device.connection.threads)
+
+
+def _sample_line(seq: int, uptime: float, busy: int, rx_bytes: int, run: int = 1):
+    return (
+        f"{run} {seq} {1000 + uptime:.2f} {uptime:.2f} cpu.busy={busy} "
+        + f"cpu.total={seq * 100} mem.total=1000 mem.available=250 "
+        + f"if.nic0.rx_bytes={rx_bytes}"
+    )
+
+
+class NodeMetricsTests(TestCase):
+    def _write_proc(self, proc: str, busy: int, idle: int, rx_bytes: int) -> None:
+        """Write a simulated /proc (atomically, the sampler is running)"""
+        files = {
+            "stat": f"cpu  {busy} 0 0 {idle} 0 0 0 0 0 0\ncpu0 {busy} 0 0 {idle}\n",
+            "meminfo": "MemTotal: 2000 kB\nMemFree: 100 kB\nMemAvailable: 500 kB\n",
+            "net/dev": (
+                "Inter-|   Receive |  Transmit\n"
+                + " face |bytes packets errs drop fifo frame compressed multicast|"
+                + "bytes packets errs drop fifo colls carrier compressed\n"
+                + "    lo: 5 5 0 0 0 0 0 0 5 5 0 0 0 0 0 0\n"
+                + f"  nic0:{rx_bytes} 10 0 0 0 0 0 0 2000 20 1 0 0 0 0 0\n"
+            ),
+        }
+        for name, content in files.items():
+            path = os.path.join(proc, name)
+            with open(f"{path}.tmp", "w") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+
+    def test_sampler_on_simulated_proc(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            proc = os.path.join(tmp_dir, "proc")
+            metrics_dir = os.path.join(tmp_dir, "metrics")
+            os.makedirs(os.path.join(proc, "net"))
+            self._write_proc(proc, busy=100, idle=900, rx_bytes=1000)
+            subprocess.run(
+                start_sampler_cmd(0.05, metrics_dir=metrics_dir, proc=proc),
+                shell=True,
+                check=True,
+            )
+            try:
+                time.sleep(0.3)
+                self._write_proc(proc, busy=400, idle=1600, rx_bytes=6000)
+                time.sleep(0.3)
+                first = subprocess.run(
+                    fetch_samples_cmd(metrics_dir=metrics_dir),
+                    shell=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                time.sleep(0.2)
+            finally:
+                subprocess.run(stop_sampler_cmd(), shell=True)
+            last_line = first.splitlines()[-1]
+            second = subprocess.run(
+                fetch_samples_cmd(sample_offset(last_line), metrics_dir=metrics_dir),
+                shell=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+
+        self.assertGreater(len(first.splitlines()), 5)
+        self.assertGreater(len(second.splitlines()), 1)
+        samples = concat_samples(
+            [parse_samples(first), parse_samples(second, previous=last_line)]
+        )
+        # Incremental fetches neither skip nor repeat samples
+        self.assertEqual(list(range(1, len(samples["seq"]) + 1)), list(samples["seq"]))
+        self.assertEqual([True], list(samples["gap"][:1]))
+        self.assertEqual(0, samples["missed"])
+
+        columns = samples["columns"]
+        util = columns["cpu.util"][~np.isnan(columns["cpu.util"])]
+        self.assertEqual([30.0], list(util))
+        self.assertEqual(30.0, np.nanmax(columns["cpu0.util"]))
+        self.assertTrue(np.all(columns["mem.util"] == 75.0))
+        self.assertNotIn("if.lo.rx_bytes", columns)
+        self.assertTrue(np.all(columns["if.nic0.tx_errors"] == 1))
+        # One sample saw the 5000 new bytes
+        rates = columns["if.nic0.rx_bytes/s"]
+        intervals = np.diff(samples["uptime"], prepend=np.nan)
+        self.assertAlmostEqual(5000, np.nansum(rates * intervals), places=3)
+
+    def test_gap_handling(self) -> None:
+        lines = [
+            _sample_line(1, 0.0, busy=0, rx_bytes=0),
+            _sample_line(2, 1.0, busy=50, rx_bytes=100),
+            # Sample 3 was lost
+            _sample_line(4, 3.0, busy=100, rx_bytes=300),
+            _sample_line(5, 4.0, busy=150, rx_bytes=400),
+            # Late sample
+            _sample_line(6, 9.0, busy=200, rx_bytes=500),
+            _sample_line(7, 10.0, busy=250, rx_bytes=600),
+            # Sampler restarted, counters reset (reboot)
+            _sample_line(1, 0.5, busy=10, rx_bytes=10, run=2),
+            _sample_line(2, 1.5, busy=60, rx_bytes=5, run=2),
+        ]
+
+        samples = parse_samples("\n".join(lines[:4]))
+        rest = parse_samples("\n".join(lines[4:]) + "\n", previous=lines[3])
+        samples = concat_samples([samples, rest])
+
+        self.assertEqual([1, 2, 4, 5, 6, 7, 1, 2], list(samples["seq"]))
+        self.assertEqual(
+            [True, False, True, False, True, False, True, False],
+            list(samples["gap"]),
+        )
+        self.assertEqual(1, samples["missed"])
+        util = samples["columns"]["cpu.util"]
+        self.assertEqual([50.0, 50.0, 50.0, 50.0], list(util[[1, 3, 5, 7]]))
+        self.assertTrue(np.isnan(util[[0, 2, 4, 6]]).all())
+        rates = samples["columns"]["if.nic0.rx_bytes/s"]
+        self.assertEqual([100.0, 100.0, 100.0], list(rates[[1, 3, 5]]))
+        # No rate across a counter reset
+        self.assertTrue(np.isnan(rates[7]))
+
+    def test_truncated_lines_are_skipped(self) -> None:
+        samples = parse_samples(f"{_sample_line(1, 0.0, 0, 0)}\n1 2 100")
+
+        self.assertEqual([1], list(samples["seq"]))
+        self.assertEqual([75.0], list(samples["columns"]["mem.util"]))
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, secs: float) -> None:
+        self.now += max(secs, 0.0)
+
+
+class _FakeRebootingNodes:
+    """SSH ports of nodes going down `down` seconds after their reboot and
+    coming back `up` seconds after it, accepting logins `login` seconds
+    after it (None: never)
+    """
+
+    def __init__(self, clock: _FakeClock, timings: dict, errors: dict) -> None:
+        self.clock = clock
+        self.timings = timings
+        self.errors = errors
+        self.rebooted_at = {}
+        self.probes = []
+        self.logins = []
+        self.lock = threading.Lock()
+
+    def reboot(self, node_ids):
+        for node_id in node_ids:
+            self.rebooted_at[node_id] = self.clock.now
+        return {
+            node_id: self.errors[node_id]
+            for node_id in node_ids
+            if node_id in self.errors
+        }
+
+    def _since_reboot(self, node_id: int) -> float:
+        return self.clock.now - self.rebooted_at.get(node_id, float("inf"))
+
+    def probe(self, host: str, port: int, timeout: float) -> bool:
+        node_id = int(host.split(".")[-1])
+        with self.lock:
+            self.probes.append(node_id)
+        down, up, _login = self.timings[node_id]
+        since = self._since_reboot(node_id)
+        return not (down is not None and down <= since < up)
+
+    def ready(self, node_id: int) -> bool:
+        with self.lock:
+            self.logins.append((node_id, self._since_reboot(node_id)))
+        login = self.timings[node_id][2]
+        return login is not None and self._since_reboot(node_id) >= login
+
+
+class RebootOrchestratorTests(TestCase):
+    def _run(self, timings: dict, waves, errors=None, **kwargs):
+        clock = _FakeClock()
+        nodes = _FakeRebootingNodes(clock, timings, errors or {})
+        orchestrator = RebootOrchestrator(
+            reboot_fn=nodes.reboot,
+            ready_fn=nodes.ready,
+            probe_fn=nodes.probe,
+            clock=clock.time,
+            sleep=clock.sleep,
+            **kwargs,
+        )
+        addresses = {node_id: (f"10.0.0.{node_id}", 22) for node_id in timings}
+        return orchestrator.run(waves, addresses), nodes
+
+    def test_waves_leaves_first(self) -> None:
+        hops = hop_distances([(1, 2), (2, 3), (2, 4), (1, 5)], roots=[1])
+
+        self.assertEqual({1: 0, 2: 1, 5: 1, 3: 2, 4: 2}, hops)
+        self.assertEqual(
+            [[3, 4], [2, 5], [1], [6]], reboot_waves([1, 2, 3, 4, 5, 6], hops)
+        )
+        self.assertEqual(
+            [[3], [4], [2], [5], [1]], reboot_waves([1, 2, 3, 4, 5], hops, 1)
+        )
+        self.assertEqual([[1, 2], [3]], reboot_waves([1, 2, 3], wave_size=2))
+
+    def test_downtime_and_waves(self) -> None:
+        reboots, nodes = self._run(
+            {1: (3.0, 40.0, 55.0), 2: (10.0, 60.0, 60.0), 3: (2.0, 30.0, 30.0)},
+            [[1, 2], [3]],
+        )
+
+        self.assertEqual([RebootState.READY] * 3, [r.state for r in reboots.values()])
+        # Going down is detected within a probe interval, coming back up
+        # within the (backed off) probe interval
+        for node_id, (down, up, login) in nodes.timings.items():
+            reboot = reboots[node_id]
+            self.assertLessEqual(down, reboot.down_at - reboot.reboot_at)
+            self.assertLessEqual(reboot.down_at - reboot.reboot_at, down + 1)
+            self.assertLessEqual(up, reboot.up_at - reboot.reboot_at)
+            self.assertLessEqual(reboot.up_at - reboot.reboot_at, up + 10)
+            self.assertLessEqual(login, reboot.reboot_time)
+            self.assertAlmostEqual(reboot.up_at - reboot.down_at, reboot.downtime)
+        # The second wave starts once the first one is ready
+        self.assertEqual(
+            max(reboots[1].ready_at, reboots[2].ready_at), reboots[3].reboot_at
+        )
+        # SSH logins are only attempted once the port is open again, and
+        # probes back off while nodes are down
+        for node_id, since_reboot in nodes.logins:
+            self.assertLessEqual(nodes.timings[node_id][1], since_reboot)
+        self.assertEqual(
+            [1, 1, 1, 1, 2, 3], sorted(node_id for node_id, _ in nodes.logins)
+        )
+        self.assertLess(nodes.probes.count(2), 20)
+
+    def test_failures(self) -> None:
+        reboots, nodes = self._run(
+            {
+                1: (None, 0.0, 0.0),  # never goes down
+                2: (5.0, float("inf"), None),  # never comes back
+                3: (5.0, 20.0, None),  # never accepts logins
+                4: (5.0, 20.0, 20.0),
+                5: (5.0, 20.0, 20.0),
+            },
+            [[1, 2, 3, 4, 5]],
+            errors={4: "connection lost"},
+            timeout=300.0,
+            down_timeout=60.0,
+        )
+
+        self.assertEqual(
+            {
+                1: "Did not go down",
+                2: "Timed out (DOWN)",
+                3: "Timed out (UP)",
+                4: "Reboot failed: connection lost",
+                5: "",
+            },
+            {node_id: reboot.error for node_id, reboot in reboots.items()},
+        )
+        self.assertEqual(RebootState.READY, reboots[5].state)
+        self.assertEqual("FAILED", reboots[2].row()["state"])
+
+
+# Size of the synthetic crash log scanned by CrashLogTests, and of the
+# multi-GB log scanned if $CTF_LARGE_UNITTESTS is set
+CRASH_LOG_FIXTURE_BYTES = 8 << 20
+LARGE_CRASH_LOG_FIXTURE_BYTES = 2 << 30
+
+
+def _write_crash_log(path: str, size: int, crashes: Dict[int, str]) -> Dict[int, int]:
+    """Write a synthetic log of about `size` bytes, with the crash lines
+    `crashes` after the given numbers of MiB. Returns the byte offset of each
+    crash line.
+    """
+    filler = b"I1019 12:00:00.000000  1234 Minion.cpp:42] heartbeat ok\n"
+    block = filler * ((1 << 20) // len(filler))
+    offsets = {}
+    with open(path, "ab") as f:
+        for mib in range(size >> 20):
+            if mib in crashes:
+                offsets[mib] = f.tell()
+                f.write(crashes[mib].encode() + b"\n")
+                f.write(b"frame 1\nframe 2\nframe 3\nframe 4\n")
+            f.write(block)
+    return offsets
+
+
+class CrashLogTests(TestCase):
+    def _scan(self, index: CrashLogIndex, path: str) -> Dict:
+        result = subprocess.run(
+            ["sh", "-c", index.scan_cmd(1, [path, path + ".missing"])],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.cmd_output = result.stdout
+        return index.update(1, result.stdout)
+
+    def _check_scan_log(self, size: int) -> None:
+        index = CrashLogIndex()
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "current")
+            last = (size >> 20) - 1
+            middle = last // 2
+            offsets = _write_crash_log(
+                path,
+                size,
+                {
+                    0: "*** Aborted at 1602198897 (unix time) try date",
+                    middle: "*** Check failure stack trace: ***",
+                    last: "E1019 *** Terminated due to exception: ***",
+                },
+            )
+            matches = self._scan(index, path)[path]
+            self.assertEqual(
+                [(offsets[0], "abort"), (offsets[middle], "check_failure")],
+                [(m.offset, m.signature) for m in matches[:2]],
+            )
+            self.assertEqual((offsets[last], "exception"), matches[2][:2])
+            self.assertEqual(["frame 1", "frame 2", "frame 3"], matches[1].context)
+            self.assertEqual(3, len(matches))
+            self.assertNotIn(path + ".missing", index.files[1])
+
+            # Unchanged: not scanned again
+            self.assertEqual(matches, self._scan(index, path)[path])
+            self.assertIn(f"@unchanged {path}", self.cmd_output)
+
+            # Appended: only the new bytes are scanned
+            size = os.path.getsize(path)
+            appended = _write_crash_log(path, 2 << 20, {1: "*** Aborted at 1602199999"})
+            matches = self._scan(index, path)[path]
+            self.assertIn(f" {size} {path}", self.cmd_output.splitlines()[0])
+            self.assertEqual(4, len(matches))
+            self.assertEqual(appended[1], matches[3].offset)
+            self.assertGreater(appended[1], size)
+            with open(path, "rb") as f:
+                f.seek(matches[3].offset)
+                self.assertEqual(b"*** Aborted at 1602199999\n", f.readline())
+
+            # Replaced (e.g. rotated): scanned from the start
+            os.remove(path)
+            replaced = _write_crash_log(path, 2 << 20, {1: "*** Aborted at 1602200000"})
+            matches = self._scan(index, path)[path]
+            self.assertIn(f" 0 {path}", self.cmd_output.splitlines()[0])
+            self.assertEqual([replaced[1]], [m.offset for m in matches])
+
+    def test_scan_log(self) -> None:
+        self._check_scan_log(CRASH_LOG_FIXTURE_BYTES)
+
+    @skipUnless(os.environ.get("CTF_LARGE_UNITTESTS"), "writes a multi-GB log")
+    def test_scan_multi_gb_log(self) -> None:
+        self._check_scan_log(LARGE_CRASH_LOG_FIXTURE_BYTES)
+
+    def test_scan_clean_log(self) -> None:
+        index = CrashLogIndex()
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "current")
+            _write_crash_log(path, 4 << 20, {})
+            self.assertEqual({}, self._scan(index, path))
+            self.assertEqual([path], list(index.files[1]))
+
+
+class _FakeChannel:
+    """paramiko Channel running commands in a local shell, optionally
+    dropping the connection after `drop_after` bytes
+    """
+
+    def __init__(self, drop_after: int = -1) -> None:
+        self.drop_after = drop_after
+        self.received = 0
+        self.proc = None
+
+    def exec_command(self, cmd: str) -> None:
+        self.proc = subprocess.Popen(["sh", "-c", cmd], stdout=subprocess.PIPE)
+
+    def recv(self, nbytes: int) -> bytes:
+        if self.drop_after >= 0:
+            nbytes = min(nbytes, self.drop_after - self.received)
+            if nbytes <= 0:
+                return b""
+        data = self.proc.stdout.read1(nbytes)
+        self.received += len(data)
+        return data
+
+    def settimeout(self, timeout: float) -> None:
+        pass
+
+    def recv_exit_status(self) -> int:
+        if self.drop_after >= 0 and self.received >= self.drop_after:
+            return -1  # connection lost
+        return self.proc.wait()
+
+    def close(self) -> None:
+        self.proc.stdout.close()
+        self.proc.wait()
+
+
+class SysdumpStreamTests(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.src = os.path.join(self.tmp_dir.name, "var", "log")
+        os.makedirs(self.src)
+        self.files = {"messages": os.urandom(1 << 20), "current": b"ok\n" * 1000}
+        for name, content in self.files.items():
+            with open(os.path.join(self.src, name), "wb") as f:
+                f.write(content)
+        self.spool = os.path.join(self.tmp_dir.name, "sysdump-spool")
+        self.local = os.path.join(self.tmp_dir.name, "sysdump")
+        self.channels = []
+
+    def _open_channel(self, drops: Dict[int, int]):
+        def open_channel() -> _FakeChannel:
+            channel = _FakeChannel(drops.get(len(self.channels), -1))
+            self.channels.append(channel)
+            return channel
+
+        return open_channel
+
+    def _stream(self, open_channel, paths: Optional[List[str]] = None, **kwargs):
+        # The archive suffix depends on the compressor: pin gzip
+        return stream_sysdump(
+            open_channel,
+            self.spool,
+            self.local,
+            paths or [self.src],
+            compressor="gzip",
+            **kwargs,
+        )
+
+    def _assert_archive(self, path: str) -> None:
+        with tarfile.open(path) as tar:
+            for name, content in self.files.items():
+                member = tar.extractfile(f"{self.src.lstrip('/')}/{name}")
+                self.assertEqual(content, member.read())
+
+    def test_stream(self) -> None:
+        stream = self._stream(self._open_channel({}))
+        self.assertEqual(self.local + ".tar.gz", stream.path)
+        self.assertEqual(os.path.getsize(stream.path), stream.size)
+        self.assertFalse(stream.truncated)
+        self.assertEqual(0, stream.resumes)
+        self._assert_archive(stream.path)
+        # The spool was verified, then removed
+        self.assertEqual(2, len(self.channels))
+        self.assertFalse(os.path.exists(self.spool))
+
+    def test_resume_after_drop(self) -> None:
+        stream = self._stream(self._open_channel({0: 100000, 1: 200000}))
+        self.assertEqual(2, stream.resumes)
+        self.assertEqual(100000, self.channels[0].received)
+        self.assertIn("tail -c +100001 ", self.channels[1].proc.args[2])
+        self.assertIn("tail -c +300001 ", self.channels[2].proc.args[2])
+        self._assert_archive(stream.path)
+        self.assertFalse(os.path.exists(self.spool))
+
+    def test_restart_without_spool(self) -> None:
+        def open_channel() -> _FakeChannel:
+            if len(self.channels) == 1:
+                os.remove(self.spool)  # e.g. the node rebooted
+            return opener()
+
+        opener = self._open_channel({0: 100000})
+        stream = self._stream(open_channel)
+        self.assertEqual(2, stream.resumes)
+        self.assertNotIn("tail", self.channels[2].proc.args[2])
+        self._assert_archive(stream.path)
+
+    def test_byte_budget(self) -> None:
+        stream = self._stream(self._open_channel({}), max_bytes=50000)
+        self.assertTrue(stream.truncated)
+        self.assertEqual(50000, stream.size)
+        self.assertEqual(50000, os.path.getsize(stream.path))
+
+    def test_failure_keeps_partial_output(self) -> None:
+        with self.assertRaises(SysdumpStreamError):
+            self._stream(self._open_channel({0: 1000, 1: 0, 2: 0}))
+        self.assertEqual(1000, os.path.getsize(self.local + ".part"))
+
+    def test_default_compressor(self) -> None:
+        # zstd if available, gzip otherwise
+        stream = stream_sysdump(
+            self._open_channel({}), self.spool, self.local, [self.src]
+        )
+        self.assertIn(stream.path, (self.local + ".tar.zst", self.local + ".tar.gz"))
+        self.assertEqual(os.path.getsize(stream.path), stream.size)
+        self.assertFalse(os.path.exists(self.spool))
+
+    def test_archive_failure(self) -> None:
+        missing = os.path.join(self.tmp_dir.name, "missing")
+        with self.assertRaises(SysdumpStreamError) as cm:
+            self._stream(self._open_channel({}), [self.src, missing], retries=1)
+        self.assertEqual(EXIT_ARCHIVE_FAILED, cm.exception.status)
+        # Restarted once, without resuming from the incomplete spool
+        self.assertEqual(2, len(self.channels))
+        self.assertNotIn("tail", self.channels[1].proc.args[2])
+        self.assertFalse(os.path.exists(self.local + ".part"))
+        spool_name = os.path.basename(self.spool)
+        leftovers = [f for f in os.listdir(self.tmp_dir.name) if spool_name in f]
+        self.assertEqual([], leftovers)
+
+    def test_puma_fetch_logfile(self) -> None:
+        class FakeSshConnection:
+            ip_address = "fake"
+
+            def connect(self, timeout=None) -> None:
+                pass
+
+            def disconnect(self) -> None:
+                pass
+
+            def get_transport(self):
+                return self
+
+            def open_session(self) -> _FakeChannel:
+                return _FakeChannel()
+
+        test = PumaTgCtfTest(unittests_fixtures.FAKE_ARGS)
+        test.SYSDUMP_PATHS = [self.src]
+        test.sysdump_spool_path = lambda: self.spool
+        test.test_args["stream_sysdump"] = True
+        test.test_args["sysdump_compressor"] = "gzip"
+        local_dir = os.path.join(self.tmp_dir.name, "logs")
+        os.makedirs(local_dir)
+        local_files = test.fetch_logfile(1, FakeSshConnection(), local_dir, self.spool)
+        self.assertEqual([f"{local_dir}/sysdump-spool.tar.gz"], local_files)
+        self._assert_archive(local_files[0])
+        self.assertEqual(test.sysdump_streams[1].path, local_files[0])
+
+
+def _scan_json(tokens: int, routes_per_response: int) -> str:
+    """Synthetic getScanStatus result: one TX response without routes and
+    one RX response with `routes_per_response` routes per scan (the SNR of
+    beam pair (tx, rx) is (tx + rx) % 30)
+    """
+    route = (
+        '{{"route": {{"tx": {tx}, "rx": {rx}}}, "rssi": -40, "snrEst": {snr}, '
+        + '"postSnr": 1.5, "rxStart": {i}, "packetIdx": {pkt}, "sweepIdx": 0}}'
+    )
+    scans = []
+    for token in range(1, tokens + 1):
+        routes = ", ".join(
+            route.format(
+                tx=i % 64,
+                rx=(i // 64) % 64,
+                snr=(i % 64 + (i // 64) % 64) % 30,
+                i=i,
+                pkt=(i // 4096) % 2,
+            )
+            for i in range(routes_per_response)
+        )
+        scans.append(
+            f'"{token}": {{"type": 1, "mode": 2, "txNode": "fa:ce:00:00:00:01", '
+            + '"startBwgdIdx": 12345, "apply": true, "responses": {'
+            + '"fa:ce:00:00:00:01": {"status": 0, "routeInfoList": [], '
+            + '"oldBeam": 1, "newBeam": 2}, '
+            + f'"fa:ce:00:00:00:02": {{"status": {token % 2}, "routeInfoList": [{routes}], '
+            + '"oldBeam": 3, "newBeam": 4}}}'
+        )
+    return '{"note": "scän", "scans": {' + ", ".join(scans) + '}, "count": 1}'
+
+
+class ScanResultsTests(TestCase):
+    def test_iter_scans(self) -> None:
+        text = _scan_json(3, 10)
+        data = text.encode()
+        # Tiny chunks split keys, numbers and UTF-8 sequences
+        chunks = [data[i : i + 7] for i in range(0, len(data), 7)]
+        self.assertEqual(
+            list(json.loads(text)["scans"].items()), list(iter_scans(chunks))
+        )
+        self.assertEqual([], list(iter_scans(['{"scans": {}}'])))
+        with self.assertRaises(ValueError):
+            list(iter_scans([text[:-20]]))
+
+    def test_table(self) -> None:
+        table = ScanTable.from_scans(iter_scans([_scan_json(2, 8192)]))
+        self.assertEqual(["fa:ce:00:00:00:01", "fa:ce:00:00:00:02"], table.nodes)
+        self.assertEqual([1, 2], table.scans["token"].tolist())
+        self.assertEqual([0, 8192] * 2, table.responses["routes"].tolist())
+        self.assertEqual(2 * 8192, len(table.measurements))
+        first = table.measurements[65]
+        self.assertEqual((1, 0, 1, 1, 1, 0), tuple(first)[:6])
+        self.assertEqual(2.0, first["snr"])
+
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "scans.npz")
+            table.save(path)
+            loaded = ScanTable.load(path)
+        self.assertEqual(table.nodes, loaded.nodes)
+        np.testing.assert_array_equal(table.measurements, loaded.measurements)
+        np.testing.assert_array_equal(table.responses, loaded.responses)
+
+        summary = table.summary()
+        self.assertEqual(2, len(summary))
+        self.assertEqual(
+            {
+                "token": 1,
+                "node": "fa:ce:00:00:00:02",
+                "measurements": 8192,
+                "routes pkt0": 4096,
+                "routes pkt1": 4096,
+                "min snr": 0.0,
+                "best tx": 0,
+                "best rx": 29,
+                "best snr": 29.0,
+            },
+            summary[0],
+        )
+
+    def test_million_measurements(self) -> None:
+        text = _scan_json(100, 10000).encode()
+        chunks = (text[i : i + 65536] for i in range(0, len(text), 65536))
+        start = time.perf_counter()
+        table = ScanTable.from_scans(iter_scans(chunks))
+        parse_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        summary = table.summary()
+        summary_secs = time.perf_counter() - start
+        print(
+            f"{len(text) >> 20} MiB, {len(table.measurements)} measurements: "
+            + f"table in {parse_secs:.1f}s, summary in {summary_secs:.2f}s"
+        )
+        self.assertEqual(10**6, len(table.measurements))
+        self.assertEqual(list(range(1, 101)), [row["token"] for row in summary])
+        self.assertTrue(all(row["best snr"] == 29.0 for row in summary))
+        # Per-measurement Python loops would take seconds here
+        self.assertLess(summary_secs, 5)
+
+
+class NodeConfigTransactionTests(TestCase):
+    NODE_CONFIG = {
+        "envParams": {"DPDK_ENABLED": "1"},
+        "tunnelConfig": {"2": {"dstIp": "2001::2", "enabled": True}},
+    }
+
+    def test_diff_skips_unchanged_edits(self) -> None:
+        transaction = NodeConfigTransaction({1: deepcopy(self.NODE_CONFIG)})
+        transaction.set(1, "tunnelConfig.2.dstIp", "2001::2")
+        transaction.set_bool(1, "tunnelConfig.2.enabled", True)
+        transaction.set_bool(1, "tunnelConfig.3.enabled", True)
+        transaction.delete(1, "tunnelConfig.4")
+
+        args, config = transaction.diff(1)
+        self.assertEqual(["-b", "tunnelConfig.3.enabled", "true"], args)
+        self.assertEqual({"enabled": True}, config["tunnelConfig"]["3"])
+        # The cached config is only replaced on commit
+        self.assertNotIn("3", self.NODE_CONFIG["tunnelConfig"])
+
+    def test_diff_last_edit_wins(self) -> None:
+        transaction = NodeConfigTransaction({1: deepcopy(self.NODE_CONFIG)})
+        transaction.set_bool(1, "tunnelConfig.2.enabled", False)
+        transaction.delete(1, "tunnelConfig.2")
+        transaction.set_bool(1, "tunnelConfig.2.enabled", True)
+
+        args, config = transaction.diff(1)
+        self.assertEqual(
+            ["-d", "tunnelConfig.2", "-b", "tunnelConfig.2.enabled", "true"], args
+        )
+        self.assertEqual({"2": {"enabled": True}}, config["tunnelConfig"])
+
+    def test_diff_without_cached_config(self) -> None:
+        transaction = NodeConfigTransaction({})
+        transaction.set_int(1, "envParams.DPDK_ENABLED", 0)
+        transaction.set(1, "envParams.OOB_NETNS", "with space")
+
+        args, config = transaction.diff(1)
+        self.assertEqual(
+            [
+                "-i",
+                "envParams.DPDK_ENABLED",
+                "0",
+                "-s",
+                "envParams.OOB_NETNS",
+                "'with space'",
+            ],
+            args,
+        )
+        self.assertIsNone(config)
+
+    def test_add_config_set_args(self) -> None:
+        transaction = NodeConfigTransaction({1: deepcopy(self.NODE_CONFIG)})
+        transaction.add_config_set_args(
+            1, "-i envParams.DPDK_ENABLED 0 -b tunnelConfig.2.enabled false"
+        )
+        transaction.add_config_set_args(1, "-s envParams.OOB_NETNS 'with space'")
+
+        _args, config = transaction.diff(1)
+        self.assertEqual(
+            {"DPDK_ENABLED": 0, "OOB_NETNS": "with space"}, config["envParams"]
+        )
+        self.assertFalse(config["tunnelConfig"]["2"]["enabled"])
+        for args in ("-i envParams.DPDK_ENABLED", "-b a.b maybe", "-x a.b 1"):
+            with self.assertRaises(ValueError):
+                transaction.add_config_set_args(1, args)
+
+
+class _RecordingTgDevice:
+    """Terragraph device where every command succeeds"""
+
+    def __init__(self) -> None:
+        self.cmds = []
+        # Map from command to its output
+        self.replies = {}
+
+    def device_type(self) -> str:
+        return "terragraph"
+
+    def action_custom_command(self, cmd: str, timeout: int):
+        self.cmds.append(cmd)
+        message = self.replies.get(cmd, "")
+        return {"error": 0, "returncode": 0, "message": message, "stderr": ""}
+
+
+class PumaNodeConfigTests(TestCase):
+    def setUp(self) -> None:
+        self.bt = PumaTgCtfTest(unittests_fixtures.FAKE_ARGS)
+        self.bt.thread_local.init(1)
+        self.device = _RecordingTgDevice()
+        self.bt.device_info = {1: self.device}
+        self.bt.node_configs = {1: {"envParams": {"DPDK_ENABLED": 1}}}
+
+    def tearDown(self) -> None:
+        self.bt.thread_local.clear()
+
+    def test_runtime_edits_update_cache(self) -> None:
+        self.bt.modify_node_config_runtime("-i envParams.DPDK_ENABLED 0", [1])
+        self.assertEqual({"DPDK_ENABLED": 0}, self.bt.node_configs[1]["envParams"])
+
+        # The transaction sees the runtime edit
+        with self.bt.node_config_transaction() as transaction:
+            transaction.set_int(1, "envParams.DPDK_ENABLED", 1)
+        self.assertIn("-i envParams.DPDK_ENABLED 1 && ", self.device.cmds[-1])
+
+    def test_up_to_date_config_is_synced(self) -> None:
+        with self.bt.node_config_transaction() as transaction:
+            transaction.set_int(1, "envParams.DPDK_ENABLED", 1)
+        self.assertEqual(["/usr/sbin/tg2 minion set_node_config"], self.device.cmds)
+
+        with self.bt.node_config_transaction(sync=False) as transaction:
+            transaction.set_int(1, "envParams.DPDK_ENABLED", 1)
+        self.assertEqual(1, len(self.device.cmds))
+
+
+class PumaSystemStatsTests(TestCase):
+    def setUp(self) -> None:
+        self.bt = PumaTgCtfTest(unittests_fixtures.FAKE_ARGS)
+        self.bt.thread_local.init(1)
+        self.device = _RecordingTgDevice()
+        self.device.replies[SYSTEM_STATS_CMD] = "0, mem.util, 20.0\n"
+        self.bt.device_info = {1: self.device}
+        self.bt.node_metrics_interval = 0.5
+        self.bt.node_metrics_stats_every = 2
+
+    def tearDown(self) -> None:
+        self.bt.thread_local.clear()
+
+    def _sample(self, age: float) -> None:
+        line = f"1 1 {time.time() - age:.2f} 10.00 stat.mem.util=10.0"
+        self.bt.node_metrics = {1: [parse_samples(line)]}
+        self.bt.node_metrics_last = {1: line}
+
+    def test_sampled_stats(self) -> None:
+        self._sample(age=1)
+
+        stats = self.bt.get_all_system_stats({"mem.util": "mem_util"}, [1])
+
+        self.assertEqual({1: {"mem_util": 10.0}}, stats)
+        self.assertNotIn(SYSTEM_STATS_CMD, self.device.cmds)
+
+    def test_stale_samples_are_ignored(self) -> None:
+        self._sample(age=10)
+
+        stats = self.bt.get_all_system_stats({"mem.util": "mem_util"}, [1])
+
+        self.assertEqual({1: {"mem_util": 20.0}}, stats)
+
+    def test_stopped_nodes_are_not_sampled(self) -> None:
+        self._sample(age=1)
+
+        self.bt.stop_node_metrics([1])
+        stats = self.bt.get_all_system_stats({"mem.util": "mem_util"}, [1])
+
+        self.assertEqual({}, self.bt.node_metrics)
+        self.assertEqual({1: {"mem_util": 20.0}}, stats)
+
+
+class _FakeTransport:
+    """Opens plain TCP connections in place of ssh channels"""
+
+    def __init__(self) -> None:
+        self.channels = 0
+
+    def is_active(self) -> bool:
+        return True
+
+    def open_channel(self, kind, dest_addr, src_addr):
+        self.channels += 1
+        return socket.create_connection(dest_addr)
+
+
+class _FakeConnection:
+    def __init__(self) -> None:
+        self.transport = _FakeTransport()
+
+    def connect(self):
+        return {"error": 0, "message": ""}
+
+    def get_transport(self):
+        return self.transport
+
+    def disconnect(self):
+        return {}
+
+
+class _ApiServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/fail":
+            # api_service errors have a JSON body
+            status, content_type = 500, "application/json"
+            body = json.dumps({"success": False, "message": "failed"}).encode()
+        elif self.path == "/api/crash":
+            status, content_type = 502, "text/plain"
+            body = b"Bad Gateway"
+        else:
+            status, content_type = 200, "application/json"
+            body = json.dumps({"method": self.path, "data": data}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class ApiServiceClientTests(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ApiServiceHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = _FakeConnection()
+        self.client = ApiServiceClient(
+            self.connection, self.server.server_address[1], host="127.0.0.1"
+        )
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_request_keep_alive(self) -> None:
+        for i in range(3):
+            self.assertEqual(
+                {"method": "/api/getLink", "data": {"name": f"link-{i}"}},
+                self.client.request("getLink", {"name": f"link-{i}"}, timeout=5),
+            )
+        # All requests reused one forwarded connection
+        self.assertEqual(1, self.connection.transport.channels)
+
+    def test_concurrent_requests(self) -> None:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(
+                pool.map(
+                    lambda i: self.client.request("getNode", {"i": i}, timeout=5),
+                    range(8),
+                )
+            )
+        self.assertEqual(list(range(8)), [r["data"]["i"] for r in results])
+
+    def test_stream(self) -> None:
+        body = b"".join(self.client.stream("getTopology", timeout=5, chunk_size=4))
+        self.assertEqual({"method": "/api/getTopology", "data": {}}, json.loads(body))
+
+    def test_error_responses(self) -> None:
+        error = {"success": False, "message": "failed"}
+        self.assertEqual(error, self.client.request("fail", timeout=5))
+        body = b"".join(self.client.stream("fail", timeout=5))
+        self.assertEqual(error, json.loads(body))
+
+        with self.assertRaises(requests.HTTPError):
+            self.client.request("crash", timeout=5)
+        with self.assertRaises(requests.HTTPError):
+            list(self.client.stream("crash", timeout=5))
+
+
+class TestCatalogTests(TestCase):
+    LIST_TESTS = (
+        "import sys\n"
+        "from ctf.ctf_client.runner.ctf_runner import CtfRunner\n"
+        "from terragraph.ctf.tg_ctf_tests import TG_CTF_TEST_SUITES, TG_CTF_TESTS\n"
+        "CtfRunner(4, TG_CTF_TESTS, TG_CTF_TEST_SUITES)._list_tests(None)\n"
+        "print(sorted(m for m in ('numpy', 'pandas') if m in sys.modules))\n"
+    )
+
+    def list_tests(self, cache_path: str) -> str:
+        """List tests in a new process (the test process may already have
+        imported pandas)
+        """
+        root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        env = dict(os.environ, CTF_TEST_REGISTRY_CACHE=cache_path)
+        env["PYTHONPATH"] = os.pathsep.join(
+            p for p in (os.path.abspath(root), env.get("PYTHONPATH")) if p
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", self.LIST_TESTS],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+        return result.stdout
+
+    def test_listing_does_not_import_tests(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            cache_path = os.path.join(temp_dir, "test_registry.json")
+            # Tests read from sources, then from the cache
+            cold = self.list_tests(cache_path)
+            self.assertTrue(os.path.exists(cache_path))
+            warm = self.list_tests(cache_path)
+
+        self.assertEqual(cold, warm)
+        self.assertTrue(cold.rstrip().endswith("[]"))
+        self.assertIn("- TestTgPumaIpv6Up: Bring up a Terragraph link", cold)
+        self.assertIn("  > PUMA: IPv6 Up\n", cold)
@@ -12,14 +12,19 @@ api_service).
 
 import json
 import logging
+import threading
 from argparse import Namespace
-from typing import Any, cast, Dict, List, Optional, Set
+from typing import Any, cast, Dict, Iterator, List, Optional, Set
 
+import requests
+from ctf.common.connections.SSHConnection import SSHConnection
 from ctf.ctf_client.runner.exceptions import (
     DeviceCmdError,
     DeviceConfigError,
     TestFailed,
 )
+from terragraph.ctf.api_service import ApiServiceClient
+from terragraph.ctf.scan_results import iter_scans, ScanTable
 from terragraph.ctf.tg import BaseTgCtfTest
 
 
@@ -44,6 +49,10 @@ API_SERVICE_HTTP_PORT = 8080
 class x86TgCtfTest(BaseTgCtfTest):
     def __init__(self, args: Namespace) -> None:
         super().__init__(args)
+        # api_service HTTP clients per node ID (None if the node cannot be
+        # reached through an ssh port forward), see api_service_request()
+        self.api_service_clients: Dict[int, Optional[ApiServiceClient]] = {}
+        self._api_service_clients_lock = threading.Lock()
 
     @staticmethod
     def test_params() -> Dict[str, Dict]:
@@ -56,6 +65,14 @@ class x86TgCtfTest(BaseTgCtfTest):
             "default": True,
             "convert": lambda k: k.lower() == "true",
         }
+        test_params["api_service_tunnel"] = {
+            "desc": (
+                "Send api_service requests directly from the runner through "
+                + "an ssh port forward (instead of running curl on the host)"
+            ),
+            "default": True,
+            "convert": lambda k: k.lower() == "true",
+        }
         test_params["keep_ctrl_alive"] = {
             "desc": "Keep E2E controller services alive after end of the test",
             "default": False,
@@ -200,6 +217,7 @@ class x86TgCtfTest(BaseTgCtfTest):
         super().post_run()
         if not self.test_args["keep_ctrl_alive"]:
             self.stop_ctrl_services()
+        self.close_api_service_clients()
 
     def _chroot_cmd(self, cmd: str) -> str:
         """Wrap the given command in 'chroot'."""
@@ -440,6 +458,41 @@ class x86TgCtfTest(BaseTgCtfTest):
             if result["message"].strip():
                 self.log_to_ctf(result["message"])
 
+    def get_api_service_client(self, node_id: int) -> Optional[ApiServiceClient]:
+        """Return the api_service client of a node, opening the ssh port
+        forward on first use. Returns None if the node can't be reached
+        that way (the caller should fall back to running curl on the node).
+        """
+        with self._api_service_clients_lock:
+            if node_id in self.api_service_clients:
+                return self.api_service_clients[node_id]
+
+            client = None
+            connection = self.device_info[node_id].connection
+            if self.test_args.get("api_service_tunnel", True) and isinstance(
+                connection, SSHConnection
+            ):
+                try:
+                    client = ApiServiceClient(connection, API_SERVICE_HTTP_PORT)
+                    self.log_to_ctf(
+                        f"Node {node_id}: forwarding api_service to {client.base_url}"
+                    )
+                except ConnectionError as e:
+                    self.log_to_ctf(
+                        f"Node {node_id}: failed to forward api_service port, "
+                        + f"using curl instead: {e}",
+                        "warning",
+                    )
+            self.api_service_clients[node_id] = client
+            return client
+
+    def close_api_service_clients(self) -> None:
+        with self._api_service_clients_lock:
+            for client in self.api_service_clients.values():
+                if client is not None:
+                    client.close()
+            self.api_service_clients.clear()
+
     def api_service_request(
         self,
         method: str,
@@ -450,6 +503,108 @@ class x86TgCtfTest(BaseTgCtfTest):
         if node_id is None:
             node_id = self.find_x86_tg_host_id()
 
+        client = self.get_api_service_client(node_id)
+        if client is None:
+            return self._api_service_request_curl(method, data, node_id)
+
+        try:
+            d = client.request(method, data, timeout=self.timeout)
+        except requests.RequestException as e:
+            error_msg = f"Node {node_id}: api_service request failed: {method}\n{e}"
+            self.log_to_ctf(error_msg, "error")
+            raise DeviceCmdError(error_msg)
+        except ValueError:
+            error_msg = (
+                f"Node {node_id}: api_service request returned invalid JSON: {method}"
+            )
+            self.log_to_ctf(error_msg, "error")
+            raise DeviceCmdError(error_msg)
+
+        self.log_to_ctf(
+            f"api_service {method} {json.dumps(data if data else {})}\n"
+            + json.dumps(d, indent=2, sort_keys=True)
+        )
+        return cast(Dict, d)
+
+    def api_service_stream(
+        self,
+        method: str,
+        data: Optional[Dict[str, Any]] = None,
+        node_id: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """Send an api_service request and yield the raw JSON response in
+        chunks, for large responses which are parsed incrementally.
+        """
+        if node_id is None:
+            node_id = self.find_x86_tg_host_id()
+
+        client = self.get_api_service_client(node_id)
+        if client is None:
+            d = self._api_service_request_curl(method, data, node_id)
+            yield json.dumps(d).encode()
+            return
+
+        self.log_to_ctf(f"api_service {method} {json.dumps(data if data else {})}")
+        try:
+            yield from client.stream(method, data, timeout=self.timeout)
+        except requests.RequestException as e:
+            error_msg = f"Node {node_id}: api_service request failed: {method}\n{e}"
+            self.log_to_ctf(error_msg, "error")
+            raise DeviceCmdError(error_msg)
+
+    def get_scan_table(self, save_path: Optional[str] = None) -> ScanTable:
+        """Fetch the results of all scans (getScanStatus) as a ScanTable,
+        optionally saving the raw JSON response to `save_path`, and record
+        the table as a step artifact.
+        """
+        with open(save_path or "/dev/null", "wb") as f:
+
+            def chunks() -> Iterator[bytes]:
+                for chunk in self.api_service_stream("getScanStatus"):
+                    f.write(chunk)
+                    yield chunk
+
+            try:
+                table = ScanTable.from_scans(iter_scans(chunks()))
+            except ValueError as e:
+                error_msg = f"api_service getScanStatus returned invalid JSON: {e}"
+                self.log_to_ctf(error_msg, "error")
+                raise DeviceCmdError(error_msg)
+        self.save_scan_table(table)
+        return table
+
+    def save_scan_table(self, table: ScanTable, name: str = "scan_results") -> None:
+        """Save a ScanTable as a .npz artifact of the current step, and its
+        per-response summary as a CTF table
+        """
+        self.log_to_ctf(
+            f"Got {len(table.scans)} scan(s) with {len(table.measurements)} "
+            + "route measurement(s)"
+        )
+        file_path = self.step_file_path("scans", f"{name}.npz")
+        table.save(file_path)
+        self.save_ctf_step_file(file_path, "scans")
+
+        rows = [{k: str(v) for k, v in row.items()} for row in table.summary()]
+        if not rows:
+            return
+        self.add_ctf_json_data(
+            {
+                "ctf_tables": [
+                    {
+                        "title": "Scan Results",
+                        "columns": ",".join(rows[0].keys()),
+                        "data_source_list": name,
+                    }
+                ],
+                "ctf_data": [{"data_source": name, "data_list": rows}],
+            }
+        )
+
+    def _api_service_request_curl(
+        self, method: str, data: Optional[Dict[str, Any]], node_id: int
+    ) -> Dict:
+        """Send an api_service request by running curl on the node."""
         url: str = f"http://localhost:{API_SERVICE_HTTP_PORT}/api/{method}"
         cmd: str = f"curl -d '{json.dumps(data if data else {})}' {url}"
         futures: Dict = self.run_cmd(cmd, [node_id])
@@ -623,21 +778,27 @@ class x86TgCtfTest(BaseTgCtfTest):
                 )
             self.log_to_ctf(f"X86 {service} log: \n{result['message']}")
 
-    def get_e2e_cntrl_version(self) -> Set[str]:
-        """Retrieve the e2e controller version string."""
-        e2e_ctrl_node_id = self.find_x86_tg_host_id()
-        version_path: str = f"{TG_REMOTE_ROOTFS_DIR}/etc/tgversion"
-        futures: Dict = self.run_cmd(f"cat {version_path}", [e2e_ctrl_node_id])
-        versions: Set[str] = set()
+    def inventory_sections(self, node_id: int) -> Dict[str, str]:
+        """Add the e2e controller version to the x86 host inventory"""
+        sections = super().inventory_sections(node_id)
+        try:
+            x86_host_id = self.find_x86_tg_host_id()
+        except DeviceConfigError:
+            return sections
+        if node_id == x86_host_id:
+            sections = {
+                **sections,
+                "e2e_controller_version": f"cat {TG_REMOTE_ROOTFS_DIR}/etc/tgversion",
+            }
+        return sections
 
-        for result in self.wait_for_cmds(futures):
-            if not result["success"]:
-                raise DeviceCmdError(
-                    f"Failed to read version from node {result['node_id']}"
-                )
-
-            ver = result["message"]
-            versions.add(ver)
-            self.log_to_ctf(f"Node {result['node_id']} version: {ver.strip()}")
+    def get_e2e_cntrl_version(self) -> Set[str]:
+        """Retrieve the e2e controller version string.
 
-        return versions
+        The controller rootfs can change without a host reboot, so the
+        host inventory is always refreshed.
+        """
+        e2e_ctrl_node_id = self.find_x86_tg_host_id()
+        return self.get_inventory_field(
+            "e2e_controller_version", "version", [e2e_ctrl_node_id], refresh=True
+        )
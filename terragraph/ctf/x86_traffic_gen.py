@@ -13,9 +13,13 @@ import datetime
 import ipaddress
 import logging
 import re
+import shutil
+import tarfile
 import threading
 from argparse import Namespace
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import Any, Dict, List, Optional, Tuple
 
 from ctf.ctf_client.runner.exceptions import (
@@ -25,15 +29,42 @@ from ctf.ctf_client.runner.exceptions import (
     TestUsageError,
 )
 from ctf.ctf_client.runner.lib import BaseCtfTest
+from terragraph.ctf.netns_addrs import AddressMap, NETNS_ADDRS_CMD, parse_netns_addrs
+from terragraph.ctf.pcap import (
+    capture_path,
+    DEFAULT_FILE_COUNT,
+    DEFAULT_FILE_SIZE_MB,
+    DEFAULT_INTERVAL,
+    DEFAULT_SNAPLEN,
+    order_ring_files,
+    PcapSummary,
+    start_capture_cmd,
+    stop_capture_cmd,
+)
+from terragraph.ctf.ping_latency import (
+    latency_ctf_json_data,
+    latency_stats,
+    parse_ping_replies,
+    save_replies,
+)
 
 
 LOG = logging.getLogger(__name__)
 
+# Ping output with more replies than this is not logged line by line
+PING_LOG_MAX_REPLIES = 1000
+
 
 class x86TrafficGenCtfTest(BaseCtfTest):
     def __init__(self, args: Namespace) -> None:
         super().__init__(args)
 
+        # Discovered traffic generator addresses. See netns_addrs.py
+        self.traffic_gen_addrs = AddressMap()
+        # Serializes address discovery, so concurrent lookups of a device
+        # share one discovery
+        self.traffic_gen_addrs_lock = threading.Lock()
+
     @staticmethod
     def test_params() -> Dict[str, Dict]:
         test_params: Dict[str, Dict] = super(
@@ -46,6 +77,12 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         }
         return test_params
 
+    def invalidate_device_state(self, node_ids: Optional[List[int]] = None) -> None:
+        super().invalidate_device_state(node_ids)
+        # Traffic generator addresses come from the prefixes of the nodes they
+        # are connected to, so they may change with any node
+        self.traffic_gen_addrs.invalidate()
+
     # TODO - identify traffic gen devices better?
     # TODO - differentiate traffic gen and x86 TG VM
     def get_traffic_gen_devices(self) -> List[int]:
@@ -101,15 +138,70 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         # pyre-fixme[16]: `x86TrafficGenCtfTest` has no attribute `client_port_name`.
         self.client_port_name = self.read_nodes_data([self.client_id, "port_name"])
 
+    def discover_traffic_gen_addrs(self, traffic_gen_ids: List[int]) -> None:
+        """Discover the addresses of all network namespaces of the given
+        traffic generators, with one command per device run concurrently.
+        Devices where discovery fails are left unknown (lookups then fall
+        back to `ifconfig`).
+        """
+        futures: Dict = self.run_cmd(NETNS_ADDRS_CMD, traffic_gen_ids)
+        for result in self.wait_for_cmds(futures):
+            node_id = result["node_id"]
+            if not result["success"]:
+                self.log_to_ctf(
+                    f"Address discovery failed on traffic generator {node_id}: "
+                    + f"{result['error']}",
+                    "warning",
+                )
+                continue
+            try:
+                addrs = parse_netns_addrs(result["message"])
+            except (ValueError, KeyError) as e:
+                self.log_to_ctf(
+                    f"Address discovery output of traffic generator {node_id} "
+                    + f"could not be parsed: {e}",
+                    "warning",
+                )
+                continue
+            self.traffic_gen_addrs.update(node_id, addrs)
+            LOG.debug(f"traffic generator {node_id} addresses: {addrs}")
+
     def get_x86_traffic_gen_ip(
         self, traffic_gen_id: int, netns: str, intf: str, ipv6: bool = True
     ) -> str:
         """Retrieve CPE ip on the ethernet port the node
-        is connected to the x86 traffic_gen on"""
+        is connected to the x86 traffic_gen on.
+
+        Addresses are resolved from discovered addresses; a device is
+        (re-)discovered when an address is missing, e.g. after a namespace
+        change.
+        """
         if traffic_gen_id not in self.device_info:
             raise TestUsageError(
                 f"traffic generator device {traffic_gen_id} not found in device_info"
             )
+        ip_addr = self.traffic_gen_addrs.lookup(traffic_gen_id, netns, intf, ipv6)
+        if ip_addr is None:
+            with self.traffic_gen_addrs_lock:
+                ip_addr = self.traffic_gen_addrs.lookup(
+                    traffic_gen_id, netns, intf, ipv6
+                )
+                if ip_addr is None:
+                    self.discover_traffic_gen_addrs([traffic_gen_id])
+                    ip_addr = self.traffic_gen_addrs.lookup(
+                        traffic_gen_id, netns, intf, ipv6
+                    )
+        if ip_addr is None:
+            return self._get_x86_traffic_gen_ip_ifconfig(
+                traffic_gen_id, netns, intf, ipv6
+            )
+        return ip_addr
+
+    def _get_x86_traffic_gen_ip_ifconfig(
+        self, traffic_gen_id: int, netns: str, intf: str, ipv6: bool = True
+    ) -> str:
+        """Retrieve CPE ip with one `ifconfig` call (used when address
+        discovery is not available)"""
         if ipv6:
             grep_str = "global"
         else:
@@ -157,6 +249,8 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         interval: float = 1,
         pkt_sz: int = 64,
         tos: str = "",
+        latency_distribution: bool = True,
+        timestamps: bool = False,
     ) -> Dict[str, Any]:
 
         """ping from traffic gen client node to traffic gen server node
@@ -173,6 +267,13 @@ class x86TrafficGenCtfTest(BaseCtfTest):
                           default is 1 second and there are cases of using 0.2 seconds.
           pkt_sz        : to send bytes other than default 64 bytes
           tos           : quality of service related bits
+          latency_distribution: parse every reply to record latency
+                          percentiles, jitter and loss bursts, CDF/histogram
+                          charts and a per-packet .npz artifact
+          timestamps    : timestamp every reply with -D (iputils ping only,
+                          busybox ping does not support it)
+        returns {"ping_summary", "ping_stats", "latency_stats"}
+        (latency_stats is None without latency_distribution)
         """
         # if tos value provided, create a tos param with -Q option
         # or else ignore it by giving empty space in the ping command
@@ -189,6 +290,7 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         if not to_intf:
             to_intf = to_netns
         ret_ping_result = {}
+        cached = self.traffic_gen_addrs.known(to_device_id)
         dest_ip = self.get_x86_traffic_gen_ip(
             to_device_id, to_netns, to_intf, ipv6=ipv6
         )
@@ -197,13 +299,33 @@ class x86TrafficGenCtfTest(BaseCtfTest):
                 f"traffic generator device {from_device_id} not found in device_info"
             )
         ping = "ping6" if ipv6 else "ping"
-        cmd = (
-            f"ip netns exec {from_netns} /bin/{ping} -c {count} "
-            f"-w {wait_time} -i {interval} -s {pkt_sz} {dest_ip} {tos_param}"
-        )
-        cmd_success = self.device_info[from_device_id].action_custom_command(
-            cmd, self.timeout - 1
-        )
+        timestamp_param = "-D " if timestamps else ""
+
+        def run_ping(dest_ip: str) -> Tuple[str, Dict]:
+            cmd = (
+                f"ip netns exec {from_netns} /bin/{ping} {timestamp_param}-c {count} "
+                f"-w {wait_time} -i {interval} -s {pkt_sz} {dest_ip} {tos_param}"
+            )
+            return cmd, self.device_info[from_device_id].action_custom_command(
+                cmd, self.timeout - 1
+            )
+
+        cmd, cmd_success = run_ping(dest_ip)
+        if cached and (cmd_success["error"] or cmd_success.get("returncode")):
+            # The cached address may be stale (e.g. after a prefix change):
+            # discover it again, and ping again if it changed
+            self.traffic_gen_addrs.invalidate(to_device_id)
+            new_dest_ip = self.get_x86_traffic_gen_ip(
+                to_device_id, to_netns, to_intf, ipv6=ipv6
+            )
+            if new_dest_ip != dest_ip:
+                self.log_to_ctf(
+                    f"traffic generator {to_device_id} address changed from "
+                    + f"{dest_ip} to {new_dest_ip}, pinging again",
+                    "warning",
+                )
+                dest_ip = new_dest_ip
+                cmd, cmd_success = run_ping(dest_ip)
         self.log_to_ctf(cmd)
         self.log_to_ctf(f"message:{cmd_success}")
 
@@ -213,7 +335,14 @@ class x86TrafficGenCtfTest(BaseCtfTest):
             raise DeviceCmdError(error_msg)
 
         output = cmd_success["message"]
-        self.log_to_ctf(f"{cmd}\n{output}")
+        replies = parse_ping_replies(output) if latency_distribution else None
+        if replies is not None and len(replies["rtt"]) > PING_LOG_MAX_REPLIES:
+            self.log_to_ctf(
+                f"{cmd}\n({len(replies['rtt'])} replies, not logged)\n"
+                + output[output.rfind("\n---") + 1 :]
+            )
+        else:
+            self.log_to_ctf(f"{cmd}\n{output}")
         ping_summary = ""
         ping_stats = ""
         for output_line in output.split("\n"):
@@ -224,7 +353,21 @@ class x86TrafficGenCtfTest(BaseCtfTest):
 
         self.log_to_ctf(f"ping_summary: {ping_summary}")
         self.log_to_ctf(f"ping_stats: {ping_stats}")
-        self.ping_output_to_ctf_table(ping_summary, ping_stats, from_device_id, dest_ip)
+        stats = None
+        latency_json_data = None
+        if replies is not None:
+            stats = latency_stats(replies)
+            self.log_to_ctf(f"latency_stats: {stats}")
+            data_source = f"Node {from_device_id} to {dest_ip}"
+            latency_json_data = latency_ctf_json_data(replies, stats, data_source)
+            self.save_ping_replies(replies, from_device_id, dest_ip)
+        self.ping_output_to_ctf_table(
+            ping_summary,
+            ping_stats,
+            from_device_id,
+            dest_ip,
+            extra_json_data=latency_json_data,
+        )
 
         if int(ping_summary.split()[3]) == 0:
             error_msg = f"{cmd} from x86 traffic generator {from_device_id} failed: {ping_summary}"
@@ -237,10 +380,25 @@ class x86TrafficGenCtfTest(BaseCtfTest):
             "info",
         )
 
-        ret_ping_result = {"ping_summary": ping_summary, "ping_stats": ping_stats}
+        ret_ping_result = {
+            "ping_summary": ping_summary,
+            "ping_stats": ping_stats,
+            "latency_stats": stats,
+        }
 
         return ret_ping_result
 
+    def save_ping_replies(
+        self, replies: Dict[str, Any], from_device_id: int, dest_ip: str
+    ) -> None:
+        """Save parsed ping replies as a .npz artifact of the current step"""
+        file_path = self.step_file_path(
+            str(from_device_id), f"ping_{dest_ip.replace(':', '_')}.npz"
+        )
+        with open(file_path, "wb") as f:
+            save_replies(f, replies)
+        self.save_ctf_step_file(file_path, str(from_device_id))
+
     def cpe_ping_and_verification(
         self,
         from_device_id: int,
@@ -252,7 +410,6 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         ipv6: bool,
         ping_options: Dict,
     ) -> None:
-
         """ping check and verification from traffic gen client node to traffic gen server node
         input arguments:
           from_device_id: source node id
@@ -371,6 +528,122 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         for node_id in self.get_traffic_gen_devices():
             self.cpe_set_mtu(node_id, self.read_nodes_data([node_id, "port_name"]), mtu)
 
+    def start_packet_capture(
+        self,
+        node_ids: List[int],
+        interface: str,
+        name: str,
+        netns: Optional[str] = None,
+        snaplen: int = DEFAULT_SNAPLEN,
+        file_size_mb: int = DEFAULT_FILE_SIZE_MB,
+        file_count: int = DEFAULT_FILE_COUNT,
+        capture_filter: str = "",
+    ) -> None:
+        """Start a header-only ring buffer pcap capture on `interface` of the
+        given traffic generators (see pcap.py).
+        Default config for traffic generators is each nic in its own namespace.
+        """
+        if netns is None:
+            netns = interface
+
+        cmd = start_capture_cmd(
+            interface,
+            capture_path(interface, name),
+            netns=netns,
+            snaplen=snaplen,
+            file_size_mb=file_size_mb,
+            file_count=file_count,
+            capture_filter=capture_filter,
+        )
+        futures: Dict = self.run_cmd(cmd, node_ids)
+        for result in self.wait_for_cmds(futures):
+            if not result["success"]:
+                error_msg = f"Node {result['node_id']}: {cmd} failed: {result['error']}"
+                self.log_to_ctf(error_msg, "error")
+                raise DeviceCmdError(error_msg)
+            self.log_to_ctf(
+                f"Started packet capture on {interface} of node {result['node_id']}"
+            )
+
+    def stop_packet_capture(
+        self,
+        node_ids: List[int],
+        interface: str,
+        name: str,
+        interval: float = DEFAULT_INTERVAL,
+        upload: bool = True,
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """Stop a capture started with start_packet_capture(), fetch its ring
+        buffer files and record per-DSCP and per-flow summary tables and
+        per-DSCP rates (in bins of `interval` seconds).
+        With `upload`, the capture files are pushed as a step artifact.
+        Returns the per-DSCP summary rows of each node.
+        """
+        path = capture_path(interface, name)
+        archive = f"{path}.tar"
+        cmd = stop_capture_cmd(path, archive)
+        futures: Dict = self.run_cmd(cmd, node_ids)
+        for result in self.wait_for_cmds(futures):
+            if not result["success"]:
+                error_msg = f"Node {result['node_id']}: {cmd} failed: {result['error']}"
+                self.log_to_ctf(error_msg, "error")
+                raise DeviceCmdError(error_msg)
+
+        dscp_rows: Dict[int, List[Dict[str, Any]]] = {}
+        json_data: Dict[str, List] = {}
+        with TemporaryDirectory(prefix="pcap-") as tmp_dir:
+            futures = {}
+            for node_id in node_ids:
+                local_dir = Path(tmp_dir, str(node_id))
+                local_dir.mkdir()
+                futures[
+                    self.thread_pool.submit(
+                        self.fetch_files,
+                        node_id,
+                        self.device_info[node_id].connection,
+                        [archive],
+                        str(local_dir),
+                        self.thread_local.step_idx,
+                    )
+                ] = node_id
+            for future in as_completed(
+                futures.keys(), timeout=self.log_collect_timeout
+            ):
+                node_id = futures[future]
+                if not future.result():
+                    raise DeviceCmdError(
+                        f"stop_packet_capture | failed to fetch capture of node {node_id}"
+                    )
+
+                local_dir = Path(tmp_dir, str(node_id))
+                local_archive = local_dir / Path(archive).name
+                with tarfile.open(local_archive) as tar:
+                    tar.extractall(local_dir)
+                summary = PcapSummary(interval)
+                ring_files = [str(f) for f in local_dir.iterdir() if f != local_archive]
+                for ring_file in order_ring_files(ring_files):
+                    summary.add_file(ring_file)
+                self.log_to_ctf(
+                    f"Node {node_id}: {interface} capture summary: "
+                    + f"{summary.dscp_rows()} ({summary.non_ip_packets} non-IP packets)"
+                )
+                dscp_rows[node_id] = summary.dscp_rows()
+                node_json_data = summary.ctf_json_data(f"Node {node_id} {interface}")
+                for key, values in node_json_data.items():
+                    json_data.setdefault(key, []).extend(values)
+
+                if upload:
+                    file_path = self.step_file_path(str(node_id), Path(archive).name)
+                    shutil.move(str(local_archive), file_path)
+                    self.save_ctf_step_file(file_path, str(node_id))
+
+        futures = self.run_cmd(f"rm -f {archive}", node_ids)
+        for _result in self.wait_for_cmds(futures):
+            pass
+
+        self.add_ctf_json_data(json_data)
+        return dscp_rows
+
     def configure_iperf_stream(
         self,
         traffic_profile: Dict[str, Any],
@@ -598,6 +871,14 @@ class x86TrafficGenCtfTest(BaseCtfTest):
         """
         traffic_streams = {}
         stream_idx = 0
+        # Refresh the addresses of all traffic generators in the profile at
+        # once; streams then resolve addresses from memory
+        self.discover_traffic_gen_addrs(
+            sorted(
+                {stream["from_device_id"] for stream in traffic_profile}
+                | {stream["to_device_id"] for stream in traffic_profile}
+            )
+        )
         for traffic_stream in traffic_profile:
             from_interface = traffic_stream.get(
                 "from_interface", traffic_stream.get("from_netns", None)